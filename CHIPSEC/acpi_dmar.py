@@ -0,0 +1,492 @@
+"""
+ACPI DMAR Table Parser and VT-d Coverage Lookup
+===============================================
+Decodes the DMA Remapping (DMAR) table the firmware publishes for VT-d and
+answers, for any PCI function, which remapping unit translates its DMA and
+which reserved memory regions stay mapped for it.
+
+The table (after the 36-byte ACPI header) holds the host address width, the
+flags (interrupt remapping, x2APIC opt-out, DMA control opt-in) and a list
+of remapping structures:
+- DRHD: a remapping hardware unit (register base, PCI segment) and the
+  devices it covers, or INCLUDE_PCI_ALL for every device of the segment not
+  claimed by another unit
+- RMRR: a memory range the firmware keeps DMA-mapped for the listed devices
+  (USB legacy emulation, integrated graphics)
+- ATSR: root ports (or ALL_PORTS of a segment) whose devices may use
+  Address Translation Services
+- RHSA, ANDD, SATC: decoded as far as the report needs
+Each DRHD/RMRR/ATSR carries device scopes: a start bus and a path of
+(device, function) hops through bridges, naming an endpoint, a bridge and
+everything below it, an IOAPIC, an HPET or an ACPI namespace device.
+
+Parsing works on raw table bytes (a dump, a sysfs table, cs.acpi), so it
+runs offline. Resolving multi-hop paths and bridge scopes needs the bridges'
+bus numbers; give DmarLookup a config reader (ConfigSpaceSnapshot, cs.pci)
+for those, otherwise only single-hop scopes resolve. The lookup is built
+once into a dict of exact B/D/F matches plus 256-entry per-bus tables for
+bridge scopes, so each query is a couple of dict/list lookups.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    dmar = DmarTable.parse(self.cs.acpi.get_table_content('DMAR'))
+    lookup = DmarLookup(dmar, self.snapshot())
+    self.logger.log(str(lookup.coverage(3, 0, 0)))
+
+    python acpi_dmar.py "ACPI SSDT/m93p_acpidump" --device 03:00.0 --dump sim_z390.json
+    python acpi_dmar.py fleet_dumps/*/ --bench 100
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from chipsec.modules.common.acpi_index import ACPI_HEADER_SIZE, AcpiTableIndex
+except ImportError:
+    from acpi_index import ACPI_HEADER_SIZE, AcpiTableIndex
+
+DMAR_SIGNATURE = b'DMAR'
+
+# Host address width, flags, 10 reserved bytes
+DMAR_FIELDS = struct.Struct('<BB10x')
+REMAPPING_HEADER = struct.Struct('<HH')
+
+# Bodies after the type/length header
+DRHD_BODY = struct.Struct('<BBHQ')     # flags, size (reserved before VT-d 3.x), segment, register base
+RMRR_BODY = struct.Struct('<2xHQQ')    # reserved, segment, base, limit (inclusive)
+ATSR_BODY = struct.Struct('<BxH')      # flags, reserved, segment
+RHSA_BODY = struct.Struct('<4xQI')     # reserved, register base, proximity domain
+SATC_BODY = struct.Struct('<BxH')      # flags, reserved, segment
+SCOPE_HEADER = struct.Struct('<BBxxBB')  # type, length, flags/reserved, enumeration ID, start bus
+
+TYPE_DRHD, TYPE_RMRR, TYPE_ATSR, TYPE_RHSA, TYPE_ANDD, TYPE_SATC = range(6)
+STRUCTURE_NAMES = {TYPE_DRHD: 'DRHD', TYPE_RMRR: 'RMRR', TYPE_ATSR: 'ATSR', TYPE_RHSA: 'RHSA',
+                   TYPE_ANDD: 'ANDD', TYPE_SATC: 'SATC'}
+
+SCOPE_ENDPOINT, SCOPE_BRIDGE, SCOPE_IOAPIC, SCOPE_HPET, SCOPE_NAMESPACE = range(1, 6)
+SCOPE_NAMES = {SCOPE_ENDPOINT: 'endpoint', SCOPE_BRIDGE: 'bridge', SCOPE_IOAPIC: 'IOAPIC',
+               SCOPE_HPET: 'HPET', SCOPE_NAMESPACE: 'ACPI device'}
+
+# DMAR flags
+FLAG_INTR_REMAP = 0x1
+FLAG_X2APIC_OPT_OUT = 0x2
+FLAG_DMA_CTRL_OPT_IN = 0x4
+
+DRHD_INCLUDE_PCI_ALL = 0x1
+ATSR_ALL_PORTS = 0x1
+
+# Bridge config dword holding the primary/secondary/subordinate bus numbers
+BRIDGE_BUS_NUMBERS = 0x18
+
+BDF = Tuple[int, int, int]
+
+
+def _bdf_text(bdf: BDF) -> str:
+    return f"{bdf[0]:02X}:{bdf[1]:02X}.{bdf[2]:X}"
+
+
+class DeviceScope(NamedTuple):
+    kind: int
+    enum_id: int
+    start_bus: int
+    path: Tuple[Tuple[int, int], ...]
+
+    @property
+    def kind_name(self) -> str:
+        return SCOPE_NAMES.get(self.kind, f"type {self.kind}")
+
+    def __str__(self):
+        hops = ' -> '.join(f"{dev:02X}.{fun:X}" for dev, fun in self.path)
+        enum = f" #{self.enum_id}" if self.kind in (SCOPE_IOAPIC, SCOPE_HPET, SCOPE_NAMESPACE) else ""
+        return f"{self.kind_name}{enum} bus {self.start_bus:02X} path {hops or '-'}"
+
+
+class Drhd(NamedTuple):
+    flags: int
+    segment: int
+    base: int
+    size: int
+    scopes: Tuple[DeviceScope, ...]
+
+    @property
+    def include_all(self) -> bool:
+        return bool(self.flags & DRHD_INCLUDE_PCI_ALL)
+
+    def __str__(self):
+        scope = "INCLUDE_PCI_ALL" if self.include_all else f"{len(self.scopes)} scope(s)"
+        return f"DRHD 0x{self.base:X} (segment {self.segment}, {scope})"
+
+
+class Rmrr(NamedTuple):
+    segment: int
+    base: int
+    limit: int
+    scopes: Tuple[DeviceScope, ...]
+
+    @property
+    def size(self) -> int:
+        return self.limit - self.base + 1
+
+    def __str__(self):
+        return f"RMRR 0x{self.base:X}-0x{self.limit:X} ({self.size // 1024} KB, segment {self.segment})"
+
+
+class Atsr(NamedTuple):
+    flags: int
+    segment: int
+    scopes: Tuple[DeviceScope, ...]
+
+    @property
+    def all_ports(self) -> bool:
+        return bool(self.flags & ATSR_ALL_PORTS)
+
+    def __str__(self):
+        ports = "ALL_PORTS" if self.all_ports else f"{len(self.scopes)} root port(s)"
+        return f"ATSR segment {self.segment} ({ports})"
+
+
+def _parse_scopes(data: bytes, offset: int, end: int) -> Tuple[DeviceScope, ...]:
+    scopes = []
+    while offset + SCOPE_HEADER.size <= end:
+        kind, length, enum_id, start_bus = SCOPE_HEADER.unpack_from(data, offset)
+        if length < SCOPE_HEADER.size or offset + length > end:
+            raise ValueError(f"Bad device scope length {length} at 0x{offset:X}")
+        path = tuple((data[at], data[at + 1]) for at in range(offset + SCOPE_HEADER.size, offset + length - 1, 2))
+        scopes.append(DeviceScope(kind, enum_id, start_bus, path))
+        offset += length
+    return tuple(scopes)
+
+
+class DmarTable(object):
+    """
+    Decoded DMAR table
+
+    Attributes:
+        host_address_width: DMA physical address width (bits)
+        flags: DMAR flags (FLAG_*)
+        drhds, rmrrs, atsrs: Decoded structures, in table order
+        rhsas: (register base, proximity domain)
+        andds: (ACPI device number, object name)
+        other: (type, length) of structures not decoded
+    """
+
+    def __init__(self, host_address_width: int, flags: int):
+        self.host_address_width = host_address_width
+        self.flags = flags
+        self.drhds: List[Drhd] = []
+        self.rmrrs: List[Rmrr] = []
+        self.atsrs: List[Atsr] = []
+        self.rhsas: List[Tuple[int, int]] = []
+        self.andds: List[Tuple[int, str]] = []
+        self.satcs: List[Atsr] = []
+        self.other: List[Tuple[int, int]] = []
+
+    @classmethod
+    def parse(cls, data) -> 'DmarTable':
+        """Decode raw table bytes (bytes, bytearray or memoryview); ValueError if malformed"""
+        data = bytes(data)
+        if len(data) < ACPI_HEADER_SIZE + DMAR_FIELDS.size or data[0:4] != DMAR_SIGNATURE:
+            raise ValueError("Not a DMAR table")
+        length = min(int.from_bytes(data[4:8], 'little'), len(data))
+        width, flags = DMAR_FIELDS.unpack_from(data, ACPI_HEADER_SIZE)
+        table = cls(width + 1, flags)
+
+        offset = ACPI_HEADER_SIZE + DMAR_FIELDS.size
+        while offset + REMAPPING_HEADER.size <= length:
+            kind, size = REMAPPING_HEADER.unpack_from(data, offset)
+            if size < REMAPPING_HEADER.size or offset + size > length:
+                raise ValueError(f"Bad remapping structure length {size} at 0x{offset:X}")
+            body = offset + REMAPPING_HEADER.size
+            end = offset + size
+            if kind == TYPE_DRHD:
+                flags, unit_size, segment, base = DRHD_BODY.unpack_from(data, body)
+                table.drhds.append(Drhd(flags, segment, base, unit_size,
+                                        _parse_scopes(data, body + DRHD_BODY.size, end)))
+            elif kind == TYPE_RMRR:
+                segment, base, limit = RMRR_BODY.unpack_from(data, body)
+                table.rmrrs.append(Rmrr(segment, base, limit, _parse_scopes(data, body + RMRR_BODY.size, end)))
+            elif kind == TYPE_ATSR:
+                flags, segment = ATSR_BODY.unpack_from(data, body)
+                table.atsrs.append(Atsr(flags, segment, _parse_scopes(data, body + ATSR_BODY.size, end)))
+            elif kind == TYPE_RHSA:
+                table.rhsas.append(RHSA_BODY.unpack_from(data, body))
+            elif kind == TYPE_ANDD:
+                name = data[body + 4:end].split(b'\0', 1)[0].decode('ascii', 'replace')
+                table.andds.append((data[body + 3], name))
+            elif kind == TYPE_SATC:
+                flags, segment = SATC_BODY.unpack_from(data, body)
+                table.satcs.append(Atsr(flags, segment, _parse_scopes(data, body + SATC_BODY.size, end)))
+            else:
+                table.other.append((kind, size))
+            offset = end
+        return table
+
+    @property
+    def interrupt_remapping(self) -> bool:
+        return bool(self.flags & FLAG_INTR_REMAP)
+
+    @property
+    def dma_control_opt_in(self) -> bool:
+        return bool(self.flags & FLAG_DMA_CTRL_OPT_IN)
+
+    def report(self, logger):
+        flags = [name for flag, name in ((FLAG_INTR_REMAP, 'INTR_REMAP'), (FLAG_X2APIC_OPT_OUT, 'X2APIC_OPT_OUT'),
+                                         (FLAG_DMA_CTRL_OPT_IN, 'DMA_CTRL_PLATFORM_OPT_IN')) if self.flags & flag]
+        logger.log(f"[*] DMAR: {self.host_address_width}-bit DMA addresses, flags {', '.join(flags) or 'none'}, "
+                   f"{len(self.drhds)} remapping unit(s), {len(self.rmrrs)} RMRR(s), {len(self.atsrs)} ATSR(s)")
+        for structure in self.drhds + self.rmrrs + self.atsrs + self.satcs:
+            logger.log(f"    {structure}")
+            for scope in structure.scopes:
+                logger.log(f"      {scope}")
+        for base, domain in self.rhsas:
+            logger.log(f"    RHSA 0x{base:X} -> proximity domain {domain}")
+        for number, name in self.andds:
+            logger.log(f"    ANDD #{number}: {name}")
+        for kind, size in self.other:
+            logger.log(f"    Unknown structure type {kind} ({size} bytes)")
+
+
+class DeviceCoverage(NamedTuple):
+    segment: int
+    bdf: BDF
+    unit: Optional[Drhd]
+    via: str
+    rmrrs: Tuple[Rmrr, ...]
+    ats: bool
+
+    def __str__(self):
+        if self.unit is None:
+            text = f"{_bdf_text(self.bdf)}: not covered by any remapping unit"
+        else:
+            text = f"{_bdf_text(self.bdf)}: remapped by DRHD 0x{self.unit.base:X} ({self.via})"
+        if self.rmrrs:
+            text += "; RMRR " + ", ".join(f"0x{r.base:X}-0x{r.limit:X}" for r in self.rmrrs)
+        if self.ats:
+            text += "; ATS allowed"
+        return text
+
+
+class DmarLookup(object):
+    """
+    Which remapping unit, RMRRs and ATS setting apply to a B/D/F
+
+    Args:
+        dmar: Parsed table
+        pci: Config reader with read_dword() for bridge bus numbers (None: single-hop scopes only)
+
+    Attributes:
+        unresolved: Scopes whose path could not be followed without bus numbers
+    """
+
+    def __init__(self, dmar: DmarTable, pci=None):
+        self.dmar = dmar
+        self.pci = pci
+        self.unresolved: List[DeviceScope] = []
+        # Exact (segment, B/D/F) matches, and per segment one entry per bus for bridge scopes
+        self._units: Dict[Tuple[int, BDF], Tuple[Drhd, str]] = {}
+        self._unit_buses: Dict[int, list] = {}
+        self._include_all: Dict[int, Drhd] = {}
+        self._rmrrs: Dict[Tuple[int, BDF], List[Rmrr]] = {}
+        self._rmrr_buses: Dict[int, list] = {}
+        self._ats_all = {atsr.segment for atsr in dmar.atsrs if atsr.all_ports}
+        self._ats: Dict[Tuple[int, BDF], bool] = {}
+        self._ats_buses: Dict[int, list] = {}
+        self._build()
+
+    def _bus_numbers(self, bdf: BDF) -> Optional[Tuple[int, int]]:
+        """(secondary, subordinate) of a bridge"""
+        if self.pci is None:
+            return None
+        try:
+            value = self.pci.read_dword(*bdf, BRIDGE_BUS_NUMBERS)
+        except Exception:
+            return None
+        secondary, subordinate = (value >> 8) & 0xFF, (value >> 16) & 0xFF
+        if value == 0xFFFFFFFF or secondary == 0 or subordinate < secondary:
+            return None
+        return secondary, subordinate
+
+    def resolve(self, scope: DeviceScope) -> Optional[BDF]:
+        """B/D/F a scope's path ends at (None if a hop can't be followed)"""
+        if not scope.path:
+            return None
+        bus = scope.start_bus
+        for dev, fun in scope.path[:-1]:
+            numbers = self._bus_numbers((bus, dev, fun))
+            if numbers is None:
+                return None
+            bus = numbers[0]
+        dev, fun = scope.path[-1]
+        return bus, dev, fun
+
+    def _target(self, scope: DeviceScope) -> Optional[Tuple[BDF, Optional[range]]]:
+        """(B/D/F, buses below it for a bridge scope) of a PCI scope"""
+        if scope.kind not in (SCOPE_ENDPOINT, SCOPE_BRIDGE):
+            return None
+        bdf = self.resolve(scope)
+        if bdf is None:
+            self.unresolved.append(scope)
+            return None
+        if scope.kind == SCOPE_ENDPOINT:
+            return bdf, None
+        numbers = self._bus_numbers(bdf)
+        if numbers is None:
+            self.unresolved.append(scope)
+            return bdf, None
+        return bdf, range(numbers[0], numbers[1] + 1)
+
+    def _build(self):
+        for drhd in self.dmar.drhds:
+            if drhd.include_all:
+                self._include_all.setdefault(drhd.segment, drhd)
+            for scope in drhd.scopes:
+                target = self._target(scope)
+                if target is None:
+                    continue
+                bdf, buses = target
+                self._units[(drhd.segment, bdf)] = (drhd, f"{scope.kind_name} scope")
+                if buses:
+                    table = self._unit_buses.setdefault(drhd.segment, [None] * 256)
+                    for bus in buses:
+                        # Nested bridges: the narrower bus range is the closer scope
+                        if table[bus] is None or table[bus][0] >= len(buses):
+                            table[bus] = (len(buses), (drhd, f"below bridge {_bdf_text(bdf)}"))
+
+        for rmrr in self.dmar.rmrrs:
+            for scope in rmrr.scopes:
+                target = self._target(scope)
+                if target is None:
+                    continue
+                bdf, buses = target
+                self._rmrrs.setdefault((rmrr.segment, bdf), []).append(rmrr)
+                if buses:
+                    table = self._rmrr_buses.setdefault(rmrr.segment, [()] * 256)
+                    for bus in buses:
+                        table[bus] += (rmrr,)
+
+        for atsr in self.dmar.atsrs:
+            for scope in atsr.scopes:
+                target = self._target(scope)
+                if target is None:
+                    continue
+                bdf, buses = target
+                self._ats[(atsr.segment, bdf)] = True
+                if buses:
+                    table = self._ats_buses.setdefault(atsr.segment, [False] * 256)
+                    for bus in buses:
+                        table[bus] = True
+
+    def unit_for(self, bus: int, dev: int, fun: int, segment: int = 0) -> Tuple[Optional[Drhd], str]:
+        """(remapping unit, how it was matched) for a function"""
+        found = self._units.get((segment, (bus, dev, fun)))
+        if found:
+            return found
+        table = self._unit_buses.get(segment)
+        if table and table[bus]:
+            return table[bus][1]
+        drhd = self._include_all.get(segment)
+        if drhd is not None:
+            return drhd, "INCLUDE_PCI_ALL"
+        return None, ""
+
+    def rmrrs_for(self, bus: int, dev: int, fun: int, segment: int = 0) -> Tuple[Rmrr, ...]:
+        """RMRRs the function (or a bridge above it) is listed in"""
+        exact = tuple(self._rmrrs.get((segment, (bus, dev, fun)), ()))
+        table = self._rmrr_buses.get(segment)
+        below = table[bus] if table else ()
+        return exact + tuple(r for r in below if r not in exact)
+
+    def ats_for(self, bus: int, dev: int, fun: int, segment: int = 0) -> bool:
+        if segment in self._ats_all or self._ats.get((segment, (bus, dev, fun))):
+            return True
+        table = self._ats_buses.get(segment)
+        return bool(table and table[bus])
+
+    def coverage(self, bus: int, dev: int, fun: int, segment: int = 0) -> DeviceCoverage:
+        unit, via = self.unit_for(bus, dev, fun, segment)
+        return DeviceCoverage(segment, (bus, dev, fun), unit, via, self.rmrrs_for(bus, dev, fun, segment),
+                              self.ats_for(bus, dev, fun, segment))
+
+
+def load_dmar(path: str) -> Optional[bytes]:
+    """Raw DMAR table from a table file, a multi-table dump or a dump directory"""
+    with AcpiTableIndex(path) as index:
+        view = index.table('DMAR')
+        if view is None:
+            return None
+        with view:
+            return bytes(view)
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+    log_good = log_warning = log_bad = log_error = log
+
+
+def _parse_bdf(text: str) -> BDF:
+    bus, rest = text.split(':')
+    dev, fun = rest.split('.')
+    return int(bus, 16), int(dev, 16), int(fun, 16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode DMAR tables and look up VT-d coverage of devices")
+    parser.add_argument("paths", nargs='+', help="DMAR tables, ACPI dumps or dump directories")
+    parser.add_argument("--device", action='append', default=[], help="B:D.F to look up (repeatable)")
+    parser.add_argument("--dump", help="sim_chipset.py JSON dump supplying bridge bus numbers")
+    parser.add_argument("--bench", type=int, default=0, help="Time this many parse + lookup passes")
+    args = parser.parse_args()
+    logger = _PrintLogger()
+
+    pci = None
+    if args.dump:
+        try:
+            from chipsec.modules.common import sim_chipset
+        except ImportError:
+            import sim_chipset
+        pci = sim_chipset.SimChipset.from_dump(args.dump, record_accesses=False).pci
+    devices = [_parse_bdf(text) for text in args.device]
+
+    # Fleet dumps mostly share a few distinct tables: decode each once
+    tables: Dict[str, List[str]] = {}
+    raw: Dict[str, bytes] = {}
+    for path in args.paths:
+        data = load_dmar(path)
+        if data is None:
+            print(f"{path}: no DMAR table")
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        raw[digest] = data
+        tables.setdefault(digest, []).append(path)
+
+    for digest, paths in tables.items():
+        shown = ', '.join(paths[:3]) + (f", ... ({len(paths)} total)" if len(paths) > 3 else "")
+        print(f"DMAR {digest[:12]} in {shown}:")
+        dmar = DmarTable.parse(raw[digest])
+        dmar.report(logger)
+        lookup = DmarLookup(dmar, pci)
+        for bdf in devices:
+            print(f"    {lookup.coverage(*bdf)}")
+        for scope in lookup.unresolved:
+            print(f"    Unresolved without bridge bus numbers: {scope}")
+
+        if args.bench:
+            queries = devices or [(bus, 0, 0) for bus in range(256)]
+            start = time.perf_counter()
+            for _ in range(args.bench):
+                lookup = DmarLookup(DmarTable.parse(raw[digest]), pci)
+                for bdf in queries:
+                    lookup.coverage(*bdf)
+            elapsed = (time.perf_counter() - start) / args.bench
+            print(f"    Parsed and looked up {len(queries)} device(s) in {elapsed * 1e6:.1f} us per pass")
+
+
+if __name__ == "__main__":
+    main()
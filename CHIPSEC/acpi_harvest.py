@@ -0,0 +1,205 @@
+"""
+Incremental ACPI Table Harvester
+================================
+Copies the ACPI tables exposed by the kernel (/sys/firmware/acpi/tables,
+including the dynamic/ and data/ subdirectories) into a dump directory,
+skipping every table that has not changed since the previous run.
+
+- Each table is stored once, content-addressed by its SHA-256, in a store
+  directory (objects/ab/abcdef...). Machines sharing a store share
+  identical tables instead of keeping a copy each.
+- The dump directory gets a hard link to the stored object per table (a
+  copy when the store is on another file system), so consumers such as
+  acpi_index.py still see plain DSDT, SSDT1, ... files.
+- A manifest in the dump directory records size, mtime, the 36-byte table
+  header and hash per table. A table whose size, mtime and header match the
+  manifest, and whose object and dump file are still in place, is skipped
+  after one stat and a 36-byte read; anything else is read and hashed.
+- Tables that disappeared from the source are dropped from the dump.
+
+A repeated run on the same machine therefore reads almost nothing and
+writes only the manifest.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python acpi_harvest.py acpi_dumps --store acpi_store
+    python acpi_harvest.py acpi_dumps --source "ACPI SSDT/m93p_acpidump" --verify
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, NamedTuple, Optional
+
+SYSFS_ACPI_TABLES = '/sys/firmware/acpi/tables'
+MANIFEST_NAME = 'manifest.json'
+
+ACPI_HEADER_SIZE = 36
+READ_CHUNK = 1 << 20
+
+
+class HarvestStats(NamedTuple):
+    tables: int
+    hashed: int
+    skipped: int
+    stored: int
+    removed: int
+    bytes_read: int
+
+    def __str__(self):
+        return (f"{self.tables} table(s): {self.skipped} unchanged, {self.hashed} hashed "
+                f"({self.bytes_read} bytes read), {self.stored} new in store, {self.removed} removed")
+
+
+def _read_header(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read(ACPI_HEADER_SIZE)
+
+
+class AcpiHarvester(object):
+    """
+    Content-addressed, manifest-checked copy of an ACPI table directory
+
+    Args:
+        out_dir: Dump directory (gets one file per table plus the manifest)
+        store_dir: Content-addressed object store (default: out_dir/.store)
+        verify: Hash every table even when the manifest says it is unchanged
+    """
+
+    def __init__(self, out_dir: str, store_dir: Optional[str] = None, verify: bool = False):
+        self.out_dir = out_dir
+        self.store_dir = store_dir or os.path.join(out_dir, '.store')
+        self.verify = verify
+        self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        self.manifest: Dict[str, dict] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f).get('tables', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, source: str):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'source': source, 'tables': self.manifest}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.store_dir, 'objects', digest[:2], digest)
+
+    def _hash_into_store(self, path: str) -> tuple:
+        """Stream a table into the store; returns (digest, bytes read, newly stored)"""
+        objects = os.path.join(self.store_dir, 'objects')
+        os.makedirs(objects, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=objects, prefix='.incoming-')
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: src.read(READ_CHUNK), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                    size += len(chunk)
+            name = digest.hexdigest()
+            target = self.object_path(name)
+            if os.path.exists(target):
+                os.unlink(tmp)
+                return name, size, False
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Dump files are hard links to the object, keep them from being edited in place
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, target)
+            return name, size, True
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _materialize(self, name: str, digest: str):
+        """Point out_dir/name at the stored object"""
+        target = os.path.join(self.out_dir, name)
+        source = self.object_path(digest)
+        if os.path.exists(target):
+            if os.path.samefile(target, source):
+                return
+            os.unlink(target)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+    def _unchanged(self, name: str, st: os.stat_result, header: bytes) -> bool:
+        entry = self.manifest.get(name)
+        if self.verify or entry is None:
+            return False
+        if entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns or entry['header'] != header.hex():
+            return False
+        target = os.path.join(self.out_dir, name)
+        return os.path.exists(self.object_path(entry['sha256'])) and os.path.exists(target)
+
+    def harvest(self, source: str = SYSFS_ACPI_TABLES) -> HarvestStats:
+        """Bring out_dir up to date with the tables in source"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        seen = set()
+        hashed = skipped = stored = bytes_read = 0
+
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, source).replace(os.sep, '/')
+                st = os.stat(path)
+                header = _read_header(path)
+                seen.add(name)
+
+                if self._unchanged(name, st, header):
+                    skipped += 1
+                    continue
+
+                digest, size, new = self._hash_into_store(path)
+                hashed += 1
+                stored += new
+                bytes_read += size
+                self._materialize(name, digest)
+                self.manifest[name] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                       'header': header.hex(), 'sha256': digest}
+
+        removed = 0
+        for name in sorted(set(self.manifest) - seen):
+            del self.manifest[name]
+            target = os.path.join(self.out_dir, name)
+            if os.path.exists(target):
+                os.unlink(target)
+            removed += 1
+
+        self._save_manifest(source)
+        return HarvestStats(len(seen), hashed, skipped, stored, removed, bytes_read)
+
+
+def harvest_tables(out_dir: str, source: str = SYSFS_ACPI_TABLES, store_dir: Optional[str] = None,
+                   verify: bool = False) -> HarvestStats:
+    """One-call harvest of source into out_dir"""
+    return AcpiHarvester(out_dir, store_dir, verify).harvest(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally copy ACPI tables into a dump directory")
+    parser.add_argument("out_dir", help="Dump directory")
+    parser.add_argument("--source", default=SYSFS_ACPI_TABLES, help="Table directory to harvest")
+    parser.add_argument("--store", help="Shared content-addressed store (default: <out_dir>/.store)")
+    parser.add_argument("--verify", action='store_true', help="Re-hash every table")
+    args = parser.parse_args()
+
+    stats = harvest_tables(args.out_dir, args.source, args.store, args.verify)
+    print(f"Harvested {args.source} into {args.out_dir}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Memory-Mapped ACPI Table Indexer
+================================
+Indexes the ACPI tables in a dump without reading it into memory: raw
+multi-table dumps, directories of single-table files (e.g. the *.dat files
+written by "acpidump -b") and acpidump's text (hex) format.
+
+Each source is memory-mapped read-only and walked header by header:
+- a table header is 36 bytes: signature, length, revision, checksum, OEM
+  ID, OEM table ID, OEM revision, creator ID, creator revision
+- the table length is taken from the header, so tables are never truncated
+  and the walk jumps straight to the next table
+- bytes between tables are searched for the next plausible header, which is
+  only accepted there if its checksum is valid (the bytes of a table sum to 0)
+- tables that run past the end of their source are reported, not indexed
+
+The result is a signature -> [AcpiTable(offset, length, ...)] index.
+Consumers get zero-copy memoryviews of each table, so memory use stays
+constant however large the dump is. Text dumps are decoded line by line into
+an anonymous temporary file which is mapped the same way.
+
+Views keep their mapping alive - release them (or use them as context
+managers) before close().
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python acpi_index.py "ACPI SSDT/m93p_acpidump"
+    python acpi_index.py acpi_dumps/acpi_dump.dat --extract extracted_tables
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import struct
+import tempfile
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+ACPI_HEADER = struct.Struct('<4sIBB6s8sI4sI')
+ACPI_HEADER_SIZE = ACPI_HEADER.size
+
+# FACS has a signature and length but no checksum or standard header
+NO_CHECKSUM_SIGNATURES = {b'FACS'}
+
+# Four signature characters - candidates for the start of a table
+SIGNATURE_PATTERN = re.compile(rb'[A-Z][A-Z0-9_!]{3}')
+
+# acpidump text format: "DSDT @ 0x..." followed by "  0000: 44 53 44 54 ..."
+TEXT_TABLE_LINE = re.compile(rb'^\s*[A-Z0-9_!]{4} @ 0x[0-9A-Fa-f]+\s*$')
+TEXT_DATA_LINE = re.compile(rb'^\s*[0-9A-Fa-f]{4,8}:((?: [0-9A-Fa-f]{2}){1,16})')
+
+TABLE_EXTENSIONS = ('', '.dat', '.bin', '.aml')
+
+# Bytes summed per step when verifying checksums
+CHECKSUM_CHUNK = 1 << 20
+
+
+class AcpiTable(NamedTuple):
+    signature: str
+    source: str
+    offset: int
+    length: int
+    revision: int
+    oem_id: str
+    oem_table_id: str
+    checksum_ok: bool
+
+    def __str__(self):
+        status = "" if self.checksum_ok else ", BAD CHECKSUM"
+        return (f"{self.signature} rev {self.revision} {self.oem_id}/{self.oem_table_id}, "
+                f"{self.length} bytes at 0x{self.offset:X} in {os.path.basename(self.source)}{status}")
+
+
+def _text(raw: bytes) -> str:
+    return raw.rstrip(b'\0 ').decode('ascii', 'replace')
+
+
+def _checksum_ok(view: memoryview) -> bool:
+    total = 0
+    for start in range(0, len(view), CHECKSUM_CHUNK):
+        total += sum(view[start:start + CHECKSUM_CHUNK])
+    return total & 0xFF == 0
+
+
+def is_text_dump(path: str) -> bool:
+    """Whether a file is acpidump's text (hex) output rather than raw tables"""
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                return TEXT_TABLE_LINE.match(line) is not None
+    return False
+
+
+def decode_text_dump(path: str, out) -> int:
+    """Stream acpidump text output into out as raw tables; returns bytes written"""
+    written = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            match = TEXT_DATA_LINE.match(line)
+            if match:
+                written += out.write(bytes.fromhex(match.group(1).decode('ascii')))
+    return written
+
+
+class AcpiTableIndex(object):
+    """
+    Signature -> table index over one or more memory-mapped sources
+
+    Args:
+        paths: Dump files and/or directories of table files
+
+    Attributes:
+        tables: {signature: [AcpiTable, ...]} in source order
+        problems: Descriptions of tables that could not be indexed
+    """
+
+    def __init__(self, *paths: str):
+        self.tables: Dict[str, List[AcpiTable]] = {}
+        self.problems: List[str] = []
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._files = []
+        self._seen = set()
+        for path in paths:
+            self.add(path)
+
+    def add(self, path: str):
+        """Index a dump file, or every table file in a directory"""
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                # sysfs names tables by bare signature (DSDT, SSDT1, ...)
+                if (os.path.isfile(full) and os.path.getsize(full)
+                        and os.path.splitext(name)[1].lower() in TABLE_EXTENSIONS):
+                    self._add_file(full)
+        else:
+            self._add_file(path)
+
+    def _add_file(self, path: str):
+        if os.path.getsize(path) == 0:
+            self.problems.append(f"{path} is empty")
+            return
+
+        if is_text_dump(path):
+            f = tempfile.TemporaryFile()
+            if decode_text_dump(path, f) == 0:
+                f.close()
+                self.problems.append(f"{path} holds no table data")
+                return
+            f.flush()
+        else:
+            f = open(path, 'rb')
+        self._files.append(f)
+        self._maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._scan(path)
+
+    def _header_at(self, data: mmap.mmap, offset: int):
+        """The header at offset if it is plausible, else None"""
+        if offset + ACPI_HEADER_SIZE > len(data):
+            return None
+        header = ACPI_HEADER.unpack_from(data, offset)
+        signature, length = header[0], header[1]
+        if not SIGNATURE_PATTERN.fullmatch(signature) or length < ACPI_HEADER_SIZE:
+            return None
+        return header
+
+    def _scan(self, path: str):
+        data = self._maps[path]
+        size = len(data)
+        offset = 0
+        # Right where a table is expected (start of file, end of the last
+        # table) a plausible header is enough; anywhere else it must checksum
+        expected = True
+
+        while offset + ACPI_HEADER_SIZE <= size:
+            header = self._header_at(data, offset)
+            if header is not None:
+                signature, length, revision, _, oem_id, oem_table_id = header[:6]
+                if offset + length > size:
+                    if expected:
+                        self.problems.append(f"{signature.decode()} at 0x{offset:X} in {path} claims {length} bytes, "
+                                             f"only {size - offset} present")
+                else:
+                    with memoryview(data)[offset:offset + length] as view:
+                        valid = signature in NO_CHECKSUM_SIGNATURES or _checksum_ok(view)
+                    if valid or expected:
+                        self._add_table(AcpiTable(signature.decode(), path, offset, length, revision, _text(oem_id),
+                                                  _text(oem_table_id), valid), data)
+                        offset += length
+                        expected = True
+                        continue
+
+            match = SIGNATURE_PATTERN.search(data, offset + 1)
+            if match is None:
+                break
+            offset = match.start()
+            expected = False
+
+    def _add_table(self, table: AcpiTable, data: mmap.mmap):
+        # The same table copied into several files of a directory is indexed
+        # once; header fields can match across distinct tables, so compare content
+        with memoryview(data)[table.offset:table.offset + table.length] as view:
+            key = (table.signature, hashlib.sha1(view).digest())
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.tables.setdefault(table.signature, []).append(table)
+
+    def signatures(self) -> List[str]:
+        return list(self.tables)
+
+    def __iter__(self) -> Iterator[AcpiTable]:
+        for tables in self.tables.values():
+            yield from tables
+
+    def __len__(self) -> int:
+        return sum(len(tables) for tables in self.tables.values())
+
+    def find(self, signature: str, instance: int = 0) -> Optional[AcpiTable]:
+        """Index entry of a table (instance counts e.g. SSDTs in source order)"""
+        tables = self.tables.get(signature, [])
+        return tables[instance] if instance < len(tables) else None
+
+    def view(self, table: AcpiTable) -> memoryview:
+        """Zero-copy view of a whole table, header included"""
+        return memoryview(self._maps[table.source])[table.offset:table.offset + table.length]
+
+    def table(self, signature: str, instance: int = 0) -> Optional[memoryview]:
+        """Zero-copy view of a table by signature, or None if absent"""
+        table = self.find(signature, instance)
+        return self.view(table) if table is not None else None
+
+    def extract(self, directory: str) -> List[str]:
+        """Write every table to its own file (DSDT.bin, SSDT1.bin, ...)"""
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        for signature, tables in self.tables.items():
+            for i, table in enumerate(tables):
+                name = signature.replace('!', '_') + (str(i) if i else '') + '.bin'
+                path = os.path.join(directory, name)
+                with open(path, 'wb') as f, self.view(table) as view:
+                    f.write(view)
+                written.append(path)
+        return written
+
+    def report(self, logger):
+        logger.log(f"[*] ACPI index: {len(self)} table(s), {len(self.tables)} signature(s)")
+        for table in self:
+            if table.checksum_ok:
+                logger.log(f"  {table}")
+            else:
+                logger.log_warning(f"  {table}")
+        for problem in self.problems:
+            logger.log_warning(f"  {problem}")
+
+    def close(self):
+        for data in self._maps.values():
+            data.close()
+        for f in self._files:
+            f.close()
+        self._maps = {}
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+    log_warning = log
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the ACPI tables in dumps or table directories")
+    parser.add_argument("paths", nargs='+', help="Dump file(s) or directories of table files")
+    parser.add_argument("--extract", help="Write each table to its own file in this directory")
+    args = parser.parse_args()
+
+    with AcpiTableIndex(*args.paths) as index:
+        index.report(_PrintLogger())
+        if args.extract:
+            for path in index.extract(args.extract):
+                print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""
+Platform Address Range Index
+============================
+One interval index over everything that claims memory or I/O addresses:
+- ACPI OperationRegions with constant address and length (aml_regions.py)
+- PCI BARs of every enumerated function (pci_enum.py)
+- the MCFG/ECAM window and the config space slots of chosen functions
+- the LPC bridge decode windows (fixed COM/LPT/FDD/KBC/EC/Super I/O
+  decodes, the four generic I/O ranges and the generic memory range)
+- the IT8888F positively decoded I/O and memory spaces
+- the 8237A DMA controller and page register ports
+
+Ranges are kept per address space ('mem' / 'io') sorted by start, with an
+implicit balanced tree of maximum end addresses on top. "Who else touches
+this range" is answered in O(log n + hits); the full overlap report is one
+sweep over the sorted ranges with a heap of the ranges still open, so whole
+platforms with thousands of ranges take milliseconds.
+
+BAR sizes come from sysfs when it is available. Reading a BAR's size from
+the hardware needs a write of all 1s, which this index never does - without
+sysfs a BAR is indexed at its base with a size of 1 and marked as such.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python addr_ranges.py "ACPI SSDT/m93p_acpidump"
+    python addr_ranges.py acpi_dumps --query mem:0xFED10000:0x1000 --bench 1000
+"""
+
+import argparse
+import heapq
+import os
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from chipsec.modules.common import pci_enum
+    from chipsec.modules.common.acpi_index import AcpiTableIndex
+    from chipsec.modules.common.aml_regions import scan_index
+    from chipsec.modules.common.ecam_reader import ECAM_BUS_SIZE, ECAM_FUNCTION_SIZE, parse_mcfg
+except ImportError:
+    import pci_enum
+    from acpi_index import AcpiTableIndex
+    from aml_regions import scan_index
+    from ecam_reader import ECAM_BUS_SIZE, ECAM_FUNCTION_SIZE, parse_mcfg
+
+MEM = 'mem'
+IO = 'io'
+
+# Intel PCH LPC bridge decode registers
+LPC_IOD = 0x80
+LPC_EN = 0x82
+LPC_GEN_DEC = (0x84, 0x88, 0x8C, 0x90)
+LPC_LGMR = 0x98
+LGMR_SIZE = 0x10000
+
+LPC_COM_BASES = (0x3F8, 0x2F8, 0x220, 0x228, 0x238, 0x2E8, 0x338, 0x3E8)
+LPC_LPT_RANGES = ((0x378, 8), (0x278, 8), (0x3BC, 3))
+LPC_FDD_BASES = (0x3F0, 0x370)
+
+# LPC_EN bit -> fixed I/O ranges it enables (COM/LPT/FDD are located by LPC_IOD)
+LPC_FIXED_DECODES = {
+    10: ("KBC", ((0x60, 1), (0x64, 1))),
+    11: ("Microcontroller", ((0x62, 1), (0x66, 1))),
+    12: ("Super I/O CNF1", ((0x2E, 2),)),
+    13: ("Super I/O CNF2", ((0x4E, 2),)),
+}
+
+# IT8888F positively decoded spaces (see AT24C02_Programmer/IT8888F_ConfigTool.py)
+IT8888_IO_SPACES = (0x58, 0x5C, 0x60, 0x64, 0x68, 0x6C)
+IT8888_MEM_SPACES = (0x70, 0x74, 0x78, 0x7C)
+IT8888_SPACE_ENABLE = 1 << 31
+
+# 8237A controllers and page registers
+DMA_PORT_RANGES = (("DMA1", 0x00, 0x10), ("DMA pages", 0x81, 0x0F), ("DMA2", 0xC0, 0x20))
+
+
+class AddressRange(NamedTuple):
+    space: str
+    start: int
+    end: int
+    kind: str
+    owner: str
+    detail: str = ''
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+    def __str__(self):
+        text = f"{self.kind} {self.owner} {self.space} 0x{self.start:X}-0x{self.end - 1:X}"
+        return f"{text} ({self.detail})" if self.detail else text
+
+
+class Overlap(NamedTuple):
+    first: AddressRange
+    second: AddressRange
+
+    @property
+    def start(self) -> int:
+        return max(self.first.start, self.second.start)
+
+    @property
+    def end(self) -> int:
+        return min(self.first.end, self.second.end)
+
+    def __str__(self):
+        return f"{self.first}  <->  {self.second}  [0x{self.start:X}-0x{self.end - 1:X}]"
+
+
+class RangeIndex(object):
+    """
+    Interval index over AddressRanges, rebuilt lazily after additions
+
+    Args:
+        ranges: Initial ranges
+    """
+
+    def __init__(self, ranges: Iterable[AddressRange] = ()):
+        self._pending: List[AddressRange] = list(ranges)
+        self._sorted: Dict[str, List[AddressRange]] = {}
+        self._max_end: Dict[str, List[int]] = {}
+
+    def add(self, address_range: AddressRange):
+        if address_range.end > address_range.start:
+            self._pending.append(address_range)
+
+    def extend(self, ranges: Iterable[AddressRange]):
+        for address_range in ranges:
+            self.add(address_range)
+
+    def _build(self):
+        if not self._pending:
+            return
+        by_space: Dict[str, List[AddressRange]] = {}
+        for ranges in self._sorted.values():
+            for address_range in ranges:
+                by_space.setdefault(address_range.space, []).append(address_range)
+        for address_range in self._pending:
+            by_space.setdefault(address_range.space, []).append(address_range)
+        self._pending = []
+
+        for space, ranges in by_space.items():
+            ranges.sort()
+            max_end = [0] * len(ranges)
+            # Node of [lo, hi) is its middle element, holding the largest end below it
+            stack = [(0, len(ranges), False)]
+            while stack:
+                lo, hi, children_done = stack.pop()
+                if lo >= hi:
+                    continue
+                mid = (lo + hi) // 2
+                if children_done:
+                    best = ranges[mid].end
+                    if lo < mid:
+                        best = max(best, max_end[(lo + mid) // 2])
+                    if mid + 1 < hi:
+                        best = max(best, max_end[(mid + 1 + hi) // 2])
+                    max_end[mid] = best
+                else:
+                    stack += [(lo, hi, True), (lo, mid, False), (mid + 1, hi, False)]
+            self._sorted[space] = ranges
+            self._max_end[space] = max_end
+
+    def __len__(self) -> int:
+        self._build()
+        return sum(len(ranges) for ranges in self._sorted.values())
+
+    def __iter__(self):
+        self._build()
+        for ranges in self._sorted.values():
+            yield from ranges
+
+    def overlapping(self, space: str, start: int, size: int = 1) -> List[AddressRange]:
+        """Every range touching [start, start + size), in address order"""
+        self._build()
+        ranges = self._sorted.get(space, [])
+        max_end = self._max_end.get(space, [])
+        end = start + size
+        hits = []
+        stack = [(0, len(ranges))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if max_end[mid] <= start:
+                # Everything below this node ends before the query
+                continue
+            candidate = ranges[mid]
+            if candidate.start < end:
+                if candidate.end > start:
+                    hits.append(candidate)
+                stack.append((mid + 1, hi))
+            stack.append((lo, mid))
+        hits.sort()
+        return hits
+
+    def who_else(self, address_range: AddressRange) -> List[AddressRange]:
+        """Ranges of other owners touching a range"""
+        return [r for r in self.overlapping(address_range.space, address_range.start, address_range.size)
+                if r.owner != address_range.owner]
+
+    def overlaps(self, space: Optional[str] = None) -> List[Overlap]:
+        """All overlapping pairs of different owners, from one sweep per space"""
+        self._build()
+        result = []
+        for name, ranges in self._sorted.items():
+            if space is not None and name != space:
+                continue
+            open_ranges: List[Tuple[int, int, AddressRange]] = []
+            for i, current in enumerate(ranges):
+                while open_ranges and open_ranges[0][0] <= current.start:
+                    heapq.heappop(open_ranges)
+                for _, _, other in open_ranges:
+                    if other.owner != current.owner:
+                        result.append(Overlap(other, current))
+                heapq.heappush(open_ranges, (current.end, i, current))
+        return result
+
+    def report(self, logger, kinds: Optional[Iterable[str]] = None, limit: int = 50):
+        """
+        Log the overlap report
+
+        Args:
+            logger: Module logger
+            kinds: Only pairs involving one of these kinds (all when None)
+            limit: Pairs logged at most (the count is always logged)
+        """
+        overlaps = self.overlaps()
+        if kinds is not None:
+            kinds = set(kinds)
+            overlaps = [o for o in overlaps if o.first.kind in kinds or o.second.kind in kinds]
+        logger.log(f"[*] Address map: {len(self)} range(s), {len(overlaps)} overlapping pair(s)")
+        for overlap in overlaps[:limit]:
+            logger.log(f"  {overlap}")
+        if len(overlaps) > limit:
+            logger.log(f"  ... {len(overlaps) - limit} more")
+
+
+def acpi_ranges(regions) -> List[AddressRange]:
+    """SystemMemory / SystemIO OperationRegions with constant address and length"""
+    spaces = {'SystemMemory': MEM, 'SystemIO': IO}
+    ranges = []
+    for region in regions:
+        space = spaces.get(region.space_name)
+        if space is None or region.address is None or not region.length:
+            continue
+        ranges.append(AddressRange(space, region.address, region.address + region.length, 'acpi',
+                                   f"{region.table}:{region.name}", region.space_name))
+    return ranges
+
+
+def mcfg_ranges(mcfg: bytes) -> List[AddressRange]:
+    """ECAM windows of a raw MCFG table"""
+    ranges = []
+    for alloc in parse_mcfg(mcfg):
+        start = alloc.base + alloc.start_bus * ECAM_BUS_SIZE
+        ranges.append(AddressRange(MEM, start, start + alloc.size, 'mcfg', f"segment {alloc.segment}",
+                                   f"buses {alloc.start_bus:02X}-{alloc.end_bus:02X}"))
+    return ranges
+
+
+def config_slot_range(ecam_base: int, device, label: str = '') -> AddressRange:
+    """The 4 KB ECAM slot of one function"""
+    start = ecam_base + ((device.bus << 20) | (device.dev << 15) | (device.fun << 12))
+    return AddressRange(MEM, start, start + ECAM_FUNCTION_SIZE, 'pcicfg', _owner(device),
+                        label or device.description)
+
+
+def _owner(device) -> str:
+    return f"{device.bus:02X}:{device.dev:02X}.{device.fun:X}"
+
+
+def _sysfs_resources(device) -> Optional[List[Tuple[int, int, int]]]:
+    path = os.path.join(pci_enum.SYSFS_PCI_DEVICES,
+                        f"{device.domain:04x}:{device.bus:02x}:{device.dev:02x}.{device.fun:x}", 'resource')
+    try:
+        with open(path) as f:
+            return [tuple(int(field, 16) for field in line.split()) for line in f]
+    except (OSError, ValueError):
+        return None
+
+
+def bar_ranges(pci, devices) -> List[AddressRange]:
+    """
+    BARs of every function in a device table
+
+    Args:
+        pci: Config reader (a ConfigSpaceSnapshot or cs.pci) - reads only
+        devices: DeviceTable or PciDevice list
+    """
+    ranges = []
+    for device in devices:
+        resources = _sysfs_resources(device)
+        count = 6 if device.header_type == 0 else 2 if device.header_type == 1 else 0
+        index = 0
+        while index < count:
+            offset = 0x10 + index * 4
+            value = pci.read_dword(device.bus, device.dev, device.fun, offset)
+            bar = index
+            index += 1
+            if value in (0, 0xFFFFFFFF):
+                continue
+
+            if value & 1:
+                space, base = IO, value & 0xFFFC
+            else:
+                space, base = MEM, value & 0xFFFFFFF0
+                if (value >> 1) & 3 == 2 and index < count:
+                    base |= pci.read_dword(device.bus, device.dev, device.fun, offset + 4) << 32
+                    index += 1
+            if not base:
+                continue
+
+            detail = f"BAR{bar}"
+            size = 1
+            if resources and bar < len(resources) and resources[bar][0] == base:
+                size = resources[bar][1] - resources[bar][0] + 1
+            else:
+                detail += ", size unknown"
+            ranges.append(AddressRange(space, base, base + size, 'bar', _owner(device),
+                                       f"{device.description} {detail}"))
+    return ranges
+
+
+def lpc_decode_ranges(pci, device) -> List[AddressRange]:
+    """I/O and memory windows the Intel LPC bridge forwards to the LPC bus"""
+    bus, dev, fun = device.bdf
+    owner = _owner(device)
+    iod_en = pci.read_dword(bus, dev, fun, LPC_IOD)
+    iod, enables = iod_en & 0xFFFF, iod_en >> 16
+    ranges = []
+
+    def fixed(name, base, size):
+        ranges.append(AddressRange(IO, base, base + size, 'lpc', owner, name))
+
+    if enables & 0x1:
+        fixed("COM A", LPC_COM_BASES[iod & 0x7], 8)
+    if enables & 0x2:
+        fixed("COM B", LPC_COM_BASES[(iod >> 4) & 0x7], 8)
+    if enables & 0x4 and (iod >> 8) & 0x3 < len(LPC_LPT_RANGES):
+        fixed("LPT", *LPC_LPT_RANGES[(iod >> 8) & 0x3])
+    if enables & 0x8:
+        base = LPC_FDD_BASES[(iod >> 12) & 0x1]
+        fixed("FDD", base, 6)
+        fixed("FDD", base + 7, 1)
+    for bit, (name, spans) in LPC_FIXED_DECODES.items():
+        if enables >> bit & 1:
+            for base, size in spans:
+                fixed(name, base, size)
+
+    for number, offset in enumerate(LPC_GEN_DEC, 1):
+        value = pci.read_dword(bus, dev, fun, offset)
+        if value & 1:
+            base = value & 0xFFFC
+            size = ((((value >> 18) & 0x3F) << 2) | 0x3) + 1
+            fixed(f"LGIR{number}", base, size)
+
+    lgmr = pci.read_dword(bus, dev, fun, LPC_LGMR)
+    if lgmr & 1:
+        base = lgmr & 0xFFFF0000
+        ranges.append(AddressRange(MEM, base, base + LGMR_SIZE, 'lpc', owner, "LGMR"))
+    return ranges
+
+
+def it8888_decode_ranges(pci, device) -> List[AddressRange]:
+    """Positively decoded I/O and memory spaces of an IT8888F bridge"""
+    bus, dev, fun = device.bdf
+    owner = _owner(device)
+    ranges = []
+    for number, offset in enumerate(IT8888_IO_SPACES):
+        value = pci.read_dword(bus, dev, fun, offset)
+        if value & IT8888_SPACE_ENABLE:
+            base = value & 0xFFFF
+            size = 1 << ((value >> 24) & 0x7)
+            ranges.append(AddressRange(IO, base, base + size, 'it8888', owner, f"I/O space {number}"))
+    for number, offset in enumerate(IT8888_MEM_SPACES):
+        value = pci.read_dword(bus, dev, fun, offset)
+        if value & IT8888_SPACE_ENABLE:
+            base = (((value >> 16) & 0xFF) << 24) | ((value & 0xFFFF) << 8)
+            size = 0x4000 << ((value >> 24) & 0x7)
+            ranges.append(AddressRange(MEM, base, base + size, 'it8888', owner, f"memory space {number}"))
+    return ranges
+
+
+def dma_port_ranges() -> List[AddressRange]:
+    return [AddressRange(IO, base, base + size, 'dma', "8237A", name) for name, base, size in DMA_PORT_RANGES]
+
+
+def build_platform_index(regions=(), mcfg: Optional[bytes] = None, pci=None, devices=None,
+                         ecam_base: Optional[int] = None) -> RangeIndex:
+    """
+    Range index of a platform
+
+    Args:
+        regions: AmlRegions of DSDT/SSDTs
+        mcfg: Raw MCFG table
+        pci: Config reader for BARs and decode registers (reads only)
+        devices: DeviceTable of the platform
+        ecam_base: ECAM base used for the LPC/ITE config slots (from MCFG if None)
+    """
+    index = RangeIndex()
+    index.extend(acpi_ranges(regions))
+    index.extend(dma_port_ranges())
+
+    if mcfg is not None:
+        windows = mcfg_ranges(mcfg)
+        index.extend(windows)
+        if ecam_base is None and windows:
+            ecam_base = parse_mcfg(mcfg)[0].base
+
+    if pci is not None and devices is not None:
+        index.extend(bar_ranges(pci, devices))
+        lpc = devices.lpc_bridge()
+        if lpc is not None:
+            index.extend(lpc_decode_ranges(pci, lpc))
+        for bridge in devices.it8888_bridges():
+            index.extend(it8888_decode_ranges(pci, bridge))
+
+        if ecam_base:
+            slots = [lpc] if lpc is not None else []
+            for device in slots + devices.it8893_bridges() + devices.it8888_bridges():
+                index.add(config_slot_range(ecam_base, device))
+    return index
+
+
+def _parse_query(text: str) -> Tuple[str, int, int]:
+    space, start, size = text.split(':')
+    return space, int(start, 0), int(size, 0)
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overlap report of ACPI regions, MCFG and decode windows")
+    parser.add_argument("paths", nargs='+', help="ACPI dump file(s) or directories of table files")
+    parser.add_argument("--query", action='append', default=[], help="space:start:size, e.g. io:0x2E:2")
+    parser.add_argument("--bench", type=int, default=0, help="Random queries to time")
+    parser.add_argument("--limit", type=int, default=50, help="Overlapping pairs shown")
+    args = parser.parse_args()
+
+    with AcpiTableIndex(*args.paths) as tables:
+        regions = scan_index(tables)
+        mcfg = tables.table('MCFG')
+        raw_mcfg = bytes(mcfg) if mcfg is not None else None
+        if mcfg is not None:
+            mcfg.release()
+
+    start = time.perf_counter()
+    index = build_platform_index(regions, raw_mcfg)
+    index.report(_PrintLogger(), limit=args.limit)
+    print(f"Built and swept {len(index)} ranges in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    for query in args.query:
+        space, base, size = _parse_query(query)
+        hits = index.overlapping(space, base, size)
+        print(f"{query}: {len(hits)} range(s)")
+        for hit in hits:
+            print(f"  {hit}")
+
+    if args.bench:
+        import random
+        ranges = list(index)
+        probes = [random.choice(ranges) for _ in range(args.bench)]
+        start = time.perf_counter()
+        for probe in probes:
+            index.overlapping(probe.space, probe.start, probe.size)
+        elapsed = time.perf_counter() - start
+        print(f"{args.bench} queries in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
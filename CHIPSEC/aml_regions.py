@@ -0,0 +1,244 @@
+"""
+AML OperationRegion Scanner
+===========================
+Finds the OperationRegion declarations in compiled AML (DSDT and SSDTs)
+without a disassembler. Searching the Python repr of a table for
+"OperationRegion(... SystemMemory ...)" never matches - that text only exists
+in the ASL source - so the binary encoding is decoded instead:
+
+    DefOpRegion := 0x5B 0x80 NameString RegionSpace RegionOffset RegionLen
+
+- NameString: optional root ('\\') or parent ('^') prefixes, then a NameSeg,
+  DualNamePath (0x2E), MultiNamePath (0x2F, count) or NullName
+- RegionSpace: one byte (0 SystemMemory, 1 SystemIO, 2 PCI_Config, ...)
+- RegionOffset / RegionLen: TermArgs; constants are decoded (Zero, One,
+  Ones and the Byte/Word/DWord/QWord prefixes). A named object as the offset
+  (e.g. a NVS base patched in by firmware) is reported by name and the
+  length after it is still decoded; any other expression is left unknown.
+
+The table is scanned once with a regex over the buffer, so memoryviews from
+acpi_index.py are scanned without copying. Candidates that don't decode as
+a valid name and region space are skipped.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python aml_regions.py "ACPI SSDT/m93p_acpidump"
+    python aml_regions.py acpi_dumps --space SystemIO --bench 100
+"""
+
+import argparse
+import re
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from chipsec.modules.common.acpi_index import ACPI_HEADER_SIZE, AcpiTableIndex
+except ImportError:
+    from acpi_index import ACPI_HEADER_SIZE, AcpiTableIndex
+
+OP_REGION_PATTERN = re.compile(rb'\x5B\x80', re.DOTALL)
+
+REGION_SPACES = {
+    0x00: 'SystemMemory',
+    0x01: 'SystemIO',
+    0x02: 'PCI_Config',
+    0x03: 'EmbeddedControl',
+    0x04: 'SMBus',
+    0x05: 'SystemCMOS',
+    0x06: 'PciBarTarget',
+    0x07: 'IPMI',
+    0x08: 'GeneralPurposeIO',
+    0x09: 'GenericSerialBus',
+    0x0A: 'PCC',
+}
+SPACE_IDS = {name: space for space, name in REGION_SPACES.items()}
+
+# Spaces 0x80-0xFF are OEM defined
+OEM_SPACE_FIRST = 0x80
+
+ZERO_OP = 0x00
+ONE_OP = 0x01
+ONES_OP = 0xFF
+BYTE_PREFIX = 0x0A
+WORD_PREFIX = 0x0B
+DWORD_PREFIX = 0x0C
+QWORD_PREFIX = 0x0E
+INTEGER_PREFIX_SIZES = {BYTE_PREFIX: 1, WORD_PREFIX: 2, DWORD_PREFIX: 4, QWORD_PREFIX: 8}
+
+ROOT_CHAR = 0x5C
+PARENT_PREFIX_CHAR = 0x5E
+DUAL_NAME_PREFIX = 0x2E
+MULTI_NAME_PREFIX = 0x2F
+NULL_NAME = 0x00
+
+LEAD_NAME_CHARS = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+NAME_CHARS = LEAD_NAME_CHARS | frozenset(b'0123456789')
+
+
+class AmlRegion(NamedTuple):
+    table: str
+    offset: int
+    name: str
+    space: int
+    address: Optional[int]
+    length: Optional[int]
+    address_ref: Optional[str]
+
+    @property
+    def space_name(self) -> str:
+        if self.space in REGION_SPACES:
+            return REGION_SPACES[self.space]
+        return f"OEM 0x{self.space:02X}" if self.space >= OEM_SPACE_FIRST else f"0x{self.space:02X}"
+
+    def overlaps(self, start: int, size: int) -> bool:
+        """Whether a constant region covers any of [start, start + size)"""
+        if self.address is None or self.length is None:
+            return False
+        return self.address < start + size and start < self.address + self.length
+
+    def __str__(self):
+        if self.address is not None:
+            address = f"0x{self.address:X}"
+        else:
+            address = self.address_ref or "<expression>"
+        length = f"0x{self.length:X}" if self.length is not None else "<expression>"
+        return f"{self.table}@0x{self.offset:X} {self.name}: {self.space_name}, {address}, {length}"
+
+
+def _name_seg(aml, pos: int) -> Optional[str]:
+    seg = aml[pos:pos + 4]
+    if len(seg) != 4 or seg[0] not in LEAD_NAME_CHARS or any(c not in NAME_CHARS for c in seg[1:]):
+        return None
+    # ASL drops the trailing '_' padding of a NameSeg
+    return bytes(seg).decode('ascii').rstrip('_') or '_'
+
+
+def decode_name_string(aml, pos: int) -> Tuple[Optional[str], int]:
+    """Decode a NameString at pos; returns (name, next position) or (None, pos)"""
+    start = pos
+    prefix = ''
+    if pos < len(aml) and aml[pos] == ROOT_CHAR:
+        prefix = '\\'
+        pos += 1
+    else:
+        while pos < len(aml) and aml[pos] == PARENT_PREFIX_CHAR:
+            prefix += '^'
+            pos += 1
+
+    if pos >= len(aml):
+        return None, start
+    lead = aml[pos]
+    if lead == NULL_NAME:
+        return (prefix or None), (pos + 1 if prefix else start)
+    if lead == DUAL_NAME_PREFIX:
+        count, pos = 2, pos + 1
+    elif lead == MULTI_NAME_PREFIX:
+        if pos + 1 >= len(aml) or aml[pos + 1] == 0:
+            return None, start
+        count, pos = aml[pos + 1], pos + 2
+    else:
+        count = 1
+
+    segs = []
+    for _ in range(count):
+        seg = _name_seg(aml, pos)
+        if seg is None:
+            return None, start
+        segs.append(seg)
+        pos += 4
+    return prefix + '.'.join(segs), pos
+
+
+def decode_integer(aml, pos: int) -> Tuple[Optional[int], int]:
+    """Decode a constant integer TermArg; returns (value, next position) or (None, pos)"""
+    if pos >= len(aml):
+        return None, pos
+    op = aml[pos]
+    if op == ZERO_OP:
+        return 0, pos + 1
+    if op == ONE_OP:
+        return 1, pos + 1
+    if op == ONES_OP:
+        return 0xFFFFFFFFFFFFFFFF, pos + 1
+    size = INTEGER_PREFIX_SIZES.get(op)
+    if size is None or pos + 1 + size > len(aml):
+        return None, pos
+    return int.from_bytes(aml[pos + 1:pos + 1 + size], 'little'), pos + 1 + size
+
+
+def scan_operation_regions(aml, table: str = 'DSDT', spaces: Optional[Sequence[int]] = None,
+                           start: int = ACPI_HEADER_SIZE) -> List[AmlRegion]:
+    """
+    Decode every OperationRegion in one AML table
+
+    Args:
+        aml: The whole table (bytes or memoryview), header included
+        table: Label used in the results (e.g. 'DSDT', 'SSDT2')
+        spaces: Region space IDs to keep (all when None)
+        start: Where the AML starts (after the table header)
+
+    Returns:
+        [AmlRegion, ...] in table order
+    """
+    regions = []
+    for match in OP_REGION_PATTERN.finditer(aml, start):
+        op = match.start()
+        name, pos = decode_name_string(aml, op + 2)
+        if name is None or pos >= len(aml):
+            continue
+        space = aml[pos]
+        if space not in REGION_SPACES and space < OEM_SPACE_FIRST:
+            continue
+        pos += 1
+
+        address_ref = None
+        address, next_pos = decode_integer(aml, pos)
+        if address is None:
+            address_ref, next_pos = decode_name_string(aml, pos)
+        length = None
+        if next_pos != pos:
+            length, _ = decode_integer(aml, next_pos)
+
+        if spaces is None or space in spaces:
+            regions.append(AmlRegion(table, op, name, space, address, length, address_ref))
+    return regions
+
+
+def scan_index(index: AcpiTableIndex, spaces: Optional[Sequence[int]] = None) -> List[AmlRegion]:
+    """OperationRegions of the DSDT and every SSDT in an AcpiTableIndex"""
+    regions = []
+    for signature in ('DSDT', 'SSDT'):
+        for i, table in enumerate(index.tables.get(signature, [])):
+            label = signature + (str(i) if i else '')
+            with index.view(table) as aml:
+                regions += scan_operation_regions(aml, label, spaces)
+    return regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the OperationRegions declared in DSDT/SSDT tables")
+    parser.add_argument("paths", nargs='+', help="ACPI dump file(s) or directories of table files")
+    parser.add_argument("--space", action='append', choices=sorted(SPACE_IDS),
+                        help="Only show this region space (repeatable)")
+    parser.add_argument("--bench", type=int, default=0, help="Time this many scans of all tables")
+    args = parser.parse_args()
+
+    spaces = [SPACE_IDS[name] for name in args.space] if args.space else None
+    with AcpiTableIndex(*args.paths) as index:
+        regions = scan_index(index, spaces)
+        for region in regions:
+            print(region)
+        print(f"{len(regions)} region(s)")
+
+        if args.bench:
+            size = sum(t.length for sig in ('DSDT', 'SSDT') for t in index.tables.get(sig, []))
+            start = time.perf_counter()
+            for _ in range(args.bench):
+                scan_index(index, spaces)
+            elapsed = (time.perf_counter() - start) / args.bench
+            print(f"Scanned {size} bytes of AML in {elapsed * 1000:.2f} ms per pass")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+Config Space Baselines and Anomaly Scoring
+==========================================
+Compares a bridge's config registers with the values expected for its
+device, instead of treating every nonzero register as suspicious.
+
+A baseline covers a window of config space (0x80-0xFF for the LPC bridge,
+0x40-0xBF for the host bridge) and gives each dword an expected value and a
+mask of the bits that are checked:
+- registers with a fixed reset value (FWH ID selects, capability headers)
+  are checked in full
+- board-configured registers (decode ranges, BARs, PM config) are known but
+  not checked (mask 0), apart from bits that must be set, like the memory
+  map lock bits of the host bridge
+- dwords the baseline doesn't name are reserved and must read as zero
+
+Baselines are indexed by (VID, DID, RID) in a dict; a RID of None matches
+any revision. Built-in baselines cover the Z390 and H81 LPC bridges and the
+Coffee Lake and Haswell host bridges, and baselines learned from known-good
+machines (the bits identical across all of them) can be saved to a JSON
+file that overrides them.
+
+Scoring XORs the whole window with the expected values and masks it as one
+integer, so a device that matches costs a single comparison; only windows
+that deviate are broken down per dword. Fleet scoring scores each distinct
+window once (machines sharing a config image share the work), batched
+through numpy when it is available, and reports deviations grouped by
+register and value rather than per machine.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    result = BaselineDB.load("config_baselines.json").score_device(self.snapshot(), 0, 0x1F, 0)
+    if result is not None:
+        result.report(self.logger)
+
+    python config_baseline.py score register_snapshots
+    python config_baseline.py --db config_baselines.json learn "Z390 LPC (fleet)" known_good/ --bdf 00:1F.0
+    python config_baseline.py --db config_baselines.json list
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from chipsec.modules.common.reg_snapshot import KIND_PCI, load_all
+except ImportError:
+    from reg_snapshot import KIND_PCI, load_all
+
+DEFAULT_DB = 'config_baselines.json'
+DB_VERSION = 1
+
+FULL = 0xFFFFFFFF
+CONFIGURED = 0  # Known register, value set by the board
+
+
+class Field(NamedTuple):
+    offset: int
+    name: str
+    expected: int = 0
+    mask: int = FULL
+
+
+# Registers 0x80-0x98 of the LPC bridge, laid out the same on 8- and 300-series PCHs
+LPC_DECODE_FIELDS = [
+    Field(0x80, 'IOD/IOE', 0, CONFIGURED),
+    Field(0x84, 'LGIR1', 0, CONFIGURED),
+    Field(0x88, 'LGIR2', 0, CONFIGURED),
+    Field(0x8C, 'LGIR3', 0, CONFIGURED),
+    Field(0x90, 'LGIR4', 0, CONFIGURED),
+    Field(0x94, 'ULKMC', 0, CONFIGURED),
+    Field(0x98, 'LGMR', 0, CONFIGURED),
+]
+
+# 8-series LPC bridge (H81)
+H81_LPC_FIELDS = LPC_DECODE_FIELDS + [
+    Field(0xA0, 'GEN_PMCON_1/2', 0, CONFIGURED),
+    Field(0xA4, 'GEN_PMCON_3', 0, CONFIGURED),
+    Field(0xAC, 'PMIR', 0, CONFIGURED),
+    Field(0xB8, 'GPI_ROUT', 0, CONFIGURED),
+    Field(0xD0, 'FWH_SEL1', 0x00112233),
+    Field(0xD4, 'FWH_SEL2', 0x00004567),
+    Field(0xD8, 'FWH_DEC_EN1', 0xFFCF, 0x0000FFFF),
+    Field(0xDC, 'BIOS_CNTL', 0, 0xFFFFFF00),
+    Field(0xE0, 'FDCAP/FDLEN/FDVER', 0x100C0009),
+    Field(0xE4, 'FVECIDX', 0, CONFIGURED),
+    Field(0xE8, 'FVECD', 0, CONFIGURED),
+    Field(0xF0, 'RCBA', 0x00000001, 0x00003FFF),
+]
+
+# 300-series LPC/eSPI bridge (Z390)
+Z390_LPC_FIELDS = LPC_DECODE_FIELDS + [
+    Field(0xD0, 'FWH_SEL1', 0x00112233),
+    Field(0xD4, 'FWH_SEL2', 0x00004567),
+    Field(0xD8, 'BDE', 0, CONFIGURED),
+    Field(0xDC, 'BC', 0, CONFIGURED),
+]
+
+# Host bridge: addresses are board-specific, the lock and enable bits are not
+HOST_BRIDGE_FIELDS = [
+    Field(0x40, 'PXPEPBAR', 0, CONFIGURED),
+    Field(0x44, 'PXPEPBAR_HI', 0, CONFIGURED),
+    Field(0x48, 'MCHBAR', 0, CONFIGURED),
+    Field(0x4C, 'MCHBAR_HI', 0, CONFIGURED),
+    Field(0x50, 'GGC (lock)', 0x1, 0x1),
+    Field(0x54, 'DEVEN', 0, CONFIGURED),
+    Field(0x58, 'PAVPC (lock)', 0x4, 0x4),
+    Field(0x5C, 'DPR (lock)', 0x1, 0x1),
+    Field(0x60, 'PCIEXBAR (enable)', 0x1, 0x1),
+    Field(0x64, 'PCIEXBAR_HI', 0, CONFIGURED),
+    Field(0x68, 'DMIBAR', 0, CONFIGURED),
+    Field(0x6C, 'DMIBAR_HI', 0, CONFIGURED),
+    Field(0x70, 'MESEG_BASE', 0, CONFIGURED),
+    Field(0x74, 'MESEG_BASE_HI', 0, CONFIGURED),
+    Field(0x78, 'MESEG_MASK (lock)', 0x400, 0x400),
+    Field(0x7C, 'MESEG_MASK_HI', 0, CONFIGURED),
+    Field(0x80, 'PAM0-3', 0, CONFIGURED),
+    Field(0x84, 'PAM4-6', 0, CONFIGURED),
+    Field(0x88, 'LAC', 0, CONFIGURED),
+    Field(0x90, 'REMAPBASE (lock)', 0x1, 0x1),
+    Field(0x94, 'REMAPBASE_HI', 0, CONFIGURED),
+    Field(0x98, 'REMAPLIMIT (lock)', 0x1, 0x1),
+    Field(0x9C, 'REMAPLIMIT_HI', 0, CONFIGURED),
+    Field(0xA0, 'TOM (lock)', 0x1, 0x1),
+    Field(0xA4, 'TOM_HI', 0, CONFIGURED),
+    Field(0xA8, 'TOUUD (lock)', 0x1, 0x1),
+    Field(0xAC, 'TOUUD_HI', 0, CONFIGURED),
+    Field(0xB0, 'BDSM (lock)', 0x1, 0x1),
+    Field(0xB4, 'BGSM (lock)', 0x1, 0x1),
+    Field(0xB8, 'TSEGMB (lock)', 0x1, 0x1),
+    Field(0xBC, 'TOLUD (lock)', 0x1, 0x1),
+]
+
+LPC_WINDOW = (0x80, 0x100)
+HOST_WINDOW = (0x40, 0xC0)
+
+
+class Deviation(NamedTuple):
+    offset: int
+    name: str
+    value: int
+    expected: int
+    mask: int
+
+    @property
+    def bits(self) -> int:
+        return (self.value ^ self.expected) & self.mask
+
+    def __str__(self):
+        return (f"0x{self.offset:02X} {self.name:<18} 0x{self.value:08X} (expected 0x{self.expected:08X} "
+                f"under mask 0x{self.mask:08X}, bits 0x{self.bits:08X} differ)")
+
+
+class Baseline(object):
+    """
+    Expected values and checked bits of one device's config window
+
+    Args:
+        name: Shown in reports
+        vid, did, rid: Device the baseline applies to (rid None: any revision)
+        start, end: Window of config space covered (dword aligned)
+        fields: Field per named dword; the others are reserved (expected 0)
+    """
+
+    def __init__(self, name: str, vid: int, did: int, rid: Optional[int] = None,
+                 start: int = LPC_WINDOW[0], end: int = LPC_WINDOW[1], fields: Iterable[Field] = ()):
+        self.name = name
+        self.vid, self.did, self.rid = vid, did, rid
+        self.start, self.end = start, end
+        self.fields: Dict[int, Field] = {}
+        for field in fields:
+            if not start <= field.offset < end or field.offset % 4:
+                raise ValueError(f"{name}: field {field.name} at 0x{field.offset:X} outside 0x{start:X}-0x{end:X}")
+            self.fields[field.offset] = field
+
+        expected = bytearray(end - start)
+        mask = bytearray(b'\xFF' * (end - start))
+        for field in self.fields.values():
+            at = field.offset - start
+            expected[at:at + 4] = (field.expected & field.mask).to_bytes(4, 'little')
+            mask[at:at + 4] = field.mask.to_bytes(4, 'little')
+        self.expected = bytes(expected)
+        self.mask = bytes(mask)
+        self._expected = int.from_bytes(self.expected, 'little')
+        self._mask = int.from_bytes(self.mask, 'little')
+
+    @property
+    def key(self) -> Tuple[int, int, Optional[int]]:
+        return self.vid, self.did, self.rid
+
+    @property
+    def dwords(self) -> int:
+        return (self.end - self.start) // 4
+
+    def name_of(self, offset: int) -> str:
+        field = self.fields.get(offset)
+        return field.name if field else 'reserved'
+
+    def difference(self, window: bytes) -> int:
+        """Deviating bits of a window as one integer (0 when it matches)"""
+        return (int.from_bytes(window, 'little') ^ self._expected) & self._mask
+
+    def deviations(self, window: bytes) -> List[Deviation]:
+        """Deviating dwords of a window (config[start:end])"""
+        if not self.difference(window):
+            return []
+        found = []
+        for at in range(0, self.end - self.start, 4):
+            value = int.from_bytes(window[at:at + 4], 'little')
+            expected = int.from_bytes(self.expected[at:at + 4], 'little')
+            mask = int.from_bytes(self.mask[at:at + 4], 'little')
+            if (value ^ expected) & mask:
+                offset = self.start + at
+                found.append(Deviation(offset, self.name_of(offset), value, expected, mask))
+        return found
+
+    def score(self, window: bytes) -> int:
+        """Number of deviating bits"""
+        return bin(self.difference(window)).count('1')
+
+    def score_many(self, windows: Sequence[bytes]) -> List[int]:
+        """Deviating bits of each window, vectorized over all of them with numpy"""
+        if np is None or not windows:
+            return [self.score(window) for window in windows]
+        values = np.frombuffer(b''.join(windows), dtype='<u4').reshape(len(windows), self.dwords)
+        expected = np.frombuffer(self.expected, dtype='<u4')
+        mask = np.frombuffer(self.mask, dtype='<u4')
+        deviating = (values ^ expected) & mask
+        return np.unpackbits(deviating.view(np.uint8), axis=1).sum(axis=1).tolist()
+
+    @classmethod
+    def learn(cls, name: str, windows: Sequence[bytes], vid: int, did: int, rid: Optional[int],
+              start: int, end: int, names: Optional[Dict[int, str]] = None) -> 'Baseline':
+        """
+        Baseline from windows of known-good machines: the bits identical on
+        all of them are checked, the others are treated as board-configured
+        """
+        if not windows:
+            raise ValueError("No windows to learn from")
+        names = names or {}
+        fields = []
+        for at in range(0, end - start, 4):
+            values = [int.from_bytes(window[at:at + 4], 'little') for window in windows]
+            varying = 0
+            for value in values[1:]:
+                varying |= value ^ values[0]
+            offset = start + at
+            mask = FULL & ~varying
+            if values[0] & mask or mask != FULL or offset in names:
+                fields.append(Field(offset, names.get(offset, f"learned 0x{offset:02X}"), values[0] & mask, mask))
+        return cls(name, vid, did, rid, start, end, fields)
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'vid': self.vid, 'did': self.did, 'rid': self.rid,
+                'start': self.start, 'end': self.end,
+                'fields': [[f.offset, f.name, f.expected, f.mask] for f in self.fields.values()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Baseline':
+        return cls(data['name'], data['vid'], data['did'], data.get('rid'), data['start'], data['end'],
+                   [Field(*field) for field in data['fields']])
+
+    def __str__(self):
+        rid = 'any' if self.rid is None else f"0x{self.rid:02X}"
+        checked = sum(1 for at in range(0, self.end - self.start, 4) if self.mask[at:at + 4] != b'\0\0\0\0')
+        return (f"{self.name}: {self.vid:04X}:{self.did:04X} rev {rid}, 0x{self.start:02X}-0x{self.end - 1:02X}, "
+                f"{len(self.fields)} named register(s), {checked}/{self.dwords} dword(s) checked")
+
+
+BUILTIN_BASELINES = [
+    Baseline("Z390 LPC bridge", 0x8086, 0xA305, None, *LPC_WINDOW, Z390_LPC_FIELDS),
+    Baseline("H81 LPC bridge", 0x8086, 0x8C5C, None, *LPC_WINDOW, H81_LPC_FIELDS),
+    Baseline("Coffee Lake host bridge (6 core)", 0x8086, 0x3EC2, None, *HOST_WINDOW, HOST_BRIDGE_FIELDS),
+    Baseline("Coffee Lake host bridge (8 core)", 0x8086, 0x3E30, None, *HOST_WINDOW, HOST_BRIDGE_FIELDS),
+    Baseline("Haswell host bridge", 0x8086, 0x0C00, None, *HOST_WINDOW, HOST_BRIDGE_FIELDS),
+]
+
+
+class DeviceScore(NamedTuple):
+    label: str
+    baseline: Baseline
+    deviations: List[Deviation]
+
+    @property
+    def score(self) -> int:
+        return sum(bin(d.bits).count('1') for d in self.deviations)
+
+    def report(self, logger):
+        if not self.deviations:
+            logger.log_good(f"{self.label} matches the {self.baseline.name} baseline "
+                            f"(0x{self.baseline.start:02X}-0x{self.baseline.end - 1:02X})")
+            return
+        logger.log_warning(f"{self.label} deviates from the {self.baseline.name} baseline in "
+                           f"{len(self.deviations)} register(s) ({self.score} bit(s)):")
+        for deviation in self.deviations:
+            logger.log(f"    {deviation}")
+
+
+def _header_ids(header: bytes) -> Tuple[int, int, int]:
+    vid_did = int.from_bytes(header[0:4], 'little')
+    return vid_did & 0xFFFF, vid_did >> 16, header[8]
+
+
+class BaselineDB(object):
+    """
+    Baselines indexed by (VID, DID, RID)
+
+    Args:
+        baselines: Initial baselines (the built-in ones by default)
+    """
+
+    def __init__(self, baselines: Optional[Iterable[Baseline]] = None):
+        self.index: Dict[Tuple[int, int, Optional[int]], Baseline] = {}
+        for baseline in BUILTIN_BASELINES if baselines is None else baselines:
+            self.add(baseline)
+
+    def add(self, baseline: Baseline):
+        self.index[baseline.key] = baseline
+
+    def lookup(self, vid: int, did: int, rid: Optional[int] = None) -> Optional[Baseline]:
+        """Baseline of this exact revision, else the one for any revision"""
+        return self.index.get((vid, did, rid)) or self.index.get((vid, did, None))
+
+    def score(self, config: bytes, label: str = '') -> Optional[DeviceScore]:
+        """Score a captured config space (at least up to the window's end); None without a baseline"""
+        baseline = self.lookup(*_header_ids(config))
+        if baseline is None or len(config) < baseline.end:
+            return None
+        return DeviceScore(label, baseline, baseline.deviations(config[baseline.start:baseline.end]))
+
+    def score_device(self, pci, bus: int, dev: int, fun: int) -> Optional[DeviceScore]:
+        """
+        Score a live device, reading only its ID dwords and the window
+
+        Args:
+            pci: Config reader with read_dword() (a ConfigSpaceSnapshot or cs.pci)
+        """
+        vid_did = pci.read_dword(bus, dev, fun, 0x00)
+        rid = pci.read_dword(bus, dev, fun, 0x08) & 0xFF
+        baseline = self.lookup(vid_did & 0xFFFF, vid_did >> 16, rid)
+        if baseline is None:
+            return None
+        window = b''.join(pci.read_dword(bus, dev, fun, offset).to_bytes(4, 'little')
+                          for offset in range(baseline.start, baseline.end, 4))
+        return DeviceScore(f"{bus:02X}:{dev:02X}.{fun:X}", baseline, baseline.deviations(window))
+
+    @classmethod
+    def load(cls, path: Optional[str] = DEFAULT_DB) -> 'BaselineDB':
+        """Built-in baselines, overridden by those saved in path (if it exists)"""
+        db = cls()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == DB_VERSION:
+                for entry in data.get('baselines', []):
+                    db.add(Baseline.from_dict(entry))
+        return db
+
+    def save(self, path: str = DEFAULT_DB, builtin: bool = False):
+        """Write the baselines (only those that aren't built in, unless builtin)"""
+        builtin_ids = {id(b) for b in BUILTIN_BASELINES}
+        baselines = [b for b in self.index.values() if builtin or id(b) not in builtin_ids]
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': DB_VERSION, 'baselines': [b.to_dict() for b in baselines]}, f, indent=1)
+        os.replace(tmp, path)
+
+
+class FleetScore(NamedTuple):
+    """
+    Attributes:
+        machines: Snapshots scored
+        scored: Regions that had a baseline
+        matching: Of those, regions matching their baseline
+        deviations: {(label, baseline name, offset, register name, value): [machines]}
+        distinct: Distinct windows scored (identical ones are scored once)
+    """
+    machines: int
+    scored: int
+    matching: int
+    deviations: Dict[Tuple[str, str, int, str, int], List[str]]
+    distinct: int
+
+    def report(self, logger, max_machines: int = 3):
+        logger.log(f"[*] Baseline scoring: {self.machines} machine(s), {self.scored} device(s) with a baseline, "
+                   f"{self.matching} matching, {self.distinct} distinct window(s)")
+        for (label, name, offset, register, value), machines in sorted(self.deviations.items(),
+                                                                         key=lambda item: -len(item[1])):
+            shown = ', '.join(machines[:max_machines])
+            more = f", ... ({len(machines)} total)" if len(machines) > max_machines else ""
+            logger.log_warning(f"{label} ({name}) 0x{offset:02X} {register} = 0x{value:08X} on "
+                               f"{len(machines)} machine(s): {shown}{more}")
+
+
+def score_fleet(db: BaselineDB, snapshots: Iterable) -> FleetScore:
+    """
+    Score the PCI regions of reg_snapshot.py snapshots against their
+    baselines. Distinct windows are scored together per baseline
+    (score_many), and only deviating ones are broken down per register.
+    """
+    # (baseline key, window) -> [(label, machine)]
+    windows: Dict[Tuple[tuple, bytes], List[Tuple[str, str]]] = {}
+    machines = scored = 0
+    for snapshot in snapshots:
+        machines += 1
+        for label, region in snapshot.regions.items():
+            if region.kind != KIND_PCI or len(region.data) < 0x10:
+                continue
+            baseline = db.lookup(*_header_ids(region.data))
+            if baseline is None or len(region.data) < baseline.end:
+                continue
+            scored += 1
+            window = region.data[baseline.start:baseline.end]
+            windows.setdefault((baseline.key, window), []).append((label, snapshot.machine))
+
+    by_baseline: Dict[tuple, List[bytes]] = {}
+    for key, window in windows:
+        by_baseline.setdefault(key, []).append(window)
+
+    matching = 0
+    deviations: Dict[Tuple[str, str, int, str, int], List[str]] = {}
+    for key, distinct in by_baseline.items():
+        baseline = db.index[key]
+        for window, score in zip(distinct, baseline.score_many(distinct)):
+            seen = windows[(key, window)]
+            if not score:
+                matching += len(seen)
+                continue
+            for deviation in baseline.deviations(window):
+                for label, machine in seen:
+                    deviations.setdefault((label, baseline.name, deviation.offset, deviation.name, deviation.value),
+                                          []).append(machine)
+    return FleetScore(machines, scored, matching, deviations, len(windows))
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+    log_good = log_warning = log_bad = log_error = log
+
+
+def _parse_bdf(text: str) -> Tuple[int, int, int]:
+    bus, rest = text.split(':')
+    dev, fun = rest.split('.')
+    return int(bus, 16), int(dev, 16), int(fun, 16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score config space against per-device baselines")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Learned baselines (JSON)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = commands.add_parser('score', help="Score register snapshots (reg_snapshot.py)")
+    score_parser.add_argument("paths", nargs='+', help="Snapshot files or store directories")
+
+    learn_parser = commands.add_parser('learn', help="Learn a baseline from known-good snapshots")
+    learn_parser.add_argument("name")
+    learn_parser.add_argument("paths", nargs='+', help="Snapshot files or store directories")
+    learn_parser.add_argument("--bdf", default='00:1F.0', help="Device to learn (default: the LPC bridge)")
+    learn_parser.add_argument("--start", type=lambda v: int(v, 0), help="Window start (default: the built-in one)")
+    learn_parser.add_argument("--end", type=lambda v: int(v, 0), help="Window end")
+    learn_parser.add_argument("--any-revision", action='store_true', help="Apply to every revision")
+
+    commands.add_parser('list', help="List the baselines")
+    args = parser.parse_args()
+    logger = _PrintLogger()
+    db = BaselineDB.load(args.db)
+
+    if args.command == 'score':
+        snapshots = load_all(args.paths)
+        start = time.perf_counter()
+        result = score_fleet(db, snapshots)
+        elapsed = time.perf_counter() - start
+        result.report(logger)
+        print(f"Scored {len(snapshots)} snapshot(s) in {elapsed:.3f}s")
+
+    elif args.command == 'learn':
+        bus, dev, fun = _parse_bdf(args.bdf)
+        label = f"{bus:02X}:{dev:02X}.{fun:X}"
+        regions = [s.regions[label] for s in load_all(args.paths) if label in s.regions]
+        if not regions:
+            parser.error(f"no snapshot holds {label}")
+        ids = {_header_ids(region.data) for region in regions}
+        if len(ids) != 1:
+            parser.error(f"{label} differs between the snapshots: " +
+                         ', '.join(f"{v:04X}:{d:04X} rev {r:02X}" for v, d, r in sorted(ids)))
+        vid, did, rid = ids.pop()
+        known = db.lookup(vid, did, rid)
+        start = args.start if args.start is not None else (known.start if known else LPC_WINDOW[0])
+        end = args.end if args.end is not None else (known.end if known else LPC_WINDOW[1])
+        names = {offset: field.name for offset, field in known.fields.items()} if known else {}
+        baseline = Baseline.learn(args.name, [region.data[start:end] for region in regions], vid, did,
+                                  None if args.any_revision else rid, start, end, names)
+        db.add(baseline)
+        db.save(args.db)
+        print(f"Learned from {len(regions)} snapshot(s): {baseline}")
+        print(f"Saved to {args.db}")
+
+    elif args.command == 'list':
+        for baseline in db.index.values():
+            print(baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+"""
+8237A DMA Controller Pair Emulator
+==================================
+Register-accurate model of the two cascaded 8237A controllers of a PC/AT
+compatible chipset (the legacy DMA block of the PCH), so the register
+sequences the LPC DMA modules write can be checked offline:
+- DMA1 (ports 0x00-0x0F, channels 0-3, byte transfers) is cascaded into
+  channel 4 of DMA2 (ports 0xC0-0xDE, every second port, channels 4-7,
+  word transfers); DMA1 only gets the bus while channel 4 is in cascade
+  mode and unmasked
+- Base/current address and count registers behind the byte pointer
+  flip-flop, command, mode, request, mask (single bit, all bits, clear),
+  master clear and the temporary register
+- Page registers 0x81-0x8F supply address bits 16-23 (bits 17-23 for the
+  16-bit channels, whose address registers count words)
+- Status: bits 0-3 are set at terminal count and cleared by reading status,
+  bits 4-7 show pending requests
+- At terminal count the request bit is cleared and the channel is masked,
+  unless it autoinitializes (current registers reload from the base ones)
+- Software requests are not maskable and run the channel to terminal count;
+  hardware requests (dreq()) honour the mask and the single/demand/block mode
+- Memory-to-memory transfers (channel 0 to 1 on DMA1, with address hold)
+- Verify transfers only count; the illegal transfer type 11 behaves the same
+
+Transfer types follow the datasheet: a "write" transfer moves data from the
+I/O device into memory, a "read" transfer from memory to the device. Data
+comes from a device attached to the channel (attach()), else the floating
+bus (0xFF), and goes to an optional memory backing: FlatMemory, or any
+object with read(address, length) and write(address, data) such as the
+simulator's cs.mem.
+
+A run to terminal count is done as up to two block copies (the address
+register wraps within its page), so a full 64K transfer costs about as much
+as one register write. sim_chipset.py routes the DMA ports of the simulated
+cs.io here.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    dma = Dma8237Pair(FlatMemory())
+    dma.write(0x0B, 0x86)      # channel 2: block mode, write transfer
+    dma.write(0x0A, 0x02)      # unmask channel 2
+    dma.write(0x09, 0x06)      # software request: runs to terminal count
+    dma.report(logger)
+
+    python dma8237.py --bench 5000000
+    python dma8237.py --replay accesses.jsonl   (a sim_chipset.py --trace file)
+"""
+
+import argparse
+import json
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+DMA1_BASE = 0x00
+DMA2_BASE = 0xC0
+
+# Controller registers (offset in ports / stride)
+REG_STATUS = 0x08           # read
+REG_COMMAND = 0x08          # write
+REG_REQUEST = 0x09
+REG_MASK_BIT = 0x0A
+REG_MODE = 0x0B
+REG_CLEAR_FLIP_FLOP = 0x0C
+REG_TEMPORARY = 0x0D        # read
+REG_MASTER_CLEAR = 0x0D     # write
+REG_CLEAR_MASK = 0x0E
+REG_MASK_ALL = 0x0F
+
+# Command register bits
+CMD_MEM_TO_MEM = 0x01
+CMD_CH0_HOLD = 0x02
+CMD_DISABLE = 0x04
+CMD_ROTATING = 0x10
+
+# Mode register fields
+MODE_TYPE_SHIFT = 2
+TYPE_VERIFY, TYPE_WRITE, TYPE_READ, TYPE_ILLEGAL = range(4)
+MODE_AUTOINIT = 0x10
+MODE_DECREMENT = 0x20
+MODE_SHIFT = 6
+MODE_DEMAND, MODE_SINGLE, MODE_BLOCK, MODE_CASCADE = range(4)
+
+TYPE_NAMES = {TYPE_VERIFY: 'verify', TYPE_WRITE: 'write (device to memory)',
+              TYPE_READ: 'read (memory to device)', TYPE_ILLEGAL: 'illegal'}
+MODE_NAMES = {MODE_DEMAND: 'demand', MODE_SINGLE: 'single', MODE_BLOCK: 'block', MODE_CASCADE: 'cascade'}
+
+# Page register port per channel (0x8F is the channel 4 / refresh page)
+PAGE_PORTS = {0: 0x87, 1: 0x83, 2: 0x81, 3: 0x82, 4: 0x8F, 5: 0x8B, 6: 0x89, 7: 0x8A}
+PAGE_FIRST, PAGE_LAST = 0x81, 0x8F
+
+FLOATING = 0xFF
+
+# ISA DMA reaches the first 16 MB
+ISA_SPACE = 1 << 24
+
+
+class FlatMemory(object):
+    """Zero-filled physical memory starting at address 0"""
+
+    def __init__(self, size: int = ISA_SPACE):
+        self.data = bytearray(size)
+
+    def read(self, address: int, length: int) -> bytes:
+        data = bytes(self.data[address:address + length])
+        return data if len(data) == length else data.ljust(length, bytes([FLOATING]))
+
+    def write(self, address: int, data: bytes):
+        end = min(address + len(data), len(self.data))
+        if address < end:
+            self.data[address:end] = data[:end - address]
+
+
+def _segments(address: int, n: int, step: int) -> List[Tuple[int, int]]:
+    """(first address, transfers) runs between address register wraps"""
+    segments = []
+    while n:
+        room = 0x10000 - address if step > 0 else address + 1
+        count = min(n, room)
+        segments.append((address, count))
+        address = (address + step * count) & 0xFFFF
+        n -= count
+    return segments
+
+
+def _reverse(data: bytes, unit: int) -> bytes:
+    if unit == 1:
+        return data[::-1]
+    words = array('H', data)
+    words.reverse()
+    return words.tobytes()
+
+
+class Dma8237(object):
+    """
+    Registers of one 8237A
+
+    Args:
+        base: First port (0x00 or 0xC0)
+        stride: Port spacing (1 for DMA1, 2 for DMA2)
+        first_channel: 0 or 4
+    """
+
+    def __init__(self, base: int, stride: int, first_channel: int):
+        self.base = base
+        self.stride = stride
+        self.first_channel = first_channel
+        self.unit = stride  # bytes per transfer
+        self.flip_flop = 0
+        self.base_address = [0] * 4
+        self.base_count = [0xFFFF] * 4
+        self.current_address = [0] * 4
+        self.current_count = [0xFFFF] * 4
+        self.mode = [0] * 4
+        self.command = 0
+        self.tc = 0
+        self.request = 0
+        self.mask = 0x0F
+        self.temporary = 0
+        self.last_serviced = 3
+
+    def ports(self) -> Dict[int, int]:
+        return {self.base + reg * self.stride: reg for reg in range(0x10)}
+
+    @property
+    def enabled(self) -> bool:
+        return not self.command & CMD_DISABLE
+
+    def transfer_mode(self, local: int) -> int:
+        return self.mode[local] >> MODE_SHIFT
+
+    def status(self) -> int:
+        return (self.request << 4) | self.tc
+
+    def priority(self) -> List[int]:
+        """Channels in service order (fixed, or rotating after the last one serviced)"""
+        if self.command & CMD_ROTATING:
+            return [(self.last_serviced + i) & 3 for i in range(1, 5)]
+        return [0, 1, 2, 3]
+
+    def read(self, reg: int) -> int:
+        if reg < 8:
+            local = reg >> 1
+            value = self.current_count[local] if reg & 1 else self.current_address[local]
+            byte = (value >> (8 * self.flip_flop)) & 0xFF
+            self.flip_flop ^= 1
+            return byte
+        if reg == REG_STATUS:
+            # Reading status clears the terminal count bits
+            value = self.status()
+            self.tc = 0
+            return value
+        if reg == REG_TEMPORARY:
+            return self.temporary
+        if reg == REG_MASK_ALL:
+            return 0xF0 | self.mask
+        return 0xFF
+
+    def write(self, reg: int, value: int):
+        if reg < 8:
+            local = reg >> 1
+            shift = 8 * self.flip_flop
+            if reg & 1:
+                self.base_count[local] = (self.base_count[local] & ~(0xFF << shift)) | (value << shift)
+                self.current_count[local] = self.base_count[local]
+            else:
+                self.base_address[local] = (self.base_address[local] & ~(0xFF << shift)) | (value << shift)
+                self.current_address[local] = self.base_address[local]
+            self.flip_flop ^= 1
+        elif reg == REG_COMMAND:
+            self.command = value
+        elif reg == REG_REQUEST:
+            bit = 1 << (value & 3)
+            self.request = self.request | bit if value & 4 else self.request & ~bit
+        elif reg == REG_MASK_BIT:
+            bit = 1 << (value & 3)
+            self.mask = self.mask | bit if value & 4 else self.mask & ~bit
+        elif reg == REG_MODE:
+            self.mode[value & 3] = value
+        elif reg == REG_CLEAR_FLIP_FLOP:
+            self.flip_flop = 0
+        elif reg == REG_MASTER_CLEAR:
+            # Same as a hardware reset; address, count and mode registers keep their values
+            self.flip_flop = 0
+            self.command = 0
+            self.tc = 0
+            self.request = 0
+            self.temporary = 0
+            self.mask = 0x0F
+            self.last_serviced = 3
+        elif reg == REG_CLEAR_MASK:
+            self.mask = 0
+        elif reg == REG_MASK_ALL:
+            self.mask = value & 0x0F
+
+
+class Dma8237Pair(object):
+    """
+    DMA1 cascaded into channel 4 of DMA2, with page registers
+
+    Args:
+        memory: Memory backing (FlatMemory, cs.mem of the simulator); None drops
+            written data and reads the floating bus
+
+    Attributes:
+        transfers: Transfer cycles run so far (a 16-bit transfer counts once)
+        devices: Channel -> attached device
+    """
+
+    def __init__(self, memory=None):
+        self.memory = memory
+        self.dma1 = Dma8237(DMA1_BASE, 1, 0)
+        self.dma2 = Dma8237(DMA2_BASE, 2, 4)
+        self.pages = bytearray(PAGE_LAST - PAGE_FIRST + 1)
+        self.devices: Dict[int, object] = {}
+        self.transfers = 0
+        self._ports: Dict[int, Tuple[Dma8237, int]] = {}
+        for controller in (self.dma1, self.dma2):
+            self._ports.update({port: (controller, reg) for port, reg in controller.ports().items()})
+
+    def firmware_init(self):
+        """What every PC/AT BIOS leaves behind: channel 4 in cascade mode and unmasked"""
+        self.dma2.write(REG_MODE, (MODE_CASCADE << MODE_SHIFT) | 0)
+        self.dma2.write(REG_MASK_BIT, 0)
+        return self
+
+    def decodes(self, port: int) -> bool:
+        return port in self._ports or PAGE_FIRST <= port <= PAGE_LAST
+
+    def controller(self, channel: int) -> Tuple[Dma8237, int]:
+        return (self.dma1, channel) if channel < 4 else (self.dma2, channel - 4)
+
+    def page(self, channel: int) -> int:
+        return self.pages[PAGE_PORTS[channel] - PAGE_FIRST]
+
+    def attach(self, channel: int, device):
+        """
+        Connect an I/O device to a channel: device.read(length) supplies the
+        bytes of write transfers, device.write(data) receives read transfers
+        """
+        self.devices[channel] = device
+
+    def read(self, port: int) -> int:
+        found = self._ports.get(port)
+        if found is None:
+            return self.pages[port - PAGE_FIRST]
+        return found[0].read(found[1])
+
+    def write(self, port: int, value: int):
+        found = self._ports.get(port)
+        if found is None:
+            self.pages[port - PAGE_FIRST] = value & 0xFF
+            return
+        found[0].write(found[1], value & 0xFF)
+        if self.dma1.request or self.dma2.request:
+            self._service()
+
+    def _granted(self, controller: Dma8237) -> bool:
+        """Whether the controller can get the bus (DMA1 through the cascade channel)"""
+        if not controller.enabled:
+            return False
+        if controller is self.dma2:
+            return True
+        return (self.dma2.enabled and self.dma2.transfer_mode(0) == MODE_CASCADE
+                and not self.dma2.mask & 1)
+
+    def _service(self):
+        # Software requests run to terminal count, DMA1 (channel 4) first
+        for controller in (self.dma1, self.dma2):
+            if not controller.request or not self._granted(controller):
+                continue
+            for local in controller.priority():
+                if not controller.request & (1 << local) or controller.transfer_mode(local) == MODE_CASCADE:
+                    continue
+                if controller is self.dma1 and local == 0 and controller.command & CMD_MEM_TO_MEM:
+                    self._memory_to_memory()
+                else:
+                    self._run(controller, local, controller.current_count[local] + 1)
+
+    def dreq(self, channel: int, transfers: int = 1) -> int:
+        """
+        Hardware DMA request held for up to 'transfers' cycles (block mode
+        runs to terminal count once started); returns the transfers run
+        """
+        controller, local = self.controller(channel)
+        if controller.mask & (1 << local) or not self._granted(controller):
+            return 0
+        mode = controller.transfer_mode(local)
+        if mode == MODE_CASCADE:
+            return 0
+        remaining = controller.current_count[local] + 1
+        return self._run(controller, local, remaining if mode == MODE_BLOCK else min(transfers, remaining))
+
+    def _address(self, controller: Dma8237, local: int, address: int) -> int:
+        page = self.page(controller.first_channel + local)
+        if controller.unit == 2:
+            return ((page & 0xFE) << 16) | (address << 1)
+        return (page << 16) | address
+
+    def _gather(self, controller: Dma8237, local: int, n: int) -> bytes:
+        """Memory read by n transfers from the current address, in transfer order"""
+        unit = controller.unit
+        if self.memory is None:
+            return bytes([FLOATING]) * (n * unit)
+        step = -1 if controller.mode[local] & MODE_DECREMENT else 1
+        chunks = []
+        for address, count in _segments(controller.current_address[local], n, step):
+            if step > 0:
+                chunks.append(self.memory.read(self._address(controller, local, address), count * unit))
+            else:
+                low = self._address(controller, local, address - count + 1)
+                chunks.append(_reverse(self.memory.read(low, count * unit), unit))
+        return b''.join(chunks)
+
+    def _scatter(self, controller: Dma8237, local: int, data: bytes):
+        """Memory written by transfers from the current address, data in transfer order"""
+        if self.memory is None:
+            return
+        unit = controller.unit
+        step = -1 if controller.mode[local] & MODE_DECREMENT else 1
+        offset = 0
+        for address, count in _segments(controller.current_address[local], len(data) // unit, step):
+            chunk = data[offset:offset + count * unit]
+            offset += count * unit
+            if step > 0:
+                self.memory.write(self._address(controller, local, address), chunk)
+            else:
+                self.memory.write(self._address(controller, local, address - count + 1), _reverse(chunk, unit))
+
+    def _advance(self, controller: Dma8237, local: int, n: int, hold: bool = False):
+        """Update address and count after n transfers; terminal count handling"""
+        if not hold:
+            step = -n if controller.mode[local] & MODE_DECREMENT else n
+            controller.current_address[local] = (controller.current_address[local] + step) & 0xFFFF
+        count = controller.current_count[local] - n
+        controller.current_count[local] = count & 0xFFFF
+        controller.last_serviced = local
+        self.transfers += n
+        if count >= 0:
+            return
+
+        bit = 1 << local
+        controller.tc |= bit
+        controller.request &= ~bit
+        if controller.mode[local] & MODE_AUTOINIT:
+            controller.current_address[local] = controller.base_address[local]
+            controller.current_count[local] = controller.base_count[local]
+        else:
+            controller.mask |= bit
+
+    def _run(self, controller: Dma8237, local: int, n: int) -> int:
+        kind = (controller.mode[local] >> MODE_TYPE_SHIFT) & 3
+        device = self.devices.get(controller.first_channel + local)
+        size = n * controller.unit
+        if kind == TYPE_WRITE:
+            data = device.read(size) if device is not None else b''
+            data = bytes(data[:size]).ljust(size, bytes([FLOATING]))
+            self._scatter(controller, local, data)
+        elif kind == TYPE_READ and device is not None:
+            # Memory reads have no side effects: skipped when nothing receives the data
+            device.write(self._gather(controller, local, n))
+        self._advance(controller, local, n)
+        return n
+
+    def _memory_to_memory(self):
+        # Channel 0 reads through the temporary register, channel 1 writes;
+        # the transfer ends at channel 1's terminal count
+        dma1 = self.dma1
+        n = dma1.current_count[1] + 1
+        hold = bool(dma1.command & CMD_CH0_HOLD)
+        data = self._gather(dma1, 0, 1) * n if hold else self._gather(dma1, 0, n)
+        self._scatter(dma1, 1, data)
+        dma1.temporary = data[-1]
+        self._advance(dma1, 0, n, hold)
+        self._advance(dma1, 1, n)
+        dma1.request &= ~1
+        self.transfers -= n
+
+    def channel_state(self, channel: int) -> dict:
+        controller, local = self.controller(channel)
+        mode = controller.mode[local]
+        return {
+            'channel': channel,
+            'mode': MODE_NAMES[mode >> MODE_SHIFT],
+            'type': TYPE_NAMES[(mode >> MODE_TYPE_SHIFT) & 3],
+            'autoinit': bool(mode & MODE_AUTOINIT),
+            'decrement': bool(mode & MODE_DECREMENT),
+            'address': self._address(controller, local, controller.current_address[local]),
+            'count': controller.current_count[local],
+            'masked': bool(controller.mask & (1 << local)),
+            'tc': bool(controller.tc & (1 << local)),
+            'requested': bool(controller.request & (1 << local)),
+        }
+
+    def report(self, logger):
+        logger.log(f"[*] 8237A pair: {self.transfers} transfer(s), DMA1 command 0x{self.dma1.command:02X}, "
+                   f"DMA2 command 0x{self.dma2.command:02X}, DMA1 "
+                   f"{'granted' if self._granted(self.dma1) else 'blocked'} by cascade channel 4")
+        for channel in range(8):
+            state = self.channel_state(channel)
+            flags = [name for name in ('autoinit', 'decrement', 'masked', 'tc', 'requested') if state[name]]
+            logger.log(f"    Channel {channel}: {state['mode']}, {state['type']}, address 0x{state['address']:06X}, "
+                       f"count 0x{state['count']:04X}{' (' + ', '.join(flags) + ')' if flags else ''}")
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+    log_good = log_warning = log_bad = log_error = log
+
+
+def replay(path: str, logger) -> int:
+    """
+    Run the DMA port accesses of a sim_chipset.py trace through the emulator,
+    reporting reads whose recorded value differs; returns the mismatch count
+    """
+    dma = Dma8237Pair(FlatMemory()).firmware_init()
+    accesses = mismatches = 0
+    with open(path) as f:
+        for line in f:
+            kind, op, port, value = json.loads(line)
+            if kind != 'io' or not dma.decodes(port):
+                continue
+            accesses += 1
+            if op == 'w':
+                dma.write(port, value)
+                continue
+            expected = dma.read(port)
+            if expected != value:
+                mismatches += 1
+                logger.log_warning(f"Access {accesses}: port 0x{port:02X} read 0x{value:02X}, emulator gives 0x{expected:02X}")
+    logger.log(f"[*] Replayed {accesses} DMA port access(es), {mismatches} read mismatch(es)")
+    dma.report(logger)
+    return mismatches
+
+
+def bench(transfers: int, logger):
+    dma = Dma8237Pair(FlatMemory()).firmware_init()
+    # Channel 2, block mode write transfers into the first 64K, one software request per run
+    rounds = max(1, transfers // 0x10000)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        dma.write(0x0C, 0)
+        dma.write(0x04, 0x00)
+        dma.write(0x04, 0x00)
+        dma.write(0x05, 0xFF)
+        dma.write(0x05, 0xFF)
+        dma.write(0x81, 0x00)
+        dma.write(0x0B, (MODE_BLOCK << MODE_SHIFT) | (TYPE_WRITE << MODE_TYPE_SHIFT) | 2)
+        dma.write(0x09, 0x04 | 2)
+    elapsed = time.perf_counter() - start
+    logger.log(f"[*] Block transfers: {dma.transfers} in {elapsed * 1000:.1f} ms "
+               f"({dma.transfers / elapsed / 1e6:.1f} M transfers/s)")
+
+    # Channel 6, single mode read transfers, one hardware request per transfer
+    dma.write(0xD6, (MODE_SINGLE << MODE_SHIFT) | (TYPE_READ << MODE_TYPE_SHIFT) | MODE_AUTOINIT | 2)
+    dma.write(0xD4, 2)
+    calls = min(transfers, 1000000)
+    done = 0
+    start = time.perf_counter()
+    for _ in range(calls):
+        done += dma.dreq(6)
+    elapsed = time.perf_counter() - start
+    logger.log(f"[*] Single transfers: {done} in {elapsed * 1000:.1f} ms ({done / elapsed / 1e6:.2f} M requests/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="8237A DMA controller pair emulator")
+    parser.add_argument("--bench", type=int, default=0, help="Run this many transfers and report the rate")
+    parser.add_argument("--replay", help="sim_chipset.py --trace file whose DMA port accesses to check")
+    args = parser.parse_args()
+    logger = _PrintLogger()
+
+    if args.replay:
+        replay(args.replay, logger)
+    if args.bench:
+        bench(args.bench, logger)
+    if not args.replay and not args.bench:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
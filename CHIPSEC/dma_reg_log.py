@@ -0,0 +1,308 @@
+"""
+Binary Columnar Register Log
+============================
+Compact on-disk format for long-term register monitoring, replacing one CSV
+line (and one flush) per sample.
+
+File layout (little-endian):
+- File header: magic b'DMARLOG1', version (u16), column count (u16),
+  flags (u16), reserved (u16), then 8 bytes of ASCII name per column
+- Blocks, each: row count (u32), payload length (u32), encoding (u8),
+  3 reserved bytes, payload
+
+Block payload (before optional zlib compression):
+- Timestamp column: int64 nanoseconds, first value absolute, the rest deltas
+- One uint32 column per register, first value absolute, the rest deltas
+  modulo 2**32 (registers that don't change become runs of zeros)
+
+Every block is fsync'ed as it is written, so a crash or power loss only costs
+the rows still buffered. Writers rotate to a new file by size and/or age. read_log() loads a file
+straight into NumPy arrays (array.array when NumPy is not installed).
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python dma_reg_log.py monitor.dmalog
+    python dma_reg_log.py monitor.00000.dmalog monitor.00001.dmalog --csv out.csv
+"""
+
+import argparse
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LOG_MAGIC = b'DMARLOG1'
+LOG_VERSION = 1
+FILE_HEADER = struct.Struct('<8sHHHH')
+BLOCK_HEADER = struct.Struct('<IIB3x')
+NAME_SIZE = 8
+
+FLAG_ZLIB = 0x1
+ENCODING_ZLIB = 0x1
+
+
+def _delta_encode(values: Sequence[int], typecode: str, modulus: int) -> bytes:
+    if np is not None:
+        dtype = np.int64 if typecode == 'q' else np.uint32
+        column = np.asarray(values, dtype=dtype)
+        encoded = np.empty_like(column)
+        if len(column):
+            encoded[0] = column[0]
+            # uint32 subtraction wraps, which is exactly the modular delta
+            np.subtract(column[1:], column[:-1], out=encoded[1:])
+        return encoded.astype('<' + encoded.dtype.str[1:], copy=False).tobytes()
+
+    encoded = array(typecode, values[:1])
+    encoded.extend((cur - prev) % modulus if typecode == 'I' else cur - prev
+                   for prev, cur in zip(values, values[1:]))
+    return encoded.tobytes()
+
+
+def _delta_decode(raw: bytes, typecode: str):
+    if np is not None:
+        dtype = '<i8' if typecode == 'q' else '<u4'
+        return np.cumsum(np.frombuffer(raw, dtype=dtype), dtype=dtype)
+
+    column = array(typecode)
+    column.frombytes(raw)
+    total = 0
+    for i, delta in enumerate(column):
+        total = total + delta if typecode == 'q' else (total + delta) & 0xFFFFFFFF
+        column[i] = total
+    return column
+
+
+class RegisterLogWriter(object):
+    """
+    Block-buffered writer with size and time based rotation.
+
+    Args:
+        path: Log file path; rotated files insert a sequence number before
+              the extension (monitor.dmalog -> monitor.00001.dmalog)
+        names: Column names (at most 8 ASCII characters each)
+        block_rows: Rows buffered before a block is written
+        compress: zlib-compress each block
+        max_bytes: Rotate once a file reaches this size
+        max_seconds: Rotate once a file has been open this long
+        flush_seconds: Write a partial block if rows have waited this long
+        fsync: fsync each block so it survives a crash or power loss
+    """
+
+    def __init__(self, path: str, names: Sequence[str], block_rows: int = 4096, compress: bool = True,
+                 max_bytes: Optional[int] = None, max_seconds: Optional[float] = None,
+                 flush_seconds: Optional[float] = 60, fsync: bool = True):
+        self.path = path
+        self.names = list(names)
+        self.block_rows = block_rows
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_seconds = flush_seconds
+        self.fsync = fsync
+
+        self.files: List[str] = []
+        self._sequence = 0
+        self._file = None
+        self._opened = 0.0
+        self._first_buffered = None
+        self._timestamps: List[int] = []
+        self._columns: List[List[int]] = [[] for _ in self.names]
+
+    def _file_path(self) -> str:
+        if self._sequence == 0:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}.{self._sequence:05d}{ext}"
+
+    def _open(self):
+        path = self._file_path()
+        self._file = open(path, 'wb')
+        self._opened = time.monotonic()
+        self.files.append(path)
+
+        flags = FLAG_ZLIB if self.compress else 0
+        self._file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION, len(self.names), flags, 0))
+        for name in self.names:
+            self._file.write(name.encode('ascii')[:NAME_SIZE].ljust(NAME_SIZE, b'\0'))
+
+    def _should_rotate(self) -> bool:
+        if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+            return True
+        if self.max_seconds is not None and time.monotonic() - self._opened >= self.max_seconds:
+            return True
+        return False
+
+    def append(self, timestamp_ns: int, values: Sequence[int]):
+        """Buffer one sample; blocks are written as they fill up"""
+        if self._first_buffered is None:
+            self._first_buffered = time.monotonic()
+
+        self._timestamps.append(timestamp_ns)
+        for column, value in zip(self._columns, values):
+            column.append(value)
+
+        if len(self._timestamps) >= self.block_rows:
+            self.flush()
+        elif self.flush_seconds is not None and time.monotonic() - self._first_buffered >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as one block, rotating first if needed"""
+        if not self._timestamps:
+            return
+
+        if self._file is None:
+            self._open()
+        elif self._should_rotate():
+            self._file.close()
+            self._sequence += 1
+            self._open()
+
+        payload = _delta_encode(self._timestamps, 'q', 1 << 64)
+        payload += b''.join(_delta_encode(column, 'I', 1 << 32) for column in self._columns)
+
+        encoding = 0
+        if self.compress:
+            payload = zlib.compress(payload, 6)
+            encoding = ENCODING_ZLIB
+
+        self._file.write(BLOCK_HEADER.pack(len(self._timestamps), len(payload), encoding))
+        self._file.write(payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+        self._timestamps = []
+        self._columns = [[] for _ in self.names]
+        self._first_buffered = None
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_log(path: str) -> Dict[str, object]:
+    """
+    Load one log file
+
+    Returns:
+        {'timestamp': int64 array, <name>: uint32 array, ...} using NumPy
+        arrays when available. Reading stops at the last good block: a
+        truncated or corrupt block (e.g. after a crash) and anything after it
+        are ignored.
+
+    Raises:
+        ValueError: If the file is not a register log
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"{path} is too short to be a register log")
+
+    magic, version, column_count, flags, _ = FILE_HEADER.unpack_from(data, 0)
+    if magic != LOG_MAGIC or version != LOG_VERSION:
+        raise ValueError(f"{path} is not a version {LOG_VERSION} register log")
+
+    offset = FILE_HEADER.size
+    names = []
+    for _ in range(column_count):
+        names.append(data[offset:offset + NAME_SIZE].rstrip(b'\0').decode('ascii'))
+        offset += NAME_SIZE
+
+    parts = {name: [] for name in ['timestamp'] + names}
+    while offset + BLOCK_HEADER.size <= len(data):
+        rows, length, encoding = BLOCK_HEADER.unpack_from(data, offset)
+        offset += BLOCK_HEADER.size
+        if offset + length > len(data):
+            break
+
+        payload = data[offset:offset + length]
+        offset += length
+        if encoding & ENCODING_ZLIB:
+            try:
+                payload = zlib.decompress(payload)
+            except zlib.error:
+                break
+        if len(payload) < rows * (8 + 4 * len(names)):
+            break
+
+        parts['timestamp'].append(_delta_decode(payload[:rows * 8], 'q'))
+        position = rows * 8
+        for name in names:
+            parts[name].append(_delta_decode(payload[position:position + rows * 4], 'I'))
+            position += rows * 4
+
+    result = {}
+    for name, blocks in parts.items():
+        typecode = 'q' if name == 'timestamp' else 'I'
+        if np is not None:
+            dtype = np.int64 if typecode == 'q' else np.uint32
+            result[name] = np.concatenate(blocks) if blocks else np.empty(0, dtype=dtype)
+        else:
+            column = array(typecode)
+            for block in blocks:
+                column.extend(block)
+            result[name] = column
+    return result
+
+
+def read_logs(paths: Sequence[str]) -> Dict[str, object]:
+    """Load a rotated set of log files (in order) into one set of columns"""
+    logs = [read_log(path) for path in paths]
+    if not logs:
+        return {}
+    if np is not None:
+        return {name: np.concatenate([log[name] for log in logs]) for name in logs[0]}
+
+    result = {}
+    for name in logs[0]:
+        column = array(logs[0][name].typecode)
+        for log in logs:
+            column.extend(log[name])
+        result[name] = column
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export binary register logs")
+    parser.add_argument("logs", nargs='+', help="Log file(s), in rotation order")
+    parser.add_argument("--csv", help="Export to CSV in the old monitor format")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    columns = read_logs(args.logs)
+    elapsed = time.perf_counter() - start
+
+    names = [name for name in columns if name != 'timestamp']
+    rows = len(columns.get('timestamp', []))
+    size = sum(os.path.getsize(path) for path in args.logs)
+    print(f"Loaded {rows} samples x {len(names)} registers from {size} bytes in {elapsed * 1000:.1f} ms")
+
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write("Timestamp," + ",".join(names) + "\n")
+            for i in range(rows):
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(columns['timestamp'][i]) / 1e9))
+                f.write(stamp + "," + ",".join(f"{int(columns[n][i]):08X}" for n in names) + "\n")
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+High-Rate Register Sampler
+==========================
+Samples a fixed set of config-space registers at a configurable rate (down
+to a tight busy-poll) and records only transitions into a preallocated ring
+buffer with time.monotonic_ns() timestamps.
+
+Compared to sleeping 100 ms between reads and keeping a set of every value
+seen, the sampler:
+- stores transitions in preallocated array('I') / array('q') slots, so
+  memory stays bounded (the oldest transitions are overwritten and counted)
+- reports the achieved sample rate, the largest gap between samples and how
+  many sample intervals were missed (dropped) because a read ran long
+- keeps what it collected when interrupted with Ctrl+C
+
+Intervals shorter than SPIN_THRESHOLD_NS busy-spin a core for the whole run,
+so callers default to sleep-based rates and ask for high rates explicitly.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+"""
+
+import struct
+import time
+from array import array
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Don't trust time.sleep() for waits shorter than this - spin instead
+SPIN_THRESHOLD_NS = 2000000
+
+# Gaps longer than this count as dropped when busy-polling (interval 0)
+BUSY_POLL_GAP_NS = 1000000
+
+
+def make_pci_reader(pci, bus: int, dev: int, fun: int, offsets: Sequence[int]) -> Callable[[], Tuple[int, ...]]:
+    """
+    Build a read function returning the current value of each register
+
+    Args:
+        pci: cs.pci, an EcamReader or anything with read_dword(bus, dev, fun, offset)
+        bus, dev, fun: PCI function holding the registers
+        offsets: Dword offsets to sample, in column order
+    """
+    offsets = tuple(offsets)
+
+    # A mapped ECAM window can be read without any method dispatch per register
+    if hasattr(pci, '_offset') and hasattr(pci, '_map'):
+        mapping = pci._map
+        positions = tuple(pci._offset(bus, dev, fun, offset) for offset in offsets)
+        unpack = struct.Struct('<I').unpack_from
+        return lambda: tuple(unpack(mapping, pos)[0] for pos in positions)
+
+    read_dword = pci.read_dword
+    return lambda: tuple(read_dword(bus, dev, fun, offset) for offset in offsets)
+
+
+class SamplerStats(NamedTuple):
+    samples: int
+    duration_ns: int
+    transitions: int
+    overwritten: int
+    dropped_intervals: int
+    max_gap_ns: int
+    interrupted: bool = False
+
+    @property
+    def rate(self) -> float:
+        """Achieved samples per second"""
+        return self.samples * 1e9 / self.duration_ns if self.duration_ns else 0.0
+
+
+class RegisterSampler(object):
+    """
+    Transition-only register sampler backed by a ring buffer.
+
+    Args:
+        read_fn: Callable returning a tuple with one value per column
+        names: Column names (e.g. ["ctrl", "stat", "tc", "addr", "desc"])
+        capacity: Number of transitions kept in the ring buffer
+        interval_ns: Target time between samples; 0 busy-polls
+    """
+
+    def __init__(self, read_fn: Callable[[], Sequence[int]], names: Sequence[str],
+                 capacity: int = 65536, interval_ns: int = 0):
+        self.read_fn = read_fn
+        self.names = list(names)
+        self.capacity = capacity
+        self.interval_ns = interval_ns
+
+        columns = len(self.names)
+        self._timestamps = array('q', bytes(8 * capacity))
+        self._values = array('I', bytes(4 * capacity * columns))
+        self._head = 0
+        self._count = 0
+        self.stats = None
+
+    @classmethod
+    def at_rate(cls, read_fn, names, rate_hz: float, capacity: int = 65536):
+        """Build a sampler for a target rate in Hz (0 or less busy-polls)"""
+        interval_ns = int(1e9 / rate_hz) if rate_hz > 0 else 0
+        return cls(read_fn, names, capacity, interval_ns)
+
+    def _record(self, timestamp: int, values: Sequence[int]):
+        slot = self._head
+        columns = len(self.names)
+        self._timestamps[slot] = timestamp
+        self._values[slot * columns:(slot + 1) * columns] = array('I', values)
+        self._head = (slot + 1) % self.capacity
+        self._count += 1
+
+    def run(self, duration: Optional[float] = None, max_samples: Optional[int] = None,
+            stop_event=None) -> SamplerStats:
+        """
+        Sample until the duration elapses, max_samples is reached,
+        stop_event (a threading.Event) is set or Ctrl+C is pressed (the
+        samples so far are kept and stats.interrupted is set)
+
+        Args:
+            duration: Seconds to sample for
+            max_samples: Stop after this many samples
+            stop_event: Event checked between samples
+
+        Returns:
+            SamplerStats for this run
+        """
+        read_fn = self.read_fn
+        interval = self.interval_ns
+        clock = time.monotonic_ns
+        gap_limit = 2 * interval if interval else BUSY_POLL_GAP_NS
+
+        records_before = self._count
+        start = clock()
+        end = start + int(duration * 1e9) if duration is not None else None
+        deadline = start
+
+        samples = 0
+        dropped = 0
+        max_gap = 0
+        last_time = start
+        last_values = None
+        interrupted = False
+
+        try:
+            while True:
+                now = clock()
+                if end is not None and now >= end:
+                    break
+                if max_samples is not None and samples >= max_samples:
+                    break
+                if stop_event is not None and stop_event.is_set():
+                    break
+
+                values = read_fn()
+                now = clock()
+                samples += 1
+
+                if values != last_values:
+                    self._record(now, values)
+                    last_values = values
+
+                gap = now - last_time
+                if gap > max_gap:
+                    max_gap = gap
+                if samples > 1 and gap > gap_limit:
+                    dropped += gap // interval - 1 if interval else 1
+                last_time = now
+
+                if interval:
+                    deadline += interval
+                    remaining = deadline - clock()
+                    if remaining < 0:
+                        # Running behind - don't burst to catch up
+                        deadline = clock()
+                    elif remaining > SPIN_THRESHOLD_NS:
+                        time.sleep((remaining - SPIN_THRESHOLD_NS // 2) / 1e9)
+                        while clock() < deadline:
+                            pass
+                    else:
+                        while clock() < deadline:
+                            pass
+        except KeyboardInterrupt:
+            interrupted = True
+
+        overwritten = max(0, self._count - self.capacity)
+        # The first record of a run is the starting state, not a transition
+        transitions = max(0, self._count - records_before - 1)
+        self.stats = SamplerStats(samples, last_time - start, transitions, overwritten, dropped, max_gap,
+                                  interrupted)
+        return self.stats
+
+    def transitions(self) -> List[Tuple[int, Tuple[int, ...]]]:
+        """Recorded transitions as (timestamp_ns, values) in chronological order"""
+        columns = len(self.names)
+        kept = min(self._count, self.capacity)
+        first = (self._head - kept) % self.capacity
+
+        result = []
+        for i in range(kept):
+            slot = (first + i) % self.capacity
+            values = tuple(self._values[slot * columns:(slot + 1) * columns])
+            result.append((self._timestamps[slot], values))
+        return result
+
+    def columns(self) -> Tuple[array, List[array]]:
+        """Recorded transitions as a timestamp array plus one array per register"""
+        transitions = self.transitions()
+        timestamps = array('q', (t for t, _ in transitions))
+        columns = [array('I', (v[i] for _, v in transitions)) for i in range(len(self.names))]
+        return timestamps, columns
+
+    def reset(self):
+        """Forget recorded transitions (the buffers are reused)"""
+        self._head = 0
+        self._count = 0
+        self.stats = None
+
+    def report(self, logger, max_lines: int = 50):
+        """Log the run statistics and the recorded transitions"""
+        stats = self.stats
+        if stats is None:
+            return
+
+        logger.log(f"Samples: {stats.samples} in {stats.duration_ns / 1e9:.3f}s "
+                   f"({stats.rate:.0f} samples/s achieved)")
+        if stats.interrupted:
+            logger.log_warning("Sampling was interrupted - statistics cover the samples taken so far")
+        logger.log(f"Transitions recorded: {stats.transitions}")
+        logger.log(f"Largest gap between samples: {stats.max_gap_ns / 1e6:.3f} ms, "
+                   f"dropped intervals: {stats.dropped_intervals}")
+        if stats.overwritten:
+            logger.log_warning(f"Ring buffer overflowed - {stats.overwritten} oldest transitions were overwritten")
+
+        transitions = self.transitions()
+        if not transitions:
+            return
+
+        start = transitions[0][0]
+        previous = transitions[0][1]
+        logger.log(f"Initial values: " + ", ".join(f"{n}=0x{v:08X}" for n, v in zip(self.names, previous)))
+
+        # The first entry is the starting state, not a transition
+        for timestamp, values in transitions[1:max_lines + 1]:
+            changes = [f"{n}: 0x{old:08X} -> 0x{new:08X}"
+                       for n, old, new in zip(self.names, previous, values) if old != new]
+            logger.log(f"  +{(timestamp - start) / 1e6:.3f} ms  " + ", ".join(changes))
+            previous = values
+
+        if len(transitions) - 1 > max_lines:
+            logger.log(f"  ... {len(transitions) - 1 - max_lines} more transitions not shown")
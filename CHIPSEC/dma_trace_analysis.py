@@ -0,0 +1,298 @@
+"""
+Register Trace Bit Analytics
+============================
+Offline, vectorized analysis of recorded register traces - the binary logs
+written by monitor_dma_registers_long_term (dma_reg_log.py) or the
+transition columns of a RegisterSampler run.
+
+Instead of guessing bit meanings from a single snapshot, every bit of every
+register is characterised from the trace:
+- toggle count (how often the bit changed between consecutive records)
+- duty cycle (fraction of time set, weighted by the time each record held)
+- run lengths (time between toggles: min / mean / max and a log2 histogram)
+- correlation between live bits, across registers: state correlation (phi)
+  and how often two bits toggle in the same record
+
+Long traces are first reduced to the records where some register changed
+(found with chunked vectorized compares), so a few hundred million samples
+of mostly idle registers take seconds. Bits that never change are folded into
+a per-register constant mask; the rest are ranked by toggle count (ties
+broken by how balanced the duty cycle is).
+
+Requires NumPy.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python dma_trace_analysis.py monitor_dma_registers_long_term.dmalog [more rotated files ...]
+"""
+
+import argparse
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+try:
+    from chipsec.modules.common.dma_reg_log import read_logs
+except ImportError:
+    from dma_reg_log import read_logs
+
+CHUNK_SIZE = 1 << 22
+
+# Correlation matrices cover at most this many of the most active bits
+MAX_CORRELATED_BITS = 64
+
+# Records processed per chunk when building the correlation matrices
+CORRELATION_CHUNK = 1 << 18
+
+
+class BitStats(NamedTuple):
+    register: str
+    bit: int
+    toggles: int
+    duty: float
+    min_run: int
+    mean_run: float
+    max_run: int
+    run_histogram: Sequence[int]
+
+    @property
+    def balance(self) -> float:
+        """Binary entropy of the duty cycle (1.0 = set half the time)"""
+        p = self.duty
+        if p <= 0.0 or p >= 1.0:
+            return 0.0
+        return float(-(p * np.log2(p) + (1 - p) * np.log2(1 - p)))
+
+
+class TraceAnalysis(object):
+    """
+    Result of analyze_trace()
+
+    Attributes:
+        records: Number of records analysed
+        duration: Time covered (timestamp units, or records without timestamps)
+        unit: 'ns' or 'samples'
+        live_bits: {register: [BitStats, ...]} ranked most active first
+        constant: {register: (mask of bits that never changed, their value)}
+        labels: 'register[bit]' label per correlation row/column
+        phi: State correlation matrix between the labelled bits
+        co_toggle: Share of toggles that two bits make in the same record
+                   (toggles in common / toggles of either)
+    """
+
+    def __init__(self, records, duration, unit):
+        self.records = records
+        self.duration = duration
+        self.unit = unit
+        self.live_bits: Dict[str, List[BitStats]] = {}
+        self.constant: Dict[str, tuple] = {}
+        self.labels: List[str] = []
+        self.phi = np.zeros((0, 0))
+        self.co_toggle = np.zeros((0, 0))
+
+    def ranked(self) -> List[BitStats]:
+        """All live bits across registers, most active first"""
+        bits = [stats for register in self.live_bits.values() for stats in register]
+        return sorted(bits, key=lambda s: (-s.toggles, -s.balance))
+
+    def correlated_pairs(self, threshold: float = 0.8):
+        """(label_a, label_b, phi, co_toggle) for strongly related bit pairs"""
+        pairs = []
+        for i in range(len(self.labels)):
+            for j in range(i + 1, len(self.labels)):
+                phi = self.phi[i, j]
+                shared = self.co_toggle[i, j]
+                if abs(phi) >= threshold or shared >= threshold:
+                    pairs.append((self.labels[i], self.labels[j], float(phi), float(shared)))
+        pairs.sort(key=lambda p: -max(abs(p[2]), p[3]))
+        return pairs
+
+    def _run(self, value) -> str:
+        if self.unit == 'ns':
+            return f"{value / 1e6:.3f} ms"
+        return f"{value:.0f} samples"
+
+    def report(self, logger, top: int = 8, max_pairs: int = 16):
+        """Log the ranked live bits per register and the strongest correlations"""
+        logger.log(f"[*] Trace analysis: {self.records} records over {self._run(self.duration)}")
+
+        for register, bits in self.live_bits.items():
+            mask, value = self.constant[register]
+            if not bits:
+                logger.log(f"  {register}: no live bits (constant 0x{value:08X})")
+                continue
+
+            logger.log(f"  {register}: {len(bits)} live bit(s), constant bits 0x{mask:08X} = 0x{value & mask:08X}")
+            for stats in bits[:top]:
+                logger.log(f"    bit {stats.bit:2d}: {stats.toggles} toggles, duty {stats.duty * 100:.1f}%, "
+                           f"runs {self._run(stats.min_run)} / {self._run(stats.mean_run)} / "
+                           f"{self._run(stats.max_run)} (min/mean/max)")
+            if len(bits) > top:
+                logger.log(f"    ... {len(bits) - top} more live bits not shown")
+
+        pairs = self.correlated_pairs()
+        if pairs:
+            logger.log("  Strongly related bits (phi, shared toggles):")
+            for a, b, phi, shared in pairs[:max_pairs]:
+                logger.log(f"    {a} ~ {b}: phi {phi:+.2f}, shared toggles {shared * 100:.0f}%")
+
+
+def _bounds(n: int, size: int):
+    for start in range(0, n, size):
+        yield start, min(start + size, n)
+
+
+def _change_points(arrays, n: int, chunk_size: int) -> np.ndarray:
+    """Indices of the first record and of every record where any register changed"""
+    points = [np.zeros(1, dtype=np.int64)]
+    for start, stop in _bounds(n - 1, chunk_size):
+        changed = np.zeros(stop - start, dtype=bool)
+        for values in arrays.values():
+            changed |= values[start + 1:stop + 1] != values[start:stop]
+        points.append(np.flatnonzero(changed) + (start + 1))
+    return np.concatenate(points)
+
+
+def analyze_trace(columns: Dict[str, Sequence[int]], timestamps: Optional[Sequence[int]] = None,
+                  end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> TraceAnalysis:
+    """
+    Characterise every bit of every register in a trace
+
+    Args:
+        columns: {register name: uint32 values}, one value per record
+        timestamps: Record times (ns). Without them records are assumed to be
+                    evenly spaced and run lengths are counted in records.
+        end: Time the last record held until (defaults to its own timestamp,
+             or one record past the end without timestamps)
+        chunk_size: Records compared per pass when finding change points
+
+    Returns:
+        TraceAnalysis
+    """
+    names = list(columns)
+    arrays = {name: np.asarray(columns[name], dtype=np.uint32) for name in names}
+    n = len(arrays[names[0]]) if names else 0
+
+    unit = 'samples' if timestamps is None else 'ns'
+    if timestamps is None:
+        times = np.arange(n, dtype=np.int64)
+        if end is None:
+            end = n
+    else:
+        times = np.asarray(timestamps, dtype=np.int64)
+
+    if n == 0:
+        return TraceAnalysis(0, 0, unit)
+
+    last = end if end is not None else int(times[-1])
+    analysis = TraceAnalysis(n, last - int(times[0]), unit)
+    total_time = float(analysis.duration) or 1.0
+
+    # Long traces are mostly repeats - keep only the records where something
+    # changed, each holding until the next change (a sampler trace already is
+    # in this form)
+    points = _change_points(arrays, n, chunk_size)
+    changes = {name: values[points] for name, values in arrays.items()}
+    change_times = times[points]
+    hold = np.diff(change_times, append=last).astype(np.float64)
+
+    for name in names:
+        values = changes[name]
+        diff = values[1:] ^ values[:-1]
+        changed = int(np.bitwise_or.reduce(diff)) if len(diff) else 0
+        analysis.constant[name] = (~changed & 0xFFFFFFFF, int(values[0]))
+
+        bits = []
+        for bit in range(32):
+            if not changed >> bit & 1:
+                continue
+            mask = np.uint32(1 << bit)
+
+            duty = float(hold[(values & mask) != 0].sum()) / total_time
+            edges = change_times[np.flatnonzero(diff & mask) + 1]
+            # The first run is measured from the start of the trace
+            runs = np.diff(edges, prepend=times[0])
+            histogram = np.bincount(np.log2(np.maximum(runs, 1)).astype(np.int64))
+
+            bits.append(BitStats(name, bit, len(edges), duty, int(runs.min()), float(runs.mean()),
+                                 int(runs.max()), histogram.tolist()))
+
+        bits.sort(key=lambda s: (-s.toggles, -s.balance))
+        analysis.live_bits[name] = bits
+
+    _correlate(analysis, changes, hold)
+    return analysis
+
+
+def _correlate(analysis: TraceAnalysis, changes, hold: np.ndarray):
+    """Fill in phi and co_toggle for the most active bits"""
+    selected = analysis.ranked()[:MAX_CORRELATED_BITS]
+    if len(selected) < 2:
+        return
+
+    k = len(selected)
+    analysis.labels = [f"{s.register}[{s.bit}]" for s in selected]
+    records = len(hold)
+
+    weighted = np.zeros((k, k))
+    weighted_sum = np.zeros(k)
+    shared = np.zeros((k, k))
+
+    for start, stop in _bounds(records, CORRELATION_CHUNK):
+        weights = hold[start:stop]
+        states = np.empty((k, stop - start), dtype=np.float64)
+        flips = np.empty((k, stop - start), dtype=np.float64)
+
+        for row, stats in enumerate(selected):
+            values = changes[stats.register]
+            mask = np.uint32(1 << stats.bit)
+            chunk = values[start:stop]
+            previous = values[start - 1:stop - 1] if start else np.concatenate((chunk[:1], chunk[:-1]))
+            states[row] = (chunk & mask) != 0
+            flips[row] = ((chunk ^ previous) & mask) != 0
+
+        weighted += (states * weights) @ states.T
+        weighted_sum += states @ weights
+        shared += flips @ flips.T
+
+    total_weight = float(hold.sum()) or 1.0
+    mean = weighted_sum / total_weight
+    covariance = weighted / total_weight - np.outer(mean, mean)
+    std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = covariance / np.outer(std, std)
+    analysis.phi = np.nan_to_num(phi)
+
+    # Jaccard index of the two bits' toggle sets
+    counts = np.diag(shared)
+    union = np.add.outer(counts, counts) - shared
+    with np.errstate(divide='ignore', invalid='ignore'):
+        analysis.co_toggle = np.nan_to_num(shared / union)
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank live bits in recorded register traces")
+    parser.add_argument("logs", nargs='+', help="Binary register log(s), in rotation order")
+    parser.add_argument("--top", type=int, default=8, help="Live bits shown per register")
+    args = parser.parse_args()
+
+    columns = read_logs(args.logs)
+    timestamps = columns.pop('timestamp')
+
+    start = time.perf_counter()
+    analysis = analyze_trace(columns, timestamps)
+    elapsed = time.perf_counter() - start
+
+    analysis.report(_PrintLogger(), top=args.top)
+    print(f"Analysed {analysis.records} records in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
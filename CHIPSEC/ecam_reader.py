@@ -0,0 +1,242 @@
+"""
+Memory-Mapped ECAM Configuration Space Reader
+=============================================
+Parses the ACPI MCFG table and maps the PCI Express enhanced configuration
+access mechanism (ECAM) window so configuration space can be read straight
+from memory instead of one cs.pci.read_dword (syscall + CF8/CFC) per dword.
+
+The window is mapped read-only through /dev/mem, or through a file holding
+an image of the window (a "stand-in") for offline work. config_space() and
+read_range() return zero-copy memoryview slices of the mapping; copy_range()
+and the bulk reader interface copy a function's config space out of it.
+
+Notes:
+- /dev/mem access needs root and a kernel that allows mapping the ECAM range
+  (it is reserved, not RAM, so CONFIG_STRICT_DEVMEM normally permits it).
+- Config space must be read with naturally sized accesses; wider loads can
+  return garbage or fault on some platforms. Copies are therefore made one
+  dword load at a time (memoryview.cast('I') element reads), never with
+  bytes()/memcpy on a view, which picks its own access width.
+
+MCFG layout (PCI Firmware Specification 3.0):
+- 36-byte ACPI header, 8 reserved bytes
+- 16-byte allocation entries: base (u64), segment (u16), start bus (u8),
+  end bus (u8), 4 reserved bytes
+
+Usage:
+    python ecam_reader.py mcfg.dat
+    python ecam_reader.py mcfg.dat --image ecam.bin --bdf 0:1f.0
+"""
+
+import argparse
+import mmap
+import os
+import struct
+from array import array
+from typing import List, NamedTuple, Optional
+
+ACPI_HEADER_SIZE = 36
+MCFG_RESERVED_SIZE = 8
+MCFG_ENTRY = struct.Struct('<QHBB4x')
+
+ECAM_FUNCTION_SIZE = 0x1000
+ECAM_BUS_SIZE = 0x100000
+
+# Where Linux exposes the firmware's MCFG table
+SYSFS_MCFG = '/sys/firmware/acpi/tables/MCFG'
+
+
+class McfgAllocation(NamedTuple):
+    base: int
+    segment: int
+    start_bus: int
+    end_bus: int
+
+    @property
+    def size(self) -> int:
+        return (self.end_bus - self.start_bus + 1) * ECAM_BUS_SIZE
+
+
+def parse_mcfg(data: bytes) -> List[McfgAllocation]:
+    """
+    Parse a raw MCFG table into its ECAM allocations
+
+    Args:
+        data: Raw table bytes (e.g. 'ACPI SSDT/m93p_acpidump/mcfg.dat')
+
+    Returns:
+        List of McfgAllocation entries
+
+    Raises:
+        ValueError: If the data is not a well-formed MCFG table
+    """
+    if len(data) < ACPI_HEADER_SIZE + MCFG_RESERVED_SIZE or bytes(data[0:4]) != b'MCFG':
+        raise ValueError("Not an MCFG table")
+
+    length = struct.unpack_from('<I', data, 4)[0]
+    if length > len(data) or length < ACPI_HEADER_SIZE + MCFG_RESERVED_SIZE:
+        raise ValueError(f"MCFG length {length} does not match {len(data)} bytes of data")
+
+    if sum(data[:length]) & 0xFF:
+        raise ValueError("MCFG checksum mismatch")
+
+    allocations = []
+    for offset in range(ACPI_HEADER_SIZE + MCFG_RESERVED_SIZE, length - MCFG_ENTRY.size + 1, MCFG_ENTRY.size):
+        base, segment, start_bus, end_bus = MCFG_ENTRY.unpack_from(data, offset)
+        allocations.append(McfgAllocation(base, segment, start_bus, end_bus))
+
+    return allocations
+
+
+def load_mcfg(path: str) -> List[McfgAllocation]:
+    """Parse an MCFG table from a file"""
+    with open(path, 'rb') as f:
+        return parse_mcfg(f.read())
+
+
+class EcamReader(object):
+    """
+    Read-only mapping of one MCFG allocation's ECAM window.
+
+    Args:
+        allocation: MCFG allocation to map
+        path: '/dev/mem' (default) or a file holding an image of the window
+        file_offset: Offset of the window's first bus in the file. Defaults to
+                     the allocation base for /dev/mem and 0 for stand-in files.
+    """
+
+    # Reads are plain memory accesses - no helper round trips
+    calls_per_capture = 0
+    name = "MCFG ECAM mapping"
+
+    def __init__(self, allocation: McfgAllocation, path: str = '/dev/mem', file_offset: Optional[int] = None):
+        self.allocation = allocation
+        self.path = path
+
+        if file_offset is None:
+            file_offset = allocation.base + allocation.start_bus * ECAM_BUS_SIZE if path == '/dev/mem' else 0
+
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            length = allocation.size
+            if path != '/dev/mem':
+                # A stand-in image may only cover the first few buses
+                length = min(length, os.fstat(self._fd).st_size - file_offset)
+            self._map = mmap.mmap(self._fd, length, access=mmap.ACCESS_READ, offset=file_offset)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+        self._view = memoryview(self._map)
+
+    @classmethod
+    def from_mcfg(cls, mcfg_data: bytes, segment: int = 0, path: str = '/dev/mem', file_offset: Optional[int] = None):
+        """Map the allocation for a PCI segment described by raw MCFG bytes"""
+        for allocation in parse_mcfg(mcfg_data):
+            if allocation.segment == segment:
+                return cls(allocation, path, file_offset)
+        raise ValueError(f"MCFG has no allocation for segment {segment}")
+
+    @classmethod
+    def from_system(cls, segment: int = 0):
+        """
+        Map the running system's ECAM window using the firmware MCFG table,
+        or return None if either is unavailable (non-Linux, not root, ...)
+        """
+        try:
+            with open(SYSFS_MCFG, 'rb') as f:
+                return cls.from_mcfg(f.read(), segment)
+        except (OSError, ValueError):
+            return None
+
+    def _offset(self, bus: int, dev: int, fun: int, offset: int = 0) -> int:
+        if not self.allocation.start_bus <= bus <= self.allocation.end_bus:
+            raise ValueError(f"Bus {bus} outside MCFG range "
+                             f"{self.allocation.start_bus}-{self.allocation.end_bus}")
+        return ((bus - self.allocation.start_bus) << 20) | (dev << 15) | (fun << 12) | offset
+
+    def config_space(self, bus: int, dev: int, fun: int, size: int = ECAM_FUNCTION_SIZE) -> memoryview:
+        """Zero-copy view of a function's configuration space"""
+        start = self._offset(bus, dev, fun)
+        if start + size > len(self._view):
+            raise ValueError(f"{bus:02X}:{dev:02X}.{fun:X} is outside the mapped window")
+        return self._view[start:start + size]
+
+    def read_range(self, bus: int, dev: int, fun: int, offset: int, length: int) -> memoryview:
+        """Zero-copy view of part of a function's configuration space"""
+        return self.config_space(bus, dev, fun)[offset:offset + length]
+
+    def copy_range(self, bus: int, dev: int, fun: int, offset: int, length: int) -> bytes:
+        """Copy part of a function's configuration space using dword loads only"""
+        start = offset & ~3
+        end = (offset + length + 3) & ~3
+        view = self.config_space(bus, dev, fun)[start:end]
+        if len(view) != end - start:
+            raise ValueError(f"Range 0x{offset:X}+0x{length:X} is outside the function's config space")
+        # Iterating the 'I' view loads each element as one aligned dword
+        words = view.cast('I')
+        try:
+            data = array('I', words).tobytes()
+        finally:
+            words.release()
+            view.release()
+        return data[offset - start:offset - start + length]
+
+    def __call__(self, bus: int, dev: int, fun: int, size: int) -> bytes:
+        # Bulk reader interface used by ConfigSpaceSnapshot
+        return self.copy_range(bus, dev, fun, 0, size)
+
+    def read_byte(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._view[self._offset(bus, dev, fun, offset)]
+
+    def read_word(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return struct.unpack_from('<H', self._map, self._offset(bus, dev, fun, offset))[0]
+
+    def read_dword(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return struct.unpack_from('<I', self._map, self._offset(bus, dev, fun, offset))[0]
+
+    def close(self):
+        # Views handed out by config_space() must be released first
+        if self._map is not None:
+            self._view.release()
+            self._map.close()
+            os.close(self._fd)
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_bdf(text: str):
+    """Parse 'bus:dev.fun' (hex) into a tuple"""
+    bus, rest = text.split(':')
+    dev, fun = rest.split('.')
+    return int(bus, 16), int(dev, 16), int(fun, 16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode MCFG and read config space through the ECAM window")
+    parser.add_argument("mcfg", help="Raw MCFG table (e.g. mcfg.dat from acpidump)")
+    parser.add_argument("--image", help="File standing in for the ECAM window (default: /dev/mem)")
+    parser.add_argument("--bdf", help="Function to dump, as bus:dev.fun in hex (e.g. 0:1f.0)")
+    parser.add_argument("--size", type=lambda x: int(x, 0), default=0x100, help="Bytes to dump (default: 0x100)")
+    args = parser.parse_args()
+
+    allocations = load_mcfg(args.mcfg)
+    for alloc in allocations:
+        print(f"Segment {alloc.segment}: base 0x{alloc.base:X}, buses {alloc.start_bus:02X}-{alloc.end_bus:02X} "
+              f"({alloc.size >> 20} MB)")
+
+    if args.bdf:
+        bus, dev, fun = parse_bdf(args.bdf)
+        with EcamReader(allocations[0], args.image or '/dev/mem') as ecam:
+            data = ecam.copy_range(bus, dev, fun, 0, args.size)
+        for offset in range(0, len(data), 16):
+            print(f"{offset:03X}: " + " ".join(f"{b:02X}" for b in data[offset:offset + 16]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Fleet Scan over Captured Platform Dumps
+=======================================
+Runs the analysis phases of lpc_dma_check and lpc_dma_h81_z390_test against
+a directory of captured platform dumps (sim_chipset.py JSON, one per
+machine, each with its ACPI table directory) in parallel worker processes.
+
+Each machine is simulated in its own process with its own virtual clock and
+work directory, so machines never share state and throughput grows with the
+number of worker processes until the cores run out. Phases that only make
+sense on a live box (interactive monitoring, long polling, DMA transfer
+attempts) are not run.
+
+Every phase's return value and the warnings/errors it logged are collected,
+and all machines are merged into one table keyed by machine and LPC
+bridge device ID. Per-machine module logs are kept in the output directory.
+A machine that can't be scanned at all (e.g. a corrupt dump) gets a single
+fleet_scan.scan_machine error row instead of stopping the scan.
+
+Needs CHIPSEC importable (for BaseModule), like sim_chipset.py.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python fleet_scan.py dumps/ --out fleet_results
+    python fleet_scan.py dumps/ --jobs 16 --module lpc_dma_check --json fleet.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    from chipsec.modules.common import sim_chipset
+except ImportError:
+    import sim_chipset
+
+# Analysis phases per module: (method, argument builder); arguments are built
+# from the simulated chipset so per-machine paths can be passed in
+FLEET_PHASES = {
+    'lpc_dma_check': [
+        ('check_tseg_protection', None),
+        ('check_smrr_protection', None),
+        ('check_vtd_protection', None),
+        ('check_lpc_dma', None),
+    ],
+    'lpc_dma_h81_z390_test': [
+        ('check_lpc_controller', None),
+        ('test_traditional_dma_regs', None),
+        ('test_h81_dma_registers', None),
+        # Tables are extracted into the machine's work directory, not the dump
+        ('analyze_acpi_dump',
+         lambda chipset: [chipset.acpi.directory, "extracted_tables"] if chipset.acpi.directory else None),
+        ('scan_platform_specific_features_enhanced', None),
+    ],
+}
+
+LPC_BDF = (0, 0x1F, 0)
+
+# Virtual seconds a phase may sleep before it is interrupted
+PHASE_BUDGET = 60.0
+
+
+class PhaseResult(NamedTuple):
+    machine: str
+    lpc_did: Optional[int]
+    module: str
+    phase: str
+    result: str
+    warnings: int
+    errors: int
+    accesses: int
+    seconds: float
+
+
+class _RecordingLogger(object):
+    """Module logger stand-in writing to a file and counting warnings/errors"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'w')
+        self.warnings = 0
+        self.errors = 0
+
+    def log(self, text, *args):
+        self._file.write(f"{text}\n")
+
+    def log_warning(self, text, *args):
+        self.warnings += 1
+        self._file.write(f"WARNING: {text}\n")
+
+    def log_error(self, text, *args):
+        self.errors += 1
+        self._file.write(f"ERROR: {text}\n")
+
+    def log_bad(self, text, *args):
+        self.warnings += 1
+        self._file.write(f"[-] {text}\n")
+
+    def log_good(self, text, *args):
+        self._file.write(f"[+] {text}\n")
+
+    def __getattr__(self, name):
+        # start_test, log_passed, log_important, ...
+        if name.startswith('log') or name.startswith('start'):
+            return self.log
+        raise AttributeError(name)
+
+    def close(self):
+        self._file.close()
+
+
+def _lpc_did(chipset) -> Optional[int]:
+    space = chipset.pci.spaces.get(LPC_BDF)
+    if space is None:
+        return None
+    return int.from_bytes(space[2:4], 'little')
+
+
+def scan_machine(dump_path: str, out_dir: str, modules: List[str]) -> List[PhaseResult]:
+    """
+    Run the analysis phases of each module against one dump (in a worker)
+
+    Returns:
+        PhaseResult per phase, in order
+    """
+    machine = os.path.splitext(os.path.basename(dump_path))[0]
+    machine_dir = os.path.join(out_dir, machine)
+    os.makedirs(machine_dir, exist_ok=True)
+
+    results = []
+    for module_name in modules:
+        chipset = sim_chipset.SimChipset.from_dump(dump_path, sim_chipset.SimClock(PHASE_BUDGET))
+        did = _lpc_did(chipset)
+        module = sim_chipset.import_module(module_name)
+        logger = _RecordingLogger(os.path.join(machine_dir, f"{module_name}.log"))
+
+        try:
+            with sim_chipset.simulated(module, chipset, os.path.join(machine_dir, module_name)):
+                instance = getattr(module, module_name)()
+                instance.cs = chipset
+                instance.logger = logger
+
+                for phase, build_args in FLEET_PHASES[module_name]:
+                    args = build_args(chipset) if build_args else []
+                    if args is None:
+                        continue
+                    warnings, errors, accesses = logger.warnings, logger.errors, len(chipset.accesses)
+                    logger.log(f"TESTING --- {phase}")
+                    start = time.perf_counter()
+                    try:
+                        value = repr(getattr(instance, phase)(*args))
+                    except Exception as e:
+                        logger.log_error(f"{phase} raised {type(e).__name__}: {e}")
+                        value = f"exception: {type(e).__name__}"
+                    results.append(PhaseResult(machine, did, module_name, phase, value, logger.warnings - warnings,
+                                               logger.errors - errors, len(chipset.accesses) - accesses,
+                                               time.perf_counter() - start))
+        finally:
+            logger.close()
+    return results
+
+
+def scan_machine_safe(dump_path: str, out_dir: str, modules: List[str]) -> List[PhaseResult]:
+    """
+    scan_machine(), turning a failure outside the phases (a corrupt dump, a
+    module that won't import) into one error row so the rest of the fleet
+    is still scanned and written out
+    """
+    start = time.perf_counter()
+    try:
+        return scan_machine(dump_path, out_dir, modules)
+    except Exception as e:
+        machine = os.path.splitext(os.path.basename(dump_path))[0]
+        return [PhaseResult(machine, None, 'fleet_scan', 'scan_machine', f"exception: {type(e).__name__}: {e}",
+                            0, 1, 0, time.perf_counter() - start)]
+
+
+def _did_text(did: Optional[int]) -> str:
+    return f"{did:04X}" if did is not None else "----"
+
+
+def merge_results(results: List[PhaseResult]) -> Dict[tuple, Dict[str, PhaseResult]]:
+    """{(machine, lpc DID): {'module.phase': PhaseResult}}"""
+    table: Dict[tuple, Dict[str, PhaseResult]] = {}
+    for result in results:
+        table.setdefault((result.machine, result.lpc_did), {})[f"{result.module}.{result.phase}"] = result
+    return dict(sorted(table.items(), key=lambda item: (item[0][0], item[0][1] or 0)))
+
+
+def write_csv(path: str, table: Dict[tuple, Dict[str, PhaseResult]]):
+    phases = sorted({phase for row in table.values() for phase in row})
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['machine', 'lpc_did'] + phases + ['warnings', 'errors'])
+        for (machine, did), row in table.items():
+            writer.writerow([machine, _did_text(did)] + [row[p].result if p in row else '' for p in phases] +
+                            [sum(r.warnings for r in row.values()), sum(r.errors for r in row.values())])
+
+
+def find_dumps(directory: str) -> List[str]:
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith('.json') and os.path.isfile(os.path.join(directory, name)))
+
+
+def scan_fleet(dumps: List[str], out_dir: str, modules: List[str], jobs: Optional[int] = None) -> List[PhaseResult]:
+    """Scan every dump, one machine per task, across worker processes"""
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    dumps = [os.path.abspath(path) for path in dumps]
+    jobs = jobs or os.cpu_count() or 1
+
+    results = []
+    if jobs == 1:
+        for path in dumps:
+            results += scan_machine_safe(path, out_dir, modules)
+        return results
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for machine_results in pool.map(scan_machine_safe, dumps, [out_dir] * len(dumps), [modules] * len(dumps)):
+            results += machine_results
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LPC DMA analysis phases over captured platform dumps")
+    parser.add_argument("dumps", help="Directory of sim_chipset JSON dumps, one per machine")
+    parser.add_argument("--out", default="fleet_results", help="Output directory (logs, CSV)")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--module", action='append', choices=sorted(FLEET_PHASES),
+                        help="Module to run (repeatable, default: all)")
+    parser.add_argument("--json", help="Also write every phase result as JSON")
+    args = parser.parse_args()
+
+    modules = args.module or sorted(FLEET_PHASES)
+    dumps = find_dumps(args.dumps)
+    start = time.perf_counter()
+    results = scan_fleet(dumps, args.out, modules, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    table = merge_results(results)
+    csv_path = os.path.join(args.out, "fleet_results.csv")
+    write_csv(csv_path, table)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([r._asdict() for r in results], f, indent=1)
+
+    for (machine, did), row in table.items():
+        warnings = sum(r.warnings for r in row.values())
+        errors = sum(r.errors for r in row.values())
+        print(f"{machine:<24} LPC {_did_text(did)}  {len(row)} phases, {warnings} warning(s), {errors} error(s)")
+    print(f"Scanned {len(dumps)} machine(s) in {elapsed:.2f}s; results in {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,53 @@
 #!/usr/bin/env python
 
+import os
+
 from chipsec.module_common import BaseModule, ModuleResult
 
+try:
+    from chipsec.modules.common.pci_cfg_snapshot import ConfigSpaceSnapshot
+    from chipsec.modules.common.pci_enum import load_device_table, mcfg_segments
+    from chipsec.modules.common.config_baseline import BaselineDB
+    from chipsec.modules.common.acpi_dmar import BRIDGE_BUS_NUMBERS, DmarLookup, DmarTable, load_dmar
+except ImportError:
+    from pci_cfg_snapshot import ConfigSpaceSnapshot
+    from pci_enum import load_device_table, mcfg_segments
+    from config_baseline import BaselineDB
+    from acpi_dmar import BRIDGE_BUS_NUMBERS, DmarLookup, DmarTable, load_dmar
+
+# Baselines learned from known-good machines (config_baseline.py learn),
+# merged over the built-in ones
+CONFIG_BASELINE_FILE = "config_baselines.json"
+
+SYSFS_DMAR = "/sys/firmware/acpi/tables/DMAR"
+
 class lpc_dma_check(BaseModule):
     def __init__(self):
         BaseModule.__init__(self)
+        self.cfg = None
+        self.pci_table = None
+        self.baseline_db = None
+        
+    def snapshot(self):
+        # All checks in this module are read-only, so they share one
+        # config-space snapshot instead of issuing a helper call per register
+        if self.cfg is None:
+            self.cfg = ConfigSpaceSnapshot.from_chipset(self.cs)
+        return self.cfg
+        
+    def devices(self):
+        # Enumerated (or cached) PCI device table, so devices are looked up
+        # by class or ID instead of probed at fixed locations
+        if self.pci_table is None:
+            self.pci_table = load_device_table(self.snapshot(), segments=mcfg_segments(self.cs))
+        return self.pci_table
+        
+    def baselines(self):
+        # Expected register values per device ID, so only real deviations
+        # from them are reported
+        if self.baseline_db is None:
+            self.baseline_db = BaselineDB.load(CONFIG_BASELINE_FILE)
+        return self.baseline_db
         
     def is_supported(self):
         # This test can run on any platform
@@ -17,12 +60,23 @@ class lpc_dma_check(BaseModule):
         # Typical bus/device/function for LPC on Intel platforms
         bus, dev, fun = 0, 31, 0  # Common for Intel
         
+        # Prefer the ISA/LPC bridge class match from the device table
+        try:
+            bridge = self.devices().lpc_bridge()
+            if bridge is not None:
+                bus, dev, fun = bridge.bdf
+            for ite in self.devices().it8893_bridges() + self.devices().it8888_bridges():
+                self.logger.log(f"[*] Found ITE bridge: {ite}")
+        except Exception as e:
+            self.logger.log_warning(f"PCI enumeration failed, probing 0:31.0: {str(e)}")
+        
         # Try to read PCI configuration to verify it's an LPC controller
         try:
-            vid = self.cs.pci.read_word(bus, dev, fun, 0x00)
-            did = self.cs.pci.read_word(bus, dev, fun, 0x02)
-            class_code = self.cs.pci.read_byte(bus, dev, fun, 0x0B)
-            sub_class = self.cs.pci.read_byte(bus, dev, fun, 0x0A)
+            cfg = self.snapshot()
+            vid = cfg.read_word(bus, dev, fun, 0x00)
+            did = cfg.read_word(bus, dev, fun, 0x02)
+            class_code = cfg.read_byte(bus, dev, fun, 0x0B)
+            sub_class = cfg.read_byte(bus, dev, fun, 0x0A)
             
             # LPC Bridge should be class 0x06, subclass 0x01
             if class_code == 0x06 and sub_class == 0x01:
@@ -46,7 +100,7 @@ class lpc_dma_check(BaseModule):
         
         try:
             # TSEGMB is typically at PCI config 0:0:0 offset 0xB8 for Intel
-            tsegmb_reg = self.cs.pci.read_dword(0, 0, 0, 0xB8)
+            tsegmb_reg = self.snapshot().read_dword(0, 0, 0, 0xB8)
             
             # Extract TSEG base and lock bit (varies by chipset, this is common pattern)
             tseg_base = (tsegmb_reg >> 20) & 0xFFF
@@ -99,11 +153,19 @@ class lpc_dma_check(BaseModule):
         self.logger.log("[*] Scanning for potential undocumented features...")
         
         suspicious_regs = []
+        cfg = self.snapshot()
+        
+        # Compare with the device's baseline when there is one
+        result = self.baselines().score_device(cfg, bus, dev, fun)
+        if result is not None:
+            result.report(self.logger)
+            return [(d.offset, d.value) for d in result.deviations]
+        self.logger.log("No baseline for this device, listing every nonzero register")
         
         # Check range of LPC configuration registers
         for offset in range(0x80, 0x100, 4):
             try:
-                val = self.cs.pci.read_dword(bus, dev, fun, offset)
+                val = cfg.read_dword(bus, dev, fun, offset)
                 if val != 0 and val != 0xFFFFFFFF:
                     # Add to list of interesting registers
                     suspicious_regs.append((offset, val))
@@ -122,31 +184,87 @@ class lpc_dma_check(BaseModule):
                 
         return suspicious_regs
         
-    def check_vtd_protection(self):
-        # Check for VT-d (IOMMU) protection
-        self.logger.log("[*] Checking for IOMMU/VT-d protection...")
+    def check_host_bridge_config(self):
+        # Compare the host bridge (memory map registers and their lock bits)
+        # with its baseline
+        self.logger.log("[*] Checking host bridge configuration...")
         
         try:
-            # VTBAR is typically at 0xFED90000 for Intel platforms
-            # We can check if the DMAR table is present in ACPI
-            has_vtd = False
+            result = self.baselines().score_device(self.snapshot(), 0, 0, 0)
+            if result is None:
+                self.logger.log("No baseline for this host bridge")
+                return None
+            result.report(self.logger)
+            return result.deviations
+        except Exception as e:
+            self.logger.log_warning(f"Could not check host bridge: {str(e)}")
+            return None
             
-            # Try to read VT-d registers from known locations
+    def dmar_table(self):
+        # Raw DMAR table: through CHIPSEC's ACPI support, else the table Linux exposes
+        acpi = getattr(self.cs, 'acpi', None)
+        if acpi is not None and hasattr(acpi, 'get_table_content'):
             try:
-                # VTBAR register is typically at PCI config 0:0:0 offset 0x180 for newer Intel
-                vtd_bar = self.cs.pci.read_dword(0, 0, 0, 0x180)
-                if vtd_bar != 0 and vtd_bar != 0xFFFFFFFF:
-                    self.logger.log(f"VT-d Base Address: 0x{vtd_bar:08X}")
-                    has_vtd = True
-            except:
+                content = acpi.get_table_content('DMAR')
+                if content:
+                    return bytes(content)
+            except Exception:
                 pass
+        if os.path.exists(SYSFS_DMAR):
+            return load_dmar(SYSFS_DMAR)
+        return None
+        
+    def dma_capable_devices(self):
+        # The LPC bridge, the ITE bridges and every function behind an IT8893
+        table = self.devices()
+        found = [table.lpc_bridge()] + table.it8893_bridges() + table.it8888_bridges()
+        for bridge in table.it8893_bridges():
+            numbers = self.snapshot().read_dword(*bridge.bdf, BRIDGE_BUS_NUMBERS)
+            secondary, subordinate = (numbers >> 8) & 0xFF, (numbers >> 16) & 0xFF
+            found += [d for d in table if d.domain == 0 and secondary <= d.bus <= subordinate]
+        unique = []
+        for device in found:
+            if device is not None and device not in unique:
+                unique.append(device)
+        return unique
+        
+    def check_vtd_protection(self):
+        # Check for VT-d (IOMMU) protection: the DMAR table names the remapping
+        # units and which devices each one translates
+        self.logger.log("[*] Checking for IOMMU/VT-d protection...")
+        
+        try:
+            data = self.dmar_table()
+            if data is None:
+                self.logger.log_warning("No DMAR table, the firmware does not enable VT-d")
+                return False
                 
-            if has_vtd:
-                self.logger.log_good("System appears to have VT-d capability")
-                return True
-            else:
-                self.logger.log_warning("Could not detect VT-d capability")
+            dmar = DmarTable.parse(data)
+            dmar.report(self.logger)
+            if not dmar.drhds:
+                self.logger.log_warning("DMAR table lists no remapping units")
+                return False
+                
+            lookup = DmarLookup(dmar, self.snapshot())
+            for scope in lookup.unresolved:
+                self.logger.log_warning(f"Could not resolve DMAR device scope: {scope}")
+                
+            uncovered = 0
+            for device in self.dma_capable_devices():
+                coverage = lookup.coverage(*device.bdf, segment=device.domain)
+                if coverage.unit is None:
+                    uncovered += 1
+                    self.logger.log_bad(f"{coverage} ({device.description})")
+                elif coverage.rmrrs:
+                    self.logger.log_warning(f"{coverage} ({device.description}): RMRR memory stays DMA-mapped")
+                else:
+                    self.logger.log_good(f"{coverage} ({device.description})")
+                    
+            if uncovered:
+                self.logger.log_warning(f"{uncovered} DMA-capable device(s) are not behind any remapping unit")
                 return False
+            self.logger.log_good("System has VT-d remapping units covering the LPC and ITE bridges")
+            return True
         except Exception as e:
             self.logger.log_warning(f"Could not check VT-d: {str(e)}")
             return None
@@ -179,11 +297,19 @@ class lpc_dma_check(BaseModule):
         if suspicious_regs:
             self.logger.log_warning(f"Found {len(suspicious_regs)} non-standard register values that might indicate undocumented features")
             
+        # Check the host bridge memory map against its baseline
+        host_deviations = self.check_host_bridge_config()
+        if host_deviations:
+            potential_vulnerabilities.append(f"Host bridge configuration deviates from its baseline in {len(host_deviations)} register(s)")
+            
         # Check for VT-d protection
         vtd_enabled = self.check_vtd_protection()
         if vtd_enabled is False:
             potential_vulnerabilities.append("No IOMMU/VT-d protection detected against DMA attacks")
             
+        # Report the reads, helper calls and calls saved by the shared snapshot
+        self.snapshot().report(self.logger)
+            
         # Final assessment
         self.logger.log("\n[*] Summary of findings:")
         
@@ -207,4 +333,9 @@ class lpc_dma_check(BaseModule):
         self.logger.log("# LPC Bus DMA Capability Security Check")
         self.logger.log("##################################################")
         
-        return self.check_lpc_dma()
\ No newline at end of file
+        try:
+            return self.check_lpc_dma()
+        finally:
+            # Release the ECAM mapping behind the shared snapshot
+            if self.cfg is not None:
+                self.cfg.close()
\ No newline at end of file
@@ -3,6 +3,56 @@
 from chipsec.module_common import BaseModule, ModuleResult
 import time
 import os
+import sys
+
+try:
+    from chipsec.modules.common.pci_cfg_snapshot import ConfigSpaceSnapshot
+    from chipsec.modules.common.dma_reg_sampler import RegisterSampler, make_pci_reader
+    from chipsec.modules.common.dma_reg_log import RegisterLogWriter, read_logs
+    from chipsec.modules.common.pci_enum import load_device_table, mcfg_segments
+    from chipsec.modules.common.reg_mask_probe import (DEFAULT_SCHEDULE, GROUP_SCHEDULE, LPC_PROTECTED_DWORDS,
+                                                       MaskStore, discover_masks)
+    from chipsec.modules.common.acpi_index import AcpiTableIndex
+    from chipsec.modules.common.aml_regions import scan_index, scan_operation_regions
+    from chipsec.modules.common.addr_ranges import RangeIndex, acpi_ranges, build_platform_index
+    from chipsec.modules.common.phase_profiler import PhaseProfiler
+    from chipsec.modules.common.pci_coalesce import coalesced
+    from chipsec.modules.common.smi_sweep import APM_CNT, SmiSweepPlanner, fadt_denylist, run_sweep
+    from chipsec.modules.common.superio import CONFIG_PORTS as SUPERIO_CONFIG_PORTS, SuperIoScanner
+    from chipsec.modules.common.acpi_harvest import SYSFS_ACPI_TABLES, harvest_tables
+    from chipsec.modules.common.pattern_scan import PatternScanner
+    from chipsec.modules.common.workload_monitor import DEFAULT_RATE as WORKLOAD_POLL_RATE, build_workloads, run_campaign
+    from chipsec.modules.common.reg_snapshot import SnapshotStore, capture as capture_registers, diff as diff_registers
+    from chipsec.modules.common.phase_cache import PhaseCache, platform_fingerprint
+    from chipsec.modules.common.phase_scheduler import POOL_LANE, PhaseScheduler
+except ImportError:
+    from pci_cfg_snapshot import ConfigSpaceSnapshot
+    from dma_reg_sampler import RegisterSampler, make_pci_reader
+    from dma_reg_log import RegisterLogWriter, read_logs
+    from pci_enum import load_device_table, mcfg_segments
+    from reg_mask_probe import DEFAULT_SCHEDULE, GROUP_SCHEDULE, LPC_PROTECTED_DWORDS, MaskStore, discover_masks
+    from acpi_index import AcpiTableIndex
+    from aml_regions import scan_index, scan_operation_regions
+    from addr_ranges import RangeIndex, acpi_ranges, build_platform_index
+    from phase_profiler import PhaseProfiler
+    from pci_coalesce import coalesced
+    from smi_sweep import APM_CNT, SmiSweepPlanner, fadt_denylist, run_sweep
+    from superio import CONFIG_PORTS as SUPERIO_CONFIG_PORTS, SuperIoScanner
+    from acpi_harvest import SYSFS_ACPI_TABLES, harvest_tables
+    from pattern_scan import PatternScanner
+    from workload_monitor import DEFAULT_RATE as WORKLOAD_POLL_RATE, build_workloads, run_campaign
+    from reg_snapshot import SnapshotStore, capture as capture_registers, diff as diff_registers
+    from phase_cache import PhaseCache, platform_fingerprint
+    from phase_scheduler import POOL_LANE, PhaseScheduler
+
+try:
+    from chipsec.modules.common.dma_trace_analysis import analyze_trace
+except ImportError:
+    try:
+        from dma_trace_analysis import analyze_trace
+    except ImportError:
+        # Trace analytics need NumPy
+        analyze_trace = None
 
 # Traditional 8237A DMA controller registers
 DMA1_BASE = 0x00  # First DMA controller (8-bit channels)
@@ -48,6 +98,7 @@ DMA_MODE_AUTO = 0x10  # Autoinit
 LPC_BUS = 0
 LPC_DEV = 0x1F
 LPC_FUN = 0
+LPC_IOD_EN = 0x80  # LPC_IOD (low word) and LPC_EN (high word)
 
 # H81 (8-series) PCH - Potential hidden DMA registers
 # These might be still present but undocumented in Z390
@@ -57,10 +108,110 @@ H81_LPC_GEN_DMA_TC = 0xD8  # General DMA Transfer Count
 H81_LPC_GEN_DMA_ADDR = 0xDC  # General DMA Address
 H81_LPC_GEN_DMA_DESC = 0xE0  # Additional DMA descriptor/control
 
+# Default rate of -poll; faster rates (-poll-rate=N, 0 busy-polls) spin a core
+POLL_RATE = 10
+
+# Samples the long-term monitor buffers before a block is written and
+# fsync'ed (one block per sample would be all header and fsync)
+LONG_TERM_FLUSH_SAMPLES = 60
+
+# Progress file of the APM SMI command sweep
+SMI_SWEEP_CHECKPOINT = "smi_sweep.json"
+
+# SMIs one -smi-sweep run may fire (two full groups); -smi-sweep=all lifts it
+SMI_SWEEP_BUDGET = 64
+
+# Result file of the unattended workload campaign
+WORKLOAD_CORRELATION_FILE = "workload_correlation.json"
+
+# Register snapshots of every run with -snapshot, per machine and boot
+REGISTER_SNAPSHOT_STORE = "register_snapshots"
+
+# Results of probe phases replayed on a known platform with -cache
+PHASE_CACHE_FILE = "phase_cache.json"
+
+# Platform fingerprint components (see phase_cache.py) each cacheable phase depends on
+PHASE_CACHE_INPUTS = {
+    'test_traditional_dma_regs': ('lpc_id', 'bios'),
+    'test_h81_dma_registers': ('lpc_id', 'bios', 'lpc_config'),
+    'inspect_acpi_tables_minimal': ('bios', 'acpi'),
+    'analyze_acpi_dump': ('acpi', 'lpc_config', 'host_config'),
+    'inspect_smi_handlers': ('lpc_id', 'bios', 'acpi'),
+    'scan_platform_specific_features': ('lpc_id', 'bios', 'lpc_config', 'host_config'),
+    'inspect_smi_handlers_safe': ('lpc_id', 'bios', 'lpc_config'),
+    'scan_platform_specific_features_enhanced': ('lpc_id', 'bios', 'lpc_config', 'host_config'),
+    'safer_dma_test': ('lpc_id', 'bios', 'lpc_config'),
+    'safer_dma_test_two': ('lpc_id', 'bios', 'lpc_config'),
+}
+
+# Worker threads for the ACPI dump and analysis with -parallel
+PARALLEL_WORKERS = 2
+
+# Content-addressed store shared by ACPI table harvests (may be shared between machines)
+ACPI_STORE_DIR = "acpi_store"
+
+# Short names used when logging the H81-style registers as a group
+H81_DMA_REGS = [
+    ("ctrl", H81_LPC_GEN_DMA_CTRL),
+    ("stat", H81_LPC_GEN_DMA_STAT),
+    ("tc", H81_LPC_GEN_DMA_TC),
+    ("addr", H81_LPC_GEN_DMA_ADDR),
+    ("desc", H81_LPC_GEN_DMA_DESC)
+]
+
+# DMA-related names counted in the DSDT/SSDTs, all in one pass per table
+ACPI_DMA_KEYWORDS = ['DMA', 'LPC', 'DMAC', 'Legacy']
+ACPI_KEYWORD_SCANNER = PatternScanner({keyword: keyword.encode() for keyword in ACPI_DMA_KEYWORDS})
+
+# Byte signatures looked for in SMI handler code: the 0xCF8 CONFIG_ADDRESS
+# immediates of the LPC DMA registers (mov eax, 0x8000F8xx) and the older
+# example pattern
+SMI_HANDLER_SIGNATURES = {
+    f"CF8 address of LPC {name}": (0x80000000 | (LPC_BUS << 16) | (LPC_DEV << 11) | (LPC_FUN << 8)
+                                   | offset).to_bytes(4, 'little')
+    for name, offset in H81_DMA_REGS
+}
+SMI_HANDLER_SIGNATURES["LPC access example"] = b'\x89\xDF\x1F\x00'
+SMI_HANDLER_SCANNER = PatternScanner(SMI_HANDLER_SIGNATURES)
+
 
 class lpc_dma_h81_z390_test(BaseModule):
     def __init__(self):
         BaseModule.__init__(self)
+        self.cfg = None
+        self.pci_table = None
+        self.phase_cache = None
+        # Hardware side of the address map, built on the access lane (map_platform)
+        self.hardware_ranges = None
+        # Bit 0 only unless -probe-groups asks for full RW/RO masks
+        self.mask_schedule = DEFAULT_SCHEDULE
+
+    def snapshot(self):
+        """
+        Config-space snapshot shared by the read-only checks.
+        Phases that write registers invalidate or refresh it afterwards.
+        """
+        if self.cfg is None:
+            self.cfg = ConfigSpaceSnapshot.from_chipset(self.cs)
+        return self.cfg
+
+    def cached(self, name, fn, *args):
+        """
+        Run a probe phase, or replay its cached results when -cache is on and
+        the platform inputs it depends on (PHASE_CACHE_INPUTS) are unchanged
+        """
+        if self.phase_cache is None:
+            return fn(*args)
+        return self.phase_cache.call(name, PHASE_CACHE_INPUTS[name], lambda: fn(*args), self)
+
+    def devices(self):
+        """
+        PCI device table (enumerated once, then reused from the on-disk cache
+        until the topology changes) for lookups by class or ID
+        """
+        if self.pci_table is None:
+            self.pci_table = load_device_table(self.snapshot(), segments=mcfg_segments(self.cs))
+        return self.pci_table
 
     def is_supported(self):
         return True
@@ -71,10 +222,20 @@ class lpc_dma_h81_z390_test(BaseModule):
         """
         self.logger.log("[*] Identifying LPC controller...")
 
+        try:
+            bridge = self.devices().lpc_bridge()
+            if bridge is not None and bridge.bdf != (LPC_BUS, LPC_DEV, LPC_FUN):
+                self.logger.log_warning(f"ISA/LPC bridge enumerated at {bridge}, not at the expected "
+                                        f"{LPC_BUS:02X}:{LPC_DEV:02X}.{LPC_FUN:X}")
+            for ite in self.devices().it8893_bridges() + self.devices().it8888_bridges():
+                self.logger.log(f"[*] Found ITE bridge: {ite}")
+        except Exception as e:
+            self.logger.log_warning(f"PCI enumeration failed: {str(e)}")
+
         try:
             # Get vendor/device ID of LPC controller
-            lpc_vid = self.cs.pci.read_word(LPC_BUS, LPC_DEV, LPC_FUN, 0x00)
-            lpc_did = self.cs.pci.read_word(LPC_BUS, LPC_DEV, LPC_FUN, 0x02)
+            lpc_vid = self.snapshot().read_word(LPC_BUS, LPC_DEV, LPC_FUN, 0x00)
+            lpc_did = self.snapshot().read_word(LPC_BUS, LPC_DEV, LPC_FUN, 0x02)
 
             if lpc_vid == 0x8086:  # Intel
                 self.logger.log_good(f"Found Intel LPC controller: VID=0x{lpc_vid:04X}, DID=0x{lpc_did:04X}")
@@ -140,8 +301,9 @@ class lpc_dma_h81_z390_test(BaseModule):
         self.logger.log("[*] Analyzing register bit patterns...")
 
         # Read current values
-        ctrl = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL)
-        stat = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
+        cfg = self.snapshot()
+        ctrl = cfg.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL)
+        stat = cfg.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
 
         # Look for common bit patterns in DMA controllers
         # Check for potential enable bits (usually bit 0)
@@ -158,11 +320,11 @@ class lpc_dma_h81_z390_test(BaseModule):
         self.logger.log(f"Potential channel select (bits 8-10): {channel}")
 
         # Analyze transfer count register
-        tc = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_TC)
+        tc = cfg.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_TC)
         self.logger.log(f"Transfer count (lower 16 bits): {tc & 0xFFFF}")
 
         # Analyze address register alignment
-        addr = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_ADDR)
+        addr = cfg.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_ADDR)
         self.logger.log(f"Address alignment: {addr & 0xF}")
 
     def test_h81_dma_registers(self):
@@ -182,11 +344,13 @@ class lpc_dma_h81_z390_test(BaseModule):
             (H81_LPC_GEN_DMA_DESC, "DMA Descriptor Control")
         ]
 
+        mask_store = MaskStore()
+
         # Scan for H81 registers in the Z390
         for reg_offset, reg_name in h81_dma_regs:
             try:
                 # Read register
-                reg_val = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset)
+                reg_val = self.snapshot().read_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset)
 
                 # Skip if register returns all 1s or all 0s (likely non-existent)
                 if reg_val != 0 and reg_val != 0xFFFFFFFF:
@@ -194,30 +358,37 @@ class lpc_dma_h81_z390_test(BaseModule):
                         f"Potential DMA register found: {reg_name} (0x{reg_offset:02X}) = 0x{reg_val:08X}")
                     hidden_regs_found = True
 
-                    # Test if register is writable - only toggle the lowest bit to be safe
-                    test_val = reg_val ^ 0x1
-                    orig_val = reg_val
-
-                    # Save original value
-                    self.cs.pci.write_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset, test_val)
+                    if reg_offset in LPC_PROTECTED_DWORDS:
+                        self.logger.log(f"Register at 0x{reg_offset:02X} ({LPC_PROTECTED_DWORDS[reg_offset]}) "
+                                        f"is protected - not written")
+                        continue
 
-                    # Read back
-                    readback = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset)
+                    # RW/RO/W1C mask, restored after every step (or taken
+                    # from the mask store if this part was mapped before)
+                    mask = discover_masks(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN, [reg_offset],
+                                          mask_store, LPC_PROTECTED_DWORDS, schedule=self.mask_schedule)[0]
 
-                    # Restore original
-                    self.cs.pci.write_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset, orig_val)
-
-                    if readback == test_val:
+                    if mask.rw:
                         self.logger.log_warning(
-                            f"Register at 0x{reg_offset:02X} is WRITABLE - potential DMA control register!")
+                            f"Register at 0x{reg_offset:02X} is WRITABLE - potential DMA control register! "
+                            f"({mask.describe()})")
+                    elif mask.untested:
+                        self.logger.log(f"Register at 0x{reg_offset:02X} has no writable bits among those tested "
+                                        f"({mask.describe()})")
                     else:
-                        self.logger.log(f"Register at 0x{reg_offset:02X} is read-only")
+                        self.logger.log(f"Register at 0x{reg_offset:02X} is read-only ({mask.describe()})")
+                    if mask.sticky:
+                        self.logger.log_bad(f"Register at 0x{reg_offset:02X} did not restore - bits 0x{mask.sticky:08X} stuck")
                 else:
                     self.logger.log(f"Register at 0x{reg_offset:02X} returned 0x{reg_val:08X} - likely not used")
 
             except Exception as e:
                 self.logger.log_error(f"Error testing register 0x{reg_offset:02X}: {str(e)}")
 
+        # Refresh point - the write/restore cycles above may have left
+        # write-1-to-clear or sticky bits in a different state
+        self.snapshot().refresh(LPC_BUS, LPC_DEV, LPC_FUN)
+
         return hidden_regs_found
 
     def try_h81_dma_activation(self):
@@ -598,6 +769,8 @@ class lpc_dma_h81_z390_test(BaseModule):
             finally:
                 # ALWAYS restore the original value immediately
                 self.cs.pci.write_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL, original_ctrl)
+                # Registers were written - drop cached copies
+                self.snapshot().invalidate(LPC_BUS, LPC_DEV, LPC_FUN)
 
         # 3. Look for register value correlations with traditional DMA activity
         self.logger.log("[*] Testing correlation with traditional DMA registers...")
@@ -881,6 +1054,9 @@ class lpc_dma_h81_z390_test(BaseModule):
             self.logger.log_error(f"Error during safe DMA testing: {str(e)}")
             import traceback
             self.logger.log_error(traceback.format_exc())
+        finally:
+            # Registers were written - drop cached copies
+            self.snapshot().invalidate(LPC_BUS, LPC_DEV, LPC_FUN)
 
         return False
 
@@ -948,85 +1124,162 @@ class lpc_dma_h81_z390_test(BaseModule):
 
         return True
 
-    def poll_dma_registers(self, duration=30):
+    def monitor_dma_during_workloads(self, workloads=None, window=5.0, rate=None):
         """
-        Poll DMA registers continuously for a period to detect any changes
+        Unattended version of monitor_dma_during_system_events: sample the DMA
+        registers in the background while built-in workloads run in turn
 
         Args:
-            duration: Duration to poll in seconds
+            workloads: Workload names (disk, net, usb, audio); all when empty
+            window: Seconds each workload runs
+            rate: Samples per second, WORKLOAD_POLL_RATE when None (0 busy-polls)
         """
-        self.logger.log(f"[*] Polling DMA registers for {duration} seconds...")
-
-        # Record initial values
-        initial_values = {
-            "ctrl": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL),
-            "stat": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT),
-            "tc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_TC),
-            "addr": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_ADDR),
-            "desc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_DESC)
-        }
+        self.logger.log("[*] Monitoring DMA registers during synthetic workloads...")
+        try:
+            selected = build_workloads(workloads)
+        except ValueError as e:
+            self.logger.log_error(str(e))
+            return None
+
+        names = [name for name, _ in H81_DMA_REGS]
+        read_fn = make_pci_reader(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN, [offset for _, offset in H81_DMA_REGS])
+        result = run_campaign(read_fn, names, selected, window=window,
+                              rate=WORKLOAD_POLL_RATE if rate is None else rate, clock=time, logger=self.logger)
+        result.report(self.logger)
+        result.write_json(WORKLOAD_CORRELATION_FILE)
+        self.logger.log(f"Saved workload correlation to {WORKLOAD_CORRELATION_FILE}")
+        return result
+
+    def snapshot_registers(self, store_dir=REGISTER_SNAPSHOT_STORE):
+        """
+        Save the config space of every domain 0 function and the legacy port
+        values to the snapshot store, and diff them against this machine's
+        previous snapshot
 
-        # Track all values seen
-        value_history = {
-            "ctrl": {initial_values["ctrl"]},
-            "stat": {initial_values["stat"]},
-            "tc": {initial_values["tc"]},
-            "addr": {initial_values["addr"]},
-            "desc": {initial_values["desc"]}
-        }
+        Args:
+            store_dir: Snapshot store directory
+        """
+        self.logger.log(f"[*] Snapshotting registers to {store_dir}...")
+        store = SnapshotStore(store_dir)
+        functions = [device.bdf for device in self.devices() if device.domain == 0]
+        current = capture_registers(self.snapshot(), functions, self.cs.io, description="lpc_dma_h81_z390_test")
+        previous = store.latest(current.machine, before=current.time_ns)
+        path = store.save(current)
+        self.logger.log(f"Saved {current} to {path}")
+
+        if previous is None:
+            self.logger.log("No earlier snapshot of this machine to compare with")
+            return None
+        result = diff_registers(previous, current)
+        result.report(self.logger)
+        return result
+
+    def map_lpc_writable_masks(self, start=0x40, end=0x100):
+        """
+        Map the RW/RO/W1C bits of the LPC bridge's device-specific config
+        space, reusing stored masks for a part that was mapped before.
+        Only bit 0 is toggled unless -probe-groups is given; protected
+        dwords (LPC_PROTECTED_DWORDS) are never written.
 
-        start_time = time.time()
-        poll_count = 0
-        changes_count = 0
+        Args:
+            start: First dword offset (the standard header is skipped by default)
+            end: End of the range (exclusive)
+        """
+        self.logger.log(f"[*] Mapping writable bits of LPC config space 0x{start:02X}-0x{end - 1:02X}...")
 
-        # Poll continuously
+        store = MaskStore()
+        begin = time.time()
         try:
-            while time.time() - start_time < duration:
-                poll_count += 1
-
-                # Sleep briefly to avoid excessive CPU usage
-                time.sleep(0.1)
-
-                # Read all registers
-                current_values = {
-                    "ctrl": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL),
-                    "stat": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT),
-                    "tc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_TC),
-                    "addr": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_ADDR),
-                    "desc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_DESC)
-                }
+            masks = discover_masks(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN, range(start, end, 4),
+                                   store, LPC_PROTECTED_DWORDS, schedule=self.mask_schedule)
+        except Exception as e:
+            self.logger.log_error(f"Error mapping LPC config space: {str(e)}")
+            return None
+        finally:
+            # Registers were written - drop cached copies
+            self.snapshot().invalidate(LPC_BUS, LPC_DEV, LPC_FUN)
+
+        writes = 0
+        for mask in masks:
+            writes += mask.writes
+            if mask.rw or mask.w1c or mask.sticky:
+                self.logger.log(f"  0x{mask.offset:02X} = 0x{mask.original:08X}: {mask.describe()}")
+            if mask.sticky:
+                self.logger.log_bad(f"  0x{mask.offset:02X} did not restore - bits 0x{mask.sticky:08X} stuck")
+
+        skipped = [offset for offset in range(start, end, 4) if offset in LPC_PROTECTED_DWORDS]
+        self.logger.log(f"Mapped {len(masks) - len(skipped)} registers in {time.time() - begin:.2f}s "
+                        f"with {writes} writes (stored in {store.path}), {len(skipped)} protected ones not written")
+        return masks
+
+    def poll_dma_registers(self, duration=30, rate=POLL_RATE):
+        """
+        Poll DMA registers continuously for a period to detect any changes
 
-                # Check for changes from the last poll
-                for reg, value in current_values.items():
-                    if value not in value_history[reg]:
-                        changes_count += 1
-                        self.logger.log(f"Register {reg} changed to: 0x{value:08X}")
-                        # Add to history
-                        value_history[reg].add(value)
+        Args:
+            duration: Duration to poll in seconds
+            rate: Target samples per second (0 busy-polls as fast as reads allow)
+        """
+        rate_desc = f"{rate} Hz" if rate > 0 else "busy-poll"
+        self.logger.log(f"[*] Polling DMA registers for {duration} seconds ({rate_desc})...")
 
-                # Provide feedback periodically
-                if poll_count % 100 == 0:
-                    elapsed = time.time() - start_time
-                    self.logger.log(f"Polling for {elapsed:.1f}s, {changes_count} changes detected")
+        names = [name for name, _ in H81_DMA_REGS]
+        read_fn = make_pci_reader(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN, [offset for _, offset in H81_DMA_REGS])
+        sampler = RegisterSampler.at_rate(read_fn, names, rate)
 
-        except KeyboardInterrupt:
+        # Ctrl+C ends the run early; the samples taken so far are still reported
+        stats = sampler.run(duration=duration)
+        if stats.interrupted:
             self.logger.log("Polling interrupted by user")
 
         # Final report
         self.logger.log("\n[*] Polling Results Summary:")
-        self.logger.log(f"Total polls: {poll_count}")
-        self.logger.log(f"Total register changes: {changes_count}")
+        sampler.report(self.logger)
 
-        for reg, values in value_history.items():
+        # Distinct values per register, from the recorded transitions only
+        timestamps, columns = sampler.columns()
+        for name, column in zip(names, columns):
+            values = sorted(set(column))
             if len(values) > 1:
-                self.logger.log(f"Register {reg} had {len(values)} different values:")
-                for value in sorted(values):
+                self.logger.log(f"Register {name} had {len(values)} different values:")
+                for value in values[:16]:
                     self.logger.log(f"  0x{value:08X}")
-            else:
-                self.logger.log(f"Register {reg} remained constant at 0x{list(values)[0]:08X}")
+            elif values:
+                self.logger.log(f"Register {name} remained constant at 0x{values[0]:08X}")
+
+        if analyze_trace is not None and len(timestamps) > 1:
+            end = timestamps[0] + sampler.stats.duration_ns
+            analyze_trace(dict(zip(names, columns)), timestamps, end=end).report(self.logger)
 
         return True
 
+    def analyze_dma_trace(self, log_paths):
+        """
+        Rank the live bits of the H81-style DMA registers from recorded traces
+
+        Args:
+            log_paths: Binary logs from monitor_dma_registers_long_term, in rotation order
+        """
+        if analyze_trace is None:
+            self.logger.log_warning("NumPy is not installed - skipping trace analysis")
+            return None
+
+        try:
+            columns = read_logs(log_paths)
+        except (OSError, ValueError) as e:
+            self.logger.log_error(f"Could not load trace: {str(e)}")
+            return None
+
+        timestamps = columns.pop('timestamp', None)
+        if timestamps is None or len(timestamps) < 2:
+            self.logger.log("Trace holds fewer than two samples - nothing to analyse")
+            return None
+
+        self.logger.log(f"[*] Analysing {len(timestamps)} samples from {', '.join(log_paths)}")
+        analysis = analyze_trace(columns, timestamps)
+        analysis.report(self.logger)
+        return analysis
+
     def run_old(self, module_argv):
         self.logger.log("##################################################")
         self.logger.log("# Z390 Undocumented DMA over LPC Test")
@@ -1067,37 +1320,35 @@ class lpc_dma_h81_z390_test(BaseModule):
             self.logger.log_good("No hidden H81-style DMA registers detected in Z390")
             return ModuleResult.PASSED
 
-    def monitor_dma_registers_long_term(self, log_file_path, interval=60):
+    def monitor_dma_registers_long_term(self, log_file_path, interval=60, max_bytes=None, max_seconds=24 * 3600):
         """
         Long-term monitoring of DMA registers to detect system usage
 
+        Samples go to a binary columnar log (see dma_reg_log.py) written in
+        blocks and rotated by size and/or age; dma_reg_log.py also loads the
+        log back into arrays or exports it as CSV. Samples are written and
+        fsync'ed in blocks of LONG_TERM_FLUSH_SAMPLES (and when monitoring
+        stops), so a crash loses at most the samples of one block.
+
         Args:
-            log_file_path: Path to write log file
+            log_file_path: Path of the first log file
             interval: Seconds between checks
+            max_bytes: Rotate to a new file once this size is reached
+            max_seconds: Rotate to a new file after this many seconds
         """
-        try:
-            with open(log_file_path, 'w') as f:
-                f.write("Timestamp,ctrl,stat,tc,addr,desc\n")
+        names = [name for name, _ in H81_DMA_REGS]
+        read_registers = make_pci_reader(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN,
+                                         [offset for _, offset in H81_DMA_REGS])
 
+        writer = RegisterLogWriter(log_file_path, names, max_bytes=max_bytes, max_seconds=max_seconds,
+                                   flush_seconds=interval * LONG_TERM_FLUSH_SAMPLES)
+        try:
+            with writer:
                 self.logger.log(f"Starting long-term monitoring, logging to {log_file_path}")
                 self.logger.log(f"Press Ctrl+C to stop monitoring")
 
                 while True:
-                    # Read all registers
-                    values = {
-                        "ctrl": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL),
-                        "stat": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT),
-                        "tc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_TC),
-                        "addr": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_ADDR),
-                        "desc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_DESC)
-                    }
-
-                    # Write to log file
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    log_line = f"{timestamp},{values['ctrl']:08X},{values['stat']:08X},{values['tc']:08X},{values['addr']:08X},{values['desc']:08X}\n"
-                    f.write(log_line)
-                    f.flush()
-
+                    writer.append(time.time_ns(), read_registers())
                     time.sleep(interval)
 
         except KeyboardInterrupt:
@@ -1105,6 +1356,11 @@ class lpc_dma_h81_z390_test(BaseModule):
         except Exception as e:
             self.logger.log_error(f"Error during monitoring: {str(e)}")
 
+        if writer.files:
+            self.logger.log(f"Monitoring log written to: {', '.join(writer.files)}")
+
+        return writer.files
+
     def inspect_acpi_tables(self):
         """
         Inspect ACPI tables for potential DMA-related entries
@@ -1205,26 +1461,29 @@ class lpc_dma_h81_z390_test(BaseModule):
                                         f"Saved {table_name} table ({len(table_content)} bytes) to {file_path}")
 
                                     # For DSDT, analyze silently and save to file
-                                    if table_name == 'DSDT':
-                                        # Convert to string for basic analysis but don't print
-                                        table_str = str(table_content)
-
-                                        # Look for DMA-related keywords silently
-                                        dma_keywords = ['DMA', 'SystemMemory', 'OperationRegion', 'LPC']
-                                        keyword_counts = {}
-
-                                        for keyword in dma_keywords:
-                                            count = table_str.count(keyword)
-                                            keyword_counts[keyword] = count
+                                    # DSDT and SSDT are AML - decode their OperationRegions
+                                    if table_name in ('DSDT', 'SSDT'):
+                                        regions = scan_operation_regions(table_content, table_name)
+
+                                        # Look for DMA-related names silently; region counts
+                                        # come from the decoded AML (the keywords themselves
+                                        # only exist in ASL source)
+                                        names = ACPI_KEYWORD_SCANNER.count(table_content)
+                                        keyword_counts = {
+                                            'DMA': names['DMA'],
+                                            'SystemMemory': sum(r.space_name == 'SystemMemory' for r in regions),
+                                            'OperationRegion': len(regions),
+                                            'LPC': names['LPC'],
+                                        }
 
                                         # Just print a summary line, not each count
-                                        self.logger.log(f"DSDT analysis: " +
+                                        self.logger.log(f"{table_name} analysis: " +
                                                         ", ".join([f"'{k}': {v}" for k, v in keyword_counts.items()]))
 
                                         # Save analysis to file silently
-                                        analysis_path = os.path.join(acpi_dir, "dsdt_dma_analysis.txt")
+                                        analysis_path = os.path.join(acpi_dir, f"{table_name.lower()}_dma_analysis.txt")
                                         with open(analysis_path, 'w') as f:
-                                            f.write("DSDT DMA-Related Keyword Analysis:\n")
+                                            f.write(f"{table_name} DMA-Related Keyword Analysis:\n")
                                             f.write("================================\n\n")
 
                                             for keyword, count in keyword_counts.items():
@@ -1232,42 +1491,9 @@ class lpc_dma_h81_z390_test(BaseModule):
 
                                             f.write("\nDMA-Related Regions:\n")
                                             f.write("===================\n\n")
+                                            self.check_acpi_regions(regions, f)
 
-                                            # Extract SystemMemory regions
-                                            import re
-                                            memory_regions = re.findall(
-                                                r"OperationRegion\s*\(\s*\w+\s*,\s*SystemMemory\s*,\s*(0x[0-9A-Fa-f]+)\s*,\s*(0x[0-9A-Fa-f]+)\s*\)",
-                                                table_str)
-
-                                            for i, (addr, size) in enumerate(memory_regions):
-                                                f.write(f"Region {i + 1}: Address {addr}, Size {size}\n")
-
-                                                # Check for LPC overlap quietly
-                                                try:
-                                                    addr_val = int(addr, 16)
-                                                    size_val = int(size, 16)
-
-                                                    lpc_addr = None
-                                                    if hasattr(self.cs, 'pci') and hasattr(self.cs.pci,
-                                                                                           'get_device_address'):
-                                                        lpc_addr = self.cs.pci.get_device_address(LPC_BUS, LPC_DEV,
-                                                                                                  LPC_FUN)
-
-                                                    if lpc_addr:
-                                                        if (addr_val <= lpc_addr + 0xFF) and (
-                                                                addr_val + size_val >= lpc_addr):
-                                                            f.write(
-                                                                f"  WARNING: This region overlaps with LPC controller configuration space!\n")
-                                                            f.write(
-                                                                f"  LPC controller at {hex(lpc_addr)}, region covers {hex(addr_val)}-{hex(addr_val + size_val)}\n")
-
-                                                            # Print this important warning to console
-                                                            self.logger.log_warning(
-                                                                f"Found ACPI region at {addr} that overlaps with LPC controller space")
-                                                except Exception as e:
-                                                    f.write(f"  Error analyzing address/size: {str(e)}\n")
-
-                                        self.logger.log(f"Saved DSDT DMA analysis to {analysis_path}")
+                                        self.logger.log(f"Saved {table_name} DMA analysis to {analysis_path}")
                     else:
                         self.logger.log("No ACPI tables found or accessible")
                 else:
@@ -1317,26 +1543,8 @@ class lpc_dma_h81_z390_test(BaseModule):
 
                 elif platform.system() == 'Linux':
                     # Try to use Linux ACPI filesystem
-                    acpi_path = '/sys/firmware/acpi/tables'
-                    if os.path.exists(acpi_path):
-                        # Just print a summary, not each file
-                        table_count = len(os.listdir(acpi_path))
-                        self.logger.log(f"Copying {table_count} ACPI tables from {acpi_path}...")
-
-                        copied_count = 0
-                        for table_name in os.listdir(acpi_path):
-                            src_path = os.path.join(acpi_path, table_name)
-                            dst_path = os.path.join(acpi_dir, table_name)
-
-                            try:
-                                with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
-                                    dst.write(src.read())
-                                copied_count += 1
-                            except Exception as e:
-                                self.logger.log_error(f"Error copying {table_name}: {str(e)}")
-
-                        # Just print summary
-                        self.logger.log(f"Successfully copied {copied_count} of {table_count} ACPI tables")
+                    if os.path.exists(SYSFS_ACPI_TABLES):
+                        self.harvest_acpi_tables(acpi_dir)
 
             return True
 
@@ -1344,103 +1552,81 @@ class lpc_dma_h81_z390_test(BaseModule):
             self.logger.log_error(f"Error during safe ACPI inspection: {str(e)}")
             return False
 
-    def analyze_acpi_dump(self, dump_path):
+    def harvest_acpi_tables(self, acpi_dir):
         """
-        Analyze ACPI dump file created by inspect_acpi_tables_minimal
+        Bring acpi_dir up to date with the kernel's ACPI tables, reading and
+        storing only the tables that changed since the previous run
+        """
+        self.logger.log(f"Harvesting ACPI tables from {SYSFS_ACPI_TABLES} (store: {ACPI_STORE_DIR})...")
+        try:
+            stats = harvest_tables(acpi_dir, SYSFS_ACPI_TABLES, ACPI_STORE_DIR)
+        except OSError as e:
+            self.logger.log_error(f"Error harvesting ACPI tables: {str(e)}")
+            return None
+        self.logger.log(f"ACPI tables in {acpi_dir}: {stats}")
+        return stats
+
+    def analyze_acpi_dump(self, dump_path, extract_dir=None):
+        """
+        Analyze the ACPI dump created by inspect_acpi_tables_minimal
+
+        Args:
+            dump_path: Dump file (raw or acpidump text) or directory of table files
+            extract_dir: Where tables and the analysis are written
+                         (default: 'extracted_tables' next to the dump)
         """
         self.logger.log("[*] Analyzing ACPI dump for DMA-related entries...")
 
         try:
-            import os
-            import re
-
             if not os.path.exists(dump_path):
-                self.logger.log_error(f"ACPI dump file {dump_path} not found")
-                return False
-
-            # Get file size
-            file_size = os.path.getsize(dump_path)
-            if file_size == 0:
-                self.logger.log_error(f"ACPI dump file {dump_path} is empty")
-                return False
-
-            self.logger.log(f"Analyzing ACPI dump file: {dump_path} ({file_size} bytes)")
-
-            # Read the dump file
-            with open(dump_path, 'rb') as f:
-                dump_data = f.read()
-
-            # Look for DSDT table
-            dsdt_offset = dump_data.find(b'DSDT')
-            if dsdt_offset == -1:
-                self.logger.log("No DSDT table found in ACPI dump")
+                self.logger.log_error(f"ACPI dump {dump_path} not found")
                 return False
 
-            self.logger.log(f"Found DSDT table at offset {dsdt_offset}")
-
-            # Convert to string for analysis
-            # Only use a portion of the file to prevent memory issues with large dumps
-            analysis_data = dump_data[max(0, dsdt_offset - 100):min(len(dump_data), dsdt_offset + 10000)]
-            data_str = str(analysis_data)
-
-            # Create directory for extracted tables if it doesn't exist
-            extract_dir = os.path.join(os.path.dirname(dump_path), "extracted_tables")
-            if not os.path.exists(extract_dir):
-                os.makedirs(extract_dir)
-
-            # Extract DSDT to a separate file
-            dsdt_file = os.path.join(extract_dir, "DSDT.bin")
-            with open(dsdt_file, 'wb') as f:
-                # In a proper implementation, we would parse the table length
-                # This is a simplified approach that just extracts a reasonable chunk
-                f.write(analysis_data[:10000])
-
-            self.logger.log(f"Extracted DSDT table to {dsdt_file}")
-
-            # Look for SystemMemory operation regions
-            memory_regions = re.findall(r"SystemMemory.*?(0x[0-9A-Fa-f]+).*?(0x[0-9A-Fa-f]+)", data_str)
-
+            with AcpiTableIndex(dump_path) as index:
+                index.report(self.logger)
+                dsdt = index.find('DSDT')
+                if dsdt is None:
+                    self.logger.log("No DSDT table found in ACPI dump")
+                    return False
+
+                self.logger.log(f"Found DSDT table at offset {dsdt.offset} ({dsdt.length} bytes)")
+
+                # Each table is written out whole, at the length from its header
+                if extract_dir is None:
+                    base_dir = dump_path if os.path.isdir(dump_path) else os.path.dirname(dump_path)
+                    extract_dir = os.path.join(base_dir, "extracted_tables")
+                written = index.extract(extract_dir)
+                self.logger.log(f"Extracted {len(written)} ACPI table(s) to {extract_dir}")
+
+                with index.view(dsdt) as data:
+                    keyword_counts = ACPI_KEYWORD_SCANNER.count(data)
+                # OperationRegions decoded from the AML of DSDT and every SSDT
+                regions = scan_index(index)
+                mcfg = index.table('MCFG')
+                raw_mcfg = bytes(mcfg) if mcfg is not None else None
+                if mcfg is not None:
+                    mcfg.release()
+
+            memory_regions = [r for r in regions if r.space_name == 'SystemMemory']
+            self.logger.log(f"Found {len(regions)} OperationRegions, {len(memory_regions)} in SystemMemory "
+                            f"(DSDT and {len(index.tables.get('SSDT', []))} SSDT(s))")
             if not memory_regions:
-                self.logger.log("No SystemMemory regions found in DSDT")
+                self.logger.log("No SystemMemory regions found in DSDT/SSDTs")
                 return False
 
-            self.logger.log(f"Found {len(memory_regions)} SystemMemory regions in DSDT")
-
             # Create analysis file
             analysis_file = os.path.join(extract_dir, "memory_regions_analysis.txt")
             with open(analysis_file, 'w') as f:
-                f.write("ACPI SystemMemory Region Analysis\n")
-                f.write("===============================\n\n")
-
-                for i, (addr, size) in enumerate(memory_regions):
-                    f.write(f"Region {i + 1}: Address {addr}, Size {size}\n")
-
-                    try:
-                        addr_val = int(addr, 16)
-                        size_val = int(size, 16)
-
-                        # Get LPC controller address
-                        lpc_cfg_space = self.cs.pci.get_device_address(LPC_BUS, LPC_DEV, LPC_FUN)
-                        if lpc_cfg_space:
-                            # Check if region overlaps with LPC controller space
-                            if (addr_val <= lpc_cfg_space + 0xFF) and (addr_val + size_val >= lpc_cfg_space):
-                                f.write(f"  WARNING: This region overlaps with LPC controller configuration space!\n")
-                                f.write(
-                                    f"  LPC controller at {hex(lpc_cfg_space)}, region covers {hex(addr_val)}-{hex(addr_val + size_val)}\n")
-
-                                # Log important finding to console
-                                self.logger.log_warning(
-                                    f"Found suspicious ACPI memory mapping at {addr} (size {size}) that includes LPC controller space")
-                    except Exception as e:
-                        f.write(f"  Error analyzing address/size: {str(e)}\n")
+                f.write("ACPI OperationRegion Analysis\n")
+                f.write("=============================\n\n")
+                self.check_acpi_regions(regions, f, self.platform_ranges(regions, raw_mcfg))
 
                 # Check for other DMA-related keywords
-                dma_keywords = ['DMA', 'LPC', 'DMAC', 'Legacy']
                 f.write("\nOther DMA-related keywords in DSDT:\n")
                 f.write("=================================\n\n")
 
-                for keyword in dma_keywords:
-                    count = data_str.count(keyword)
+                for keyword in ACPI_DMA_KEYWORDS:
+                    count = keyword_counts[keyword]
                     f.write(f"'{keyword}': {count} occurrences\n")
 
                     if count > 0:
@@ -1453,6 +1639,106 @@ class lpc_dma_h81_z390_test(BaseModule):
             self.logger.log_error(f"Error analyzing ACPI dump: {str(e)}")
             return False
 
+    def map_platform(self, mcfg=None):
+        """
+        Address ranges decoded by the hardware: PCI BARs, MCFG window, LPC and
+        IT8888F decode windows, LPC/ITE config space slots and the DMA ports.
+        Reads MCFG, config space and the device table, so under -parallel it
+        runs on the access lane and the ACPI analysis only merges the result.
+
+        Args:
+            mcfg: Raw MCFG table (read through cs.acpi if None)
+        """
+        if mcfg is None and hasattr(self.cs, 'acpi') and hasattr(self.cs.acpi, 'get_table_content'):
+            try:
+                mcfg = self.cs.acpi.get_table_content('MCFG')
+            except Exception:
+                mcfg = None
+
+        ecam_base = None
+        if hasattr(self.cs, 'pci') and hasattr(self.cs.pci, 'get_device_address'):
+            try:
+                ecam_base = self.cs.pci.get_device_address(0, 0, 0)
+            except Exception:
+                ecam_base = None
+
+        try:
+            pci, devices = self.snapshot(), self.devices()
+        except Exception as e:
+            self.logger.log_warning(f"PCI devices unavailable for the address map: {str(e)}")
+            pci = devices = None
+
+        self.hardware_ranges = list(build_platform_index((), mcfg or None, pci, devices, ecam_base))
+        return self.hardware_ranges
+
+    def platform_ranges(self, regions, mcfg=None):
+        """
+        Interval index of the ACPI regions and the hardware ranges from
+        map_platform() (mapped now if no phase did it before)
+
+        Args:
+            regions: AmlRegion list from aml_regions.py
+            mcfg: Raw MCFG table, used when the hardware ranges are mapped now
+        """
+        hardware = self.hardware_ranges
+        if hardware is None:
+            hardware = self.map_platform(mcfg)
+        index = RangeIndex(acpi_ranges(regions))
+        index.extend(hardware)
+        return index
+
+    def check_acpi_regions(self, regions, f, ranges=None):
+        """
+        Write decoded OperationRegions to an analysis file with everything
+        else decoding the same addresses, flagging SystemMemory regions over
+        the LPC/ITE bridges' config space and SystemIO regions over the
+        legacy DMA controller ports
+
+        Args:
+            regions: AmlRegion list from aml_regions.py
+            f: Open text file
+            ranges: RangeIndex from platform_ranges() (built if None)
+
+        Returns:
+            Number of flagged regions
+        """
+        if ranges is None:
+            ranges = self.platform_ranges(regions)
+
+        flagged = 0
+        for i, region in enumerate(regions):
+            f.write(f"Region {i + 1}: {region}\n")
+
+            for own in acpi_ranges([region]):
+                others = [other for other in ranges.who_else(own) if other.kind != 'acpi']
+                for other in others:
+                    if other.kind == 'pcicfg':
+                        f.write(f"  WARNING: This region overlaps with {other.owner} ({other.detail}) "
+                                f"configuration space!\n")
+                        f.write(f"  Config space at {hex(other.start)}, region covers "
+                                f"{hex(own.start)}-{hex(own.end)}\n")
+                        # Log important finding to console
+                        self.logger.log_warning(f"Found suspicious ACPI memory mapping {region.name} at "
+                                                f"{hex(own.start)} (size {hex(own.size)}) that includes "
+                                                f"{other.detail} config space")
+                    elif other.kind == 'dma':
+                        f.write(f"  NOTE: This region covers 8237A {other.detail} ports "
+                                f"{hex(other.start)}-{hex(other.end - 1)}\n")
+                        self.logger.log(f"ACPI I/O region {region.name} ({region.table}) covers legacy DMA ports "
+                                        f"{hex(own.start)}-{hex(own.end - 1)}")
+                    else:
+                        f.write(f"  Also decoded by: {other}\n")
+                if any(other.kind in ('pcicfg', 'dma') for other in others):
+                    flagged += 1
+
+        overlaps = ranges.overlaps()
+        f.write(f"\nAddress Map Overlaps ({len(ranges)} ranges):\n")
+        f.write("============================\n\n")
+        for overlap in overlaps:
+            f.write(f"{overlap}\n")
+        ranges.report(self.logger, kinds=('bar', 'lpc', 'it8888', 'pcicfg', 'mcfg'), limit=10)
+        return flagged
+
     def inspect_acpi_tables_minimal(self):
         """
         Minimal ACPI table inspection that focuses only on saving files
@@ -1517,23 +1803,8 @@ class lpc_dma_h81_z390_test(BaseModule):
 
                     except Exception:
                         # Fallback to copying from /sys/firmware/acpi/tables
-                        acpi_path = '/sys/firmware/acpi/tables'
-                        if os.path.exists(acpi_path):
-                            self.logger.log(f"Copying ACPI tables from {acpi_path}...")
-
-                            copied = 0
-                            for table in os.listdir(acpi_path):
-                                src = os.path.join(acpi_path, table)
-                                dst = os.path.join(acpi_dir, table)
-
-                                try:
-                                    with open(src, 'rb') as s, open(dst, 'wb') as d:
-                                        d.write(s.read())
-                                    copied += 1
-                                except Exception as e:
-                                    self.logger.log_error(f"Error copying {table}: {str(e)}")
-
-                            self.logger.log(f"Copied {copied} ACPI tables to {acpi_dir}")
+                        if os.path.exists(SYSFS_ACPI_TABLES):
+                            self.harvest_acpi_tables(acpi_dir)
                         else:
                             self.logger.log_error("Could not access ACPI tables on this Linux system")
 
@@ -1591,13 +1862,12 @@ class lpc_dma_h81_z390_test(BaseModule):
                             # Look for signatures that might indicate LPC DMA access
                             # This is very implementation-specific and would need to be
                             # customized based on actual analysis of known handlers
-
-                            # Example: Look for byte sequences that might represent access
-                            # to the LPC controller configuration space via port IO
-                            # (This is a simplified example)
-                            if b'\x89\xDF\x1F\x00' in handler_code:  # Just an example pattern
-                                self.logger.log_warning(
-                                    f"SMI Handler {handler_id} contains suspicious pattern that may access LPC controller")
+                            found = SMI_HANDLER_SCANNER.scan(handler_code)
+                            for name, offsets in found.items():
+                                if offsets:
+                                    self.logger.log_warning(
+                                        f"SMI Handler {handler_id} contains {name} at "
+                                        f"{', '.join(f'0x{o:X}' for o in offsets[:4])} - may access LPC controller")
                 else:
                     self.logger.log("No SMI handlers found or accessible")
             else:
@@ -1616,8 +1886,8 @@ class lpc_dma_h81_z390_test(BaseModule):
                 # Check if writing to SMI port affects our DMA registers
                 # Save original register values
                 original_values = {
-                    "ctrl": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL),
-                    "stat": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
+                    "ctrl": self.snapshot().read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL),
+                    "stat": self.snapshot().read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
                 }
 
                 # Try a few common SMI commands that might be related to DMA or platform config
@@ -1643,6 +1913,9 @@ class lpc_dma_h81_z390_test(BaseModule):
                     except Exception as e:
                         self.logger.log_error(f"Error testing SMI command 0x{test_cmd:02X}: {str(e)}")
 
+                # SMI handlers can touch any register - recapture lazily on next read
+                self.snapshot().invalidate()
+
         except Exception as e:
             self.logger.log_error(f"Error during SMI handler inspection: {str(e)}")
 
@@ -1698,48 +1971,9 @@ class lpc_dma_h81_z390_test(BaseModule):
                 if smi_sources:
                     self.logger.log(f"Enabled SMI sources: {', '.join(smi_sources)}")
 
-            # Scan I/O port 0xB2 (APM SMI) usage
-            # Test a range of values to see if they trigger readable effects
-            original_ctrl = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL)
-            original_stat = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
-
-            self.logger.log("Testing APM SMI commands to detect handlers that might configure DMA...")
-
-            # Test a wider range of SMI commands
-            for cmd in range(0x00, 0xFF, 0x10):  # Test every 16th value to cover range efficiently
-                try:
-                    self.logger.log(f"Testing SMI command 0x{cmd:02X}...")
-                    self.cs.io.write_port_byte(0xB2, cmd)
-
-                    # Give SMI handler time to execute
-                    time.sleep(0.01)
-
-                    # Check if our registers changed
-                    new_ctrl = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL)
-                    new_stat = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
-
-                    if new_ctrl != original_ctrl or new_stat != original_stat:
-                        self.logger.log_warning(f"SMI command 0x{cmd:02X} affected DMA registers!")
-                        self.logger.log_warning(f"  CTRL: 0x{original_ctrl:08X} -> 0x{new_ctrl:08X}")
-                        self.logger.log_warning(f"  STAT: 0x{original_stat:08X} -> 0x{new_stat:08X}")
-
-                        # Now test neighboring values to narrow down the specific command
-                        for subcmd in range(cmd, cmd + 16):
-                            if subcmd != cmd:  # Skip the one we already tested
-                                try:
-                                    self.cs.io.write_port_byte(0xB2, subcmd)
-                                    time.sleep(0.01)
-
-                                    sub_ctrl = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL)
-                                    sub_stat = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)
-
-                                    if sub_ctrl != original_ctrl or sub_stat != original_stat:
-                                        self.logger.log_warning(
-                                            f"Additional SMI command 0x{subcmd:02X} affects DMA registers")
-                                except:
-                                    pass
-                except:
-                    self.logger.log(f"Error testing SMI command 0x{cmd:02X}")
+            # Sweep the APM SMI commands for handlers that might configure DMA,
+            # clearing commands in groups instead of firing one check per value
+            self.sweep_smi_commands()
 
             # Scan firmware volumes for SMI handler signatures
             if hasattr(self.cs, 'uefi') and hasattr(self.cs.uefi, 'get_EFI_System_Table'):
@@ -1753,6 +1987,53 @@ class lpc_dma_h81_z390_test(BaseModule):
         except Exception as e:
             self.logger.log_error(f"Error during direct SMI handler inspection: {str(e)}")
 
+    def sweep_smi_commands(self, checkpoint=SMI_SWEEP_CHECKPOINT, max_smis=SMI_SWEEP_BUDGET):
+        """
+        Find the APM SMI commands that change the H81-style DMA registers
+
+        Commands are fired in adaptively sized groups with one register
+        fingerprint per group; groups that change a register are split until
+        single commands remain. Progress is checkpointed after every group,
+        so the sweep resumes after a freeze or once max_smis is spent
+        (None fires every remaining command in one run). Delete the
+        checkpoint file to start over. The FADT's ACPI_ENABLE,
+        ACPI_DISABLE and S4BIOS_REQ values are never fired.
+        """
+        self.logger.log("[*] Sweeping APM SMI commands for handlers touching the DMA registers...")
+
+        planner = SmiSweepPlanner.resume(checkpoint)
+        facp = None
+        if hasattr(self.cs, 'acpi') and hasattr(self.cs.acpi, 'get_table_content'):
+            try:
+                facp = self.cs.acpi.get_table_content('FACP')
+            except Exception:
+                facp = None
+        planner.skip(fadt_denylist(facp))
+        if planner.complete:
+            self.logger.log(f"[*] Sweep already complete in {checkpoint}")
+        else:
+            offsets = [offset for _, offset in H81_DMA_REGS]
+            fingerprint = make_pci_reader(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN, offsets)
+
+            def restore(baseline):
+                # Only registers that are writable can be put back
+                for offset, value in zip(offsets, baseline):
+                    if self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, offset) != value:
+                        self.cs.pci.write_dword(LPC_BUS, LPC_DEV, LPC_FUN, offset, value)
+
+            try:
+                fired = run_sweep(planner, lambda cmd: self.cs.io.write_port_byte(APM_CNT, cmd), fingerprint,
+                                  restore, max_smis=max_smis, checkpoint=checkpoint, clock=time)
+                self.logger.log(f"[*] Fired {fired} SMI(s) this run")
+            except KeyboardInterrupt:
+                self.logger.log("[*] Sweep interrupted - progress is kept in the checkpoint")
+            finally:
+                # SMI handlers can touch any register - recapture lazily on next read
+                self.snapshot().invalidate()
+
+        planner.report(self.logger, [name for name, _ in H81_DMA_REGS])
+        return sorted(planner.hits)
+
     def inspect_smi_handlers_safe(self):
         """
         Safer inspection of SMI-related registers without triggering actual SMI execution
@@ -1762,8 +2043,10 @@ class lpc_dma_h81_z390_test(BaseModule):
         try:
             # Only read SMI configuration registers, don't write to port 0xB2
 
+            cfg = self.snapshot()
+
             # Check SMRAM control register
-            smram_ctrl = self.cs.pci.read_dword(0, 0x1F, 0, 0xB0)
+            smram_ctrl = cfg.read_dword(0, 0x1F, 0, 0xB0)
             if smram_ctrl != 0xFFFFFFFF:
                 self.logger.log(f"SMRAM control register: 0x{smram_ctrl:08X}")
 
@@ -1776,7 +2059,7 @@ class lpc_dma_h81_z390_test(BaseModule):
                     self.logger.log("SMRAM is enabled (D_EN bit set)")
 
             # Check SMI_EN register in ACPI controller (read-only)
-            smi_en = self.cs.pci.read_dword(0, 0x1F, 0, 0x30)
+            smi_en = cfg.read_dword(0, 0x1F, 0, 0x30)
             if smi_en != 0xFFFFFFFF:
                 self.logger.log(f"SMI_EN register: 0x{smi_en:08X}")
 
@@ -1791,7 +2074,7 @@ class lpc_dma_h81_z390_test(BaseModule):
                     self.logger.log(f"Enabled SMI sources: {', '.join(smi_sources)}")
 
             # Check SMI_STS register (SMI status)
-            smi_sts = self.cs.pci.read_dword(0, 0x1F, 0, 0x34)
+            smi_sts = cfg.read_dword(0, 0x1F, 0, 0x34)
             if smi_sts != 0xFFFFFFFF:
                 self.logger.log(f"SMI_STS register: 0x{smi_sts:08X}")
 
@@ -1803,13 +2086,7 @@ class lpc_dma_h81_z390_test(BaseModule):
             # Read the H81-style DMA registers to see if they appear to be related to SMI
             # This is read-only and shouldn't trigger any system instability
 
-            dma_regs = {
-                "ctrl": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_CTRL),
-                "stat": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT),
-                "tc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_TC),
-                "addr": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_ADDR),
-                "desc": self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_DESC)
-            }
+            dma_regs = {name: cfg.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, offset) for name, offset in H81_DMA_REGS}
 
             # Look for bit patterns that might indicate SMI functionality
             # For example, if bits match known SMI status/control bits
@@ -1846,7 +2123,7 @@ class lpc_dma_h81_z390_test(BaseModule):
 
         for bus, dev, func, offset, name in vendor_specific_regs:
             try:
-                val = self.cs.pci.read_dword(bus, dev, func, offset)
+                val = self.snapshot().read_dword(bus, dev, func, offset)
                 if val != 0 and val != 0xFFFFFFFF:
                     self.logger.log(f"Found potential {name} register: 0x{val:08X}")
 
@@ -1874,11 +2151,27 @@ class lpc_dma_h81_z390_test(BaseModule):
             (0, 22, 0, "EHCI Controller")
         ]
 
+        # Pick the same kinds of devices (plus any ITE bridges) from the
+        # device table, keeping the fixed list only if enumeration fails
+        try:
+            table = self.devices()
+            found = (table.find_class(0x06, 0x00) + table.find_class(0x06, 0x04) + table.find_class(0x03) +
+                     table.find_class(0x06, 0x01) + table.find_class(0x0C, 0x05) + table.find_class(0x0C, 0x03) +
+                     table.it8893_bridges() + table.it8888_bridges())
+            found = [d for d in dict.fromkeys(found) if d.domain == 0]
+            if found:
+                interesting_devices = [(d.bus, d.dev, d.fun, f"{d.description} {d.vid:04X}:{d.did:04X}")
+                                       for d in found]
+        except Exception as e:
+            self.logger.log_warning(f"PCI enumeration failed, using fixed device list: {str(e)}")
+
+        cfg = self.snapshot()
+
         for bus, dev, func, desc in interesting_devices:
             try:
                 # Read device ID information
-                vid = self.cs.pci.read_word(bus, dev, func, 0x00)
-                did = self.cs.pci.read_word(bus, dev, func, 0x02)
+                vid = cfg.read_word(bus, dev, func, 0x00)
+                did = cfg.read_word(bus, dev, func, 0x02)
 
                 if vid != 0xFFFF:  # Valid device
                     self.logger.log(f"Scanning {desc}: VID=0x{vid:04X}, DID=0x{did:04X}")
@@ -1886,7 +2179,7 @@ class lpc_dma_h81_z390_test(BaseModule):
                     # Scan for non-standard registers in extended config space
                     # Standard config is 0x00-0x3F, but interesting stuff is often in 0x40-0xFF
                     for offset in range(0x40, 0x100, 4):
-                        val = self.cs.pci.read_dword(bus, dev, func, offset)
+                        val = cfg.read_dword(bus, dev, func, offset)
 
                         # Skip registers that are all 0 or all 1 (likely unused)
                         if val != 0 and val != 0xFFFFFFFF:
@@ -1904,59 +2197,22 @@ class lpc_dma_h81_z390_test(BaseModule):
         # Check Super I/O chips which might control legacy DMA
         self.logger.log("Scanning for Super I/O chips...")
 
-        # Common Super I/O config ports
-        sio_ports = [(0x2E, 0x2F), (0x4E, 0x4F)]
-
-        for idx_port, data_port in sio_ports:
-            try:
-                # Super I/O detection sequence
-                # Enter config mode
-                self.cs.io.write_port_byte(idx_port, 0x87)
-                self.cs.io.write_port_byte(idx_port, 0x01)
-                self.cs.io.write_port_byte(idx_port, 0x55)
-                self.cs.io.write_port_byte(idx_port, 0x55)
-
-                # Read chip ID
-                self.cs.io.write_port_byte(idx_port, 0x20)  # Select chip ID register
-                chip_id_high = self.cs.io.read_port_byte(data_port)
-
-                self.cs.io.write_port_byte(idx_port, 0x21)  # Select chip ID register + 1
-                chip_id_low = self.cs.io.read_port_byte(data_port)
-
-                chip_id = (chip_id_high << 8) | chip_id_low
-
-                if chip_id != 0xFF and chip_id != 0x00:
-                    self.logger.log(f"Found Super I/O chip: ID=0x{chip_id:04X}")
-
-                    # Check for DMA configuration registers
-                    # Specific registers depend on the chip
-                    logical_devices = 8  # Most Super I/O chips have up to 8 logical devices
-
-                    for ldn in range(logical_devices):
-                        # Select logical device
-                        self.cs.io.write_port_byte(idx_port, 0x07)
-                        self.cs.io.write_port_byte(data_port, ldn)
-
-                        # Read device ID
-                        self.cs.io.write_port_byte(idx_port, 0x30)
-                        dev_id = self.cs.io.read_port_byte(data_port)
-
-                        if dev_id != 0:
-                            self.logger.log(f"  Logical device {ldn}: ID=0x{dev_id:02X}")
-
-                            # Check for DMA channel assignment
-                            self.cs.io.write_port_byte(idx_port, 0x74)  # Common DMA channel register
-                            dma_chan = self.cs.io.read_port_byte(data_port)
-
-                            if dma_chan != 0:
-                                self.logger.log_warning(f"  Logical device {ldn} is using DMA channel {dma_chan}")
-
-                # Exit config mode
-                self.cs.io.write_port_byte(idx_port, 0x02)
-                self.cs.io.write_port_byte(data_port, 0x02)
+        # Only probe the config ports the LPC bridge forwards (LPC_EN CNF1/CNF2)
+        sio_ports = list(SUPERIO_CONFIG_PORTS)
+        try:
+            lpc_en = self.snapshot().read_dword(LPC_BUS, LPC_DEV, LPC_FUN, LPC_IOD_EN) >> 16
+            if lpc_en != 0xFFFF:
+                sio_ports = [port for port, bit in ((0x2E, 12), (0x4E, 13)) if lpc_en >> bit & 1]
+        except Exception as e:
+            self.logger.log(f"Could not read LPC_EN, probing both config ports: {str(e)}")
 
-            except Exception as e:
-                self.logger.log(f"Error accessing Super I/O at port 0x{idx_port:02X}: {str(e)}")
+        # One entry key per vendor per port, then every logical device's
+        # resources in a single pass
+        scanner = SuperIoScanner(self.cs.io, sio_ports)
+        for chip in scanner.scan():
+            chip.report(self.logger)
+        self.logger.log(f"Super I/O inventory used {scanner.accesses} port accesses "
+                        f"(ports {', '.join(f'0x{port:02X}' for port in sio_ports) or 'none'})")
 
         # Check legacy DMA controller I/O ports
         self.logger.log("Testing legacy DMA controller I/O ports...")
@@ -2016,66 +2272,193 @@ class lpc_dma_h81_z390_test(BaseModule):
         self.logger.log("# Check for Undocumented DMA over LPC Test")
         self.logger.log("##################################################")
 
+        profile_json = None
+        for arg in module_argv:
+            if arg.startswith('-profile-json='):
+                profile_json = arg.split('=', 1)[1]
+
+        # Time every phase and count the config/port accesses it issues, and
+        # the sleeps made here and inside the helpers that sleep on their own
+        helpers = [sys.modules[obj.__module__] for obj in (RegisterSampler, RegisterLogWriter, run_campaign, run_sweep)]
+        profiler = PhaseProfiler(self.cs, sys.modules[__name__], self.logger, helpers=helpers)
+        # Merge adjacent config reads; the DMA status register may clear on
+        # read, so every read of it reaches the hardware
+        with profiler, coalesced(self.cs, side_effects=[(LPC_BUS, LPC_DEV, LPC_FUN, H81_LPC_GEN_DMA_STAT)],
+                                 clock=time) as pci:
+            try:
+                dma_present, hidden_regs_found = self.run_phases(module_argv, profiler, pci)
+            finally:
+                # Release the ECAM mapping behind the shared config snapshot
+                if self.cfg is not None:
+                    self.cfg.close()
+
+        if self.phase_cache is not None:
+            self.phase_cache.save()
+            self.phase_cache.report(self.logger)
+
+        # Report the helper calls saved by the shared config snapshot and coalescing
+        if self.cfg is not None:
+            self.cfg.report(self.logger)
+        pci.report(self.logger)
+
+        profiler.report(self.logger)
+        if profile_json:
+            profiler.write_json(profile_json)
+            self.logger.log(f"[*] Phase profile written to {profile_json}")
+
+        # Final assessment
+        self.logger.log("\n[*] Test Results Summary:")
+
+        if dma_present:
+            self.logger.log_warning("Traditional 8237A DMA registers appear to respond")
+        else:
+            self.logger.log("Traditional 8237A DMA registers do not respond")
+
+        if hidden_regs_found:
+            self.logger.log_warning("Found potential hidden H81-style DMA registers in Z390")
+            self.logger.log_warning("Safe testing completed without attempting actual DMA transfers")
+            self.logger.log_warning("See log for detailed register analysis")
+            return ModuleResult.WARNING
+        else:
+            self.logger.log_good("No hidden H81-style DMA registers detected in Z390")
+            return ModuleResult.PASSED
+
+    def run_phases(self, module_argv, profiler, pci):
+        """
+        Run the test phases in order, each one timed by the profiler
+
+        The probe phases form a dependency graph (phase_scheduler.py) so that
+        with -parallel the ACPI work overlaps the hardware probes; the DMA
+        tests after them depend on the probe results and run in order.
+        Phases that trigger SMIs or sample registers over time pause read
+        coalescing (pci) so every read reaches the hardware.
+
+        Returns:
+            (dma_present, hidden_regs_found)
+        """
+        # Probe phases: the ACPI analysis only touches files and ranges mapped
+        # beforehand, so with -parallel it runs on a worker thread while the
+        # register and SMI probes keep the hardware to themselves
+        workers = 0
+        for arg in module_argv:
+            if arg == '-parallel':
+                workers = PARALLEL_WORKERS
+            elif arg.startswith('-parallel='):
+                try:
+                    workers = max(0, int(arg.split('=', 1)[1]))
+                except ValueError:
+                    pass
+        scheduler = PhaseScheduler(self, profiler, workers=workers, clock=time)
+
         # Verify we're running on a Z390 chipset
-        if not self.check_lpc_controller():
-            self.logger.log_error("Not running on a Z390 chipset")
-            self.logger.log_error("Not running on a Z390 chipset")
-            self.logger.log_error("Not running on a Z390 chipset")
-            # return ModuleResult.ERROR
+        def check_lpc_controller():
+            if not self.check_lpc_controller():
+                self.logger.log_error("Not running on a Z390 chipset")
+                self.logger.log_error("Not running on a Z390 chipset")
+                self.logger.log_error("Not running on a Z390 chipset")
+                # return ModuleResult.ERROR
+        scheduler.add("check_lpc_controller", check_lpc_controller)
+        probe_deps = ["check_lpc_controller"]
+
+        # Optional: replay probe phases on a platform tested before
+        cache_path = None
+        for arg in module_argv:
+            if arg == '-cache':
+                cache_path = PHASE_CACHE_FILE
+            elif arg.startswith('-cache='):
+                cache_path = arg.split('=', 1)[1]
+        if cache_path:
+            def fingerprint_platform():
+                fingerprint = platform_fingerprint(self.cs, self.snapshot(), store_dir=ACPI_STORE_DIR)
+                self.logger.log(f"[*] Platform fingerprint: LPC {fingerprint['lpc_id']}, "
+                                f"BIOS '{fingerprint['bios'] or 'unknown'}', ACPI {fingerprint['acpi'][:12] or 'unknown'}")
+                self.phase_cache = PhaseCache(cache_path, fingerprint)
+            scheduler.add("fingerprint_platform", fingerprint_platform, deps=probe_deps)
+            probe_deps = ["fingerprint_platform"]
 
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- test_traditional_dma_regs")
-        self.logger.log("##################################################")
         # Test if traditional 8237A DMA registers respond
-        dma_present = self.test_traditional_dma_regs()
-
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- test_h81_dma_registers")
-        self.logger.log("##################################################")
-        # Test for presence of H81-style hidden DMA registers
-        hidden_regs_found = self.test_h81_dma_registers()
+        scheduler.add("test_traditional_dma_regs", self.cached, "test_traditional_dma_regs",
+                      self.test_traditional_dma_regs, deps=probe_deps)
+
+        # Test for presence of H81-style hidden DMA registers (-probe-groups
+        # toggles whole bit groups instead of bit 0)
+        if '-probe-groups' in module_argv:
+            self.mask_schedule = GROUP_SCHEDULE
+        scheduler.add("test_h81_dma_registers", self.cached, "test_h81_dma_registers",
+                      self.test_h81_dma_registers, deps=probe_deps)
+
+        snapshot_store = None
+        for arg in module_argv:
+            if arg == '-snapshot':
+                snapshot_store = REGISTER_SNAPSHOT_STORE
+            elif arg.startswith('-snapshot='):
+                snapshot_store = arg.split('=', 1)[1]
+        if snapshot_store:
+            scheduler.add("snapshot_registers", self.snapshot_registers, snapshot_store, deps=probe_deps)
+
+        if '-map-masks' in module_argv:
+            scheduler.add("map_lpc_writable_masks", self.map_lpc_writable_masks, deps=probe_deps)
 
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- inspect_acpi_tables_minimal")
-        self.logger.log("##################################################")
         # Inspect ACPI tables for DMA-related entries
         # self.inspect_acpi_tables()
         # self.inspect_acpi_tables_safe()
         # Use simplified ACPI inspection that won't flood console
-        self.inspect_acpi_tables_minimal()
+        # It reads tables through cs.acpi (or acpidump), so it stays on the access lane
+        scheduler.add("inspect_acpi_tables_minimal", self.cached, "inspect_acpi_tables_minimal",
+                      self.inspect_acpi_tables_minimal, deps=probe_deps)
+
+        # MCFG, config space and the device table for the ACPI address map
+        scheduler.add("map_platform", self.map_platform, deps=probe_deps)
 
         # Then analyze the generated dump file
-        self.logger.log("##################################################")
-        self.logger.log("# Analyzing ACPI dump for DMA-related entries")
-        self.logger.log("##################################################")
-        dump_path = os.path.join("acpi_dumps", "acpi_dump.dat")
-        self.analyze_acpi_dump(dump_path)
+        def analyze_acpi_dump():
+            dump_path = os.path.join("acpi_dumps", "acpi_dump.dat")
+            if not os.path.exists(dump_path) or os.path.getsize(dump_path) == 0:
+                # The Linux fallback copies one file per table instead
+                dump_path = "acpi_dumps"
+            return self.cached("analyze_acpi_dump", self.analyze_acpi_dump, dump_path)
+        scheduler.add("analyze_acpi_dump", analyze_acpi_dump, deps=["inspect_acpi_tables_minimal", "map_platform"],
+                      lane=POOL_LANE)
 
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- inspect_smi_handlers")
-        self.logger.log("##################################################")
         # Inspect SMI handlers for potential DMA activity
-        self.inspect_smi_handlers()
+        scheduler.add("inspect_smi_handlers", self.cached, "inspect_smi_handlers", self.inspect_smi_handlers,
+                      deps=probe_deps, context=pci.paused())
 
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- scan_platform_specific_features")
-        self.logger.log("##################################################")
         # Scan for platform-specific features
-        self.scan_platform_specific_features()
+        scheduler.add("scan_platform_specific_features", self.cached, "scan_platform_specific_features",
+                      self.scan_platform_specific_features, deps=probe_deps)
 
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- inspect_smi_handlers_safe")
-        self.logger.log("##################################################")
         # Use enhanced SMI handler inspection
         # Causes total system freeze
         # self.inspect_smi_handlers_direct()
-        self.inspect_smi_handlers_safe()
+        scheduler.add("inspect_smi_handlers_safe", self.cached, "inspect_smi_handlers_safe",
+                      self.inspect_smi_handlers_safe, deps=probe_deps)
+
+        # Optional: sweep all APM SMI commands (fires SMIs - resumable)
+        if '-smi-sweep' in module_argv or any(arg.startswith('-smi-sweep=') for arg in module_argv):
+            # A small budget per run unless the whole sweep is asked for
+            max_smis = SMI_SWEEP_BUDGET
+            for arg in module_argv:
+                if arg == '-smi-sweep=all':
+                    max_smis = None
+                elif arg.startswith('-smi-sweep='):
+                    try:
+                        max_smis = int(arg.split('=')[1])
+                    except ValueError:
+                        pass
+            scheduler.add("sweep_smi_commands", lambda: self.sweep_smi_commands(max_smis=max_smis),
+                          deps=probe_deps, context=pci.paused())
 
-        self.logger.log("##################################################")
-        self.logger.log(f"TESTING --- scan_platform_specific_features_enhanced")
-        self.logger.log("##################################################")
         # Use enhanced platform-specific feature detection
-        self.scan_platform_specific_features_enhanced()
+        scheduler.add("scan_platform_specific_features_enhanced", self.cached,
+                      "scan_platform_specific_features_enhanced", self.scan_platform_specific_features_enhanced,
+                      deps=probe_deps)
+
+        results = scheduler.run()
+        if workers:
+            scheduler.report(self.logger)
+        dma_present = results["test_traditional_dma_regs"]
+        hidden_regs_found = results["test_h81_dma_registers"]
 
         # If we found potential DMA registers, analyze them safely
         if hidden_regs_found:
@@ -2083,23 +2466,39 @@ class lpc_dma_h81_z390_test(BaseModule):
             self.logger.log("    Proceeding with non-invasive analysis only to avoid system instability.")
 
             # Use safer methods instead of the original try_h81_dma_activation
+            with profiler.phase("safer_dma_test"):
+                self.cached("safer_dma_test", self.safer_dma_test)
 
-            self.logger.log("##################################################")
-            self.logger.log(f"TESTING --- safer_dma_test")
-            self.logger.log("##################################################")
-            self.safer_dma_test()
-
-            self.logger.log("##################################################")
-            self.logger.log(f"TESTING --- safer_dma_test_two")
-            self.logger.log("##################################################")
-            self.safer_dma_test_two()
+            with profiler.phase("safer_dma_test_two"):
+                self.cached("safer_dma_test_two", self.safer_dma_test_two)
 
-            self.logger.log("##################################################")
-            self.logger.log(f"TESTING --- monitor_dma_during_system_events")
-            self.logger.log("##################################################")
             # Optional: Monitor system events if user wants
             # if '-monitor' in module_argv:
-            self.monitor_dma_during_system_events()
+            # -workloads[=disk,net,...] drives built-in workloads instead of asking the user
+            workloads = None
+            workload_time = 5.0
+            poll_rate = None  # Sleep-based default unless -poll-rate=N asks for more (0 = busy-poll)
+            for arg in module_argv:
+                if arg == '-workloads':
+                    workloads = []
+                elif arg.startswith('-workloads='):
+                    workloads = arg.split('=')[1].split(',')
+                elif arg.startswith('-workload-time='):
+                    try:
+                        workload_time = float(arg.split('=')[1])
+                    except ValueError:
+                        pass
+                elif arg.startswith('-poll-rate='):
+                    try:
+                        poll_rate = float(arg.split('=')[1])
+                    except ValueError:
+                        pass
+            if workloads is not None:
+                with profiler.phase("monitor_dma_during_workloads"), pci.paused():
+                    self.monitor_dma_during_workloads(workloads, workload_time, poll_rate)
+            else:
+                with profiler.phase("monitor_dma_during_system_events"), pci.paused():
+                    self.monitor_dma_during_system_events()
 
             # Optional: Poll registers if user wants
             # if '-poll' in module_argv:
@@ -2110,26 +2509,16 @@ class lpc_dma_h81_z390_test(BaseModule):
                         poll_duration = int(arg.split('=')[1])
                     except:
                         pass
-            self.poll_dma_registers(duration=poll_duration)
+            with profiler.phase("poll_dma_registers"), pci.paused():
+                self.poll_dma_registers(duration=poll_duration, rate=POLL_RATE if poll_rate is None else poll_rate)
 
-            self.logger.log("##################################################")
-            self.logger.log(f"TESTING --- monitor_dma_registers_long_term")
-            self.logger.log("##################################################")
-            self.monitor_dma_registers_long_term("monitor_dma_registers_long_term.log")
-
-        # Final assessment
-        self.logger.log("\n[*] Test Results Summary:")
-
-        if dma_present:
-            self.logger.log_warning("Traditional 8237A DMA registers appear to respond")
-        else:
-            self.logger.log("Traditional 8237A DMA registers do not respond")
+            with profiler.phase("monitor_dma_registers_long_term"), pci.paused():
+                trace_files = self.monitor_dma_registers_long_term("monitor_dma_registers_long_term.dmalog")
+            for arg in module_argv:
+                if arg.startswith('-trace='):
+                    trace_files = arg.split('=')[1].split(',')
+            if trace_files:
+                with profiler.phase("analyze_dma_trace"):
+                    self.analyze_dma_trace(trace_files)
 
-        if hidden_regs_found:
-            self.logger.log_warning("Found potential hidden H81-style DMA registers in Z390")
-            self.logger.log_warning("Safe testing completed without attempting actual DMA transfers")
-            self.logger.log_warning("See log for detailed register analysis")
-            return ModuleResult.WARNING
-        else:
-            self.logger.log_good("No hidden H81-style DMA registers detected in Z390")
-            return ModuleResult.PASSED
+        return dma_present, hidden_regs_found
@@ -3,6 +3,12 @@
 from chipsec.module_common import BaseModule, ModuleResult
 import time
 
+try:
+    from chipsec.modules.common.reg_mask_probe import (DEFAULT_SCHEDULE, GROUP_SCHEDULE, LPC_PROTECTED_DWORDS,
+                                                       MaskStore, discover_masks)
+except ImportError:
+    from reg_mask_probe import DEFAULT_SCHEDULE, GROUP_SCHEDULE, LPC_PROTECTED_DWORDS, MaskStore, discover_masks
+
 # Intel 8237 DMA Controller Registers
 DMA1_BASE = 0x00  # First DMA controller (8-bit channels)
 DMA2_BASE = 0xC0  # Second DMA controller (16-bit channels)
@@ -74,6 +80,8 @@ LPC_REG_GEN_DMAADR = 0xDC  # General DMA Address
 class lpc_dma_z390_test(BaseModule):
     def __init__(self):
         BaseModule.__init__(self)
+        # Bit 0 only unless -probe-groups asks for full RW/RO masks
+        self.mask_schedule = DEFAULT_SCHEDULE
 
     def is_supported(self):
         return True
@@ -151,6 +159,7 @@ class lpc_dma_z390_test(BaseModule):
 
         # Look for potential LPC DMA registers (focusing on D0-E0 range)
         found_suspicious_regs = False
+        mask_store = MaskStore()
         for reg_offset in range(0xD0, 0xE8, 4):
             try:
                 reg_val = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset)
@@ -159,21 +168,21 @@ class lpc_dma_z390_test(BaseModule):
                         reg_offset, reg_val))
                     found_suspicious_regs = True
 
-                    # Try to modify the register to see if it's writable
-                    # Be careful - only toggle the low bit to avoid damaging the system
-                    test_val = reg_val ^ 0x1  # Toggle the lowest bit only
-                    old_val = reg_val
-
-                    self.cs.pci.write_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset, test_val)
-                    # Read back to see if the change took effect
-                    readback = self.cs.pci.read_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset)
-
-                    # Restore original value
-                    self.cs.pci.write_dword(LPC_BUS, LPC_DEV, LPC_FUN, reg_offset, old_val)
-
-                    if readback == test_val:
-                        self.logger.log_bad("Register at 0x{:02X} is writable! Possible DMA control register.".format(
-                            reg_offset))
+                    # Work out which bits are writable, restoring after every
+                    # step (stored masks are reused without writing)
+                    if reg_offset in LPC_PROTECTED_DWORDS:
+                        self.logger.log("Register at 0x{:02X} ({}) is protected - not written".format(
+                            reg_offset, LPC_PROTECTED_DWORDS[reg_offset]))
+                        continue
+                    mask = discover_masks(self.cs.pci, LPC_BUS, LPC_DEV, LPC_FUN, [reg_offset],
+                                          mask_store, LPC_PROTECTED_DWORDS, schedule=self.mask_schedule)[0]
+
+                    if mask.rw:
+                        self.logger.log_bad("Register at 0x{:02X} is writable! Possible DMA control register. ({})".format(
+                            reg_offset, mask.describe()))
+                    if mask.sticky:
+                        self.logger.log_bad("Register at 0x{:02X} did not restore - bits 0x{:08X} stuck".format(
+                            reg_offset, mask.sticky))
             except Exception as e:
                 self.logger.log_error("Error testing register 0x{:02X}: {}".format(reg_offset, str(e)))
 
@@ -243,6 +252,10 @@ class lpc_dma_z390_test(BaseModule):
         self.logger.log("# Checks for undocumented DMA capabilities over LPC")
         self.logger.log("##################################################")
 
+        # -probe-groups toggles whole bit groups of the unprotected registers
+        if '-probe-groups' in module_argv:
+            self.mask_schedule = GROUP_SCHEDULE
+
         # Check which channels might have been active (have residue)
         has_dma_residue = False
         for channel in [0, 1, 2, 3, 5, 6, 7]:  # Skip channel 4 (cascade)
@@ -0,0 +1,312 @@
+"""
+PCI Configuration Space Snapshot
+================================
+Captures the configuration space of a PCI function once and serves every
+subsequent read-only register query from memory.
+
+Every cs.pci.read_* call is a kernel round trip through the CHIPSEC helper.
+The LPC checks read the same handful of dwords (0:31:0 0xD0-0xE0, 0:0:0 0xB8,
+...) over and over, so a snapshot taken at the start of a read-only phase
+answers all of them for the cost of one pass over each function.
+
+When the firmware MCFG table and /dev/mem are available the ECAM window is
+mapped directly (see ecam_reader.py) and captures cost no helper calls at
+all. Otherwise, when the host bridge exposes an enabled PCIEXBAR and the chipset object
+offers cs.mem.read_physical_mem, each function is captured with a single
+bulk read of its ECAM window instead of 64 (or 1024) dword reads.
+
+Writes are never routed through the snapshot. Code that modifies registers
+keeps using cs.pci directly and calls refresh() afterwards so later read-only
+checks see the new state.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+"""
+
+from typing import Callable, Dict, Optional, Set, Tuple
+
+try:
+    from chipsec.modules.common.ecam_reader import EcamReader
+except ImportError:
+    from ecam_reader import EcamReader
+
+# Standard PCI and PCIe extended configuration space sizes
+PCI_CFG_SIZE = 0x100
+PCIE_CFG_SIZE = 0x1000
+
+# Intel host bridge PCI Express base address register (0:0:0)
+HOST_BRIDGE_PCIEXBAR = 0x60
+
+Bdf = Tuple[int, int, int]
+
+
+def pciexbar_reader(cs) -> Optional[Callable]:
+    """
+    Build a bulk config-space reader from the host bridge PCIEXBAR
+
+    Returns a reader(bus, dev, fun, size) -> bytes that fetches a function's
+    ECAM window with one cs.mem.read_physical_mem call, or None if PCIEXBAR
+    is disabled or physical memory reads are not available.
+    """
+    if not hasattr(cs, 'mem') or not hasattr(cs.mem, 'read_physical_mem'):
+        return None
+
+    try:
+        lo = cs.pci.read_dword(0, 0, 0, HOST_BRIDGE_PCIEXBAR)
+        hi = cs.pci.read_dword(0, 0, 0, HOST_BRIDGE_PCIEXBAR + 4)
+    except Exception:
+        return None
+
+    if lo == 0xFFFFFFFF or not (lo & 0x1):
+        return None
+
+    # Bits 2:1 select the window length: 256MB, 128MB or 64MB
+    length = {0: 256, 1: 128, 2: 64}.get((lo >> 1) & 0x3)
+    if length is None:
+        return None
+
+    base = ((hi & 0x7F) << 32) | (lo & 0xFC000000)
+    base &= ~((length << 20) - 1)
+    max_bus = length - 1
+
+    def reader(bus, dev, fun, size):
+        if bus > max_bus:
+            raise ValueError(f"Bus {bus} outside the {length}MB ECAM window")
+        return cs.mem.read_physical_mem(base + ((bus << 20) | (dev << 15) | (fun << 12)), size)
+
+    # Remember the window so callers can report it
+    reader.base = base
+    reader.size = length << 20
+    return reader
+
+
+class ConfigSpaceSnapshot(object):
+    """
+    In-memory copy of PCI configuration space, captured per function.
+
+    With a bulk reader every function is captured whole on first access (one
+    helper call) once its vendor ID dword shows something answers, so an
+    absent function costs a 4-byte read instead of a full capture. Without
+    one, dwords are memoized as they are first read so the snapshot never
+    costs more helper calls than reading live would;
+    capture() still walks a full function when a complete image is wanted.
+    Cached values stay in place until refresh() or invalidate() is called.
+
+    The snapshot exposes the same read_byte/read_word/read_dword interface as
+    cs.pci so it can be used as a drop-in replacement for read-only code paths.
+
+    Args:
+        cs: CHIPSEC chipset object (anything with a cs.pci.read_dword)
+        size: Default number of bytes captured per function
+        reader: Optional bulk reader(bus, dev, fun, size) -> bytes used instead
+                of per-dword reads (e.g. an ECAM mapping)
+    """
+
+    def __init__(self, cs, size: int = PCI_CFG_SIZE, reader: Optional[Callable] = None):
+        self.cs = cs
+        self.size = size
+        self.reader = reader
+        self._spaces: Dict[Bdf, bytearray] = {}
+        # Dword offsets read so far per function; None once fully captured
+        self._valid: Dict[Bdf, Optional[Set[int]]] = {}
+
+        # Accounting: reads requested, reads answered from memory and calls
+        # actually made to the helper
+        self.requested_reads = 0
+        self.served_reads = 0
+        self.helper_calls = 0
+        self._released_mode = None
+
+    @classmethod
+    def from_chipset(cls, cs):
+        """
+        Build a snapshot for this chipset, capturing the full 4 KB extended
+        space through the ECAM window when a bulk reader is available and
+        falling back to memoized dword reads otherwise
+        """
+        snapshot = cls(cs)
+
+        # Prefer a direct mapping of the MCFG window, then the helper's
+        # physical memory reads through PCIEXBAR
+        reader = EcamReader.from_system()
+        if reader is None:
+            reader = pciexbar_reader(cs)
+            if hasattr(cs, 'mem') and hasattr(cs.mem, 'read_physical_mem'):
+                # PCIEXBAR discovery itself costs two helper reads
+                snapshot.helper_calls += 2
+
+        if reader is not None:
+            snapshot.reader = reader
+            snapshot.size = PCIE_CFG_SIZE
+        return snapshot
+
+    def _read_live(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        self.helper_calls += 1
+        return self.cs.pci.read_dword(bus, dev, fun, offset)
+
+    def _probe(self, bus: int, dev: int, fun: int) -> bool:
+        """Whether a function answers, from its vendor ID dword read through the bulk reader"""
+        self.helper_calls += getattr(self.reader, 'calls_per_capture', 1)
+        return int.from_bytes(self.reader(bus, dev, fun, 4), 'little') != 0xFFFFFFFF
+
+    def capture(self, bus: int, dev: int, fun: int, size: Optional[int] = None) -> bytes:
+        """
+        Capture one function's configuration space in a single pass
+
+        Args:
+            bus, dev, fun: PCI function to capture
+            size: Bytes to capture (defaults to the snapshot size)
+
+        Returns:
+            The captured configuration space as bytes
+        """
+        size = size or self.size
+
+        if self.reader is not None:
+            self.helper_calls += getattr(self.reader, 'calls_per_capture', 1)
+            buf = bytearray(self.reader(bus, dev, fun, size))
+        else:
+            first = self._read_live(bus, dev, fun, 0x00)
+
+            # A missing function reads back all 1s - don't walk the rest of it
+            buf = bytearray(b'\xFF' * size)
+            if first != 0xFFFFFFFF:
+                buf[0:4] = first.to_bytes(4, 'little')
+                for offset in range(4, size, 4):
+                    buf[offset:offset + 4] = self._read_live(bus, dev, fun, offset).to_bytes(4, 'little')
+
+        self._spaces[(bus, dev, fun)] = buf
+        self._valid[(bus, dev, fun)] = None
+        return bytes(buf)
+
+    def close(self):
+        """
+        Release the bulk reader (an ECAM mapping stays open until then).
+        Captured data stays readable; later captures use dword reads.
+        """
+        if self.reader is None:
+            return
+        close = getattr(self.reader, 'close', None)
+        if close is not None:
+            close()
+        self._released_mode = self.mode
+        self.reader = None
+        self.size = PCI_CFG_SIZE
+
+    @property
+    def mode(self) -> str:
+        """How functions are captured (the released bulk reader after close())"""
+        if self.reader is not None:
+            return getattr(self.reader, 'name', "ECAM bulk reads")
+        return self._released_mode or "memoized dword reads"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self, bus: Optional[int] = None, dev: Optional[int] = None, fun: Optional[int] = None):
+        """
+        Explicit refresh point - re-read one function, or every cached
+        function when called without arguments. Partially memoized functions
+        only re-read the dwords that were cached.
+        """
+        if bus is None:
+            targets = list(self._spaces)
+        elif (bus, dev, fun) in self._spaces:
+            targets = [(bus, dev, fun)]
+        else:
+            return
+
+        for bdf in targets:
+            valid = self._valid[bdf]
+            if valid is None:
+                self.capture(*bdf, size=len(self._spaces[bdf]))
+            else:
+                space = self._spaces[bdf]
+                for offset in sorted(valid):
+                    space[offset:offset + 4] = self._read_live(*bdf, offset).to_bytes(4, 'little')
+
+    def invalidate(self, bus: Optional[int] = None, dev: Optional[int] = None, fun: Optional[int] = None):
+        """Drop a cached function (or all of them) so the next read recaptures it"""
+        if bus is None:
+            self._spaces.clear()
+            self._valid.clear()
+        else:
+            self._spaces.pop((bus, dev, fun), None)
+            self._valid.pop((bus, dev, fun), None)
+
+    def config_space(self, bus: int, dev: int, fun: int) -> bytes:
+        """Return the complete configuration space, capturing it if needed"""
+        if self._valid.get((bus, dev, fun), ()) is not None:
+            return self.capture(bus, dev, fun)
+        return bytes(self._spaces[(bus, dev, fun)])
+
+    def functions(self):
+        """B/D/F tuples currently held in the snapshot"""
+        return list(self._spaces)
+
+    def is_present(self, bus: int, dev: int, fun: int) -> bool:
+        return self.read_word(bus, dev, fun, 0x00) != 0xFFFF
+
+    def _read(self, bus: int, dev: int, fun: int, offset: int, width: int) -> int:
+        self.requested_reads += 1
+        bdf = (bus, dev, fun)
+
+        space = self._spaces.get(bdf)
+        if space is None:
+            if self.reader is not None and self._probe(bus, dev, fun):
+                self.capture(bus, dev, fun)
+            elif self.reader is not None:
+                # Nothing answers - every read returns all 1s
+                self._spaces[bdf] = bytearray(b'\xFF' * self.size)
+                self._valid[bdf] = None
+            else:
+                self._spaces[bdf] = bytearray(b'\xFF' * self.size)
+                self._valid[bdf] = set()
+            space = self._spaces[bdf]
+
+        aligned = offset & ~0x3
+        shift = (offset - aligned) * 8
+        mask = (1 << (width * 8)) - 1
+
+        if offset + width > len(space):
+            # Beyond the captured window (e.g. extended space on a 256-byte
+            # snapshot) - fall back to a live read of the containing dword
+            return (self._read_live(bus, dev, fun, aligned) >> shift) & mask
+
+        valid = self._valid[bdf]
+        if valid is not None and aligned not in valid:
+            dword = self._read_live(bus, dev, fun, aligned)
+            space[aligned:aligned + 4] = dword.to_bytes(4, 'little')
+            valid.add(aligned)
+
+            # Dword 0 all 1s means nothing answers at this B/D/F
+            if aligned == 0 and dword == 0xFFFFFFFF:
+                self._valid[bdf] = None
+            return (dword >> shift) & mask
+
+        self.served_reads += 1
+        return int.from_bytes(space[offset:offset + width], 'little')
+
+    def read_byte(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._read(bus, dev, fun, offset, 1)
+
+    def read_word(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._read(bus, dev, fun, offset, 2)
+
+    def read_dword(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._read(bus, dev, fun, offset, 4)
+
+    @property
+    def saved_calls(self) -> int:
+        """Helper calls avoided compared to issuing one helper call per read"""
+        return self.requested_reads - self.helper_calls
+
+    def report(self, logger):
+        """Log the reads requested, the helper calls issued and the calls removed this run"""
+        logger.log(f"[*] Config snapshot: {len(self._spaces)} function(s) via {self.mode}, "
+                   f"{self.requested_reads} reads requested, {self.served_reads} served from memory, "
+                   f"{self.helper_calls} helper calls issued")
+        if self.saved_calls > 0:
+            logger.log_good(f"Snapshot removed {self.saved_calls} helper call(s) compared to one call per read")
@@ -0,0 +1,250 @@
+"""
+Read-Coalescing PCI Proxy
+=========================
+Stands in for cs.pci on live code paths and merges adjacent config reads:
+
+- byte and word reads are served from one aligned dword read, so VID/DID
+  read as two words or class/subclass as two bytes cost one transaction
+- a read of the dword right after the previous one in the same function
+  starts a burst: the next dwords are fetched with one bulk read (ECAM
+  mapping or one cs.mem.read_physical_mem through PCIEXBAR) and the following
+  sequential reads are answered from it
+- fetched dwords are only reused within a short window (1 ms by default) -
+  unlike ConfigSpaceSnapshot this is not a long-lived cache
+
+Registers marked side-effecting (read-to-clear status, FIFOs, ...) keep their
+exact semantics: every read of them is passed through at the requested width
+and they are never fetched as part of a burst. Writes are always passed
+through and drop everything cached for that function. While paused() the
+proxy passes every read through, e.g. for sampling loops that must see each
+read hit the hardware.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    with coalesced(self.cs, side_effects=[(0, 0x1F, 0, 0xD4)]) as pci:
+        ...
+        with pci.paused():
+            self.poll_dma_registers()
+    pci.report(self.logger)
+"""
+
+import contextlib
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    from chipsec.modules.common.ecam_reader import EcamReader
+    from chipsec.modules.common.pci_cfg_snapshot import pciexbar_reader
+except ImportError:
+    from ecam_reader import EcamReader
+    from pci_cfg_snapshot import pciexbar_reader
+
+# How long a fetched dword may be reused
+WINDOW_NS = 1000000
+
+# Dwords fetched by one bulk read once reads turn sequential
+BURST_DWORDS = 8
+
+PCIE_CFG_SIZE = 0x1000
+
+READ_METHODS = {1: 'read_byte', 2: 'read_word', 4: 'read_dword'}
+
+Bdf = Tuple[int, int, int]
+
+
+def bulk_range_reader(cs) -> Optional[Callable]:
+    """
+    Build a read_range(bus, dev, fun, offset, length) -> bytes for bursts
+
+    Prefers a direct mapping of the MCFG window, then one physical memory
+    read through the host bridge PCIEXBAR; None when neither is available.
+    """
+    ecam = EcamReader.from_system()
+    if ecam is not None:
+        def read_range(bus, dev, fun, offset, length):
+            # Dword loads only - wide MMIO reads of config space are not safe
+            return ecam.copy_range(bus, dev, fun, offset, length)
+        read_range.close = ecam.close
+        return read_range
+
+    window = pciexbar_reader(cs)
+    if window is None:
+        return None
+
+    def read_range(bus, dev, fun, offset, length):
+        address = ((bus << 20) | (dev << 15) | (fun << 12)) + offset
+        if address + length > window.size:
+            raise ValueError(f"{bus:02X}:{dev:02X}.{fun:X} outside the ECAM window")
+        return cs.mem.read_physical_mem(window.base + address, length)
+    return read_range
+
+
+class CoalescingPci(object):
+    """
+    cs.pci proxy merging adjacent reads into dword and burst reads
+
+    Args:
+        pci: The real cs.pci (anything with read_dword/write_* methods)
+        range_reader: Optional read_range(bus, dev, fun, offset, length) used for bursts
+        side_effects: (bus, dev, fun, offset) of registers whose reads must not be merged
+        window_ns: How long fetched values are reused
+        burst: Dwords fetched per burst
+        clock: Module providing monotonic_ns() (the caller's time module)
+
+    Every attribute other than the read/write methods comes from pci.
+    """
+
+    def __init__(self, pci, range_reader: Optional[Callable] = None,
+                 side_effects: Iterable[Tuple[int, int, int, int]] = (), window_ns: int = WINDOW_NS,
+                 burst: int = BURST_DWORDS, clock=time):
+        self.pci = pci
+        self.range_reader = range_reader
+        self.window_ns = window_ns
+        self.burst = burst
+        self.clock = clock
+        self.side_effects: Set[Tuple[int, int, int, int]] = set()
+        for bus, dev, fun, offset in side_effects:
+            self.mark_side_effecting(bus, dev, fun, offset)
+
+        # Per function: dword offset -> (value, expiry)
+        self._cache: Dict[Bdf, Dict[int, Tuple[int, int]]] = {}
+        # Last dword offset read per function, to spot sequential walks
+        self._last: Dict[Bdf, int] = {}
+        self._paused = 0
+
+        # Accounting: reads requested by callers, reads issued to the
+        # hardware (bursts count once) and reads passed through unmerged
+        self.requested_reads = 0
+        self.transactions = 0
+        self.bursts = 0
+        self.passed_through = 0
+
+    def mark_side_effecting(self, bus: int, dev: int, fun: int, offset: int, length: int = 4):
+        for dword in range(offset & ~3, offset + length, 4):
+            self.side_effects.add((bus, dev, fun, dword))
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Pass every read straight through for the duration of the block"""
+        self._paused += 1
+        try:
+            yield self
+        finally:
+            self._paused -= 1
+
+    def flush(self, bus: Optional[int] = None, dev: Optional[int] = None, fun: Optional[int] = None):
+        """Forget fetched values for one function, or all of them"""
+        if bus is None:
+            self._cache.clear()
+            self._last.clear()
+        else:
+            self._cache.pop((bus, dev, fun), None)
+            self._last.pop((bus, dev, fun), None)
+
+    def _burst_length(self, bdf: Bdf, dword: int) -> int:
+        count = 0
+        while (count < self.burst and dword + count * 4 < PCIE_CFG_SIZE
+               and (*bdf, dword + count * 4) not in self.side_effects):
+            count += 1
+        return count
+
+    def _fetch(self, bdf: Bdf, dword: int) -> int:
+        now = self.clock.monotonic_ns()
+        cache = self._cache.setdefault(bdf, {})
+        cached = cache.get(dword)
+        if cached is not None and now < cached[1]:
+            return cached[0]
+
+        expiry = now + self.window_ns
+        count = self._burst_length(bdf, dword) if self._last.get(bdf) == dword - 4 else 1
+        self.transactions += 1
+        if count > 1 and self.range_reader is not None:
+            try:
+                data = self.range_reader(*bdf, dword, count * 4)
+            except Exception:
+                data = None
+            if data is not None and len(data) == count * 4:
+                self.bursts += 1
+                for i in range(count):
+                    cache[dword + i * 4] = (int.from_bytes(data[i * 4:i * 4 + 4], 'little'), expiry)
+                return cache[dword][0]
+
+        value = self.pci.read_dword(*bdf, dword)
+        cache[dword] = (value, expiry)
+        return value
+
+    def _read(self, bus: int, dev: int, fun: int, offset: int, width: int) -> int:
+        self.requested_reads += 1
+        bdf = (bus, dev, fun)
+        first = offset & ~3
+        last = (offset + width - 1) & ~3
+
+        if self._paused or (*bdf, first) in self.side_effects or (*bdf, last) in self.side_effects:
+            self.transactions += 1
+            self.passed_through += 1
+            self._last[bdf] = last
+            return getattr(self.pci, READ_METHODS[width])(bus, dev, fun, offset)
+
+        value = 0
+        for i, dword in enumerate(range(first, last + 4, 4)):
+            value |= self._fetch(bdf, dword) << (32 * i)
+            self._last[bdf] = dword
+        return (value >> (8 * (offset - first))) & ((1 << (8 * width)) - 1)
+
+    def read_byte(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._read(bus, dev, fun, offset, 1)
+
+    def read_word(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._read(bus, dev, fun, offset, 2)
+
+    def read_dword(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        return self._read(bus, dev, fun, offset, 4)
+
+    def _write(self, method: str, bus: int, dev: int, fun: int, offset: int, value: int):
+        # A write may change any register of the function, not just this one
+        self.flush(bus, dev, fun)
+        return getattr(self.pci, method)(bus, dev, fun, offset, value)
+
+    def write_byte(self, bus: int, dev: int, fun: int, offset: int, value: int):
+        return self._write('write_byte', bus, dev, fun, offset, value)
+
+    def write_word(self, bus: int, dev: int, fun: int, offset: int, value: int):
+        return self._write('write_word', bus, dev, fun, offset, value)
+
+    def write_dword(self, bus: int, dev: int, fun: int, offset: int, value: int):
+        return self._write('write_dword', bus, dev, fun, offset, value)
+
+    def __getattr__(self, name):
+        return getattr(self.pci, name)
+
+    @property
+    def saved_transactions(self) -> int:
+        return self.requested_reads - self.transactions
+
+    def report(self, logger):
+        logger.log(f"[*] PCI read coalescing: {self.requested_reads} reads requested, {self.transactions} issued "
+                   f"({self.bursts} burst(s), {self.passed_through} passed through)")
+        if self.saved_transactions > 0:
+            logger.log_good(f"Read coalescing saved {self.saved_transactions} config transactions")
+
+
+@contextlib.contextmanager
+def coalesced(cs, side_effects: Iterable[Tuple[int, int, int, int]] = (), **kwargs):
+    """
+    Route cs.pci through a CoalescingPci for the duration of the block
+
+    Extra keyword arguments go to CoalescingPci (window_ns, burst, clock).
+    """
+    original = cs.pci
+    proxy = CoalescingPci(original, side_effects=side_effects, **kwargs)
+    cs.pci = proxy
+    try:
+        # Built after installing the proxy so PCIEXBAR discovery is accounted for
+        proxy.range_reader = bulk_range_reader(cs)
+        yield proxy
+    finally:
+        cs.pci = original
+        close = getattr(proxy.range_reader, 'close', None)
+        if close is not None:
+            close()
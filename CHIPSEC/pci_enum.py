@@ -0,0 +1,446 @@
+"""
+PCI Hierarchy Enumerator
+========================
+Walks every PCI domain, bus and function once and builds a device table
+indexed by B/D/F, vendor/device ID and class code, so modules can look up
+the LPC bridge, the IT8893 PCIe-to-PCI bridge or the IT8888F PCI-to-ISA
+bridge instead of probing fixed B/D/F tuples.
+
+Sources, in order of preference:
+- Linux sysfs (/sys/bus/pci/devices): every domain, config headers read by
+  a thread pool, no CHIPSEC helper calls
+- Any object with read_dword(bus, dev, fun, offset) - cs.pci, a
+  ConfigSpaceSnapshot or an EcamReader - walking domain 0 from bus 0 and
+  following bridge secondary bus numbers. Every other PCI segment in MCFG
+  is walked the same way from its first bus, through physical memory reads
+  of its ECAM window (mcfg_segments())
+
+The table is cached on disk as JSON together with a topology fingerprint.
+A cached table is reused only while the fingerprint still matches: the
+sysfs device list, or (without sysfs) dword 0 of every cached function and
+of every slot on each bus known to hold devices (bus 0, the buses of the
+cached functions and the bridges' secondary buses), in every segment.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python pci_enum.py
+    python pci_enum.py --class 0601 --id 1283:8893
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from chipsec.modules.common.ecam_reader import ECAM_FUNCTION_SIZE, parse_mcfg
+except ImportError:
+    from ecam_reader import ECAM_FUNCTION_SIZE, parse_mcfg
+
+SYSFS_PCI_DEVICES = '/sys/bus/pci/devices'
+DEFAULT_CACHE = 'pci_device_table.json'
+CACHE_VERSION = 1
+
+# Header bytes needed for the table (IDs, class, header type, bus numbers)
+HEADER_SIZE = 0x40
+
+# Devices the LPC/ISA DMA work cares about
+ITE_VID = 0x1283
+IT8893_DID = 0x8893
+IT8888_DID = 0x8888
+
+CLASS_HOST_BRIDGE = (0x06, 0x00)
+CLASS_ISA_BRIDGE = (0x06, 0x01)
+CLASS_PCI_BRIDGE = (0x06, 0x04)
+
+CLASS_NAMES = {
+    (0x01, None): "Mass Storage",
+    (0x02, None): "Network",
+    (0x03, None): "Display",
+    (0x04, None): "Multimedia",
+    (0x05, None): "Memory Controller",
+    (0x06, 0x00): "Host Bridge",
+    (0x06, 0x01): "ISA/LPC Bridge",
+    (0x06, 0x04): "PCI Bridge",
+    (0x06, None): "Bridge",
+    (0x07, None): "Communication",
+    (0x08, None): "System Peripheral",
+    (0x0C, 0x03): "USB Controller",
+    (0x0C, 0x05): "SMBus Controller",
+    (0x0C, None): "Serial Bus",
+}
+
+
+class PciDevice(NamedTuple):
+    domain: int
+    bus: int
+    dev: int
+    fun: int
+    vid: int
+    did: int
+    class_code: int
+    revision: int
+    header_type: int
+    secondary_bus: Optional[int] = None
+
+    @property
+    def bdf(self) -> Tuple[int, int, int]:
+        return self.bus, self.dev, self.fun
+
+    @property
+    def base_class(self) -> int:
+        return self.class_code >> 16
+
+    @property
+    def sub_class(self) -> int:
+        return (self.class_code >> 8) & 0xFF
+
+    @property
+    def description(self) -> str:
+        return (CLASS_NAMES.get((self.base_class, self.sub_class))
+                or CLASS_NAMES.get((self.base_class, None))
+                or f"Class {self.class_code:06X}")
+
+    def __str__(self):
+        return (f"{self.domain:04X}:{self.bus:02X}:{self.dev:02X}.{self.fun:X} "
+                f"{self.vid:04X}:{self.did:04X} {self.description}")
+
+
+def _parse_header(domain: int, bus: int, dev: int, fun: int, header: bytes) -> Optional[PciDevice]:
+    vid, did = struct.unpack_from('<HH', header, 0)
+    if vid == 0xFFFF:
+        return None
+
+    revision_class = struct.unpack_from('<I', header, 0x08)[0]
+    header_type = header[0x0E] & 0x7F
+    secondary = header[0x19] if header_type == 1 and len(header) > 0x19 else None
+    return PciDevice(domain, bus, dev, fun, vid, did, revision_class >> 8, revision_class & 0xFF,
+                     header_type, secondary)
+
+
+class DeviceTable(object):
+    """
+    Enumerated PCI functions with lookups by B/D/F, ID and class
+
+    Args:
+        devices: PciDevice entries
+        fingerprint: Topology fingerprint the table was built against
+        source: Where the table came from ('sysfs', 'chipset' or 'cache')
+    """
+
+    def __init__(self, devices: List[PciDevice], fingerprint: str = '', source: str = ''):
+        self.devices = sorted(devices)
+        self.fingerprint = fingerprint
+        self.source = source
+
+        self._by_bdf: Dict[Tuple[int, int, int, int], PciDevice] = {}
+        self._by_id: Dict[Tuple[int, int], List[PciDevice]] = {}
+        self._by_class: Dict[Tuple[int, int], List[PciDevice]] = {}
+        for device in self.devices:
+            self._by_bdf[(device.domain,) + device.bdf] = device
+            self._by_id.setdefault((device.vid, device.did), []).append(device)
+            self._by_class.setdefault((device.base_class, device.sub_class), []).append(device)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def get(self, bus: int, dev: int, fun: int, domain: int = 0) -> Optional[PciDevice]:
+        return self._by_bdf.get((domain, bus, dev, fun))
+
+    def find_id(self, vid: int, did: Optional[int] = None) -> List[PciDevice]:
+        """Functions matching a vendor ID, optionally narrowed to a device ID"""
+        if did is not None:
+            return list(self._by_id.get((vid, did), []))
+        return [d for d in self.devices if d.vid == vid]
+
+    def find_class(self, base_class: int, sub_class: Optional[int] = None) -> List[PciDevice]:
+        """Functions matching a base class, optionally narrowed to a subclass"""
+        if sub_class is not None:
+            return list(self._by_class.get((base_class, sub_class), []))
+        return [d for d in self.devices if d.base_class == base_class]
+
+    def lpc_bridge(self) -> Optional[PciDevice]:
+        """The chipset LPC/ISA bridge (the first class 06/01 function on domain 0)"""
+        bridges = [d for d in self.find_class(*CLASS_ISA_BRIDGE) if d.domain == 0]
+        return bridges[0] if bridges else None
+
+    def it8893_bridges(self) -> List[PciDevice]:
+        return self.find_id(ITE_VID, IT8893_DID)
+
+    def it8888_bridges(self) -> List[PciDevice]:
+        return self.find_id(ITE_VID, IT8888_DID)
+
+    def to_json(self) -> dict:
+        return {
+            'version': CACHE_VERSION,
+            'fingerprint': self.fingerprint,
+            'devices': [list(d) for d in self.devices],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict):
+        if data.get('version') != CACHE_VERSION:
+            raise ValueError("Unsupported device table cache version")
+        return cls([PciDevice(*entry) for entry in data['devices']], data['fingerprint'], 'cache')
+
+    def report(self, logger):
+        logger.log(f"[*] PCI device table: {len(self.devices)} function(s) ({self.source})")
+        for device in self.devices:
+            logger.log(f"  {device}")
+
+
+def _sysfs_name_to_bdf(name: str) -> Tuple[int, int, int, int]:
+    domain, bus, rest = name.split(':')
+    dev, fun = rest.split('.')
+    return int(domain, 16), int(bus, 16), int(dev, 16), int(fun, 16)
+
+
+def sysfs_fingerprint(root: Optional[str] = None) -> Optional[str]:
+    """Hash of the sysfs device list, or None without sysfs"""
+    root = root or SYSFS_PCI_DEVICES
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return None
+    return 'sysfs:' + hashlib.sha1('\n'.join(names).encode()).hexdigest()
+
+
+def enumerate_sysfs(root: Optional[str] = None, workers: int = 8) -> Optional[DeviceTable]:
+    """
+    Enumerate every domain through sysfs, reading config headers in parallel
+
+    Returns:
+        DeviceTable, or None if sysfs is unavailable
+    """
+    root = root or SYSFS_PCI_DEVICES
+    fingerprint = sysfs_fingerprint(root)
+    if fingerprint is None:
+        return None
+
+    def read_device(name):
+        try:
+            with open(os.path.join(root, name, 'config'), 'rb') as f:
+                header = f.read(HEADER_SIZE)
+        except OSError:
+            return None
+        if len(header) < 0x10:
+            return None
+        return _parse_header(*_sysfs_name_to_bdf(name), header)
+
+    names = sorted(os.listdir(root))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        devices = [d for d in pool.map(read_device, names) if d is not None]
+
+    return DeviceTable(devices, fingerprint, 'sysfs')
+
+
+def _read_header(pci, bus: int, dev: int, fun: int) -> Optional[bytes]:
+    first = pci.read_dword(bus, dev, fun, 0x00)
+    if first == 0xFFFFFFFF or first & 0xFFFF == 0xFFFF:
+        return None
+    header = first.to_bytes(4, 'little')
+    for offset in range(0x04, 0x1C, 4):
+        header += pci.read_dword(bus, dev, fun, offset).to_bytes(4, 'little')
+    return header
+
+
+class SegmentReader(object):
+    """
+    read_dword() over one MCFG allocation's ECAM window through physical
+    memory reads (cs.mem), for PCI segments cs.pci can't address
+
+    Args:
+        mem: Anything with read_physical_mem(address, length) (cs.mem)
+        allocation: ecam_reader.McfgAllocation of the segment
+    """
+
+    def __init__(self, mem, allocation):
+        self.mem = mem
+        self.allocation = allocation
+        self.start_bus = allocation.start_bus
+
+    def read_dword(self, bus: int, dev: int, fun: int, offset: int) -> int:
+        if not self.allocation.start_bus <= bus <= self.allocation.end_bus:
+            return 0xFFFFFFFF
+        # The MCFG base address is that of bus 0, whatever the first bus
+        address = self.allocation.base + ((bus << 20) | (dev << 15) | (fun << 12))
+        address += offset & (ECAM_FUNCTION_SIZE - 4)
+        data = self.mem.read_physical_mem(address, 4)
+        return struct.unpack('<I', bytes(data[:4]).ljust(4, b'\xFF'))[0]
+
+
+def mcfg_segments(cs) -> Dict[int, SegmentReader]:
+    """
+    Config readers for the PCI segments other than 0, from the MCFG table
+    read through cs.acpi ({} when MCFG or physical memory reads are missing)
+    """
+    if not hasattr(cs, 'acpi') or not hasattr(cs, 'mem') or not hasattr(cs.mem, 'read_physical_mem'):
+        return {}
+    try:
+        allocations = parse_mcfg(cs.acpi.get_table_content('MCFG'))
+    except Exception:
+        return {}
+    return {a.segment: SegmentReader(cs.mem, a) for a in allocations if a.segment != 0}
+
+
+def _readers(pci, segments: Optional[Dict[int, object]]) -> Dict[int, object]:
+    # Segment 0 is always read through pci
+    readers = dict(segments or {})
+    readers[0] = pci
+    return readers
+
+
+def chipset_fingerprint(pci, devices: List[PciDevice] = (), segments: Optional[Dict[int, object]] = None) -> str:
+    """
+    Dword 0 of every given function, and of every slot on each bus known to
+    hold devices: every segment's first bus, the given functions' buses and
+    the bridges' secondary buses
+
+    Args:
+        segments: Config readers of the PCI segments other than 0 (see mcfg_segments())
+    """
+    readers = _readers(pci, segments)
+    buses = {(segment, getattr(reader, 'start_bus', 0)) for segment, reader in readers.items()}
+    for device in devices:
+        buses.add((device.domain, device.bus))
+        if device.secondary_bus:
+            buses.add((device.domain, device.secondary_bus))
+
+    points = {(segment, bus, dev, 0) for segment, bus in buses for dev in range(32)}
+    points.update((d.domain,) + d.bdf for d in devices)
+
+    digest = hashlib.sha1()
+    for segment, bus, dev, fun in sorted(points):
+        reader = readers.get(segment)
+        if reader is None:
+            continue
+        digest.update(struct.pack('<HBBBI', segment, bus, dev, fun, reader.read_dword(bus, dev, fun, 0x00)))
+    return 'chipset:' + digest.hexdigest()
+
+
+def enumerate_chipset(pci, segments: Optional[Dict[int, object]] = None) -> DeviceTable:
+    """
+    Enumerate domain 0 through config reads, starting at bus 0 and following
+    every bridge's secondary bus, then every other segment the same way from
+    its first bus
+
+    Args:
+        pci: cs.pci, a ConfigSpaceSnapshot or anything with read_dword()
+        segments: Config readers of the PCI segments other than 0 (see mcfg_segments())
+    """
+    devices = []
+    for segment, reader in sorted(_readers(pci, segments).items()):
+        devices += _walk(reader, segment, getattr(reader, 'start_bus', 0))
+
+    table = DeviceTable(devices, source='chipset')
+    table.fingerprint = chipset_fingerprint(pci, table.devices, segments)
+    return table
+
+
+def _walk(pci, domain: int, start_bus: int) -> List[PciDevice]:
+    """Functions of one segment, from start_bus down through the bridges"""
+    devices = []
+    pending = [start_bus]
+    visited = set()
+
+    while pending:
+        bus = pending.pop()
+        if bus in visited:
+            continue
+        visited.add(bus)
+
+        for dev in range(32):
+            header = _read_header(pci, bus, dev, 0)
+            if header is None:
+                continue
+
+            functions = 8 if header[0x0E] & 0x80 else 1
+            for fun in range(functions):
+                if fun:
+                    header = _read_header(pci, bus, dev, fun)
+                    if header is None:
+                        continue
+                device = _parse_header(domain, bus, dev, fun, header)
+                devices.append(device)
+                if device.secondary_bus:
+                    pending.append(device.secondary_bus)
+    return devices
+
+
+def load_device_table(pci=None, cache_path: Optional[str] = DEFAULT_CACHE,
+                      sysfs_root: Optional[str] = None, segments: Optional[Dict[int, object]] = None) -> DeviceTable:
+    """
+    Return the device table, reusing the on-disk cache while the topology
+    fingerprint still matches and re-enumerating otherwise
+
+    Args:
+        pci: Config reader used when sysfs is unavailable (cs.pci or a snapshot)
+        cache_path: JSON cache file, or None to skip caching
+        sysfs_root: sysfs PCI device directory (defaults to SYSFS_PCI_DEVICES)
+        segments: Config readers of the PCI segments other than 0, used with pci
+    """
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = DeviceTable.from_json(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            cached = None
+
+    fingerprint = sysfs_fingerprint(sysfs_root)
+    if cached is not None:
+        if fingerprint is None and pci is not None:
+            fingerprint = chipset_fingerprint(pci, cached.devices, segments)
+        if fingerprint is not None and fingerprint == cached.fingerprint:
+            return cached
+
+    table = enumerate_sysfs(sysfs_root)
+    if table is None:
+        if pci is None:
+            raise ValueError("No sysfs PCI tree and no config reader to enumerate with")
+        table = enumerate_chipset(pci, segments)
+
+    if cache_path:
+        try:
+            with open(cache_path, 'w') as f:
+                json.dump(table.to_json(), f)
+        except OSError:
+            pass
+
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enumerate PCI functions into a cached device table")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"Cache file (default: {DEFAULT_CACHE})")
+    parser.add_argument("--no-cache", action='store_true', help="Always re-enumerate")
+    parser.add_argument("--class", dest='cls', help="Only show a class, e.g. 0601 or 06")
+    parser.add_argument("--id", help="Only show vid[:did] in hex, e.g. 1283:8893")
+    args = parser.parse_args()
+
+    table = load_device_table(cache_path=None if args.no_cache else args.cache)
+    devices = table.devices
+    if args.cls:
+        if len(args.cls) > 2:
+            devices = table.find_class(int(args.cls[:2], 16), int(args.cls[2:4], 16))
+        else:
+            devices = table.find_class(int(args.cls, 16))
+    if args.id:
+        vid, _, did = args.id.partition(':')
+        matches = table.find_id(int(vid, 16), int(did, 16) if did else None)
+        devices = [d for d in devices if d in matches]
+
+    print(f"{len(table)} function(s) from {table.source}")
+    for device in devices:
+        print(f"  {device}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Platform-Fingerprinted Phase Result Cache
+=========================================
+Lets a module skip expensive probe phases (ACPI dumping, SMI inspection,
+register probing) on a platform it has already tested.
+
+The platform is fingerprinted by component:
+- lpc_id: LPC bridge device and revision ID
+- bios: BIOS vendor, version and date (DMI on Linux, the registry on Windows)
+- acpi: SHA-256 over the ACPI tables (from the incremental harvest manifest
+  on Linux, else the tables CHIPSEC returns)
+- lpc_config / host_config: hash of the LPC bridge and host bridge config
+  headers (0x00-0xFF), with status registers masked out
+
+Each phase names the components it depends on. Its result is cached under a
+key built from the phase name and those components only, so an ACPI change
+re-runs the ACPI phases but still replays the register probes. A cached
+phase is replayed by re-emitting the lines it logged (same logger methods,
+same order) and returning its recorded return value; a phase whose return
+value can't be stored as JSON, or that raised, is never cached.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    cache = PhaseCache("phase_cache.json", platform_fingerprint(self.cs, self.snapshot()))
+    found = cache.call("test_h81_dma_registers", ('lpc_id', 'lpc_config'), self.test_h81_dma_registers, self)
+    cache.save()
+    cache.report(self.logger)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from chipsec.modules.common.acpi_harvest import SYSFS_ACPI_TABLES, AcpiHarvester
+except ImportError:
+    from acpi_harvest import SYSFS_ACPI_TABLES, AcpiHarvester
+
+CACHE_VERSION = 1
+DEFAULT_CACHE = 'phase_cache.json'
+
+# Entries kept per phase (one per platform/input combination seen)
+MAX_ENTRIES_PER_PHASE = 8
+
+SYSFS_DMI = '/sys/class/dmi/id'
+DMI_BIOS_FIELDS = ('bios_vendor', 'bios_version', 'bios_date')
+BIOS_REGISTRY_KEY = r'HARDWARE\DESCRIPTION\System\BIOS'
+BIOS_REGISTRY_VALUES = ('BIOSVendor', 'BIOSVersion', 'BIOSReleaseDate')
+
+LPC_BDF = (0, 0x1F, 0)
+HOST_BDF = (0, 0, 0)
+HEADER_SIZE = 0x100
+
+# Dwords whose value changes on its own: PCI status (with the command
+# register) and the LPC general DMA status register
+VOLATILE_DWORDS = {LPC_BDF: (0x04, 0xD4), HOST_BDF: (0x04,)}
+
+# Logger methods recorded for replay
+RECORDED_METHODS = ('log', 'log_good', 'log_bad', 'log_warning', 'log_error', 'log_important',
+                    'log_passed', 'log_failed', 'log_heading')
+
+
+def _bios_version() -> str:
+    values = []
+    for name in DMI_BIOS_FIELDS:
+        try:
+            with open(os.path.join(SYSFS_DMI, name)) as f:
+                values.append(f.read().strip())
+        except OSError:
+            pass
+    if values:
+        return ' '.join(values)
+
+    try:
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, BIOS_REGISTRY_KEY) as key:
+            return ' '.join(str(winreg.QueryValueEx(key, name)[0]) for name in BIOS_REGISTRY_VALUES)
+    except (ImportError, OSError):
+        return ''
+
+
+def _acpi_digest(cs, acpi_dir: str, store_dir: Optional[str]) -> str:
+    digest = hashlib.sha256()
+    if os.path.isdir(SYSFS_ACPI_TABLES):
+        harvester = AcpiHarvester(acpi_dir, store_dir)
+        harvester.harvest(SYSFS_ACPI_TABLES)
+        for name, entry in sorted(harvester.manifest.items()):
+            digest.update(f"{name}={entry['sha256']}\n".encode())
+        return digest.hexdigest()
+
+    acpi = getattr(cs, 'acpi', None)
+    if acpi is None or not hasattr(acpi, 'get_ACPI_table_list') or not hasattr(acpi, 'get_table_content'):
+        return ''
+    for name in sorted(acpi.get_ACPI_table_list()):
+        content = acpi.get_table_content(name)
+        digest.update(name.encode() + b'=' + hashlib.sha256(bytes(content or b'')).digest())
+    return digest.hexdigest()
+
+
+def _config_digest(pci, bdf: Tuple[int, int, int]) -> str:
+    digest = hashlib.sha256()
+    volatile = VOLATILE_DWORDS.get(bdf, ())
+    for offset in range(0, HEADER_SIZE, 4):
+        value = 0 if offset in volatile else pci.read_dword(*bdf, offset)
+        digest.update(value.to_bytes(4, 'little'))
+    return digest.hexdigest()
+
+
+def platform_fingerprint(cs, pci=None, acpi_dir: str = 'acpi_dumps', store_dir: Optional[str] = None) -> Dict[str, str]:
+    """
+    Fingerprint components of the platform
+
+    Args:
+        cs: The module's chipset object
+        pci: Config reader (a ConfigSpaceSnapshot saves helper calls); cs.pci by default
+        acpi_dir, store_dir: Where the ACPI tables are harvested on Linux (see acpi_harvest.py)
+    """
+    pci = pci or cs.pci
+    did = pci.read_dword(*LPC_BDF, 0x00) >> 16
+    rid = pci.read_dword(*LPC_BDF, 0x08) & 0xFF
+    return {
+        'lpc_id': f"{did:04X}:{rid:02X}",
+        'bios': _bios_version(),
+        'acpi': _acpi_digest(cs, acpi_dir, store_dir),
+        'lpc_config': _config_digest(pci, LPC_BDF),
+        'host_config': _config_digest(pci, HOST_BDF),
+    }
+
+
+class _RecordingLogger(object):
+    """Forwards to the module logger and keeps (method, text) for replay"""
+
+    def __init__(self, logger):
+        self._logger = logger
+        self.lines: List[Tuple[str, str]] = []
+
+    def __getattr__(self, name):
+        target = getattr(self._logger, name)
+        if name not in RECORDED_METHODS:
+            return target
+        lines = self.lines
+
+        def recorded(text='', *args, **kwargs):
+            lines.append((name, str(text)))
+            return target(text, *args, **kwargs)
+        return recorded
+
+
+class PhaseCache(object):
+    """
+    Phase results keyed by phase name and the fingerprint components it uses
+
+    Args:
+        path: JSON cache file
+        fingerprint: Components from platform_fingerprint()
+
+    Attributes:
+        hits, misses: Phase names replayed / run this time
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE, fingerprint: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.fingerprint = fingerprint or {}
+        self.entries: Dict[str, dict] = self._load()
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def key(self, name: str, inputs: Sequence[str]) -> str:
+        digest = hashlib.sha256(name.encode())
+        for component in sorted(inputs):
+            digest.update(f"\n{component}={self.fingerprint.get(component, '')}".encode())
+        return digest.hexdigest()
+
+    def call(self, name: str, inputs: Sequence[str], fn: Callable[[], object], owner):
+        """
+        Return fn()'s result, replayed from the cache when the phase's inputs
+        are unchanged
+
+        Args:
+            name: Phase name
+            inputs: Fingerprint components the phase depends on
+            fn: Runs the phase
+            owner: Object whose .logger the phase logs through (the module)
+        """
+        key = self.key(name, inputs)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits.append(name)
+            owner.logger.log(f"[*] {name}: replaying results cached "
+                             f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['time']))} (inputs unchanged)")
+            for method, text in entry['log']:
+                getattr(owner.logger, method)(text)
+            return entry['value']
+
+        self.misses.append(name)
+        logger = owner.logger
+        if hasattr(logger, 'redirect'):
+            # Phases running concurrently (phase_scheduler.py): record this thread only
+            recorder = _RecordingLogger(logger.current)
+            with logger.redirect(recorder):
+                value = fn()
+        else:
+            recorder = _RecordingLogger(logger)
+            owner.logger = recorder
+            try:
+                value = fn()
+            finally:
+                owner.logger = logger
+
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            return value
+        with self._lock:
+            self.entries[key] = {'phase': name, 'inputs': {c: self.fingerprint.get(c, '') for c in inputs},
+                                 'time': time.time(), 'value': value, 'log': recorder.lines}
+            self._prune(name)
+        return value
+
+    def _prune(self, name: str):
+        keys = sorted((entry['time'], key) for key, entry in self.entries.items() if entry['phase'] == name)
+        for _, key in keys[:-MAX_ENTRIES_PER_PHASE]:
+            del self.entries[key]
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with self._lock, open(tmp, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'fingerprint': self.fingerprint, 'entries': self.entries}, f)
+        os.replace(tmp, self.path)
+
+    def report(self, logger):
+        logger.log(f"[*] Phase cache ({self.path}): {len(self.hits)} phase(s) replayed, {len(self.misses)} run")
+        if self.hits:
+            logger.log(f"    Replayed: {', '.join(self.hits)}")
+        if self.misses:
+            logger.log(f"    Run: {', '.join(self.misses)}")
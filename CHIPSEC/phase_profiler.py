@@ -0,0 +1,265 @@
+"""
+Per-Phase Profiler for CHIPSEC Modules
+======================================
+Wraps each phase of a module's run() with monotonic timers and counts the
+hardware accesses the phase issues, so it is clear which phase dominates
+wall time and how many config/port accesses each one costs.
+
+While attached the profiler replaces:
+- cs.pci, cs.io, cs.mem and cs.msr with proxies counting reads and writes
+  (everything else is passed straight through)
+- the 'time' global of the module and of each helper module given, with a
+  proxy counting sleeps and the time actually spent in them
+
+Wall time is read from the module's own clock (virtual under
+sim_chipset.py), CPU time from the calling thread's clock. Accesses made
+through references taken before attach() are not counted. A thread inside
+collect() (a phase_scheduler.py worker) counts into its own tally, so
+phases running concurrently don't book each other's accesses.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    profiler = PhaseProfiler(self.cs, sys.modules[__name__], self.logger,
+                             helpers=[sys.modules[RegisterSampler.__module__]])
+    with profiler:
+        with profiler.phase("test_traditional_dma_regs"):
+            self.test_traditional_dma_regs()
+    profiler.report(self.logger)
+    profiler.write_json("phase_profile.json")
+"""
+
+import contextlib
+import json
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# Counter incremented by each call, per cs attribute
+COUNTED_CALLS = {
+    'pci': {
+        'read_byte': 'pci_reads', 'read_word': 'pci_reads', 'read_dword': 'pci_reads',
+        'write_byte': 'pci_writes', 'write_word': 'pci_writes', 'write_dword': 'pci_writes',
+    },
+    'io': {
+        'read_port_byte': 'io_reads', 'read_port_word': 'io_reads', 'read_port_dword': 'io_reads',
+        'write_port_byte': 'io_writes', 'write_port_word': 'io_writes', 'write_port_dword': 'io_writes',
+    },
+    'mem': {
+        'read_physical_mem': 'mem_reads', 'write_physical_mem': 'mem_writes',
+    },
+    'msr': {
+        'read_msr': 'msr_reads', 'write_msr': 'msr_writes',
+    },
+}
+
+COUNTERS = ('pci_reads', 'pci_writes', 'io_reads', 'io_writes', 'mem_reads', 'mem_writes',
+            'msr_reads', 'msr_writes', 'sleeps')
+
+
+class PhaseProfile(NamedTuple):
+    name: str
+    wall_ns: int
+    cpu_ns: int
+    counts: Dict[str, int]
+    slept_ns: int
+    error: Optional[str]
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'wall_ms': self.wall_ns / 1e6, 'cpu_ms': self.cpu_ns / 1e6,
+                'slept_ms': self.slept_ns / 1e6, 'error': self.error, **self.counts}
+
+
+def _rw(counts: Dict[str, int], kind: str) -> str:
+    return f"{counts[kind + '_reads']}/{counts[kind + '_writes']}"
+
+
+class _CountingProxy(object):
+    """Passes attribute access through to target, counting the mapped calls"""
+
+    def __init__(self, target, calls: Dict[str, str], profiler: 'PhaseProfiler'):
+        self._target = target
+        self._calls = calls
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        counter = self._calls.get(name)
+        if counter is None or not callable(value):
+            return value
+        profiler = self._profiler
+
+        def counted(*args, **kwargs):
+            profiler.tally().counts[counter] += 1
+            return value(*args, **kwargs)
+        return counted
+
+
+class _CountingClock(object):
+    """Stand-in for a module's time global counting sleep() calls"""
+
+    def __init__(self, clock, profiler: 'PhaseProfiler'):
+        self._clock = clock
+        self._profiler = profiler
+
+    def sleep(self, seconds: float):
+        # Record the time actually slept (oversleep, Ctrl+C), not the request
+        tally = self._profiler.tally()
+        tally.counts['sleeps'] += 1
+        start = self._clock.monotonic_ns()
+        try:
+            return self._clock.sleep(seconds)
+        finally:
+            tally.slept_ns += self._clock.monotonic_ns() - start
+
+    def __getattr__(self, name):
+        return getattr(self._clock, name)
+
+
+class _Tally(object):
+    """Accesses and sleeps counted on one thread inside collect()"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.slept_ns = 0
+
+
+class PhaseProfiler(object):
+    """
+    Per-phase timing and hardware access accounting
+
+    Args:
+        cs: The module's chipset object (self.cs)
+        module: Module whose 'time' global is wrapped to count sleeps (None to skip)
+        logger: When given, each phase is announced with the usual banner
+        helpers: Further modules whose 'time' global is wrapped (helpers that sleep)
+
+    Attributes:
+        phases: PhaseProfile per completed phase, in run order
+    """
+
+    def __init__(self, cs, module=None, logger=None, helpers: Sequence = ()):
+        self.cs = cs
+        self.module = module
+        self.logger = logger
+        self.helpers = list(helpers)
+        self.phases: List[PhaseProfile] = []
+        self.counts: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.slept_ns = 0
+        self._local = threading.local()
+        self._saved = []
+
+    def _clock(self):
+        if self.module is not None and hasattr(self.module, 'time'):
+            return self.module.time
+        return time
+
+    def attach(self):
+        """Install the counting proxies"""
+        if self._saved:
+            return
+        for attr, calls in COUNTED_CALLS.items():
+            target = getattr(self.cs, attr, None)
+            if target is not None:
+                self._saved.append((self.cs, attr, target))
+                setattr(self.cs, attr, _CountingProxy(target, calls, self))
+        for module in [self.module] + self.helpers:
+            if module is None or not hasattr(module, 'time') or isinstance(module.time, _CountingClock):
+                continue
+            self._saved.append((module, 'time', module.time))
+            module.time = _CountingClock(module.time, self)
+
+    def detach(self):
+        """Put the original cs attributes and time module back"""
+        for owner, attr, value in reversed(self._saved):
+            setattr(owner, attr, value)
+        self._saved = []
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    def tally(self):
+        """Where the calling thread's accesses and sleeps are counted"""
+        return getattr(self._local, 'tally', None) or self
+
+    @contextlib.contextmanager
+    def collect(self):
+        """Count the calling thread's accesses and sleeps apart, for record()"""
+        tally = _Tally()
+        self._local.tally = tally
+        try:
+            yield tally
+        finally:
+            self._local.tally = None
+
+    def banner(self, name: str):
+        """Announce a phase (no-op without a logger)"""
+        if self.logger is not None:
+            self.logger.log("##################################################")
+            self.logger.log(f"TESTING --- {name}")
+            self.logger.log("##################################################")
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time and count everything done inside the block as one phase"""
+        self.banner(name)
+
+        clock = self._clock()
+        counts = dict(self.counts)
+        slept_ns = self.slept_ns
+        error = None
+        cpu_start = time.thread_time_ns()
+        start = clock.monotonic_ns()
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            wall_ns = clock.monotonic_ns() - start
+            cpu_ns = time.thread_time_ns() - cpu_start
+            self.phases.append(PhaseProfile(name, wall_ns, cpu_ns,
+                                            {key: self.counts[key] - counts[key] for key in COUNTERS},
+                                            self.slept_ns - slept_ns, error))
+
+    def record(self, name: str, wall_ns: int, cpu_ns: int, error: Optional[str] = None, tally=None):
+        """
+        Add a phase timed elsewhere, e.g. on a worker thread by
+        phase_scheduler.py, with the accesses and sleeps collect() counted
+        for it (none when tally is None)
+        """
+        counts = dict(tally.counts) if tally is not None else dict.fromkeys(COUNTERS, 0)
+        slept_ns = tally.slept_ns if tally is not None else 0
+        self.phases.append(PhaseProfile(name, wall_ns, cpu_ns, counts, slept_ns, error))
+
+    def total(self) -> PhaseProfile:
+        return PhaseProfile('total', sum(p.wall_ns for p in self.phases), sum(p.cpu_ns for p in self.phases),
+                            {key: sum(p.counts[key] for p in self.phases) for key in COUNTERS},
+                            sum(p.slept_ns for p in self.phases), None)
+
+    def report(self, logger):
+        total = self.total()
+        logger.log("\n[*] Phase profile:")
+        logger.log(f"    {'Phase':<42} {'Wall ms':>10} {'%':>5} {'CPU ms':>9} {'PCI r/w':>13} "
+                   f"{'I/O r/w':>11} {'MEM r/w':>9} {'MSR r/w':>9} {'Sleeps':>7} {'Slept ms':>10}")
+        for p in self.phases + [total]:
+            share = 100.0 * p.wall_ns / total.wall_ns if total.wall_ns else 0.0
+            c = p.counts
+            name = p.name + (f" ({p.error})" if p.error else "")
+            logger.log(f"    {name:<42} {p.wall_ns / 1e6:>10.1f} {share:>5.1f} {p.cpu_ns / 1e6:>9.1f} "
+                       f"{_rw(c, 'pci'):>13} {_rw(c, 'io'):>11} {_rw(c, 'mem'):>9} {_rw(c, 'msr'):>9} "
+                       f"{c['sleeps']:>7} {p.slept_ns / 1e6:>10.1f}")
+        if self.phases:
+            slowest = max(self.phases, key=lambda p: p.wall_ns)
+            logger.log(f"    Slowest phase: {slowest.name}")
+
+    def to_dict(self) -> dict:
+        return {'phases': [p.to_dict() for p in self.phases], 'total': self.total().to_dict()}
+
+    def write_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
@@ -0,0 +1,402 @@
+"""
+Phase Dependency Scheduler
+==========================
+Runs a module's phases as a dependency graph instead of strictly one after
+another.
+
+Each phase names the phases it depends on and the lane it runs on:
+- ACCESS_LANE: touches the hardware (config/port/memory accesses, SMIs).
+  Access-lane phases run one at a time on the calling thread, in the order
+  they were added, so register sequences are never interleaved.
+- POOL_LANE: file- and CPU-bound work (ACPI dumping, AML parsing). Pool
+  phases run on worker threads as soon as their dependencies are done,
+  overlapping the access lane.
+
+Pool phases are meant to get everything they need from the hardware
+through access-lane phases they depend on. One that still reaches it is not
+let through concurrently: while the scheduler runs, cs.pci, cs.io, cs.mem,
+cs.msr and cs.acpi calls made from worker threads wait for the access lane,
+which every access-lane phase holds for its whole duration. The time spent
+waiting is kept apart from the phase's own time.
+
+Pool phases log into a per-thread buffer that is written out under the
+phase's banner when the phase completes, so concurrent phases never
+interleave their lines. With workers=0 every phase runs inline in the order
+added, exactly like a serial run().
+
+The report lists each phase's lane, start and duration, the critical path
+(the chain of phases, counting the access-lane order as a dependency, that
+bounds the wall time however many workers there are) and the wall time saved
+against running the same phases back to back. A pool phase counts there
+with its own time only: host time (its file and CPU work is not on the
+virtual clock of sim_chipset.py) less its waits for the access lane.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    scheduler = PhaseScheduler(self, profiler, workers=2, clock=time)
+    scheduler.add("check_lpc_controller", self.check_lpc_controller)
+    scheduler.add("inspect_acpi_tables_minimal", self.inspect_acpi_tables_minimal,
+                  deps=["check_lpc_controller"], lane=POOL_LANE)
+    scheduler.add("test_h81_dma_registers", self.test_h81_dma_registers, deps=["check_lpc_controller"])
+    results = scheduler.run()
+    scheduler.report(self.logger)
+"""
+
+import contextlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+ACCESS_LANE = 'access'
+POOL_LANE = 'pool'
+
+# cs attributes whose calls from worker threads wait for the access lane
+GATED_ATTRS = ('pci', 'io', 'mem', 'msr', 'acpi')
+
+# Logger methods buffered for pool phases
+LOGGED_METHODS = ('log', 'log_good', 'log_bad', 'log_warning', 'log_error', 'log_important',
+                  'log_passed', 'log_failed', 'log_heading')
+
+
+class Phase(object):
+    """One node of the graph, with its timing once run"""
+
+    def __init__(self, name: str, fn: Callable, args: tuple, deps: Sequence[str], lane: str, context=None):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.deps = tuple(deps)
+        self.lane = lane
+        self.context = context
+        self.start_ns: Optional[int] = None
+        self.end_ns: Optional[int] = None
+        self.cpu_ns = 0
+        self.host_ns = 0
+        self.wait_ns = 0
+        self.lane_calls = 0
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.buffer: Optional['_BufferLogger'] = None
+        self.tally = None
+
+    @property
+    def wall_ns(self) -> int:
+        if self.start_ns is None or self.end_ns is None:
+            return 0
+        return self.end_ns - self.start_ns
+
+    @property
+    def busy_ns(self) -> int:
+        """Time the phase itself took: pool phases without their access lane waits"""
+        if self.lane == POOL_LANE:
+            return max(0, self.host_ns - self.wait_ns)
+        return self.wall_ns
+
+
+class _BufferLogger(object):
+    """Keeps a pool phase's log calls until the phase completes"""
+
+    def __init__(self, logger):
+        self._logger = logger
+        self.calls = []
+
+    def __getattr__(self, name):
+        target = getattr(self._logger, name)
+        if name not in LOGGED_METHODS:
+            return target
+        calls = self.calls
+
+        def buffered(*args, **kwargs):
+            calls.append((name, args, kwargs))
+        return buffered
+
+    def flush(self):
+        for name, args, kwargs in self.calls:
+            getattr(self._logger, name)(*args, **kwargs)
+        self.calls = []
+
+
+class ThreadLogger(object):
+    """
+    Stands in for the module logger while the scheduler runs: forwards to
+    the real logger, or to whatever the current thread redirected it to
+
+    Attributes:
+        current: This thread's target
+    """
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        return getattr(self._local, 'target', None) or self._logger
+
+    @contextlib.contextmanager
+    def redirect(self, target):
+        """Send this thread's log calls to target inside the block"""
+        previous = getattr(self._local, 'target', None)
+        self._local.target = target
+        try:
+            yield target
+        finally:
+            self._local.target = previous
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+
+class _LaneProxy(object):
+    """Makes calls from worker threads wait for the access lane"""
+
+    def __init__(self, target, scheduler: 'PhaseScheduler'):
+        self._target = target
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value):
+            return value
+        scheduler = self._scheduler
+
+        def gated(*args, **kwargs):
+            phase = getattr(scheduler._local, 'phase', None)
+            if phase is None:
+                return value(*args, **kwargs)
+            start = time.perf_counter_ns()
+            with scheduler.lane:
+                phase.wait_ns += time.perf_counter_ns() - start
+                phase.lane_calls += 1
+                scheduler.gated_calls += 1
+                return value(*args, **kwargs)
+        return gated
+
+
+class PhaseScheduler(object):
+    """
+    Dependency graph of phases, run with the hardware phases serialized
+
+    Args:
+        owner: Object whose .logger the phases log through (the module)
+        profiler: PhaseProfiler timing each phase (None to skip)
+        workers: Worker threads for pool phases (0 runs everything inline, in order)
+        clock: Provides monotonic_ns() (the module's time, virtual under sim_chipset.py)
+
+    Attributes:
+        phases: Phase per name, in the order added
+        gated_calls: Hardware calls from worker threads that waited for the access lane
+    """
+
+    def __init__(self, owner, profiler=None, workers: int = 0, clock=time):
+        self.owner = owner
+        self.profiler = profiler
+        self.workers = workers
+        self.clock = clock
+        self.phases: Dict[str, Phase] = {}
+        self.lane = threading.RLock()
+        self.gated_calls = 0
+        self._local = threading.local()
+        self._saved = []
+
+    def add(self, name: str, fn: Callable, *args, deps: Sequence[str] = (), lane: str = ACCESS_LANE, context=None):
+        """
+        Add a phase running fn(*args)
+
+        Args:
+            deps: Phases that must complete first (already added, so the graph stays acyclic)
+            lane: ACCESS_LANE or POOL_LANE
+            context: Context manager entered around the phase (e.g. pci.paused())
+        """
+        if name in self.phases:
+            raise ValueError(f"Phase {name} added twice")
+        if lane not in (ACCESS_LANE, POOL_LANE):
+            raise ValueError(f"Unknown lane {lane!r}")
+        for dep in deps:
+            if dep not in self.phases:
+                raise ValueError(f"Phase {name} depends on {dep}, which was not added before it")
+        self.phases[name] = Phase(name, fn, args, deps, lane, context)
+
+    def _install(self):
+        cs = self.owner.cs
+        for attr in GATED_ATTRS:
+            target = getattr(cs, attr, None)
+            if target is not None:
+                self._saved.append((cs, attr, target))
+                setattr(cs, attr, _LaneProxy(target, self))
+        self._saved.append((self.owner, 'logger', self.owner.logger))
+        self.owner.logger = ThreadLogger(self.owner.logger)
+
+    def _uninstall(self):
+        for owner, attr, value in reversed(self._saved):
+            setattr(owner, attr, value)
+        self._saved = []
+
+    def _execute(self, phase: Phase):
+        cpu_start = time.thread_time_ns()
+        host_start = time.perf_counter_ns()
+        phase.start_ns = self.clock.monotonic_ns()
+        try:
+            phase.result = phase.fn(*phase.args)
+        except BaseException as e:
+            phase.error = e
+            raise
+        finally:
+            phase.end_ns = self.clock.monotonic_ns()
+            phase.host_ns = time.perf_counter_ns() - host_start
+            phase.cpu_ns = time.thread_time_ns() - cpu_start
+
+    def _run_on_lane(self, phase: Phase):
+        with self.lane, contextlib.ExitStack() as stack:
+            if self.profiler is not None:
+                stack.enter_context(self.profiler.phase(phase.name))
+            if phase.context is not None:
+                stack.enter_context(phase.context)
+            self._execute(phase)
+
+    def _run_pooled(self, phase: Phase):
+        self._local.phase = phase
+        logger = self.owner.logger
+        phase.buffer = _BufferLogger(logger._logger)
+        try:
+            with logger.redirect(phase.buffer), contextlib.ExitStack() as stack:
+                # Count the phase's own accesses (made through the lane proxy) and sleeps
+                if self.profiler is not None:
+                    phase.tally = stack.enter_context(self.profiler.collect())
+                if phase.context is not None:
+                    stack.enter_context(phase.context)
+                self._execute(phase)
+        finally:
+            self._local.phase = None
+
+    def _finish_pooled(self, phase: Phase):
+        """Write out a completed pool phase's banner, log lines and profile"""
+        if self.profiler is not None:
+            self.profiler.banner(phase.name)
+        if phase.buffer is not None:
+            phase.buffer.flush()
+        if self.profiler is not None:
+            self.profiler.record(phase.name, phase.wall_ns, phase.cpu_ns,
+                                 type(phase.error).__name__ if phase.error else None, phase.tally)
+
+    def _ready(self, phase: Phase, done: set) -> bool:
+        return all(dep in done for dep in phase.deps)
+
+    def run(self) -> Dict[str, object]:
+        """Run every phase; returns {name: return value}"""
+        if not self.workers:
+            for phase in self.phases.values():
+                self._run_on_lane(phase)
+            return {name: phase.result for name, phase in self.phases.items()}
+
+        self._install()
+        try:
+            self._run_concurrent()
+        finally:
+            self._uninstall()
+        return {name: phase.result for name, phase in self.phases.items()}
+
+    def _run_concurrent(self):
+        pending: List[Phase] = list(self.phases.values())
+        done = set()
+        running = {}
+        error = None
+
+        def collect(futures):
+            nonlocal error
+            for future in futures:
+                phase = running.pop(future)
+                self._finish_pooled(phase)
+                if phase.error is not None and error is None:
+                    error = phase.error
+                done.add(phase.name)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='phase') as pool:
+            while pending or running:
+                lane_phase = None
+                if error is None:
+                    for phase in [p for p in pending if p.lane == POOL_LANE and self._ready(p, done)]:
+                        pending.remove(phase)
+                        running[pool.submit(self._run_pooled, phase)] = phase
+                    # The access lane keeps the order the phases were added in
+                    lane_phase = next((p for p in pending if p.lane == ACCESS_LANE), None)
+                    if lane_phase is not None and not self._ready(lane_phase, done):
+                        lane_phase = None
+                else:
+                    pending = []
+
+                if lane_phase is not None:
+                    pending.remove(lane_phase)
+                    try:
+                        self._run_on_lane(lane_phase)
+                    except BaseException as e:
+                        error = e
+                    done.add(lane_phase.name)
+                    collect([f for f in running if f.done()])
+                elif running:
+                    finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    collect(finished)
+                elif pending:
+                    raise RuntimeError(f"Phases {', '.join(p.name for p in pending)} can never run")
+
+        if error is not None:
+            raise error
+
+    def critical_path(self) -> List[Phase]:
+        """Longest chain of dependent phases (access-lane order counts as a dependency)"""
+        finish: Dict[str, int] = {}
+        previous: Dict[str, Optional[str]] = {}
+        last_on_lane = None
+        for phase in self.phases.values():
+            deps = list(phase.deps)
+            if phase.lane == ACCESS_LANE:
+                if last_on_lane is not None:
+                    deps.append(last_on_lane)
+                last_on_lane = phase.name
+            before = max(deps, key=lambda d: finish[d], default=None)
+            previous[phase.name] = before
+            finish[phase.name] = phase.busy_ns + (finish[before] if before else 0)
+        if not finish:
+            return []
+
+        path = []
+        name = max(finish, key=finish.get)
+        while name is not None:
+            path.append(self.phases[name])
+            name = previous[name]
+        return path[::-1]
+
+    def serial_ns(self) -> int:
+        """Wall time of the same phases run back to back (see Phase.busy_ns)"""
+        return sum(phase.busy_ns for phase in self.phases.values())
+
+    def elapsed_ns(self) -> int:
+        """Wall time from the first phase's start to the last one's end"""
+        ran = [p for p in self.phases.values() if p.start_ns is not None and p.end_ns is not None]
+        if not ran:
+            return 0
+        return max(p.end_ns for p in ran) - min(p.start_ns for p in ran)
+
+    def report(self, logger):
+        ran = [p for p in self.phases.values() if p.start_ns is not None]
+        origin = min((p.start_ns for p in ran), default=0)
+        logger.log(f"\n[*] Phase schedule ({self.workers} worker thread(s), access lane serialized):")
+        logger.log(f"    {'Phase':<42} {'Lane':<7} {'Start ms':>10} {'Wall ms':>10} {'Own ms':>10} {'Wait ms':>10}  "
+                   f"Depends on")
+        for p in ran:
+            name = p.name + (f" ({type(p.error).__name__})" if p.error else "")
+            logger.log(f"    {name:<42} {p.lane:<7} {(p.start_ns - origin) / 1e6:>10.1f} {p.wall_ns / 1e6:>10.1f} "
+                       f"{p.busy_ns / 1e6:>10.1f} {p.wait_ns / 1e6:>10.1f}  {', '.join(p.deps) or '-'}")
+
+        path = self.critical_path()
+        logger.log(f"    Critical path ({sum(p.busy_ns for p in path) / 1e6:.1f} ms): "
+                   f"{' -> '.join(p.name for p in path)}")
+        serial, elapsed = self.serial_ns(), self.elapsed_ns()
+        saved = serial - elapsed
+        share = 100.0 * saved / serial if serial else 0.0
+        logger.log(f"    Wall time: {elapsed / 1e6:.1f} ms scheduled vs {serial / 1e6:.1f} ms back to back "
+                   f"({saved / 1e6:.1f} ms, {share:.1f}% saved)")
+        if self.gated_calls:
+            logger.log(f"    Hardware calls from pool phases held for the access lane: {self.gated_calls}")
@@ -0,0 +1,282 @@
+"""
+Config Register Writable-Mask Probe
+===================================
+Works out which bits of a 32-bit PCI config register are read/write,
+read-only, write-1-to-clear or changing on their own, using far fewer
+write/restore cycles than toggling one bit at a time.
+
+Each register is probed as follows:
+1. Read it a few times - bits that change without any write are volatile
+   and are left alone.
+2. Write the original value back once - bits that were set and read back
+   clear are write-1-to-clear (W1C) status bits. (Any write does this,
+   including the restore in the old bit-0 toggle tests.)
+3. Walk an ordered schedule of bit groups. The default schedule toggles
+   bit 0 only (what the tests always did); GROUP_SCHEDULE (high bytes first,
+   the low byte as two nibbles) classifies every bit and is opt-in. Each
+   step toggles a whole group, reads back and restores.
+   Group bits that followed the write are RW, the rest RO; bits in no group
+   of the schedule stay untested (never RO). If bits outside the group
+   changed too, the group is split in half and both halves are
+   retried, down to single bits, to isolate the side effect.
+4. After every restore the register is re-read. If it does not return to
+   the original value the bits that stuck are reported and probing of that
+   register stops.
+
+With independent bits GROUP_SCHEDULE classifies a full 32-bit register
+with 1 + 2 * 5 = 11 writes instead of 64, and no schedule exceeds max_writes
+per register. Protected dwords (lock, BIOS control, decode and routing
+registers) are never written at all. Discovered masks are stored per
+vendor/device ID so a known part is not probed twice.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+"""
+
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# The single-bit toggle the tests always did
+DEFAULT_SCHEDULE = (0x00000001,)
+
+# Ordered bit groups: address-like high bytes first, control bits last and
+# in smaller groups (full classification, opt-in)
+GROUP_SCHEDULE = (0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000F0, 0x0000000F)
+
+# LPC bridge dwords never written: lock bits are write-once, and a crash
+# between write and restore must not leave the platform misconfigured
+LPC_PROTECTED_DWORDS = {
+    0x40: "PMBASE/ABASE",
+    0x44: "ACPI_CNTL",
+    0x60: "PIRQ[A-D]_ROUT",
+    0x68: "PIRQ[E-H]_ROUT",
+    0x80: "LPC_IOD/LPC_EN",
+    0x84: "GEN1_DEC",
+    0x88: "GEN2_DEC",
+    0x8C: "GEN3_DEC",
+    0x90: "GEN4_DEC",
+    0xA0: "GEN_PMCON_1/2",
+    0xA4: "GEN_PMCON_3",
+    0xD8: "FWH_DEC_EN1",
+    0xDC: "BIOS_CNTL",
+}
+
+DEFAULT_MASK_STORE = 'register_masks.json'
+
+# Reads taken before probing to spot bits that change by themselves
+STABILITY_READS = 3
+
+
+class RegisterMask(NamedTuple):
+    offset: int
+    original: int
+    rw: int
+    ro: int
+    w1c: int
+    volatile: int
+    sticky: int
+    untested: int
+    writes: int
+
+    def describe(self) -> str:
+        text = f"RW 0x{self.rw:08X}, RO 0x{self.ro:08X}"
+        if self.w1c:
+            text += f", W1C 0x{self.w1c:08X}"
+        if self.volatile:
+            text += f", volatile 0x{self.volatile:08X}"
+        if self.sticky:
+            text += f", STUCK 0x{self.sticky:08X}"
+        if self.untested:
+            text += f", untested 0x{self.untested:08X}"
+        return text
+
+
+class WritableMaskProbe(object):
+    """
+    Writable-mask discovery for the config registers of one PCI function
+
+    Args:
+        pci: cs.pci (anything with read_dword/write_dword)
+        bus, dev, fun: PCI function to probe
+        schedule: Ordered bit groups toggled one step at a time
+        protected: {offset: name} of dwords that must never be written
+        max_writes: Upper bound on writes per register
+    """
+
+    def __init__(self, pci, bus: int, dev: int, fun: int, schedule: Sequence[int] = DEFAULT_SCHEDULE,
+                 protected: Optional[Dict[int, int]] = None, max_writes: int = 48):
+        self.pci = pci
+        self.bdf = (bus, dev, fun)
+        self.schedule = list(schedule)
+        self.protected = protected or {}
+        self.max_writes = max_writes
+        self.total_writes = 0
+
+    def _read(self, offset: int) -> int:
+        return self.pci.read_dword(*self.bdf, offset)
+
+    def _write(self, offset: int, value: int):
+        self.total_writes += 1
+        self.pci.write_dword(*self.bdf, offset, value)
+
+    def probe(self, offset: int) -> RegisterMask:
+        """Classify every bit of the dword at offset (restoring it after each step)"""
+        if offset in self.protected:
+            # Read only: every bit stays untested
+            return RegisterMask(offset, self._read(offset), 0, 0, 0, 0, 0, 0xFFFFFFFF, 0)
+
+        reads = [self._read(offset) for _ in range(STABILITY_READS)]
+        original = reads[0]
+        volatile = 0
+        for value in reads[1:]:
+            volatile |= value ^ original
+
+        writes = 0
+
+        # Writing the value back shows which set bits are write-1-to-clear
+        self._write(offset, original)
+        writes += 1
+        after = self._read(offset)
+        w1c = original & ~after & ~volatile
+        current = after
+        # Never write 1 to a W1C bit again
+        base = original & ~w1c
+
+        rw = 0
+        sticky = 0
+        covered = 0
+        for group in self.schedule:
+            covered |= group
+        # Bits the schedule never toggles are not known to be read-only
+        untested = volatile | w1c | (~covered & 0xFFFFFFFF)
+        pending = [group & ~untested & 0xFFFFFFFF for group in self.schedule]
+        pending = [group for group in pending if group]
+
+        while pending:
+            group = pending.pop(0)
+            if writes + 2 > self.max_writes:
+                untested |= group
+                for rest in pending:
+                    untested |= rest
+                break
+
+            target = base ^ group
+            self._write(offset, target)
+            readback = self._read(offset)
+            self._write(offset, base)
+            restored = self._read(offset)
+            writes += 2
+
+            stuck = (restored ^ current) & ~volatile
+            if stuck:
+                # The register did not come back - stop touching it
+                sticky |= stuck
+                rw |= (readback ^ current) & group & ~volatile
+                untested |= group & ~rw
+                for rest in pending:
+                    untested |= rest
+                break
+
+            changed = (readback ^ current) & ~volatile
+            outside = changed & ~group
+            followed = changed & group
+            if outside and bin(group).count('1') > 1:
+                # Side effects - isolate them by splitting the group
+                low_half = _lower_half(group)
+                pending[:0] = [low_half, group & ~low_half]
+                continue
+
+            rw |= followed
+
+        rw &= ~untested
+        ro = 0xFFFFFFFF & ~rw & ~untested & ~sticky
+        return RegisterMask(offset, original, rw, ro, w1c, volatile, sticky, untested & ~w1c & ~volatile,
+                            writes)
+
+    def probe_range(self, start: int, end: int, step: int = 4) -> List[RegisterMask]:
+        """Probe every dword in [start, end)"""
+        return [self.probe(offset) for offset in range(start, end, step)]
+
+
+def _lower_half(group: int) -> int:
+    """The lower half of a group's set bits"""
+    bits = [bit for bit in range(32) if group >> bit & 1]
+    mask = 0
+    for bit in bits[:len(bits) // 2]:
+        mask |= 1 << bit
+    return mask
+
+
+class MaskStore(object):
+    """
+    Discovered masks per vendor/device ID, kept as JSON
+
+    Args:
+        path: JSON file to load from and save to
+    """
+
+    def __init__(self, path: str = DEFAULT_MASK_STORE):
+        self.path = path
+        self.masks: Dict[str, Dict[str, dict]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.masks = json.load(f)
+            except (OSError, ValueError):
+                self.masks = {}
+
+    @staticmethod
+    def _key(vid: int, did: int) -> str:
+        return f"{vid:04X}:{did:04X}"
+
+    def get(self, vid: int, did: int, offset: int) -> Optional[RegisterMask]:
+        entry = self.masks.get(self._key(vid, did), {}).get(f"0x{offset:02X}")
+        # A stored mask costs no writes this time
+        return RegisterMask(**entry)._replace(writes=0) if entry else None
+
+    def put(self, vid: int, did: int, mask: RegisterMask):
+        self.masks.setdefault(self._key(vid, did), {})[f"0x{mask.offset:02X}"] = mask._asdict()
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.masks, f, indent=1, sort_keys=True)
+
+
+def discover_masks(pci, bus: int, dev: int, fun: int, offsets: Sequence[int], store: Optional[MaskStore] = None,
+                   protected: Optional[Dict[int, str]] = None, refresh: bool = False,
+                   schedule: Sequence[int] = DEFAULT_SCHEDULE) -> List[RegisterMask]:
+    """
+    Masks for a set of registers, from the store when known and probed otherwise
+
+    Args:
+        pci: cs.pci
+        bus, dev, fun: PCI function
+        offsets: Dword offsets to classify
+        store: MaskStore to consult and update (saved when anything was probed)
+        protected: {offset: name} of dwords never written
+        refresh: Probe even if the store already has the register
+        schedule: Bit groups to toggle (GROUP_SCHEDULE maps every bit)
+    """
+    vid_did = pci.read_dword(bus, dev, fun, 0x00)
+    vid, did = vid_did & 0xFFFF, vid_did >> 16
+
+    probe = WritableMaskProbe(pci, bus, dev, fun, schedule, protected)
+    covered = 0
+    for group in schedule:
+        covered |= group
+    masks = []
+    probed = False
+    for offset in offsets:
+        mask = None if (store is None or refresh) else store.get(vid, did, offset)
+        # A mask stored by a narrower schedule left bits of this one untested -
+        # probe it again
+        if mask is None or (mask.untested & covered and offset not in probe.protected):
+            mask = probe.probe(offset)
+            probed = True
+            if store is not None:
+                store.put(vid, did, mask)
+        masks.append(mask)
+
+    if probed and store is not None:
+        store.save()
+    return masks
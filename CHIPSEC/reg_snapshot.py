@@ -0,0 +1,511 @@
+"""
+Register Snapshot Store and Diff
+================================
+Saves PCI config space and I/O port values as compact binary snapshots and
+compares them field by field, instead of comparing logged values by eye.
+
+Snapshot file (little-endian):
+- Header: magic b'REGSNAP1', metadata length (u32), metadata as JSON
+  (machine, boot, time_ns, description)
+- Region count (u32), then per region: kind (u8: 0 PCI, 1 I/O), bus, dev,
+  fun (u8), I/O base (u16), reserved (u16), length (u32), the raw bytes and
+  one 8-byte BLAKE2b hash per 64-byte block
+
+A store keeps snapshots as <store>/<machine>/<boot>/<time_ns>.regsnap, where
+machine is /etc/machine-id (or the host name) and boot the kernel boot ID
+(or the boot time rounded to the minute).
+
+Diffing compares the hash arrays first: a region whose hashes match is
+skipped without looking at its bytes, and inside a changed region only the
+blocks whose hashes differ are decoded into fields (standard header fields,
+named LPC bridge registers, otherwise the dword offset). Fleet diffs also
+group identical regions by their hash array, so each distinct config space
+is diffed against the reference once however many machines share it.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python reg_snapshot.py capture sim_z390.json --store snapshots
+    python reg_snapshot.py diff old.regsnap new.regsnap
+    python reg_snapshot.py fleet reference.regsnap snapshots/
+    python reg_snapshot.py list snapshots
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import struct
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+SNAPSHOT_MAGIC = b'REGSNAP1'
+SNAPSHOT_SUFFIX = '.regsnap'
+FILE_HEADER = struct.Struct('<8sI')
+COUNT = struct.Struct('<I')
+REGION_HEADER = struct.Struct('<BBBBHHI')
+
+BLOCK_SIZE = 64
+HASH_SIZE = 8
+
+KIND_PCI = 0
+KIND_IO = 1
+
+MACHINE_ID_PATH = '/etc/machine-id'
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+# Read-only port ranges captured by default: (base, count)
+DEFAULT_PORTS = [
+    (0x80, 0x10),  # DMA page registers (0x80 is the POST code port)
+    (0x61, 0x01),  # NMI status and control
+    (0x92, 0x01),  # System control port A
+]
+
+# Type 0/1 header fields: offset -> (width, name); the rest of the header is
+# reported per dword
+PCI_HEADER_FIELDS = {
+    0x00: (2, 'VID'), 0x02: (2, 'DID'), 0x04: (2, 'CMD'), 0x06: (2, 'STS'),
+    0x08: (1, 'RID'), 0x09: (3, 'CLASS'), 0x0C: (1, 'CLS'), 0x0D: (1, 'LAT'),
+    0x0E: (1, 'HDR'), 0x0F: (1, 'BIST'),
+    0x10: (4, 'BAR0'), 0x14: (4, 'BAR1'), 0x18: (4, 'BAR2'), 0x1C: (4, 'BAR3'),
+    0x20: (4, 'BAR4'), 0x24: (4, 'BAR5'), 0x2C: (4, 'SVID/SID'), 0x30: (4, 'ROM'),
+    0x34: (1, 'CAP'), 0x3C: (1, 'INT_LINE'), 0x3D: (1, 'INT_PIN'),
+}
+
+# Named dwords of the LPC bridge (0:1F.0), as used by the LPC DMA tests
+LPC_FIELDS = {
+    0x40: 'ACPI_BASE', 0x44: 'ACPI_CNTL', 0x48: 'GPIO_BASE', 0x4C: 'GPIO_CNTL',
+    0x80: 'LPC_IOD/LPC_EN', 0x84: 'GEN1_DEC', 0x88: 'GEN2_DEC', 0x8C: 'GEN3_DEC', 0x90: 'GEN4_DEC',
+    0xD0: 'GEN_DMA_CTRL', 0xD4: 'GEN_DMA_STAT', 0xD8: 'GEN_DMA_TC', 0xDC: 'GEN_DMA_ADDR',
+    0xE0: 'GEN_DMA_DESC',
+}
+LPC_BDF = (0, 0x1F, 0)
+
+
+def block_hashes(data: bytes) -> bytes:
+    """One HASH_SIZE-byte hash per BLOCK_SIZE-byte block, concatenated"""
+    view = memoryview(data)
+    return b''.join(hashlib.blake2b(view[i:i + BLOCK_SIZE], digest_size=HASH_SIZE).digest()
+                    for i in range(0, len(view), BLOCK_SIZE))
+
+
+def machine_id() -> str:
+    try:
+        with open(MACHINE_ID_PATH) as f:
+            value = f.read().strip()
+        if value:
+            return value
+    except OSError:
+        pass
+    return socket.gethostname()
+
+
+def boot_id() -> str:
+    try:
+        with open(BOOT_ID_PATH) as f:
+            return f.read().strip()
+    except OSError:
+        # Boot time to the minute - stable across runs of the same boot
+        return time.strftime('%Y%m%d-%H%M', time.gmtime(time.time() - time.monotonic()))
+
+
+class Region(NamedTuple):
+    kind: int
+    key: Tuple[int, ...]
+    data: bytes
+    hashes: bytes
+
+    @property
+    def label(self) -> str:
+        if self.kind == KIND_PCI:
+            return f"{self.key[0]:02X}:{self.key[1]:02X}.{self.key[2]:X}"
+        return f"io 0x{self.key[0]:04X}"
+
+
+class RegisterSnapshot(object):
+    """
+    PCI config spaces and I/O port values of one machine at one time
+
+    Attributes:
+        machine, boot: Store keys
+        time_ns: Capture time (time.time_ns())
+        regions: {label: Region}, e.g. '00:1F.0' or 'io 0x0080'
+    """
+
+    def __init__(self, machine: str, boot: str, time_ns: int, description: str = ''):
+        self.machine = machine
+        self.boot = boot
+        self.time_ns = time_ns
+        self.description = description
+        self.regions: Dict[str, Region] = {}
+        self.path: Optional[str] = None
+
+    def _add(self, kind: int, key: Tuple[int, ...], data: bytes):
+        data = bytes(data)
+        region = Region(kind, key, data, block_hashes(data))
+        self.regions[region.label] = region
+
+    def add_pci(self, bus: int, dev: int, fun: int, data: bytes):
+        self._add(KIND_PCI, (bus, dev, fun), data)
+
+    def add_io(self, base: int, data: bytes):
+        self._add(KIND_IO, (base,), data)
+
+    def to_bytes(self) -> bytes:
+        meta = json.dumps({'machine': self.machine, 'boot': self.boot, 'time_ns': self.time_ns,
+                           'description': self.description}).encode()
+        parts = [FILE_HEADER.pack(SNAPSHOT_MAGIC, len(meta)), meta, COUNT.pack(len(self.regions))]
+        for region in self.regions.values():
+            bus, dev, fun = region.key if region.kind == KIND_PCI else (0, 0, 0)
+            base = region.key[0] if region.kind == KIND_IO else 0
+            parts += [REGION_HEADER.pack(region.kind, bus, dev, fun, base, 0, len(region.data)),
+                      region.data, region.hashes]
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'RegisterSnapshot':
+        magic, meta_size = FILE_HEADER.unpack_from(raw, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a register snapshot")
+        pos = FILE_HEADER.size
+        meta = json.loads(raw[pos:pos + meta_size])
+        pos += meta_size
+        snapshot = cls(meta['machine'], meta['boot'], meta['time_ns'], meta.get('description', ''))
+        (count,) = COUNT.unpack_from(raw, pos)
+        pos += COUNT.size
+        for _ in range(count):
+            kind, bus, dev, fun, base, _, length = REGION_HEADER.unpack_from(raw, pos)
+            pos += REGION_HEADER.size
+            data = raw[pos:pos + length]
+            pos += length
+            hashes_size = -(-length // BLOCK_SIZE) * HASH_SIZE
+            region = Region(kind, (bus, dev, fun) if kind == KIND_PCI else (base,), data,
+                            raw[pos:pos + hashes_size])
+            pos += hashes_size
+            snapshot.regions[region.label] = region
+        return snapshot
+
+    def save(self, path: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str) -> 'RegisterSnapshot':
+        with open(path, 'rb') as f:
+            snapshot = cls.from_bytes(f.read())
+        snapshot.path = path
+        return snapshot
+
+    def __str__(self):
+        return (f"{self.machine[:12]} boot {self.boot[:8]} at "
+                f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(self.time_ns / 1e9))} UTC "
+                f"({len(self.regions)} regions)")
+
+
+def capture(pci, functions: Iterable[Tuple[int, int, int]], io=None, ports: Sequence[Tuple[int, int]] = DEFAULT_PORTS,
+            machine: Optional[str] = None, boot: Optional[str] = None, description: str = '') -> RegisterSnapshot:
+    """
+    Capture a snapshot
+
+    Args:
+        pci: A ConfigSpaceSnapshot (anything with config_space(bus, dev, fun))
+        functions: B/D/F tuples to capture
+        io: cs.io for the port ranges (None to skip ports)
+        ports: (base, count) port ranges read a byte at a time
+        machine, boot: Store keys (this machine and boot by default)
+    """
+    snapshot = RegisterSnapshot(machine or machine_id(), boot or boot_id(), time.time_ns(), description)
+    for bus, dev, fun in functions:
+        snapshot.add_pci(bus, dev, fun, pci.config_space(bus, dev, fun))
+    if io is not None:
+        for base, count in ports:
+            snapshot.add_io(base, bytes(io.read_port_byte(port) & 0xFF for port in range(base, base + count)))
+    return snapshot
+
+
+class SnapshotStore(object):
+    """Snapshots on disk as <root>/<machine>/<boot>/<time_ns>.regsnap"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def save(self, snapshot: RegisterSnapshot) -> str:
+        directory = os.path.join(self.root, snapshot.machine, snapshot.boot)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{snapshot.time_ns}{SNAPSHOT_SUFFIX}")
+        snapshot.save(path)
+        return path
+
+    def paths(self, machine: Optional[str] = None) -> List[str]:
+        """Snapshot files, oldest first (of one machine, or all)"""
+        found = []
+        top = os.path.join(self.root, machine) if machine else self.root
+        for root, _, files in os.walk(top):
+            found += [os.path.join(root, name) for name in files if name.endswith(SNAPSHOT_SUFFIX)]
+        return sorted(found, key=lambda path: int(os.path.basename(path)[:-len(SNAPSHOT_SUFFIX)]))
+
+    def machines(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def latest(self, machine: str, before: Optional[int] = None) -> Optional[RegisterSnapshot]:
+        """Newest snapshot of a machine (taken before time_ns 'before' if given)"""
+        for path in reversed(self.paths(machine)):
+            if before is None or int(os.path.basename(path)[:-len(SNAPSHOT_SUFFIX)]) < before:
+                return RegisterSnapshot.load(path)
+        return None
+
+
+class FieldChange(NamedTuple):
+    region: str
+    offset: int
+    width: int
+    name: str
+    old: int
+    new: int
+
+    def __str__(self):
+        digits = self.width * 2
+        return f"{self.region} {self.name:<14} 0x{self.old:0{digits}X} -> 0x{self.new:0{digits}X}"
+
+
+def _fields(region: Region, start: int, end: int) -> List[Tuple[int, int, str]]:
+    """(offset, width, name) of the fields covering bytes start..end of a region"""
+    if region.kind == KIND_IO:
+        return [(offset, 1, f"port 0x{region.key[0] + offset:04X}") for offset in range(start, end)]
+
+    fields = []
+    offset = start
+    while offset < end:
+        if offset < 0x40 and offset in PCI_HEADER_FIELDS:
+            width, name = PCI_HEADER_FIELDS[offset]
+        else:
+            width = 4 - offset % 4
+            name = LPC_FIELDS.get(offset) if region.key == LPC_BDF else None
+            name = name or f"0x{offset:03X}"
+        fields.append((offset, width, name))
+        offset += width
+    return fields
+
+
+def diff_regions(old: Region, new: Region) -> List[FieldChange]:
+    """Changed fields of one region, looking only at blocks whose hashes differ"""
+    if old.hashes == new.hashes and len(old.data) == len(new.data):
+        return []
+    changes = []
+    size = min(len(old.data), len(new.data))
+    for block in range(0, -(-size // BLOCK_SIZE)):
+        h = block * HASH_SIZE
+        if old.hashes[h:h + HASH_SIZE] == new.hashes[h:h + HASH_SIZE]:
+            continue
+        start = block * BLOCK_SIZE
+        end = min(start + BLOCK_SIZE, size)
+        for offset, width, name in _fields(old, start, end):
+            a = old.data[offset:offset + width]
+            b = new.data[offset:offset + width]
+            if a != b:
+                changes.append(FieldChange(old.label, offset, width, name,
+                                           int.from_bytes(a, 'little'), int.from_bytes(b, 'little')))
+    return changes
+
+
+class SnapshotDiff(NamedTuple):
+    old: RegisterSnapshot
+    new: RegisterSnapshot
+    added: List[str]
+    removed: List[str]
+    changes: List[FieldChange]
+
+    @property
+    def identical(self) -> bool:
+        return not (self.added or self.removed or self.changes)
+
+    def report(self, logger, max_lines: int = 100):
+        logger.log(f"[*] Register diff: {self.old} -> {self.new}")
+        for label in self.added:
+            logger.log(f"    + {label}")
+        for label in self.removed:
+            logger.log(f"    - {label}")
+        for change in self.changes[:max_lines]:
+            logger.log(f"    {change}")
+        if len(self.changes) > max_lines:
+            logger.log(f"    ... {len(self.changes) - max_lines} more changed fields not shown")
+        if self.identical:
+            logger.log_good("No register changes")
+        else:
+            logger.log(f"    {len(self.changes)} changed field(s), {len(self.added)} region(s) added, "
+                       f"{len(self.removed)} removed")
+
+
+def diff(old: RegisterSnapshot, new: RegisterSnapshot) -> SnapshotDiff:
+    """Compare two snapshots region by region"""
+    changes = []
+    for label, region in old.regions.items():
+        other = new.regions.get(label)
+        if other is not None:
+            changes += diff_regions(region, other)
+    return SnapshotDiff(old, new, sorted(set(new.regions) - set(old.regions)),
+                        sorted(set(old.regions) - set(new.regions)), changes)
+
+
+def diff_sets(old: Sequence[RegisterSnapshot], new: Sequence[RegisterSnapshot]) -> Dict[str, SnapshotDiff]:
+    """Pair two sets of snapshots by machine (newest of each) and diff every pair"""
+    def newest(snapshots):
+        by_machine = {}
+        for snapshot in snapshots:
+            current = by_machine.get(snapshot.machine)
+            if current is None or snapshot.time_ns > current.time_ns:
+                by_machine[snapshot.machine] = snapshot
+        return by_machine
+
+    old_by_machine = newest(old)
+    new_by_machine = newest(new)
+    return {machine: diff(old_by_machine[machine], new_by_machine[machine])
+            for machine in sorted(set(old_by_machine) & set(new_by_machine))}
+
+
+class FleetDiff(NamedTuple):
+    machines: int
+    # (region, field name) -> {(old, new): [machines]}
+    fields: Dict[Tuple[str, str], Dict[Tuple[int, int], List[str]]]
+    # region -> machines missing it / having it extra
+    missing: Dict[str, List[str]]
+    extra: Dict[str, List[str]]
+    compared_regions: int
+
+    def report(self, logger, max_values: int = 3):
+        logger.log(f"[*] Fleet diff: {self.machines} machine(s) against the reference, "
+                   f"{self.compared_regions} distinct region image(s) decoded")
+        for (region, name), values in sorted(self.fields.items()):
+            count = sum(len(m) for m in values.values())
+            logger.log(f"    {region} {name:<14} differs on {count} machine(s)")
+            for (old, new), machines in sorted(values.items(), key=lambda item: -len(item[1]))[:max_values]:
+                logger.log(f"        0x{old:X} -> 0x{new:X} on {len(machines)}: {', '.join(machines[:4])}"
+                           + (" ..." if len(machines) > 4 else ""))
+        for region, machines in sorted(self.missing.items()):
+            logger.log(f"    {region} missing on {len(machines)} machine(s)")
+        for region, machines in sorted(self.extra.items()):
+            logger.log(f"    {region} only on {len(machines)} machine(s)")
+
+
+def fleet_diff(reference: RegisterSnapshot, snapshots: Iterable[RegisterSnapshot]) -> FleetDiff:
+    """
+    Diff every snapshot against a reference, decoding each distinct region
+    image (same label and hash array) only once
+    """
+    fields: Dict[Tuple[str, str], Dict[Tuple[int, int], List[str]]] = {}
+    missing: Dict[str, List[str]] = {}
+    extra: Dict[str, List[str]] = {}
+    decoded: Dict[Tuple[str, bytes], List[FieldChange]] = {}
+    machines = 0
+
+    for snapshot in snapshots:
+        machines += 1
+        name = snapshot.machine
+        for label, region in reference.regions.items():
+            other = snapshot.regions.get(label)
+            if other is None:
+                missing.setdefault(label, []).append(name)
+                continue
+            key = (label, other.hashes)
+            changes = decoded.get(key)
+            if changes is None:
+                changes = decoded[key] = diff_regions(region, other)
+            for change in changes:
+                fields.setdefault((label, change.name), {}).setdefault((change.old, change.new), []).append(name)
+        for label in snapshot.regions:
+            if label not in reference.regions:
+                extra.setdefault(label, []).append(name)
+
+    return FleetDiff(machines, fields, missing, extra, len(decoded))
+
+
+def load_all(paths: Iterable[str]) -> List[RegisterSnapshot]:
+    """Load snapshot files, expanding directories (stores) recursively"""
+    snapshots = []
+    for path in paths:
+        if os.path.isdir(path):
+            snapshots += [RegisterSnapshot.load(p) for p in SnapshotStore(path).paths()]
+        else:
+            snapshots.append(RegisterSnapshot.load(path))
+    return snapshots
+
+
+class _PrintLogger(object):
+    def log(self, text):
+        print(text)
+
+    log_good = log_warning = log_bad = log_error = log
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture, store and diff register snapshots")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    capture_parser = commands.add_parser('capture', help="Snapshot a simulated platform dump")
+    capture_parser.add_argument("dump", help="sim_chipset.py JSON dump")
+    capture_parser.add_argument("--store", default='snapshots', help="Snapshot store directory")
+    capture_parser.add_argument("--machine", help="Machine key (default: the dump file name)")
+
+    diff_parser = commands.add_parser('diff', help="Diff two snapshots (or two stores, by machine)")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+
+    fleet_parser = commands.add_parser('fleet', help="Diff many snapshots against a reference")
+    fleet_parser.add_argument("reference")
+    fleet_parser.add_argument("paths", nargs='+', help="Snapshot files or store directories")
+    fleet_parser.add_argument("--latest", action='store_true', help="Only each machine's newest snapshot")
+
+    list_parser = commands.add_parser('list', help="List the snapshots in a store")
+    list_parser.add_argument("store")
+    args = parser.parse_args()
+    logger = _PrintLogger()
+
+    if args.command == 'capture':
+        try:
+            from chipsec.modules.common import sim_chipset
+            from chipsec.modules.common.pci_cfg_snapshot import ConfigSpaceSnapshot, pciexbar_reader
+        except ImportError:
+            import sim_chipset
+            from pci_cfg_snapshot import ConfigSpaceSnapshot, pciexbar_reader
+        chipset = sim_chipset.SimChipset.from_dump(args.dump, record_accesses=False)
+        config = ConfigSpaceSnapshot(chipset, 0x1000, pciexbar_reader(chipset))
+        machine = args.machine or os.path.splitext(os.path.basename(args.dump))[0]
+        snapshot = capture(config, sorted(chipset.pci.spaces), chipset.io, machine=machine, boot='dump',
+                           description=args.dump)
+        print(f"Saved {snapshot} to {SnapshotStore(args.store).save(snapshot)}")
+
+    elif args.command == 'diff':
+        if os.path.isdir(args.old) and os.path.isdir(args.new):
+            for machine, result in diff_sets(load_all([args.old]), load_all([args.new])).items():
+                result.report(logger)
+        else:
+            diff(RegisterSnapshot.load(args.old), RegisterSnapshot.load(args.new)).report(logger)
+
+    elif args.command == 'fleet':
+        reference = RegisterSnapshot.load(args.reference)
+        snapshots = load_all(args.paths)
+        if args.latest:
+            newest = {}
+            for snapshot in snapshots:
+                if snapshot.machine not in newest or snapshot.time_ns > newest[snapshot.machine].time_ns:
+                    newest[snapshot.machine] = snapshot
+            snapshots = list(newest.values())
+        start = time.perf_counter()
+        result = fleet_diff(reference, snapshots)
+        elapsed = time.perf_counter() - start
+        result.report(logger)
+        print(f"Diffed {len(snapshots)} snapshot(s) in {elapsed:.3f}s")
+
+    elif args.command == 'list':
+        for path in SnapshotStore(args.store).paths():
+            print(f"{RegisterSnapshot.load(path)}  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,660 @@
+"""
+Simulated Chipset Backend
+=========================
+A stand-in for the CHIPSEC 'cs' object so the LPC DMA modules can run
+without hardware - for regression tests and benchmarks on plain Linux CI.
+
+The simulated platform is loaded from a JSON dump (see sim_z390.json):
+- "pci": config space per function, either "hex" (raw bytes) or sparse
+  "dwords" ({offset: value}); "masks" optionally limit writes per dword
+  ({offset: {"rw": mask, "w1c": mask}}, the reg_mask_probe.py fields)
+- "io": initial values for plain I/O ports
+- "msr": MSR values
+- "mem": physical memory ranges as hex
+- "acpi_dir": directory of raw ACPI tables (*.dat / *.bin / *.aml), the
+  only ACPI the simulated platform has
+- "superio": Super I/O chips per config index port ({port: {"key": [bytes],
+  "regs": {reg: value}, "ldn": {ldn: {reg: value}}}})
+- "smi": SMI handler effects per APM command, as config dwords the handler
+  writes ({command: {bdf: {offset: value}}}), ignoring write masks
+
+Modelled beyond plain storage:
+- The 8237A DMA controller pair (ports 0x00-0x0F, 0xC0-0xDE, page registers
+  0x81-0x8F) through dma8237.py, in the state firmware leaves it (channel 4
+  cascading DMA1): software requests run transfers to terminal count, against
+  the dump's memory ranges
+- APM_CNT/APM_STS (0xB2/0xB3): writes to 0xB2 are counted as SMIs
+- Super I/O config ports: the entry key unlocks the index/data pair, 0xAA
+  to the index port or 0x02 to register 0x02 locks it again
+- The ECAM window behind host bridge PCIEXBAR, so bulk reads through
+  cs.mem.read_physical_mem see the same config space as cs.pci
+
+Every access is recorded in cs.accesses as (kind, op, target, value) and a
+virtual clock advances by a fixed cost per access. run_module() loads a
+module with the simulated cs, the virtual clock and non-interactive input,
+so results and timing are deterministic. Long loops that normally end with
+Ctrl+C are interrupted after a virtual time budget.
+
+Running modules needs CHIPSEC importable (for BaseModule); no hardware,
+driver or root access is used, and nothing is read from the host's sysfs,
+ACPI tables or DMI data.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage:
+    python sim_chipset.py sim_z390.json -m lpc_dma_check
+    python sim_chipset.py sim_z390.json -m lpc_dma_h81_z390_test -a -poll=5 --trace accesses.jsonl
+"""
+
+import argparse
+import builtins
+import contextlib
+import importlib
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import tempfile
+import time as _time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from chipsec.modules.common.dma8237 import Dma8237Pair
+except ImportError:
+    from dma8237 import Dma8237Pair
+
+# Virtual cost of one helper round trip (config, port or MSR access)
+ACCESS_NS = 2000
+
+# Virtual cost of reading the clock, so busy-wait loops always progress
+CLOCK_READ_NS = 50
+
+# Virtual seconds a sleeping loop may run before a simulated Ctrl+C
+DEFAULT_INTERRUPT_BUDGET = 600.0
+
+# Arbitrary start time (2020-01-01 UTC) so timestamps are reproducible
+EPOCH_NS = 1577836800 * 10 ** 9
+
+APM_CNT = 0xB2
+APM_STS = 0xB3
+
+
+def _int(value) -> int:
+    return value if isinstance(value, int) else int(value, 0)
+
+
+def parse_bdf(text: str) -> Tuple[int, int, int]:
+    """Parse 'bus:dev.fun' (hex)"""
+    bus, rest = text.split(':')
+    dev, fun = rest.split('.')
+    return int(bus, 16), int(dev, 16), int(fun, 16)
+
+
+class SimClock(object):
+    """
+    Virtual replacement for the time module used by the modules under test
+
+    Sleeping advances virtual time instantly. Once a sleep would pass the
+    interrupt deadline KeyboardInterrupt is raised - the simulated Ctrl+C -
+    and the next deadline is set one budget later.
+    """
+
+    def __init__(self, interrupt_budget: float = DEFAULT_INTERRUPT_BUDGET):
+        self.now_ns = 0
+        self.interrupt_budget = interrupt_budget
+        self.next_interrupt = int(interrupt_budget * 1e9)
+        self.interrupts = 0
+
+    def advance(self, ns: int):
+        self.now_ns += ns
+
+    def monotonic_ns(self) -> int:
+        self.now_ns += CLOCK_READ_NS
+        return self.now_ns
+
+    def monotonic(self) -> float:
+        return self.monotonic_ns() / 1e9
+
+    def perf_counter(self) -> float:
+        return self.monotonic()
+
+    def time_ns(self) -> int:
+        return EPOCH_NS + self.monotonic_ns()
+
+    def time(self) -> float:
+        return self.time_ns() / 1e9
+
+    def sleep(self, seconds: float):
+        target = self.now_ns + int(seconds * 1e9)
+        if target > self.next_interrupt:
+            self.now_ns = self.next_interrupt
+            self.next_interrupt = self.now_ns + int(self.interrupt_budget * 1e9)
+            self.interrupts += 1
+            raise KeyboardInterrupt
+        self.now_ns = target
+
+    def localtime(self, seconds: Optional[float] = None):
+        return _time.gmtime(self.time() if seconds is None else seconds)
+
+    def gmtime(self, seconds: Optional[float] = None):
+        return self.localtime(seconds)
+
+    def strftime(self, fmt: str, t=None) -> str:
+        return _time.strftime(fmt, t if t is not None else self.localtime())
+
+    def __getattr__(self, name):
+        # Everything else (struct_time, mktime, ...) comes from the real module
+        return getattr(_time, name)
+
+
+class SimPci(object):
+    """Config space per function; absent functions read back all 1s"""
+
+    def __init__(self, chipset):
+        self._cs = chipset
+        self.spaces: Dict[Tuple[int, int, int], bytearray] = {}
+        self.masks: Dict[Tuple[int, int, int], Dict[int, dict]] = {}
+
+    def add_function(self, bdf: Tuple[int, int, int], data: bytes = b'', size: int = 0x1000):
+        space = bytearray(size)
+        space[:len(data)] = data
+        self.spaces[bdf] = space
+        return space
+
+    def _dword(self, bus, dev, fun, offset) -> int:
+        space = self.spaces.get((bus, dev, fun))
+        if space is None or offset + 4 > len(space):
+            return 0xFFFFFFFF
+        return struct.unpack_from('<I', space, offset)[0]
+
+    def read_dword(self, bus, dev, fun, offset):
+        value = self._dword(bus, dev, fun, offset & ~3)
+        self._cs.record('pci', 'r', (bus, dev, fun, offset), value)
+        return value
+
+    def read_word(self, bus, dev, fun, offset):
+        value = (self._dword(bus, dev, fun, offset & ~3) >> ((offset & 2) * 8)) & 0xFFFF
+        self._cs.record('pci', 'r', (bus, dev, fun, offset), value)
+        return value
+
+    def read_byte(self, bus, dev, fun, offset):
+        value = (self._dword(bus, dev, fun, offset & ~3) >> ((offset & 3) * 8)) & 0xFF
+        self._cs.record('pci', 'r', (bus, dev, fun, offset), value)
+        return value
+
+    def _write(self, bus, dev, fun, offset, value, width):
+        self._cs.record('pci', 'w', (bus, dev, fun, offset), value)
+        space = self.spaces.get((bus, dev, fun))
+        aligned = offset & ~3
+        if space is None or aligned + 4 > len(space):
+            return
+
+        shift = (offset - aligned) * 8
+        lanes = ((1 << (width * 8)) - 1) << shift
+        old = struct.unpack_from('<I', space, aligned)[0]
+        mask = self.masks.get((bus, dev, fun), {}).get(aligned)
+        rw = mask.get('rw', 0xFFFFFFFF) if mask else 0xFFFFFFFF
+        w1c = mask.get('w1c', 0) if mask else 0
+
+        value = (value << shift) & lanes
+        new = (old & ~(rw & lanes)) | (value & rw)
+        new &= ~(value & w1c)
+        struct.pack_into('<I', space, aligned, new & 0xFFFFFFFF)
+
+    def write_dword(self, bus, dev, fun, offset, value):
+        self._write(bus, dev, fun, offset, value, 4)
+
+    def write_word(self, bus, dev, fun, offset, value):
+        self._write(bus, dev, fun, offset, value, 2)
+
+    def write_byte(self, bus, dev, fun, offset, value):
+        self._write(bus, dev, fun, offset, value, 1)
+
+    def get_device_address(self, bus, dev, fun):
+        return self._cs.ecam_base() + ((bus << 20) | (dev << 15) | (fun << 12))
+
+
+class SimSuperIo(object):
+    """Super I/O config index/data pair behind an entry key"""
+
+    def __init__(self, key: List[int], regs: Dict[int, int], ldns: Dict[int, Dict[int, int]]):
+        self.key = key
+        self.regs = regs
+        self.ldns = ldns
+        self.unlocked = False
+        self._recent: List[int] = []
+        self._index = 0
+
+    def write_index(self, value: int):
+        if not self.unlocked:
+            self._recent = (self._recent + [value])[-len(self.key):]
+            self.unlocked = self._recent == self.key
+        elif value == 0xAA:
+            self.unlocked = False
+            self._recent = []
+        else:
+            self._index = value
+
+    def write_data(self, value: int):
+        if not self.unlocked:
+            return
+        if self._index == 0x02 and value & 0x02:
+            self.unlocked = False
+            self._recent = []
+        elif self._index < 0x30:
+            self.regs[self._index] = value
+        else:
+            self.ldns.setdefault(self.regs.get(0x07, 0), {})[self._index] = value
+
+    def read_data(self) -> int:
+        if not self.unlocked:
+            return 0xFF
+        if self._index < 0x30:
+            return self.regs.get(self._index, 0x00)
+        return self.ldns.get(self.regs.get(0x07, 0), {}).get(self._index, 0x00)
+
+
+class SimIo(object):
+    """Port I/O with 8237A and APM models; other ports are plain storage"""
+
+    def __init__(self, chipset):
+        self._cs = chipset
+        self.ports: Dict[int, int] = {}
+        self.dma = Dma8237Pair(chipset.mem).firmware_init()
+        self.smi_count = 0
+        # APM command -> [(bdf, offset, value), ...] written by its SMI handler
+        self.smi_handlers: Dict[int, List[tuple]] = {}
+        # Config index port -> SimSuperIo
+        self.superio: Dict[int, SimSuperIo] = {}
+
+    def read_port_byte(self, port):
+        if self.dma.decodes(port):
+            value = self.dma.read(port)
+        elif port - 1 in self.superio:
+            value = self.superio[port - 1].read_data()
+        else:
+            value = self.ports.get(port, 0xFF)
+        self._cs.record('io', 'r', port, value)
+        return value
+
+    def write_port_byte(self, port, value):
+        value &= 0xFF
+        self._cs.record('io', 'w', port, value)
+        if self.dma.decodes(port):
+            self.dma.write(port, value)
+            return
+        if port in self.superio:
+            self.superio[port].write_index(value)
+            return
+        if port - 1 in self.superio:
+            self.superio[port - 1].write_data(value)
+            return
+        if port == APM_CNT:
+            self.smi_count += 1
+            for bdf, offset, data in self.smi_handlers.get(value, []):
+                space = self._cs.pci.spaces.get(bdf)
+                if space is not None:
+                    struct.pack_into('<I', space, offset, data)
+        self.ports[port] = value
+
+    def read_port_word(self, port):
+        return self.read_port_byte(port) | (self.read_port_byte(port + 1) << 8)
+
+    def write_port_word(self, port, value):
+        self.write_port_byte(port, value & 0xFF)
+        self.write_port_byte(port + 1, value >> 8)
+
+    def read_port_dword(self, port):
+        return self.read_port_word(port) | (self.read_port_word(port + 2) << 16)
+
+    def write_port_dword(self, port, value):
+        self.write_port_word(port, value & 0xFFFF)
+        self.write_port_word(port + 2, value >> 16)
+
+
+class SimMem(object):
+    """Sparse physical memory; the PCIEXBAR window is served from SimPci"""
+
+    def __init__(self, chipset):
+        self._cs = chipset
+        self.ranges: List[Tuple[int, bytearray]] = []
+        self._next_alloc = 0x10000000
+
+    def add_range(self, base: int, data: bytes):
+        self.ranges.append((base, bytearray(data)))
+
+    def _find(self, address: int, length: int):
+        for base, data in self.ranges:
+            if base <= address and address + length <= base + len(data):
+                return base, data
+        return None, None
+
+    def read_physical_mem(self, address, length):
+        self._cs.record('mem', 'r', address, length)
+
+        window = self._cs.ecam_window()
+        if window and window[0] <= address < window[0] + window[1]:
+            offset = address - window[0]
+            bdf = (offset >> 20, (offset >> 15) & 0x1F, (offset >> 12) & 0x7)
+            space = self._cs.pci.spaces.get(bdf)
+            start = offset & 0xFFF
+            if space is None:
+                return b'\xFF' * length
+            return bytes(space[start:start + length]).ljust(length, b'\xFF')
+
+        base, data = self._find(address, length)
+        if data is None:
+            return b'\xFF' * length
+        return bytes(data[address - base:address - base + length])
+
+    def write_physical_mem(self, address, length, buf):
+        self._cs.record('mem', 'w', address, length)
+        base, data = self._find(address, length)
+        if data is not None:
+            data[address - base:address - base + length] = bytes(buf)[:length]
+
+    def read(self, address: int, length: int) -> bytes:
+        # Bus master (DMA) access: not a helper call, so not recorded
+        base, data = self._find(address, length)
+        if data is None:
+            return b'\xFF' * length
+        return bytes(data[address - base:address - base + length])
+
+    def write(self, address: int, buf: bytes):
+        base, data = self._find(address, len(buf))
+        if data is not None:
+            data[address - base:address - base + len(buf)] = buf
+
+    def alloc_physical_mem(self, length, max_address=0xFFFFFFFFFFFFFFFF):
+        address = self._next_alloc
+        self._next_alloc += (length + 0xFFF) & ~0xFFF
+        self.add_range(address, bytes(length))
+        self._cs.record('mem', 'alloc', address, length)
+        return address, address
+
+    def free_physical_mem(self, address):
+        self._cs.record('mem', 'free', address, 0)
+        self.ranges = [(base, data) for base, data in self.ranges if base != address]
+
+
+class SimMsr(object):
+    def __init__(self, chipset):
+        self._cs = chipset
+        self.values: Dict[int, int] = {}
+
+    def read_msr(self, cpu, msr):
+        value = self.values.get(msr, 0)
+        self._cs.record('msr', 'r', msr, value)
+        return value & 0xFFFFFFFF, value >> 32
+
+    def write_msr(self, cpu, msr, eax, edx):
+        value = (edx << 32) | eax
+        self._cs.record('msr', 'w', msr, value)
+        self.values[msr] = value
+
+
+class SimAcpi(object):
+    """Raw ACPI tables from a directory, looked up by signature"""
+
+    def __init__(self, chipset, directory: Optional[str] = None):
+        self._cs = chipset
+        self.directory = directory
+        self.tables: Dict[str, List[bytes]] = {}
+        if directory:
+            for name in sorted(os.listdir(directory)):
+                if os.path.splitext(name)[1].lower() not in ('.dat', '.bin', '.aml'):
+                    continue
+                with open(os.path.join(directory, name), 'rb') as f:
+                    data = f.read()
+                if len(data) >= 36:
+                    signature = data[0:4].decode('ascii', 'replace')
+                    self.tables.setdefault(signature, []).append(data)
+
+    def get_ACPI_table_list(self):
+        return {signature: list(range(len(tables))) for signature, tables in self.tables.items()}
+
+    def get_table_content(self, signature):
+        self._cs.record('acpi', 'r', signature, 0)
+        tables = self.tables.get(signature)
+        return tables[0] if tables else None
+
+    def get_DSDT(self):
+        return self.get_table_content('DSDT')
+
+
+class SimChipset(object):
+    """
+    The simulated 'cs' object
+
+    Args:
+        clock: SimClock advanced by ACCESS_NS per access (a new one if None)
+        record_accesses: Keep every access in self.accesses
+    """
+
+    def __init__(self, clock: Optional[SimClock] = None, record_accesses: bool = True):
+        self.clock = clock or SimClock()
+        self.record_accesses = record_accesses
+        self.accesses: List[tuple] = []
+        self.counts: Dict[Tuple[str, str], int] = {}
+
+        self.pci = SimPci(self)
+        self.mem = SimMem(self)
+        self.io = SimIo(self)
+        self.msr = SimMsr(self)
+        self.acpi = SimAcpi(self)
+
+    def record(self, kind: str, op: str, target, value):
+        self.clock.advance(ACCESS_NS)
+        key = (kind, op)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if self.record_accesses:
+            self.accesses.append((kind, op, target, value))
+
+    def ecam_window(self) -> Optional[Tuple[int, int]]:
+        """(base, size) decoded from the host bridge PCIEXBAR, if enabled"""
+        host = self.pci.spaces.get((0, 0, 0))
+        if host is None:
+            return None
+        lo, hi = struct.unpack_from('<II', host, 0x60)
+        if not lo & 1:
+            return None
+        size = {0: 256, 1: 128, 2: 64}.get((lo >> 1) & 3, 256) << 20
+        return ((hi & 0x7F) << 32) | (lo & 0xFC000000), size
+
+    def ecam_base(self) -> int:
+        window = self.ecam_window()
+        return window[0] if window else 0
+
+    def read_register_field(self, register, field=None, cpu=0):
+        # The modules only pass raw MSR numbers here
+        if isinstance(register, int):
+            eax, edx = self.msr.read_msr(cpu, register)
+            return (edx << 32) | eax
+        raise ValueError(f"Register {register} is not modelled")
+
+    @classmethod
+    def from_dump(cls, path: str, clock: Optional[SimClock] = None, record_accesses: bool = True):
+        """Build a simulated platform from a JSON dump"""
+        with open(path) as f:
+            dump = json.load(f)
+
+        chipset = cls(clock, record_accesses)
+        for name, entry in dump.get('pci', {}).items():
+            bdf = parse_bdf(name)
+            space = chipset.pci.add_function(bdf, bytes.fromhex(entry.get('hex', '')), _int(entry.get('size', 0x1000)))
+            for offset, value in entry.get('dwords', {}).items():
+                struct.pack_into('<I', space, _int(offset), _int(value))
+            chipset.pci.masks[bdf] = {_int(offset): {k: _int(v) for k, v in mask.items()}
+                                      for offset, mask in entry.get('masks', {}).items()}
+
+        for port, value in dump.get('io', {}).items():
+            if chipset.io.dma.decodes(_int(port)):
+                chipset.io.dma.write(_int(port), _int(value))
+            else:
+                chipset.io.ports[_int(port)] = _int(value)
+        for msr, value in dump.get('msr', {}).items():
+            chipset.msr.values[_int(msr)] = _int(value)
+        for port, chip in dump.get('superio', {}).items():
+            chipset.io.superio[_int(port)] = SimSuperIo(
+                [_int(value) for value in chip['key']], {_int(r): _int(v) for r, v in chip.get('regs', {}).items()},
+                {_int(ldn): {_int(r): _int(v) for r, v in regs.items()} for ldn, regs in chip.get('ldn', {}).items()})
+        for command, writes in dump.get('smi', {}).items():
+            chipset.io.smi_handlers[_int(command)] = [(parse_bdf(name), _int(offset), _int(value))
+                                                      for name, dwords in writes.items()
+                                                      for offset, value in dwords.items()]
+        for base, data in dump.get('mem', {}).items():
+            chipset.mem.add_range(_int(base), bytes.fromhex(data))
+
+        acpi_dir = dump.get('acpi_dir')
+        if acpi_dir:
+            if not os.path.isabs(acpi_dir):
+                acpi_dir = os.path.join(os.path.dirname(os.path.abspath(path)), acpi_dir)
+            # A dump copied without its tables just has no ACPI
+            if os.path.isdir(acpi_dir):
+                chipset.acpi = SimAcpi(chipset, acpi_dir)
+
+        return chipset
+
+    def summary(self) -> str:
+        parts = [f"{kind} {op}: {count}" for (kind, op), count in sorted(self.counts.items())]
+        return ", ".join(parts) + f", SMIs triggered: {self.io.smi_count}"
+
+
+# Modules whose 'time' reference is switched to the virtual clock
+CLOCKED_MODULES = ('dma_reg_sampler', 'dma_reg_log', 'workload_monitor')
+
+# Host firmware paths, redirected wherever they were imported by name;
+# ACPI tables then come only from the dump's acpi_dir through cs.acpi
+HOST_PATHS = {'SYSFS_ACPI_TABLES': 'no-acpi', 'SYSFS_DMAR': 'no-dmar', 'SYSFS_DMI': 'no-dmi'}
+HOST_PATH_MODULES = ('acpi_harvest', 'phase_cache', 'lpc_dma_check')
+
+
+def _no_host_process(args, *rest, **kwargs):
+    raise FileNotFoundError(f"{args[0] if isinstance(args, (list, tuple)) else args}: "
+                            f"host programs are not run in the simulator")
+
+
+def _loaded(name: str):
+    """Imported copies of a helper module (plain and chipsec.modules.common)"""
+    return [module for key, module in list(sys.modules.items())
+            if module is not None and (key == name or key.endswith('.' + name))]
+
+
+def import_module(module_name: str):
+    """Import a module or helper from this directory"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    return importlib.import_module(module_name)
+
+
+@contextlib.contextmanager
+def simulated(module, chipset: SimChipset, workdir: str):
+    """
+    Patch a module and its helpers onto a simulated platform for the duration
+    of the block, running in workdir
+
+    Keeps the simulation away from the host: no sysfs PCI tree, MCFG
+    mapping, ACPI tables or DMI data, no host programs (acpidump, aplay,
+    ...), an unknown platform.system(), virtual time and no interactive
+    prompts.
+    """
+    clock = chipset.clock
+    overrides = [(builtins, 'input', lambda prompt='': ''), (module, 'time', clock),
+                 (platform, 'system', lambda: 'Simulated'),
+                 (subprocess, 'run', _no_host_process), (subprocess, 'Popen', _no_host_process)]
+    for helper in [module] + [m for name in HOST_PATH_MODULES for m in _loaded(name)]:
+        for attr, path in HOST_PATHS.items():
+            overrides.append((helper, attr, os.path.join(workdir, path)))
+    for helper in _loaded('phase_cache'):
+        # Not the host's BIOS from the Windows registry either
+        overrides.append((helper, '_bios_version', lambda: ''))
+    for helper in _loaded('pci_enum'):
+        overrides.append((helper, 'SYSFS_PCI_DEVICES', os.path.join(workdir, 'no-sysfs')))
+    for helper in _loaded('ecam_reader'):
+        overrides.append((helper, 'SYSFS_MCFG', os.path.join(workdir, 'no-mcfg')))
+    for helper in _loaded('workload_monitor'):
+        # Workloads may run (scratch file, loopback), but never against host USB devices
+        overrides.append((helper, 'USB_DEVICE_NODES', os.path.join(workdir, 'no-usb')))
+        overrides.append((helper, 'SYSFS_USB_DEVICES', os.path.join(workdir, 'no-usb')))
+    for helper in _loaded('dma_reg_sampler'):
+        # Sleeping is free on the virtual clock - never spin-wait
+        overrides.append((helper, 'SPIN_THRESHOLD_NS', 0))
+    for name in CLOCKED_MODULES:
+        overrides += [(helper, 'time', clock) for helper in _loaded(name)]
+
+    cwd = os.getcwd()
+    saved = [(owner, attr, getattr(owner, attr)) for owner, attr, _ in overrides if hasattr(owner, attr)]
+    try:
+        for owner, attr, value in overrides:
+            if hasattr(owner, attr):
+                setattr(owner, attr, value)
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)
+        yield
+    finally:
+        os.chdir(cwd)
+        for owner, attr, value in saved:
+            setattr(owner, attr, value)
+
+
+def run_module(module_name: str, dump_path: str, module_argv: Optional[List[str]] = None,
+               interrupt_budget: float = DEFAULT_INTERRUPT_BUDGET, workdir: Optional[str] = None):
+    """
+    Run one CHIPSEC module against a simulated platform
+
+    Args:
+        module_name: Module file name, e.g. 'lpc_dma_check'
+        dump_path: JSON platform dump
+        module_argv: Arguments passed to run()
+        interrupt_budget: Virtual seconds before a sleeping loop gets Ctrl+C
+        workdir: Directory for files the module writes (a new temporary one if None)
+
+    Returns:
+        (result, chipset, wall_seconds)
+    """
+    dump_path = os.path.abspath(dump_path)
+    clock = SimClock(interrupt_budget)
+    chipset = SimChipset.from_dump(dump_path, clock)
+    module = import_module(module_name)
+
+    workdir = workdir or tempfile.mkdtemp(prefix='sim_chipset_')
+    with simulated(module, chipset, workdir):
+        instance = getattr(module, module_name)()
+        instance.cs = chipset
+
+        start = _time.perf_counter()
+        result = instance.run(module_argv or [])
+        wall = _time.perf_counter() - start
+
+    return result, chipset, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a CHIPSEC module against a simulated chipset")
+    parser.add_argument("dump", help="JSON platform dump (e.g. sim_z390.json)")
+    parser.add_argument("-m", "--module", required=True, help="Module name, e.g. lpc_dma_check")
+    parser.add_argument("-a", "--args", nargs=argparse.REMAINDER, default=[], help="Module arguments")
+    parser.add_argument("--budget", type=float, default=DEFAULT_INTERRUPT_BUDGET,
+                        help="Virtual seconds before a sleeping loop is interrupted")
+    parser.add_argument("--workdir", help="Where the module writes its files (default: a temp directory)")
+    parser.add_argument("--trace", help="Write every access as JSON lines")
+    args = parser.parse_args()
+
+    result, chipset, wall = run_module(args.module, args.dump, args.args, args.budget, args.workdir)
+
+    print(f"Result: {result}")
+    print(f"Accesses: {len(chipset.accesses)} ({chipset.summary()})")
+    print(f"Virtual time: {chipset.clock.now_ns / 1e9:.3f}s, simulated Ctrl+C: {chipset.clock.interrupts}, "
+          f"wall time: {wall:.3f}s")
+
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            for kind, op, target, value in chipset.accesses:
+                f.write(json.dumps([kind, op, target, value]) + "\n")
+
+
+if __name__ == "__main__":
+    main()
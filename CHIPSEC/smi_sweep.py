@@ -0,0 +1,298 @@
+"""
+Adaptive SMI Command Sweep
+==========================
+Finds the APM SMI commands (values written to port 0xB2) that change a set
+of registers, testing commands in groups instead of one at a time.
+
+A group's commands are fired back to back, the registers are fingerprinted
+once (one tuple of dwords, see dma_reg_sampler.make_pci_reader) and compared
+with the baseline:
+- no change: every command in the group is cleared at once
+- a change: the group is split in half and both halves are tested again,
+  down to single commands (binary splitting)
+
+Group sizes adapt to how many hits have been found so far (generalised
+binary splitting): with d hits expected among n untested commands the next
+group holds 2^floor(log2(n / d)) commands. Each hit then costs about
+log2(group size) extra SMIs, and settle sleeps and fingerprint reads are
+paid per group rather than per command.
+
+Every command still has to be fired at least once to be cleared - port
+0xB2 takes one value per SMI. A command whose effect is undone by a later
+command in the same group, or which only changes the registers briefly,
+is missed, as it would be with one check per command after the settle time.
+Splitting relies on putting the registers back after a hit: when that
+fails (read-only bits set by the handler) firing the halves again shows
+nothing, so the group is reported as an unresolved hit instead.
+
+Sleeps are bounded (SMI gap and settle time are clamped, and groups are cut
+down to what is left of the run's sleep or SMI budget). Progress is
+checkpointed to a JSON file after every group, so an interrupted or
+budgeted sweep resumes where it stopped.
+
+The values the FADT reserves for its SMI_CMD port (ACPI_ENABLE,
+ACPI_DISABLE, S4BIOS_REQ) switch the ACPI mode or put the machine into
+S4, so they are never fired: fadt_denylist() reads them from the FACP and
+SmiSweepPlanner.skip() takes them out of the plan.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    planner = SmiSweepPlanner.resume("smi_sweep.json")
+    planner.skip(fadt_denylist(cs.acpi.get_table_content('FACP')))
+    run_sweep(planner, fire, fingerprint, restore, checkpoint="smi_sweep.json", clock=time)
+    planner.report(self.logger)
+"""
+
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+APM_CNT = 0xB2
+
+# Upper bounds on the sleeps between SMIs and before a fingerprint
+MAX_GAP = 0.01
+MAX_SETTLE = 0.1
+
+DEFAULT_GAP = 0.001
+DEFAULT_SETTLE = 0.01
+
+# Hits assumed before the first one is found, for the first group size
+PRIOR_HITS = 1
+
+# FADT byte offsets of the SMI_CMD port and of the values the OS writes to it
+FADT_SMI_CMD = 48
+FADT_SMI_VALUES = (('ACPI_ENABLE', 52), ('ACPI_DISABLE', 53), ('S4BIOS_REQ', 54))
+
+
+def fadt_denylist(facp: Optional[bytes]) -> Dict[int, str]:
+    """
+    SMI command values reserved by the FADT (raw FACP table, header
+    included), as {value: field name}. A zero field is not supported and
+    is left out; so is everything when the table is missing or short.
+    """
+    denied: Dict[int, str] = {}
+    if not facp or len(facp) <= max(offset for _, offset in FADT_SMI_VALUES):
+        return denied
+    for name, offset in FADT_SMI_VALUES:
+        if facp[offset]:
+            denied.setdefault(facp[offset], name)
+    return denied
+
+
+class SmiSweepPlanner(object):
+    """
+    Group testing plan over SMI command values
+
+    Args:
+        commands: Command values to test (all 256 by default)
+        max_group: Largest group fired before a fingerprint
+
+    Attributes:
+        hits: {command: [changed register indices]} pinpointed so far
+        unresolved: [(group, [changed register indices])] hits whose effect could not be undone
+        skipped: {command: reason} never fired (see skip())
+        smis: SMIs fired over all runs
+        checks: Fingerprints compared over all runs
+    """
+
+    def __init__(self, commands: Sequence[int] = range(0x100), max_group: int = 32):
+        self.max_group = max_group
+        self.untested: List[int] = list(commands)
+        self.total = len(self.untested)
+        # Halves of positive groups, tested before any new group
+        self.pending: List[List[int]] = []
+        self.hits: Dict[int, List[int]] = {}
+        self.unresolved: List[Tuple[List[int], List[int]]] = []
+        self.skipped: Dict[int, str] = {}
+        self.smis = 0
+        self.checks = 0
+
+    def skip(self, commands: Dict[int, str]):
+        """Take commands ({command: reason}) out of the plan, so they are never fired"""
+        removed = [c for c in commands if c not in self.skipped and
+                   (c in self.untested or any(c in group for group in self.pending))]
+        self.untested = [c for c in self.untested if c not in commands]
+        self.pending = [kept for kept in ([c for c in group if c not in commands] for group in self.pending) if kept]
+        self.total -= len(removed)
+        for command in removed:
+            self.skipped[command] = commands[command]
+
+    @property
+    def complete(self) -> bool:
+        return not self.pending and not self.untested
+
+    def group_size(self) -> int:
+        expected = max(len(self.hits) + len(self.unresolved), PRIOR_HITS)
+        size = 1
+        while size * 2 <= max(1, len(self.untested) // expected) and size * 2 <= self.max_group:
+            size *= 2
+        return size
+
+    def next_group(self, limit: Optional[int] = None) -> Optional[List[int]]:
+        """
+        The commands to fire next, or None once the sweep is complete. A
+        group larger than limit is cut down to limit commands (a pending
+        group is split, its remainder tested after it).
+        """
+        if self.pending:
+            group = self.pending[0]
+            if limit is not None and len(group) > limit:
+                self.pending[0:1] = [group[:limit], group[limit:]]
+            return self.pending[0]
+        if self.untested:
+            size = self.group_size()
+            if limit is not None:
+                size = min(size, limit)
+            group = self.untested[:size]
+            self.pending.append(group)
+            del self.untested[:len(group)]
+            return group
+        return None
+
+    def record(self, group: List[int], changed: List[int], restored: bool = True):
+        """
+        Record the outcome of firing group: the fingerprint indices that
+        changed, and whether they could be put back afterwards
+        """
+        self.checks += 1
+        self.pending.remove(group)
+        if not changed:
+            return
+        if len(group) == 1:
+            self.hits[group[0]] = list(changed)
+            return
+        if not restored:
+            self.unresolved.append((list(group), list(changed)))
+            return
+        half = len(group) // 2
+        # Depth first, so a hit is pinpointed while the baseline is fresh
+        self.pending[:0] = [group[:half], group[half:]]
+
+    def to_dict(self) -> dict:
+        return {'max_group': self.max_group, 'total': self.total, 'untested': self.untested,
+                'pending': self.pending, 'hits': {str(c): v for c, v in self.hits.items()},
+                'unresolved': self.unresolved, 'skipped': {str(c): r for c, r in self.skipped.items()},
+                'smis': self.smis, 'checks': self.checks}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SmiSweepPlanner':
+        planner = cls([], data['max_group'])
+        planner.total = data['total']
+        planner.untested = data['untested']
+        planner.pending = data['pending']
+        planner.hits = {int(c): v for c, v in data['hits'].items()}
+        planner.unresolved = [(group, changed) for group, changed in data['unresolved']]
+        planner.skipped = {int(c): r for c, r in data.get('skipped', {}).items()}
+        planner.smis = data['smis']
+        planner.checks = data['checks']
+        return planner
+
+    def save(self, path: str):
+        # Written aside and renamed, so a freeze mid-write keeps the last checkpoint
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def resume(cls, path: str, commands: Sequence[int] = range(0x100), max_group: int = 32) -> 'SmiSweepPlanner':
+        """Continue the sweep checkpointed at path, or start a new one"""
+        if os.path.exists(path):
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        return cls(commands, max_group)
+
+    def report(self, logger, names: Optional[Sequence[str]] = None):
+        done = self.total - len(self.untested) - sum(len(g) for g in self.pending)
+        logger.log(f"[*] SMI sweep: {done}/{self.total} commands cleared or pinpointed with {self.smis} SMI(s) "
+                   f"and {self.checks} fingerprint check(s)")
+        if not self.complete:
+            logger.log("    Sweep incomplete - run again to resume from the checkpoint")
+        for command, reason in sorted(self.skipped.items()):
+            logger.log(f"    Skipped 0x{command:02X} ({reason})")
+
+        def registers(changed):
+            return ', '.join(names[i] if names else str(i) for i in changed)
+
+        for command, changed in sorted(self.hits.items()):
+            logger.log_warning(f"SMI command 0x{command:02X} changes {registers(changed)}")
+        for group, changed in self.unresolved:
+            logger.log_warning(f"One of SMI commands 0x{min(group):02X}-0x{max(group):02X} changes "
+                               f"{registers(changed)} (could not be undone to narrow it down)")
+
+
+def _clamp(seconds: float, limit: float) -> float:
+    return min(max(seconds, 0.0), limit)
+
+
+def run_sweep(planner: SmiSweepPlanner, fire: Callable[[int], None], fingerprint: Callable[[], Tuple[int, ...]],
+              restore: Optional[Callable[[Tuple[int, ...]], None]] = None, gap: float = DEFAULT_GAP,
+              settle: float = DEFAULT_SETTLE, max_smis: Optional[int] = None, max_sleep: Optional[float] = None,
+              checkpoint: Optional[str] = None, clock=time) -> int:
+    """
+    Fire groups of SMI commands until the sweep completes or a budget is spent
+
+    Args:
+        planner: Plan to advance (fresh or resumed)
+        fire: Triggers one SMI, e.g. lambda cmd: cs.io.write_port_byte(APM_CNT, cmd)
+        fingerprint: Reads the watched registers as a tuple
+        restore: Called with the baseline after a change, to put the registers back
+        gap: Sleep between SMIs in a group (clamped to MAX_GAP)
+        settle: Sleep before fingerprinting (clamped to MAX_SETTLE)
+        max_smis: SMIs this run may fire
+        max_sleep: Seconds this run may sleep
+        checkpoint: JSON file the plan is saved to after every group
+        clock: Module providing sleep() (the caller's time module)
+
+    Returns:
+        SMIs fired by this run
+    """
+    gap = _clamp(gap, MAX_GAP)
+    settle = _clamp(settle, MAX_SETTLE)
+    fired = 0
+    slept = 0.0
+
+    baseline = fingerprint()
+    while True:
+        # Cut the next group down to what is left of the budgets
+        limit = None
+        if max_smis is not None:
+            limit = max_smis - fired
+        if max_sleep is not None:
+            left = max_sleep - slept - settle
+            affordable = int(left // gap) if gap > 0 else (None if left >= 0 else 0)
+            if affordable is not None:
+                limit = affordable if limit is None else min(limit, affordable)
+        if limit is not None and limit < 1:
+            break
+        group = planner.next_group(limit)
+        if group is None:
+            break
+        cost = len(group) * gap + settle
+
+        for i, command in enumerate(group):
+            fire(command)
+            fired += 1
+            planner.smis += 1
+            if i + 1 < len(group):
+                clock.sleep(gap)
+        clock.sleep(settle)
+        slept += cost
+
+        current = fingerprint()
+        changed = [i for i, (old, new) in enumerate(zip(baseline, current)) if old != new]
+        restored = True
+        if changed:
+            if restore is not None:
+                restore(baseline)
+                current = fingerprint()
+            restored = all(current[i] == baseline[i] for i in changed)
+            # Whatever could not be restored becomes the new reference
+            baseline = current
+        planner.record(group, changed, restored)
+        if checkpoint:
+            planner.save(checkpoint)
+
+    return fired
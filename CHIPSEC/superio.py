@@ -0,0 +1,324 @@
+"""
+Super I/O Identification and Resource Dump
+==========================================
+Identifies the Super I/O chip behind the LPC config ports (0x2E/0x4E) and
+dumps the resources of each of its logical devices (LDNs): I/O bases, IRQ
+and ISA DMA channel. These devices are what use the legacy 8237A DMA
+channels (floppy, parallel port ECP mode, some UARTs/IR).
+
+Each vendor's entry key is tried once per port, in an order that puts the
+keys shared by several vendors first:
+- 0x87 0x87: Winbond, Nuvoton and Fintek (exit: 0xAA to the index port)
+- 0x87 0x01 0x55 0x55 (0x55 0xAA on 0x4E): ITE (exit: 0x02 to register 0x02)
+- 0x55: SMSC/Microchip (exit: 0xAA)
+
+The chip ID (registers 0x20/0x21, and the Fintek vendor ID at 0x23/0x24) is
+looked up in SUPERIO_CHIPS, indexed by key family and ID. Revision bits are
+masked off per chip (the family's mask unless the chip sets its own), so
+every stepping of a chip is found with a lookup per distinct mask.
+
+The resource dump is planned up front and executed in one pass: select each
+known LDN once and read its activate, I/O base, IRQ and DMA registers. A
+present chip costs a fixed number of port accesses:
+    entry key + 4 (ID) + LDNs * (2 + 2 * len(LDN_REGISTERS)) + exit
+and an absent port only its entry keys, ID reads and exits. An ID missing
+from the database is confirmed with one more register read (an undecoded
+port can echo the last byte written) and its first 12 LDNs are dumped.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    inventory = SuperIoScanner(self.cs.io).scan()
+    for chip in inventory:
+        chip.report(self.logger)
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+CONFIG_PORTS = (0x2E, 0x4E)
+
+REG_LDN = 0x07
+REG_CHIP_ID_HI = 0x20
+REG_CHIP_ID_LO = 0x21
+REG_VENDOR_ID_HI = 0x23
+REG_VENDOR_ID_LO = 0x24
+REG_CONFIG_CTRL = 0x02
+
+REG_ACTIVATE = 0x30
+REG_IO_BASE0 = 0x60
+REG_IO_BASE1 = 0x62
+REG_IRQ0 = 0x70
+REG_DMA0 = 0x74
+
+# Registers read per logical device, in dump order
+LDN_REGISTERS = (REG_ACTIVATE, REG_IO_BASE0, REG_IO_BASE0 + 1, REG_IO_BASE1, REG_IO_BASE1 + 1, REG_IRQ0, REG_DMA0)
+
+# ISA PnP: DMA channel 4 (the cascade) means "no DMA"
+NO_DMA = 0x04
+
+FINTEK_VENDOR_ID = 0x1934
+
+WINBOND = 'Winbond/Nuvoton/Fintek'
+ITE = 'ITE'
+SMSC = 'SMSC'
+
+
+class EntryKey(NamedTuple):
+    family: str
+    keys: Dict[int, Tuple[int, ...]]  # config port -> bytes written to it
+    exit: Tuple[Tuple[str, int], ...]  # ('index' | 'data', value)
+    id_mask: int
+
+
+# Revision bits of the NCT67xx parts are 2:0 (NCT6796D 0xD420, NCT6798D
+# 0xD428), as in the Linux nct6775 driver - 0xFFF0 would fold one into the other
+NCT67XX_ID_MASK = 0xFFF8
+
+# The W83627HF/THF keep the revision in the whole low byte (Linux w83627hf)
+W83627HF_ID_MASK = 0xFF00
+
+ENTRY_KEYS = (
+    # W836xx and Fintek parts keep revisions in bits 3:0 (Linux w83627ehf, f71882fg)
+    EntryKey(WINBOND, {0x2E: (0x87, 0x87), 0x4E: (0x87, 0x87)}, (('index', 0xAA),), 0xFFF0),
+    EntryKey(ITE, {0x2E: (0x87, 0x01, 0x55, 0x55), 0x4E: (0x87, 0x01, 0x55, 0xAA)},
+             (('index', REG_CONFIG_CTRL), ('data', 0x02)), 0xFFFF),
+    EntryKey(SMSC, {0x2E: (0x55,), 0x4E: (0x55,)}, (('index', 0xAA),), 0xFF00),
+)
+
+
+class ChipInfo(NamedTuple):
+    name: str
+    ldns: Dict[int, str]
+    id_mask: Optional[int] = None  # Revision mask, when not the family's
+
+
+# Common logical device layouts
+_ITE_LDNS = {0x00: "FDC", 0x01: "UART 1", 0x02: "UART 2", 0x03: "Parallel", 0x04: "EC/HWM",
+             0x05: "KBC keyboard", 0x06: "KBC mouse", 0x07: "GPIO", 0x0A: "CIR"}
+_NUVOTON_LDNS = {0x00: "FDC", 0x01: "Parallel", 0x02: "UART A", 0x03: "UART B/IR", 0x05: "KBC",
+                 0x06: "CIR", 0x07: "GPIO 6-8", 0x08: "WDT/GPIO", 0x09: "GPIO 2-5", 0x0A: "ACPI",
+                 0x0B: "HWM/SB-TSI"}
+_FINTEK_LDNS = {0x00: "FDC", 0x01: "UART 1", 0x02: "UART 2", 0x03: "Parallel", 0x04: "HWM",
+                0x05: "KBC", 0x06: "GPIO", 0x07: "WDT", 0x0A: "PME/ACPI"}
+_SMSC_LDNS = {0x00: "FDC", 0x03: "Parallel", 0x04: "UART 1", 0x05: "UART 2", 0x07: "KBC",
+              0x0A: "Runtime registers"}
+
+# (key family, chip ID & chip mask) -> chip
+SUPERIO_CHIPS: Dict[Tuple[str, int], ChipInfo] = {
+    (ITE, 0x8712): ChipInfo("IT8712F", _ITE_LDNS),
+    (ITE, 0x8716): ChipInfo("IT8716F", _ITE_LDNS),
+    (ITE, 0x8718): ChipInfo("IT8718F", _ITE_LDNS),
+    (ITE, 0x8720): ChipInfo("IT8720F", _ITE_LDNS),
+    (ITE, 0x8721): ChipInfo("IT8721F", _ITE_LDNS),
+    (ITE, 0x8726): ChipInfo("IT8726F", _ITE_LDNS),
+    (ITE, 0x8728): ChipInfo("IT8728F", _ITE_LDNS),
+    (ITE, 0x8771): ChipInfo("IT8771E", _ITE_LDNS),
+    (ITE, 0x8772): ChipInfo("IT8772E", _ITE_LDNS),
+    (ITE, 0x8613): ChipInfo("IT8613E", _ITE_LDNS),
+    (ITE, 0x8620): ChipInfo("IT8620E", _ITE_LDNS),
+    (ITE, 0x8628): ChipInfo("IT8628E", _ITE_LDNS),
+    (ITE, 0x8655): ChipInfo("IT8655E", _ITE_LDNS),
+    (ITE, 0x8665): ChipInfo("IT8665E", _ITE_LDNS),
+    (ITE, 0x8686): ChipInfo("IT8686E", _ITE_LDNS),
+    (ITE, 0x8688): ChipInfo("IT8688E", _ITE_LDNS),
+    (ITE, 0x8795): ChipInfo("IT8795E", _ITE_LDNS),
+    (WINBOND, 0x5200): ChipInfo("W83627HF", _NUVOTON_LDNS, W83627HF_ID_MASK),
+    (WINBOND, 0x8200): ChipInfo("W83627THF", _NUVOTON_LDNS, W83627HF_ID_MASK),
+    (WINBOND, 0x8850): ChipInfo("W83627EHF", _NUVOTON_LDNS),
+    (WINBOND, 0x8860): ChipInfo("W83627EHG", _NUVOTON_LDNS),
+    (WINBOND, 0xA020): ChipInfo("W83627DHG", _NUVOTON_LDNS),
+    (WINBOND, 0xB070): ChipInfo("W83627DHG-P", _NUVOTON_LDNS),
+    (WINBOND, 0xA510): ChipInfo("W83667HG", _NUVOTON_LDNS),
+    (WINBOND, 0xB350): ChipInfo("W83667HG-B", _NUVOTON_LDNS),
+    (WINBOND, 0xB470): ChipInfo("NCT6775F", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xC330): ChipInfo("NCT6776F", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xC560): ChipInfo("NCT6779D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xC800): ChipInfo("NCT6791D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xC910): ChipInfo("NCT6792D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xD120): ChipInfo("NCT6793D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xD350): ChipInfo("NCT6795D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xD420): ChipInfo("NCT6796D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xD450): ChipInfo("NCT6797D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0xD428): ChipInfo("NCT6798D", _NUVOTON_LDNS, NCT67XX_ID_MASK),
+    (WINBOND, 0x0540): ChipInfo("F71882FG", _FINTEK_LDNS),
+    (WINBOND, 0x0600): ChipInfo("F71862FG", _FINTEK_LDNS),
+    (WINBOND, 0x0720): ChipInfo("F71889", _FINTEK_LDNS),
+    (WINBOND, 0x0810): ChipInfo("F71869", _FINTEK_LDNS),
+    (WINBOND, 0x0900): ChipInfo("F71808E", _FINTEK_LDNS),
+    (WINBOND, 0x1010): ChipInfo("F81866", _FINTEK_LDNS),
+    (SMSC, 0x5900): ChipInfo("LPC47M10x", _SMSC_LDNS),
+    (SMSC, 0x6000): ChipInfo("LPC47M15x", _SMSC_LDNS),
+    (SMSC, 0x7A00): ChipInfo("LPC47N217", _SMSC_LDNS),
+    (SMSC, 0x7C00): ChipInfo("SCH3112", _SMSC_LDNS),
+    (SMSC, 0x7D00): ChipInfo("SCH3116", _SMSC_LDNS),
+    (SMSC, 0x7F00): ChipInfo("SCH3114", _SMSC_LDNS),
+}
+
+# LDNs dumped for a chip answering with an ID missing from the database
+UNKNOWN_CHIP_LDNS = range(0x0C)
+
+
+def lookup_chip(family: str, chip_id: int, mask: int) -> Optional[ChipInfo]:
+    """
+    Database entry for an ID read after family's entry key: the exact ID
+    first, then each revision mask in use (mask is the family's), keeping
+    the most revision bits first. A masked ID only matches a chip that uses
+    that mask.
+    """
+    chip = SUPERIO_CHIPS.get((family, chip_id))
+    if chip is not None:
+        return chip
+    masks = {info.id_mask or mask for (chip_family, _), info in SUPERIO_CHIPS.items() if chip_family == family}
+    for chip_mask in sorted(masks, key=lambda m: (-bin(m).count('1'), m)):
+        chip = SUPERIO_CHIPS.get((family, chip_id & chip_mask))
+        if chip is not None and (chip.id_mask or mask) == chip_mask:
+            return chip
+    return None
+
+
+def _plausible_id(chip_id: int) -> bool:
+    # Nothing decoded reads 0xFF; a chip still locked reads 0x00 or echoes
+    return chip_id not in (0x0000, 0xFFFF) and chip_id >> 8 not in (0x00, 0xFF)
+
+
+class LogicalDevice(NamedTuple):
+    ldn: int
+    name: str
+    active: bool
+    io_bases: Tuple[int, ...]
+    irq: int
+    dma: Optional[int]
+
+    def __str__(self):
+        io = ', '.join(f"0x{base:X}" for base in self.io_bases) or "none"
+        dma = str(self.dma) if self.dma is not None else "none"
+        state = "active" if self.active else "inactive"
+        return f"LDN 0x{self.ldn:02X} {self.name}: {state}, I/O {io}, IRQ {self.irq}, DMA {dma}"
+
+
+class SuperIoChip(NamedTuple):
+    port: int
+    family: str
+    chip_id: int
+    name: str
+    devices: List[LogicalDevice]
+    accesses: int
+
+    def dma_users(self) -> List[LogicalDevice]:
+        return [device for device in self.devices if device.active and device.dma is not None]
+
+    def report(self, logger):
+        logger.log(f"Found Super I/O chip at 0x{self.port:02X}: {self.name} ({self.family}, ID=0x{self.chip_id:04X})")
+        for device in self.devices:
+            logger.log(f"  {device}")
+        for device in self.dma_users():
+            logger.log_warning(f"  Logical device 0x{device.ldn:02X} ({device.name}) is using DMA channel {device.dma}")
+
+
+class SuperIoScanner(object):
+    """
+    Entry-key probing and single-pass LDN dump over cs.io
+
+    Args:
+        io: cs.io (read_port_byte/write_port_byte)
+        ports: Config index ports to probe (data port is index + 1)
+
+    Attributes:
+        accesses: Port reads and writes issued so far
+    """
+
+    def __init__(self, io, ports: Sequence[int] = CONFIG_PORTS):
+        self.io = io
+        self.ports = ports
+        self.accesses = 0
+
+    def _write(self, port: int, value: int):
+        self.accesses += 1
+        self.io.write_port_byte(port, value)
+
+    def _read(self, port: int) -> int:
+        self.accesses += 1
+        return self.io.read_port_byte(port)
+
+    def _run(self, plan: List[tuple]) -> List[int]:
+        """Execute ('w', port, value) / ('r', port) steps in order; returns the reads"""
+        values = []
+        for step in plan:
+            if step[0] == 'w':
+                self._write(step[1], step[2])
+            else:
+                values.append(self._read(step[1]))
+        return values
+
+    @staticmethod
+    def _register(index: int, reg: int) -> List[tuple]:
+        return [('w', index, reg), ('r', index + 1)]
+
+    def _exit(self, index: int, key: EntryKey):
+        self._run([('w', index if target == 'index' else index + 1, value) for target, value in key.exit])
+
+    def _identify(self, index: int, key: EntryKey) -> Optional[Tuple[int, ChipInfo]]:
+        plan = [('w', index, value) for value in key.keys[index]]
+        plan += self._register(index, REG_CHIP_ID_HI) + self._register(index, REG_CHIP_ID_LO)
+        hi, lo = self._run(plan)
+        chip_id = (hi << 8) | lo
+        if not _plausible_id(chip_id):
+            return None
+
+        chip = lookup_chip(key.family, chip_id, key.id_mask)
+        if chip is None and key.family == WINBOND:
+            # Fintek parts answer the same key; their vendor ID tells them apart
+            vendor_hi, vendor_lo = self._run(self._register(index, REG_VENDOR_ID_HI) +
+                                             self._register(index, REG_VENDOR_ID_LO))
+            if (vendor_hi << 8) | vendor_lo == FINTEK_VENDOR_ID:
+                chip = ChipInfo(f"Fintek 0x{chip_id:04X}", _FINTEK_LDNS)
+        if chip is None:
+            # An undecoded data port may just return the last byte written to
+            # it; a real chip still answers its ID after another data write
+            check = [('w', index, REG_LDN), ('w', index + 1, 0x00)] + self._register(index, REG_CHIP_ID_HI)
+            if self._run(check) != [hi]:
+                return None
+            chip = ChipInfo(f"unknown {key.family} 0x{chip_id:04X}", {ldn: f"LDN {ldn}" for ldn in UNKNOWN_CHIP_LDNS})
+        return chip_id, chip
+
+    def _dump(self, index: int, chip: ChipInfo) -> List[LogicalDevice]:
+        # Plan every LDN select and register read, then run it in one pass
+        plan = []
+        for ldn in chip.ldns:
+            plan += [('w', index, REG_LDN), ('w', index + 1, ldn)]
+            for reg in LDN_REGISTERS:
+                plan += self._register(index, reg)
+        values = self._run(plan)
+
+        devices = []
+        per_ldn = len(LDN_REGISTERS)
+        for i, (ldn, name) in enumerate(chip.ldns.items()):
+            active, base0_hi, base0_lo, base1_hi, base1_lo, irq, dma = values[i * per_ldn:(i + 1) * per_ldn]
+            io_bases = tuple(base for base in ((base0_hi << 8) | base0_lo, (base1_hi << 8) | base1_lo) if base)
+            dma = dma & 0x07
+            devices.append(LogicalDevice(ldn, name, bool(active & 0x01), io_bases, irq & 0x0F,
+                                         dma if dma != NO_DMA else None))
+        return devices
+
+    def probe(self, index: int) -> Optional[SuperIoChip]:
+        """Identify and dump the chip behind one config port, or None"""
+        start = self.accesses
+        for key in ENTRY_KEYS:
+            if index not in key.keys:
+                continue
+            try:
+                found = self._identify(index, key)
+                if found is not None:
+                    chip_id, chip = found
+                    devices = self._dump(index, chip)
+                    self._exit(index, key)
+                    return SuperIoChip(index, key.family, chip_id, chip.name, devices, self.accesses - start)
+            except Exception:
+                pass
+            # Leave config mode before trying the next vendor's key
+            self._exit(index, key)
+        return None
+
+    def scan(self) -> List[SuperIoChip]:
+        """Probe every config port; one SuperIoChip per chip found"""
+        return [chip for chip in (self.probe(port) for port in self.ports) if chip is not None]
@@ -0,0 +1,70 @@
+"""
+Tests for superio.py chip identification
+
+Run from this directory:
+    python -m unittest test_superio
+"""
+
+import unittest
+
+from sim_chipset import SimChipset, SimSuperIo
+from superio import ENTRY_KEYS, ITE, SMSC, WINBOND, SuperIoScanner, lookup_chip
+
+MASKS = {key.family: key.id_mask for key in ENTRY_KEYS}
+
+
+class LookupChipTest(unittest.TestCase):
+
+    def test_exact_ids(self):
+        self.assertEqual(lookup_chip(WINBOND, 0xD420, MASKS[WINBOND]).name, "NCT6796D")
+        self.assertEqual(lookup_chip(WINBOND, 0xD428, MASKS[WINBOND]).name, "NCT6798D")
+        self.assertEqual(lookup_chip(ITE, 0x8688, MASKS[ITE]).name, "IT8688E")
+
+    def test_nuvoton_revision_bits(self):
+        # Bits 2:0 are the revision; bit 3 tells NCT6796D and NCT6798D apart
+        for revision in range(8):
+            self.assertEqual(lookup_chip(WINBOND, 0xD420 | revision, MASKS[WINBOND]).name, "NCT6796D")
+            self.assertEqual(lookup_chip(WINBOND, 0xD428 | revision, MASKS[WINBOND]).name, "NCT6798D")
+        self.assertEqual(lookup_chip(WINBOND, 0xC562, MASKS[WINBOND]).name, "NCT6779D")
+
+    def test_winbond_revision_bits(self):
+        # W836xx parts keep the revision in bits 3:0, the W83627HF in the low byte
+        self.assertEqual(lookup_chip(WINBOND, 0xB078, MASKS[WINBOND]).name, "W83627DHG-P")
+        self.assertEqual(lookup_chip(WINBOND, 0xA023, MASKS[WINBOND]).name, "W83627DHG")
+        self.assertEqual(lookup_chip(WINBOND, 0x523A, MASKS[WINBOND]).name, "W83627HF")
+        self.assertEqual(lookup_chip(WINBOND, 0x8853, MASKS[WINBOND]).name, "W83627EHF")
+        self.assertEqual(lookup_chip(WINBOND, 0x8861, MASKS[WINBOND]).name, "W83627EHG")
+
+    def test_fintek_revision_bits(self):
+        self.assertEqual(lookup_chip(WINBOND, 0x0541, MASKS[WINBOND]).name, "F71882FG")
+
+    def test_smsc_revision_byte(self):
+        self.assertEqual(lookup_chip(SMSC, 0x5903, MASKS[SMSC]).name, "LPC47M10x")
+
+    def test_unknown_id(self):
+        self.assertIsNone(lookup_chip(ITE, 0x8689, MASKS[ITE]))
+        self.assertIsNone(lookup_chip(WINBOND, 0xD430, MASKS[WINBOND]))
+
+
+class ScannerTest(unittest.TestCase):
+
+    def scan(self, key, chip_id):
+        chipset = SimChipset(record_accesses=False)
+        chipset.io.superio[0x2E] = SimSuperIo(key, {0x20: chip_id >> 8, 0x21: chip_id & 0xFF}, {})
+        return SuperIoScanner(chipset.io, ports=(0x2E,)).scan()
+
+    def test_nct6798d_revision(self):
+        chips = self.scan([0x87, 0x87], 0xD42B)
+        self.assertEqual([(chip.name, chip.chip_id) for chip in chips], [("NCT6798D", 0xD42B)])
+
+    def test_nct6796d_revision(self):
+        chips = self.scan([0x87, 0x87], 0xD423)
+        self.assertEqual([chip.name for chip in chips], ["NCT6796D"])
+
+    def test_w83627dhg_p_revision(self):
+        chips = self.scan([0x87, 0x87], 0xB078)
+        self.assertEqual([(chip.name, chip.chip_id) for chip in chips], [("W83627DHG-P", 0xB078)])
+
+
+if __name__ == "__main__":
+    unittest.main()
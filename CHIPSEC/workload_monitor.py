@@ -0,0 +1,442 @@
+"""
+Unattended Workload-Correlated Register Monitoring
+==================================================
+Replaces "please open a web page, then press Enter" with built-in synthetic
+workloads: a RegisterSampler runs in a background thread for the whole
+campaign while each workload is driven for a fixed window in turn, with an
+idle window before the first one and between the others.
+
+Workloads:
+- disk: write, fsync and re-read a scratch file (its cache is dropped before
+  reading back where posix_fadvise is available)
+- net: TCP stream over the loopback interface
+- usb: GET_DESCRIPTOR control transfers to every device in /dev/bus/usb
+  (real bus traffic, needs root); without access the sysfs descriptors of
+  every device are re-read instead
+- audio: silence played to the ALSA 'null' device with aplay
+
+Every window is stamped with monotonic_ns() on the same clock as the sampler,
+so each recorded register transition is attributed to the window its
+timestamp falls in ('idle' between workloads). A workload whose transition
+rate is above the idle rate is reported as correlated.
+
+Placed next to the CHIPSEC modules in 'chipsec/modules/common'.
+
+Usage (in a module):
+    read_fn = make_pci_reader(self.cs.pci, 0, 0x1F, 0, offsets)
+    result = run_campaign(read_fn, names, build_workloads(['disk', 'net']), window=5.0, clock=time)
+    result.report(self.logger)
+    result.write_json("workload_correlation.json")
+"""
+
+import abc
+import ctypes
+import glob
+import json
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from chipsec.modules.common.dma_reg_sampler import RegisterSampler
+except ImportError:
+    from dma_reg_sampler import RegisterSampler
+
+try:
+    import fcntl
+except ImportError:
+    # Missing on Windows - the USB workload then has no device nodes to use
+    fcntl = None
+
+SYSFS_USB_DEVICES = '/sys/bus/usb/devices'
+USB_DEVICE_NODES = '/dev/bus/usb'
+
+# struct usbdevfs_ctrltransfer and _IOWR('U', 0, ...)
+USBDEVFS_CTRLTRANSFER = struct.Struct('@BBHHHIP')
+USBDEVFS_CONTROL = 0xC0000000 | (USBDEVFS_CTRLTRANSFER.size << 16) | (ord('U') << 8)
+USB_DIR_IN = 0x80
+USB_REQ_GET_DESCRIPTOR = 0x06
+USB_DT_DEVICE = 0x01
+USB_DEVICE_DESCRIPTOR_SIZE = 18
+
+AUDIO_DEVICE = 'null'
+
+DISK_BLOCK = 1 << 20
+DISK_FILE_BLOCKS = 16
+NET_CHUNK = 1 << 16
+
+DEFAULT_WINDOW = 5.0
+DEFAULT_IDLE = 2.0
+# Sleep-based: a shorter interval than dma_reg_sampler.SPIN_THRESHOLD_NS spins a core
+DEFAULT_RATE = 100
+
+IDLE = 'idle'
+
+
+class Workload(abc.ABC):
+    """A synthetic activity driven for one window; subclasses implement run()"""
+
+    name = ''
+    unit = 'ops'
+
+    def unavailable(self) -> Optional[str]:
+        """Why the workload cannot run here, or None"""
+        return None
+
+    @abc.abstractmethod
+    def run(self, deadline_ns: int, clock) -> int:
+        """Generate activity until clock.monotonic_ns() reaches deadline_ns; returns units done"""
+
+
+class DiskWorkload(Workload):
+    """Write, fsync and read back a scratch file in directory"""
+
+    name = 'disk'
+    unit = 'bytes'
+
+    def __init__(self, directory: str = '.'):
+        self.directory = directory
+
+    def run(self, deadline_ns: int, clock) -> int:
+        path = os.path.join(self.directory, f".workload_disk.{os.getpid()}")
+        block = os.urandom(DISK_BLOCK)
+        done = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            while clock.monotonic_ns() < deadline_ns:
+                os.lseek(fd, 0, os.SEEK_SET)
+                for _ in range(DISK_FILE_BLOCKS):
+                    done += os.write(fd, block)
+                os.fsync(fd)
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                os.lseek(fd, 0, os.SEEK_SET)
+                while True:
+                    data = os.read(fd, DISK_BLOCK)
+                    if not data:
+                        break
+                    done += len(data)
+        finally:
+            os.close(fd)
+            os.unlink(path)
+        return done
+
+
+class LoopbackNetWorkload(Workload):
+    """Stream data through a TCP connection on 127.0.0.1"""
+
+    name = 'net'
+    unit = 'bytes'
+
+    def run(self, deadline_ns: int, clock) -> int:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        client = socket.create_connection(server.getsockname())
+        peer, _ = server.accept()
+
+        def drain():
+            while peer.recv(NET_CHUNK):
+                pass
+        reader = threading.Thread(target=drain, daemon=True)
+        reader.start()
+
+        chunk = bytes(NET_CHUNK)
+        done = 0
+        try:
+            while clock.monotonic_ns() < deadline_ns:
+                client.sendall(chunk)
+                done += len(chunk)
+        finally:
+            client.close()
+            reader.join(1.0)
+            peer.close()
+            server.close()
+        return done
+
+
+class UsbWorkload(Workload):
+    """GET_DESCRIPTOR requests to every USB device, or sysfs descriptor re-reads"""
+
+    name = 'usb'
+    unit = 'requests'
+
+    def __init__(self):
+        self.nodes = sorted(glob.glob(os.path.join(USB_DEVICE_NODES, '*', '*'))) if fcntl else []
+        self.sysfs = sorted(glob.glob(os.path.join(SYSFS_USB_DEVICES, '*', 'descriptors')))
+
+    def unavailable(self) -> Optional[str]:
+        if not self.nodes and not self.sysfs:
+            return "no USB devices found"
+        return None
+
+    def _control(self, fd: int, buffer) -> None:
+        request = USBDEVFS_CTRLTRANSFER.pack(USB_DIR_IN, USB_REQ_GET_DESCRIPTOR, USB_DT_DEVICE << 8, 0,
+                                             USB_DEVICE_DESCRIPTOR_SIZE, 100, ctypes.addressof(buffer))
+        fcntl.ioctl(fd, USBDEVFS_CONTROL, bytearray(request))
+
+    def run(self, deadline_ns: int, clock) -> int:
+        handles = []
+        for node in self.nodes:
+            try:
+                handles.append(os.open(node, os.O_RDWR))
+            except OSError:
+                pass
+        buffer = ctypes.create_string_buffer(USB_DEVICE_DESCRIPTOR_SIZE)
+        done = 0
+        try:
+            while clock.monotonic_ns() < deadline_ns:
+                if handles:
+                    for fd in handles:
+                        try:
+                            self._control(fd, buffer)
+                            done += 1
+                        except OSError:
+                            pass
+                else:
+                    for path in self.sysfs:
+                        with open(path, 'rb') as f:
+                            f.read()
+                        done += 1
+        finally:
+            for fd in handles:
+                os.close(fd)
+        return done
+
+
+class AudioWorkload(Workload):
+    """Play silence to an ALSA device (the null sink by default) with aplay"""
+
+    name = 'audio'
+    unit = 'polls'
+
+    def __init__(self, device: str = AUDIO_DEVICE):
+        self.device = device
+        self.player = shutil.which('aplay')
+
+    def unavailable(self) -> Optional[str]:
+        return None if self.player else "aplay not found"
+
+    def run(self, deadline_ns: int, clock) -> int:
+        process = subprocess.Popen([self.player, '-q', '-D', self.device, '-t', 'raw', '-f', 'S16_LE',
+                                    '-r', '48000', '-c', '2', '/dev/zero'],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        polls = 0
+        try:
+            while clock.monotonic_ns() < deadline_ns and process.poll() is None:
+                clock.sleep(0.05)
+                polls += 1
+        finally:
+            process.terminate()
+            process.wait()
+        return polls
+
+
+WORKLOADS: Dict[str, Callable[[], Workload]] = {
+    'disk': DiskWorkload,
+    'net': LoopbackNetWorkload,
+    'usb': UsbWorkload,
+    'audio': AudioWorkload,
+}
+
+
+def build_workloads(names: Optional[Sequence[str]] = None) -> List[Workload]:
+    """Instantiate workloads by name (all of them, in WORKLOADS order, when None)"""
+    names = list(WORKLOADS) if not names else names
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        raise ValueError(f"Unknown workload(s): {', '.join(unknown)} (known: {', '.join(WORKLOADS)})")
+    return [WORKLOADS[name]() for name in names]
+
+
+class WorkloadWindow(NamedTuple):
+    name: str
+    start_ns: int
+    end_ns: int
+    done: int
+    unit: str
+    error: Optional[str]
+
+    @property
+    def seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+
+class CampaignResult(object):
+    """
+    Sampler transitions attributed to workload windows
+
+    Attributes:
+        names: Register names
+        windows: WorkloadWindow per window, idle ones included, in run order
+        transitions: [(timestamp_ns, values)] from the sampler, the first being the starting state
+        stats: SamplerStats of the background sampler
+        error: Why the campaign stopped early, if it did
+    """
+
+    def __init__(self, names: Sequence[str], windows: List[WorkloadWindow],
+                 transitions: List[Tuple[int, Tuple[int, ...]]], stats, error: Optional[str] = None):
+        self.names = list(names)
+        self.windows = windows
+        self.transitions = transitions
+        self.stats = stats
+        self.error = error
+
+    def window_at(self, timestamp: int) -> str:
+        for window in self.windows:
+            if window.start_ns <= timestamp < window.end_ns:
+                return window.name
+        return IDLE
+
+    def events(self) -> List[Tuple[int, str, List[Tuple[str, int, int]]]]:
+        """[(timestamp_ns, window, [(register, old, new)])] for every transition"""
+        events = []
+        for (_, previous), (timestamp, values) in zip(self.transitions, self.transitions[1:]):
+            changes = [(name, old, new) for name, old, new in zip(self.names, previous, values) if old != new]
+            events.append((timestamp, self.window_at(timestamp), changes))
+        return events
+
+    def summary(self) -> Dict[str, dict]:
+        """Per window name: seconds covered, transitions, rate and changes per register"""
+        summary = {}
+        for window in self.windows:
+            entry = summary.setdefault(window.name, {'seconds': 0.0, 'transitions': 0, 'done': 0,
+                                                     'unit': window.unit, 'error': window.error,
+                                                     'registers': {}})
+            entry['seconds'] += window.seconds
+            entry['done'] += window.done
+        for _, name, changes in self.events():
+            entry = summary.setdefault(name, {'seconds': 0.0, 'transitions': 0, 'done': 0, 'unit': '',
+                                              'error': None, 'registers': {}})
+            entry['transitions'] += 1
+            for register, _, _ in changes:
+                entry['registers'][register] = entry['registers'].get(register, 0) + 1
+        for entry in summary.values():
+            entry['rate'] = entry['transitions'] / entry['seconds'] if entry['seconds'] else 0.0
+        return summary
+
+    def correlated(self) -> List[str]:
+        """Workloads with a higher transition rate than the idle windows"""
+        summary = self.summary()
+        idle_rate = summary.get(IDLE, {}).get('rate', 0.0)
+        return [name for name, entry in summary.items()
+                if name != IDLE and entry['transitions'] and entry['rate'] > idle_rate]
+
+    def report(self, logger, max_lines: int = 20):
+        if self.stats is not None:
+            logger.log(f"[*] Background sampler: {self.stats.samples} samples ({self.stats.rate:.0f}/s), "
+                       f"{self.stats.transitions} transition(s), largest gap {self.stats.max_gap_ns / 1e6:.3f} ms")
+        if self.error:
+            logger.log_warning(f"Campaign stopped early: {self.error}")
+
+        summary = self.summary()
+        logger.log(f"    {'Window':<8} {'Seconds':>8} {'Work done':>20} {'Transitions':>12} {'Per s':>8}  Registers")
+        for name, entry in summary.items():
+            if entry['error']:
+                logger.log(f"    {name:<8} skipped: {entry['error']}")
+                continue
+            registers = ", ".join(f"{r} x{n}" for r, n in sorted(entry['registers'].items()))
+            done = f"{entry['done']} {entry['unit']}" if name != IDLE else "-"
+            logger.log(f"    {name:<8} {entry['seconds']:>8.2f} {done:>20} {entry['transitions']:>12} "
+                       f"{entry['rate']:>8.2f}  {registers}")
+
+        events = self.events()
+        if events:
+            start = self.windows[0].start_ns if self.windows else events[0][0]
+            for timestamp, name, changes in events[:max_lines]:
+                text = ", ".join(f"{r}: 0x{old:08X} -> 0x{new:08X}" for r, old, new in changes)
+                logger.log(f"  +{(timestamp - start) / 1e6:.3f} ms [{name}] {text}")
+            if len(events) > max_lines:
+                logger.log(f"  ... {len(events) - max_lines} more transitions not shown")
+
+        correlated = self.correlated()
+        if correlated:
+            for name in correlated:
+                logger.log_warning(f"Register transitions correlate with the {name} workload "
+                                   f"({summary[name]['rate']:.2f}/s vs {summary.get(IDLE, {}).get('rate', 0.0):.2f}/s idle)")
+        else:
+            logger.log_good("No workload changed the registers more often than idle")
+
+    def to_dict(self) -> dict:
+        return {'names': self.names, 'error': self.error,
+                'windows': [w._asdict() for w in self.windows],
+                'events': [{'timestamp_ns': t, 'window': name, 'changes': [list(c) for c in changes]}
+                           for t, name, changes in self.events()],
+                'summary': self.summary()}
+
+    def write_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+def run_campaign(read_fn: Callable[[], Sequence[int]], names: Sequence[str], workloads: Sequence[Workload],
+                 window: float = DEFAULT_WINDOW, idle: float = DEFAULT_IDLE, rate: float = DEFAULT_RATE,
+                 clock=time, logger=None) -> CampaignResult:
+    """
+    Sample registers in the background while each workload runs for one window
+
+    Args:
+        read_fn: Returns the current register values (see dma_reg_sampler.make_pci_reader)
+        names: Register names, one per value
+        workloads: Workloads to drive, in order
+        window: Seconds each workload runs
+        idle: Seconds of idle before the first workload and after each one
+        rate: Target samples per second (0 busy-polls)
+        clock: Module providing monotonic_ns() and sleep() (the caller's time module)
+        logger: When given, each window is announced
+
+    Returns:
+        CampaignResult
+    """
+    sampler = RegisterSampler.at_rate(read_fn, names, rate)
+    stop = threading.Event()
+    failure = []
+
+    def sample():
+        try:
+            sampler.run(stop_event=stop)
+        except BaseException as e:
+            failure.append(f"sampler: {type(e).__name__} {e}".strip())
+
+    windows: List[WorkloadWindow] = []
+
+    def idle_window():
+        start = clock.monotonic_ns()
+        clock.sleep(idle)
+        windows.append(WorkloadWindow(IDLE, start, clock.monotonic_ns(), 0, '', None))
+
+    thread = threading.Thread(target=sample, name='register-sampler', daemon=True)
+    thread.start()
+    error = None
+    try:
+        idle_window()
+        for workload in workloads:
+            reason = workload.unavailable()
+            now = clock.monotonic_ns()
+            if reason:
+                windows.append(WorkloadWindow(workload.name, now, now, 0, workload.unit, reason))
+                continue
+            if logger is not None:
+                logger.log(f"Running {workload.name} workload for {window:.1f}s...")
+            start = clock.monotonic_ns()
+            try:
+                done = workload.run(start + int(window * 1e9), clock)
+                failed = None
+            except OSError as e:
+                done, failed = 0, str(e)
+            windows.append(WorkloadWindow(workload.name, start, clock.monotonic_ns(), done, workload.unit, failed))
+            idle_window()
+            if failure:
+                break
+    except KeyboardInterrupt:
+        error = "interrupted"
+    finally:
+        stop.set()
+        thread.join()
+
+    return CampaignResult(names, windows, sampler.transitions(), sampler.stats, error or (failure[0] if failure else None))